@@ -5,6 +5,7 @@ CONFIGURACIÓN CORREGIDA PARA DESPLIEGUE GRATUITO EN NUBE (Render/Railway).
 
 from pathlib import Path
 import os
+import sys
 from django.utils.translation import gettext_lazy as _
 
 # Construye paths dentro del proyecto: BASE_DIR / 'subdir'.
@@ -100,6 +101,10 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Activa el shard (base de datos) del usuario autenticado
+    'mi_finanzas.shards.ShardMiddleware',
+    # Tras una escritura, las siguientes lecturas del usuario van a la primaria
+    'mi_finanzas.replicas.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -152,6 +157,38 @@ DATABASES = {
     }
 }
 
+# 'manage.py test' declara además las bases de prueba del reparto y de la réplica
+# (en memoria durante los tests); fuera de los tests solo existen las que se configuran.
+_PRUEBAS = sys.argv[1:2] == ['test']
+
+# Shards: bases donde se reparten los datos de los usuarios (mi_finanzas/shards.py).
+# Por defecto solo 'default'. Para repartir: MI_FINANZAS_SHARDS=default,shard_1,shard_2
+# y 'python manage.py migrate --database=shard_1' (etc.) antes de arrancar.
+MI_FINANZAS_SHARDS = [
+    alias.strip() for alias in os.environ.get('MI_FINANZAS_SHARDS', 'default').split(',') if alias.strip()
+]
+for _alias in sorted(set(MI_FINANZAS_SHARDS) | ({'shard_1', 'shard_2'} if _PRUEBAS else set())):
+    DATABASES.setdefault(_alias, {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / f'db_{_alias}.sqlite3',
+    })
+
+# Réplicas de lectura (mi_finanzas/replicas.py): primaria -> réplica, p. ej.
+# MI_FINANZAS_REPLICAS=default:replica,shard_1:replica_1. Por defecto ninguna.
+MI_FINANZAS_REPLICAS = dict(
+    par.strip().split(':', 1) for par in os.environ.get('MI_FINANZAS_REPLICAS', '').split(',') if ':' in par
+)
+for _alias in sorted(set(MI_FINANZAS_REPLICAS.values()) | ({'replica'} if _PRUEBAS else set())):
+    DATABASES.setdefault(_alias, {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / f'db_{_alias}.sqlite3',
+    })
+# Lectura de lo propio escrito: peticiones (y segundos como máximo) que leen de la primaria tras un POST
+MI_FINANZAS_PRIMARIO_TRAS_ESCRITURA = 3
+MI_FINANZAS_PRIMARIO_TRAS_ESCRITURA_SEGUNDOS = 30
+
+DATABASE_ROUTERS = ['mi_finanzas.shards.RouterShards']
+
 
 # ----------------------------------------------------------------------
 # ARCHIVOS ESTÁTICOS Y MEDIA
@@ -180,3 +217,22 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Necesarias para crispy_forms
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
+
+# Política ante transacciones duplicadas (misma huella) en inserciones por lotes:
+# 'OMITIR' (descarta duplicados), 'ERROR' (aborta el lote) o 'PERMITIR'.
+MI_FINANZAS_POLITICA_DUPLICADOS = 'OMITIR'
+
+# Horizonte del archivo en frío: las transacciones anteriores a este número de
+# meses se mueven a TransaccionArchivada con 'python manage.py archivar'.
+MI_FINANZAS_HORIZONTE_ARCHIVO_MESES = 24
+
+# Cola de tareas en segundo plano (mi_finanzas/tareas.py): espera entre
+# reintentos (exponencial, en segundos) y tiempo sin latido tras el cual una
+# tarea EN_CURSO se considera colgada y se reencola. Cada trabajador renueva
+# el latido de sus tareas cada MI_FINANZAS_TAREAS_LATIDO segundos y busca
+# tareas colgadas (de trabajadores caídos) cada MI_FINANZAS_TAREAS_RECUPERAR_CADA.
+MI_FINANZAS_TAREAS_ESPERA_BASE = 30
+MI_FINANZAS_TAREAS_ESPERA_MAXIMA = 3600
+MI_FINANZAS_TAREAS_TIEMPO_LIMITE = 900
+MI_FINANZAS_TAREAS_LATIDO = 30
+MI_FINANZAS_TAREAS_RECUPERAR_CADA = 60
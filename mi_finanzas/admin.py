@@ -1,33 +1,137 @@
 from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
 # Importamos todos los modelos que se van a registrar en este archivo
-from .models import Cuenta, Transaccion, Categoria, TransaccionRecurrente, Presupuesto 
+from .models import (
+    Cuenta, Transaccion, Categoria, TransaccionRecurrente, Presupuesto,
+    TransaccionArchivada, SaldoApertura, Tarea, AsignacionShard, OcurrenciaRecurrente,
+    Prestamo, CuotaPrestamo, Posicion, PrecioActivo, DivisionTransaccion, Etiqueta,
+    AnomaliaGasto, MiembroCuenta,
+)
+from .replicas import en_replica, usar_replica
+from .shards import alias_admin, en_cada_shard, en_shard, es_modelo_shard, shards
+
+User = get_user_model()
+
+# -------------------------------------------------------------------------
+# 0. ADMIN SOBRE VARIOS SHARDS (?shard=<alias> elige la base consultada)
+# -------------------------------------------------------------------------
+
+class FiltroShard(admin.SimpleListFilter):
+    title = 'shard'
+    parameter_name = 'shard'
+
+    def lookups(self, request, model_admin):
+        # Fan-out: un COUNT por shard
+        conteos = en_cada_shard(lambda alias: model_admin.model.objects.using(alias).count())
+        return [(alias, f"{alias} ({total})") for alias, total in conteos.items()]
+
+    def queryset(self, request, queryset):
+        # La vista entera ya se ejecuta en el shard elegido (ShardAdminMixin)
+        return queryset
+
+
+class ShardAdminMixin:
+    """
+    Ejecuta las vistas del admin (incluido el renderizado) en el shard elegido.
+    Sin ?shard= se consulta 'default'. En otro shard no existe auth_user, así que
+    no se hace JOIN con el usuario: la búsqueda por username se resuelve en 'default'.
+    """
+
+    def _en_shard(self, vista, request, *args):
+        with en_shard(alias_admin(request)):
+            respuesta = vista(request, *args)
+            if hasattr(respuesta, 'render') and not respuesta.is_rendered:
+                respuesta.render()
+        return respuesta
+
+    def changelist_view(self, request, extra_context=None):
+        # Los listados (GET) leen de la réplica del shard, si la hay
+        with en_replica(usar_replica(request)):
+            return self._en_shard(super().changelist_view, request, extra_context)
+
+    def changeform_view(self, request, object_id=None, form_url='', extra_context=None):
+        return self._en_shard(super().changeform_view, request, object_id, form_url, extra_context)
+
+    def delete_view(self, request, object_id, extra_context=None):
+        return self._en_shard(super().delete_view, request, object_id, extra_context)
+
+    def history_view(self, request, object_id, extra_context=None):
+        return self._en_shard(super().history_view, request, object_id, extra_context)
+
+    def get_list_filter(self, request):
+        filtros = super().get_list_filter(request)
+        return (FiltroShard, *filtros) if len(shards()) > 1 else filtros
+
+    def get_list_select_related(self, request):
+        if alias_admin(request) == DEFAULT_DB_ALIAS:
+            return super().get_list_select_related(request)
+        return tuple(
+            campo.name for campo in self.model._meta.concrete_fields
+            if campo.many_to_one and es_modelo_shard(campo.related_model)
+        )
+
+    def get_search_fields(self, request):
+        campos = super().get_search_fields(request)
+        if alias_admin(request) == DEFAULT_DB_ALIAS:
+            return campos
+        return tuple(c for c in campos if not c.startswith('usuario__'))
+
+    def get_search_results(self, request, queryset, search_term):
+        resultado, duplicados = super().get_search_results(request, queryset, search_term)
+        por_usuario = any(c.startswith('usuario__') for c in super().get_search_fields(request))
+        if search_term and por_usuario and alias_admin(request) != DEFAULT_DB_ALIAS:
+            ids = list(User.objects.filter(username__icontains=search_term).values_list('pk', flat=True))
+            coincidencias = queryset.filter(usuario_id__in=ids)
+            resultado = resultado | coincidencias if self.get_search_fields(request) else coincidencias
+        return resultado, duplicados
 
 # -------------------------------------------------------------------------
 # 1. CLASE ADMIN PARA CUENTA
 # -------------------------------------------------------------------------
 
-class CuentaAdmin(admin.ModelAdmin):
+class MiembroCuentaInline(admin.TabularInline):
+    """Usuarios con acceso a la cuenta (cuentas compartidas, mi_finanzas/compartidas.py)."""
+    model = MiembroCuenta
+    fields = ('usuario', 'rol')
+    raw_id_fields = ('usuario',)
+    extra = 0
+
+
+class CuentaAdmin(ShardAdminMixin, admin.ModelAdmin):
     # CORRECCIÓN: 'balance' cambiado a 'saldo' para coincidir con models.py y evitar admin.E108
     list_display = ('nombre', 'usuario', 'tipo', 'saldo') 
     list_filter = ('usuario', 'tipo')
     search_fields = ('nombre', 'usuario__username')
+    inlines = [MiembroCuentaInline]
 
 # -------------------------------------------------------------------------
 # 2. CLASE ADMIN PARA TRANSACCION
 # -------------------------------------------------------------------------
 
-class TransaccionAdmin(admin.ModelAdmin):
+class DivisionTransaccionInline(admin.TabularInline):
+    """Reparto entre categorías (solo lectura: se edita desde la vista Dividir, que valida la suma)."""
+    model = DivisionTransaccion
+    fields = ('categoria', 'monto')
+    readonly_fields = fields
+    extra = 0
+    max_num = 0
+    can_delete = False
+
+
+class TransaccionAdmin(ShardAdminMixin, admin.ModelAdmin):
     list_display = ('fecha', 'usuario', 'cuenta', 'tipo', 'monto')
     list_filter = ('usuario', 'tipo', 'cuenta')
     search_fields = ('usuario__username', 'cuenta__nombre')
     date_hierarchy = 'fecha'
+    inlines = [DivisionTransaccionInline]
 
 # -------------------------------------------------------------------------
 # 3. CLASE ADMIN PARA CATEGORIA
 # -------------------------------------------------------------------------
 
-class CategoriaAdmin(admin.ModelAdmin):
-    list_display = ('nombre', 'usuario') 
+class CategoriaAdmin(ShardAdminMixin, admin.ModelAdmin):
+    list_display = ('nombre', 'padre', 'usuario')
     list_filter = ('usuario',)
     search_fields = ('nombre',)
 
@@ -35,22 +139,118 @@ class CategoriaAdmin(admin.ModelAdmin):
 # 4. CLASE ADMIN PARA TRANSACCION RECURRENTE (usando decorador)
 # -------------------------------------------------------------------------
 
+class OcurrenciaRecurrenteInline(admin.TabularInline):
+    """Próximas ocurrencias precalculadas (solo lectura: se regeneran al guardar la regla)."""
+    model = OcurrenciaRecurrente
+    fields = ('indice', 'fecha', 'monto')
+    readonly_fields = fields
+    extra = 0
+    max_num = 0
+    can_delete = False
+
+
 @admin.register(TransaccionRecurrente)
-class TransaccionRecurrenteAdmin(admin.ModelAdmin):
-    list_display = ('descripcion', 'monto', 'frecuencia', 'proximo_pago', 'esta_activa')
+class TransaccionRecurrenteAdmin(ShardAdminMixin, admin.ModelAdmin):
+    list_display = ('descripcion', 'monto', 'frecuencia', 'intervalo', 'proximo_pago', 'esta_activa')
     list_filter = ('frecuencia', 'esta_activa')
+    inlines = [OcurrenciaRecurrenteInline]
+
+class CuotaPrestamoInline(admin.TabularInline):
+    """Calendario de amortización (solo lectura: lo mantiene mi_finanzas/prestamos.py)."""
+    model = CuotaPrestamo
+    fields = ('numero', 'fecha', 'cuota', 'interes', 'capital', 'saldo', 'transaccion')
+    readonly_fields = fields
+    extra = 0
+    max_num = 0
+    can_delete = False
+
+
+@admin.register(Prestamo)
+class PrestamoAdmin(ShardAdminMixin, admin.ModelAdmin):
+    list_display = ('cuenta', 'principal', 'tasa_anual', 'plazo_meses', 'cuota', 'capital_pendiente', 'cuotas_pagadas')
+    readonly_fields = ('cuota', 'capital_pendiente', 'cuotas_pagadas')
+    inlines = [CuotaPrestamoInline]
+
+@admin.register(Posicion)
+class PosicionAdmin(ShardAdminMixin, admin.ModelAdmin):
+    list_display = ('cuenta', 'activo', 'cantidad')
+    search_fields = ('activo',)
+
+
+@admin.register(PrecioActivo)
+class PrecioActivoAdmin(admin.ModelAdmin):
+    """Precios compartidos (en 'default'); se cargan con manage.py cargar_precios."""
+    list_display = ('activo', 'fecha', 'precio')
+    list_filter = ('activo',)
+    date_hierarchy = 'fecha'
 
 # -------------------------------------------------------------------------
 # 5. CLASE ADMIN PARA PRESUPUESTO (usando decorador)
 # -------------------------------------------------------------------------
 
 @admin.register(Presupuesto)
-class PresupuestoAdmin(admin.ModelAdmin):
+class PresupuestoAdmin(ShardAdminMixin, admin.ModelAdmin):
     list_display = ('usuario', 'categoria', 'monto_limite', 'mes', 'anio')
     list_filter = ('mes', 'anio', 'categoria')
 
+@admin.register(Etiqueta)
+class EtiquetaAdmin(ShardAdminMixin, admin.ModelAdmin):
+    list_display = ('nombre', 'usuario')
+    search_fields = ('nombre',)
+
+@admin.register(AnomaliaGasto)
+class AnomaliaGastoAdmin(ShardAdminMixin, admin.ModelAdmin):
+    """Solo lectura: se recalculan con 'manage.py detectar_anomalias'."""
+    list_display = ('usuario', 'categoria', 'mes', 'gasto', 'mediana', 'puntuacion')
+    date_hierarchy = 'mes'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+# -------------------------------------------------------------------------
+# 6. ARCHIVO EN FRÍO (solo lectura; se gestiona con 'manage.py archivar')
+# -------------------------------------------------------------------------
+
+@admin.register(TransaccionArchivada)
+class TransaccionArchivadaAdmin(ShardAdminMixin, admin.ModelAdmin):
+    list_display = ('fecha', 'usuario', 'cuenta', 'tipo', 'monto')
+    list_filter = ('usuario', 'tipo')
+    date_hierarchy = 'fecha'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(SaldoApertura)
+class SaldoAperturaAdmin(ShardAdminMixin, admin.ModelAdmin):
+    list_display = ('cuenta', 'fecha_corte', 'saldo')
+
+# -------------------------------------------------------------------------
+# 7. COLA DE TAREAS Y ASIGNACIÓN DE SHARDS (siempre en default)
+# -------------------------------------------------------------------------
+
+@admin.register(Tarea)
+class TareaAdmin(admin.ModelAdmin):
+    list_display = ('nombre', 'usuario', 'estado', 'progreso', 'intentos', 'fecha_creacion', 'fecha_fin')
+    list_filter = ('estado', 'nombre')
+    readonly_fields = ('error', 'resultado', 'trabajador', 'latido', 'fecha_inicio', 'fecha_fin')
+
+
+@admin.register(AsignacionShard)
+class AsignacionShardAdmin(admin.ModelAdmin):
+    list_display = ('usuario', 'alias', 'fecha_asignacion')
+    list_filter = ('alias',)
+    # El alias solo se cambia con 'manage.py rebalancear_shards' (mueve los datos)
+    readonly_fields = ('alias',)
+
 # -------------------------------------------------------------------------
-# 6. REGISTRO DE MODELOS (usando admin.site.register)
+# 8. REGISTRO DE MODELOS (usando admin.site.register)
 # -------------------------------------------------------------------------
 
 admin.site.register(Cuenta, CuentaAdmin)
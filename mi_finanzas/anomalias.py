@@ -0,0 +1,177 @@
+"""
+Detección de gastos inusuales por categoría ("la luz de este mes es el triple").
+
+- El historial del usuario se carga con values_list como tres columnas de
+  enteros: mes (año·12 + mes − 1), categoría y céntimos con signo. Las
+  transacciones divididas aportan cada línea (el mismo LEFT JOIN que
+  mi_finanzas/jerarquia.py) y los meses archivados, sus resúmenes mensuales.
+- El gasto neto se acumula en una matriz categorías x meses; los meses
+  anteriores al primer movimiento de cada categoría no cuentan (NaN).
+- Cada mes se compara con la mediana y la desviación absoluta mediana (MAD)
+  de los VENTANA_MESES anteriores: puntuación z robusta
+  0.6745 · (gasto − mediana) / MAD, con todas las ventanas de todas las
+  categorías a la vez (NumPy: sliding_window_view + nanmedian).
+- Los meses que superan el umbral se guardan en AnomaliaGasto: el panel los
+  lee sin recalcular. Se recalculan con 'manage.py detectar_anomalias'
+  (todos los usuarios, en un pool de procesos) o con la tarea del mismo nombre.
+"""
+import warnings
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from django.db.models import F, IntegerField
+from django.db.models.functions import Cast, ExtractMonth, ExtractYear, Round
+from django.utils import timezone
+
+from .divisiones import anotar_lineas
+from .models import AnomaliaGasto, Categoria, ResumenMensualArchivado, Transaccion, monto_firmado
+from .shards import alias_para, atomico, en_shard
+
+VENTANA_MESES = 12
+# Meses con historial necesarios para juzgar uno
+MINIMO_HISTORIA = 3
+UMBRAL = 3.5
+# La MAD de una factura fija es 0: escala mínima relativa a la mediana y absoluta (céntimos)
+_ESCALA_RELATIVA = 0.1
+_ESCALA_MINIMA = 100
+# Diferencias menores que esta (céntimos) no se señalan aunque la puntuación sea alta
+_DIFERENCIA_MINIMA = 1000
+_K = 0.6745
+
+
+def _indice_mes(fecha):
+    return fecha.year * 12 + fecha.month - 1
+
+
+def _fecha_mes(indice):
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def _centimos(expresion):
+    return Cast(Round(expresion * 100), IntegerField())
+
+
+# ========================================================
+# --- CARGA ---
+# ========================================================
+
+def _movimientos(usuario_id):
+    """[(mes, categoria_id, céntimos con signo)] de las transacciones (por línea) y de los resúmenes archivados."""
+    vivas = (
+        anotar_lineas(Transaccion.objects.filter(usuario_id=usuario_id, es_transferencia=False))
+        .annotate(indice=ExtractYear('fecha') * 12 + ExtractMonth('fecha') - 1)
+        .filter(linea_categoria__isnull=False)
+        .values_list('indice', 'linea_categoria', _centimos(monto_firmado('importe')))
+    )
+    archivadas = (
+        ResumenMensualArchivado.objects.filter(usuario_id=usuario_id, es_transferencia=False, categoria__isnull=False)
+        .values_list(F('anio') * 12 + F('mes') - 1, 'categoria_id', _centimos(monto_firmado('total')))
+    )
+    return list(vivas.order_by()) + list(archivadas.order_by())
+
+
+# ========================================================
+# --- CÁLCULO ---
+# ========================================================
+
+def _puntuar(gastos, ventana):
+    """
+    gastos: filas (categorías) de gasto mensual en céntimos, NaN antes del
+    primer mes de la categoría. Devuelve (medianas, mad, historia) por celda,
+    calculados sobre los 'ventana' meses anteriores.
+    """
+    filas, meses = gastos.shape
+    relleno = np.concatenate([np.full((filas, ventana), np.nan), gastos], axis=1)
+    # Ventana de la celda j = meses j-ventana .. j-1
+    ventanas = sliding_window_view(relleno, ventana, axis=1)[:, :meses]
+    with warnings.catch_warnings():
+        # Ventanas sin historial (todo NaN): mediana NaN, se descartan por 'historia'
+        warnings.simplefilter('ignore', RuntimeWarning)
+        medianas = np.nanmedian(ventanas, axis=2)
+        mad = np.nanmedian(np.abs(ventanas - medianas[..., None]), axis=2)
+    return medianas, mad, np.count_nonzero(~np.isnan(ventanas), axis=2)
+
+
+def _matriz(movimientos, categorias, hasta):
+    """(categoria_ids, primer_mes, gastos) con el gasto neto (céntimos, positivo) por categoría y mes."""
+    # Las transacciones con fecha futura no cuentan todavía
+    filas = [(mes, cat, centimos) for mes, cat, centimos in movimientos if cat in categorias and mes <= hasta]
+    if not filas:
+        return [], 0, None
+    desde = min(mes for mes, _, _ in filas)
+    meses = hasta - desde + 1
+    categoria_ids = sorted({cat for _, cat, _ in filas})
+    indices, cats, centimos = (np.asarray(columna, dtype=np.int64) for columna in zip(*filas))
+    fila, columna = np.searchsorted(np.asarray(categoria_ids), cats), indices - desde
+    gastos = np.zeros((len(categoria_ids), meses), dtype=np.float64)
+    # add.at acumula también los índices repetidos (varias transacciones en el mes)
+    np.add.at(gastos, (fila, columna), -centimos)
+    primeros = np.full(len(categoria_ids), meses, dtype=np.int64)
+    np.minimum.at(primeros, fila, columna)
+    gastos[np.arange(meses)[None, :] < primeros[:, None]] = np.nan
+    return categoria_ids, desde, gastos
+
+
+def calcular_anomalias(movimientos, categorias, hasta, ventana=VENTANA_MESES, umbral=UMBRAL):
+    """
+    Anomalías de 'movimientos' ([(mes, categoria_id, céntimos con signo)]) en
+    las categorías de gasto 'categorias', hasta el mes 'hasta' (índice) incluido:
+    [{'categoria_id', 'mes', 'gasto', 'mediana', 'desviacion', 'puntuacion'}] en céntimos.
+    """
+    categoria_ids, desde, gastos = _matriz(movimientos, categorias, hasta)
+    if not categoria_ids:
+        return []
+    medianas, mad, historia = _puntuar(gastos, ventana)
+
+    escala = np.maximum(np.maximum(mad, _ESCALA_RELATIVA * np.abs(medianas)), _ESCALA_MINIMA)
+    with np.errstate(invalid='ignore'):
+        puntuaciones = _K * (gastos - medianas) / escala
+        marcadas = ((historia >= MINIMO_HISTORIA) & (puntuaciones >= umbral)
+                    & (gastos - medianas >= _DIFERENCIA_MINIMA))
+    celdas = zip(*np.nonzero(marcadas))
+
+    return [
+        {
+            'categoria_id': categoria_ids[i], 'mes': desde + int(j), 'gasto': int(gastos[i][j]),
+            'mediana': int(round(medianas[i][j])), 'desviacion': int(round(mad[i][j])),
+            'puntuacion': round(float(puntuaciones[i][j]), 2),
+        }
+        for i, j in celdas
+    ]
+
+
+# ========================================================
+# --- GUARDAR Y LEER ---
+# ========================================================
+
+def _decimal(centimos):
+    return Decimal(centimos) / 100
+
+
+def detectar_anomalias(usuario_id, hoy=None, ventana=VENTANA_MESES, umbral=UMBRAL):
+    """Recalcula en su shard las anomalías guardadas de un usuario. Devuelve cuántas hay."""
+    hoy = hoy or timezone.localdate()
+    with en_shard(alias_para(usuario_id)):
+        categorias = set(Categoria.objects.filter(usuario_id=usuario_id, tipo='EGRESO').values_list('pk', flat=True))
+        anomalias = calcular_anomalias(_movimientos(usuario_id), categorias, _indice_mes(hoy), ventana, umbral)
+        # Solo la sustitución va en la transacción: la lectura y el cálculo no bloquean a otros procesos
+        with atomico():
+            AnomaliaGasto.objects.filter(usuario_id=usuario_id).delete()
+            AnomaliaGasto.objects.bulk_create([
+                AnomaliaGasto(
+                    usuario_id=usuario_id, categoria_id=a['categoria_id'], mes=_fecha_mes(a['mes']),
+                    gasto=_decimal(a['gasto']), mediana=_decimal(a['mediana']),
+                    desviacion=_decimal(a['desviacion']), puntuacion=a['puntuacion'],
+                )
+                for a in anomalias
+            ])
+    return len(anomalias)
+
+
+def anomalias_recientes(usuario, hoy=None, meses=2):
+    """Anomalías guardadas del mes en curso y los 'meses' − 1 anteriores, para el panel."""
+    hoy = hoy or timezone.localdate()
+    desde = _fecha_mes(_indice_mes(hoy) - meses + 1)
+    return AnomaliaGasto.objects.filter(usuario=usuario, mes__gte=desde).select_related('categoria')
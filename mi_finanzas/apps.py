@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class MiFinanzasConfig(AppConfig):
+    name = 'mi_finanzas'
+
+    def ready(self):
+        # Conecta los receptores de señales (borrado de usuarios en su shard,
+        # versión de los datos de cada usuario, pagos de préstamos, autocompletado,
+        # árbol de categorías, permisos de cuentas compartidas)
+        from . import autocompletar, compartidas, jerarquia, prestamos, shards, versiones  # noqa: F401
@@ -0,0 +1,198 @@
+"""
+Archivo en frío de transacciones antiguas.
+
+Las transacciones anteriores al horizonte (primer día de un mes) se mueven de
+Transaccion a TransaccionArchivada con un único INSERT ... SELECT. En el corte
+se guardan:
+
+- SaldoApertura por cuenta: saldo_apertura + Σ transacciones vivas = Cuenta.saldo
+- ResumenMensualArchivado: totales por mes/cuenta/categoría/tipo para reportes
+  (las transacciones divididas cuentan por sus líneas, que se archivan con ellas).
+
+Las etiquetas de las transacciones también viajan con ellas al archivo y de vuelta.
+
+Así las consultas del panel solo recorren los datos recientes, y los reportes
+y la conciliación siguen cuadrando. restaurar_archivo() hace el camino inverso.
+"""
+from datetime import date
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+from .models import (
+    Cuenta, DivisionArchivada, DivisionTransaccion, ResumenMensualArchivado, SaldoApertura, Transaccion,
+    TransaccionArchivada, TransaccionEtiqueta, TransaccionEtiquetaArchivada, monto_firmado,
+)
+from .compartidas import cuentas_visibles, propietarios
+from .divisiones import anotar_lineas
+from .shards import atomico
+from .versiones import meses_cambiados
+
+# Columnas comunes a Transaccion y TransaccionArchivada (mismo orden en ambas tablas)
+COLUMNAS = [
+    'id', 'usuario_id', 'cuenta_id', 'monto', 'tipo', 'categoria_id', 'fecha', 'descripcion',
+    'fecha_creacion', 'es_transferencia', 'transaccion_relacionada_id', 'huella',
+]
+# Columnas comunes a DivisionTransaccion y DivisionArchivada
+COLUMNAS_DIVISION = ['id', 'usuario_id', 'transaccion_id', 'categoria_id', 'monto']
+# Columnas comunes a TransaccionEtiqueta y TransaccionEtiquetaArchivada
+COLUMNAS_ETIQUETA = ['id', 'transaccion_id', 'etiqueta_id']
+
+# Máximo de parámetros en un filtro pk__in (límite de variables de SQLite)
+_LOTE_IN = 900
+
+
+def horizonte_por_defecto(meses=None, hoy=None):
+    """Primer día del mes que queda 'meses' (o MI_FINANZAS_HORIZONTE_ARCHIVO_MESES) meses atrás."""
+    if meses is None:
+        meses = getattr(settings, 'MI_FINANZAS_HORIZONTE_ARCHIVO_MESES', 24)
+    hoy = hoy or date.today()
+    return (hoy - relativedelta(months=meses)).replace(day=1)
+
+
+# ========================================================
+# --- AUXILIARES ---
+# ========================================================
+
+def _copiar(queryset, modelo_destino, campos=COLUMNAS):
+    """INSERT INTO destino (campos) SELECT campos FROM <queryset>. Devuelve filas copiadas."""
+    # En la misma base (shard) que el queryset de origen
+    alias = queryset.db
+    connection = connections[alias]
+    sql, params = queryset.order_by().values_list(*campos).query.get_compiler(using=alias).as_sql()
+    columnas = ', '.join(connection.ops.quote_name(modelo_destino._meta.get_field(c).column) for c in campos)
+    tabla = connection.ops.quote_name(modelo_destino._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {tabla} ({columnas}) {sql}", params)
+        return cursor.rowcount
+
+
+def _borrar_por_lotes(queryset):
+    """Borra por lotes de PKs para no cargar la tabla entera en el Collector de Django."""
+    pks = list(queryset.order_by().values_list('pk', flat=True))
+    for inicio in range(0, len(pks), _LOTE_IN):
+        queryset.model.objects.filter(pk__in=pks[inicio:inicio + _LOTE_IN]).delete()
+    return len(pks)
+
+
+def _recalcular_resumenes(usuarios):
+    """Reconstruye los resúmenes mensuales desde el archivo con un solo GROUP BY."""
+    ResumenMensualArchivado.objects.filter(usuario_id__in=usuarios).delete()
+    # Cada transacción aporta sus líneas de reparto o, si no tiene, una línea con su categoría (LEFT JOIN)
+    filas = (
+        anotar_lineas(TransaccionArchivada.objects.filter(usuario_id__in=usuarios))
+        .annotate(anio=ExtractYear('fecha'), mes=ExtractMonth('fecha'))
+        .values('usuario_id', 'cuenta_id', 'linea_categoria', 'anio', 'mes', 'tipo', 'es_transferencia')
+        .annotate(total=Sum('importe'), cantidad=Count('id'))
+        .order_by()
+    )
+    ResumenMensualArchivado.objects.bulk_create(
+        [ResumenMensualArchivado(categoria_id=fila.pop('linea_categoria'), **fila) for fila in filas], batch_size=1000
+    )
+
+
+def _recalcular_aperturas(usuarios, fecha_corte):
+    """Saldo de apertura = saldo actual - Σ(transacciones vivas) para cada cuenta afectada."""
+    cuentas = list(Cuenta.objects.select_for_update().filter(usuario_id__in=usuarios))
+    con_archivo = set(
+        TransaccionArchivada.objects.filter(usuario_id__in=usuarios)
+        .values_list('cuenta_id', flat=True).distinct()
+    )
+    vivos = dict(
+        Transaccion.objects.filter(cuenta__in=cuentas)
+        .values('cuenta_id').annotate(total=Sum(monto_firmado())).order_by()
+        .values_list('cuenta_id', 'total')
+    )
+
+    SaldoApertura.objects.filter(cuenta__in=cuentas).exclude(cuenta_id__in=con_archivo).delete()
+    for cuenta in cuentas:
+        if cuenta.pk not in con_archivo:
+            continue
+        SaldoApertura.objects.update_or_create(
+            cuenta=cuenta,
+            defaults={
+                'fecha_corte': fecha_corte,
+                'saldo': cuenta.saldo - (vivos.get(cuenta.pk) or Decimal('0.00')),
+            },
+        )
+
+
+# ========================================================
+# --- ARCHIVAR / RESTAURAR ---
+# ========================================================
+
+@atomico
+def archivar_transacciones(fecha_corte=None, usuario=None):
+    """
+    Mueve al archivo las transacciones con fecha anterior a fecha_corte
+    (se redondea al primer día del mes). Devuelve el número de filas movidas.
+    """
+    fecha_corte = (fecha_corte or horizonte_por_defecto()).replace(day=1)
+    qs = Transaccion.objects.filter(fecha__lt=fecha_corte)
+    if usuario is not None:
+        qs = qs.filter(usuario=usuario)
+
+    usuarios = set(qs.order_by().values_list('usuario_id', flat=True).distinct())
+    if not usuarios:
+        return 0
+    # Meses que pasan al archivo: sus comparativas cerradas se recalculan (mi_finanzas/versiones.py)
+    meses_cambiados(usuarios, qs.aggregate(primera=Min('fecha'))['primera'], fecha_corte - relativedelta(days=1))
+
+    _copiar(qs, TransaccionArchivada)
+    _copiar(DivisionTransaccion.objects.filter(transaccion__in=qs), DivisionArchivada, COLUMNAS_DIVISION)
+    _copiar(TransaccionEtiqueta.objects.filter(transaccion__in=qs), TransaccionEtiquetaArchivada, COLUMNAS_ETIQUETA)
+    movidas = _borrar_por_lotes(qs)
+
+    _recalcular_resumenes(usuarios)
+    _recalcular_aperturas(usuarios, fecha_corte)
+    return movidas
+
+
+@atomico
+def restaurar_archivo(usuario=None, desde=None):
+    """
+    Devuelve a Transaccion las filas archivadas (todas, o las de fecha >= desde).
+    Conserva ids y enlaces de transferencias. Devuelve el número de filas restauradas.
+    """
+    qs = TransaccionArchivada.objects.all()
+    if usuario is not None:
+        qs = qs.filter(usuario=usuario)
+    if desde is not None:
+        desde = desde.replace(day=1)
+        qs = qs.filter(fecha__gte=desde)
+
+    usuarios = set(qs.order_by().values_list('usuario_id', flat=True).distinct())
+    if not usuarios:
+        return 0
+    limites = qs.aggregate(primera=Min('fecha'), ultima=Max('fecha'))
+    meses_cambiados(usuarios, limites['primera'], limites['ultima'])
+
+    _copiar(qs, Transaccion)
+    _copiar(DivisionArchivada.objects.filter(transaccion__in=qs), DivisionTransaccion, COLUMNAS_DIVISION)
+    _copiar(TransaccionEtiquetaArchivada.objects.filter(transaccion__in=qs), TransaccionEtiqueta, COLUMNAS_ETIQUETA)
+    # El recuento de delete() incluye las líneas archivadas borradas en cascada
+    restauradas = qs.delete()[1].get(TransaccionArchivada._meta.label, 0)
+
+    _recalcular_resumenes(usuarios)
+    # Si aún queda archivo, el nuevo corte es 'desde'; si no, se eliminan las aperturas.
+    _recalcular_aperturas(usuarios, desde)
+    return restauradas
+
+
+# ========================================================
+# --- CONSULTAS PARA REPORTES ---
+# ========================================================
+
+def resumenes_desde(usuario, desde):
+    """Resúmenes archivados (sin transferencias) de los meses >= desde, de las cuentas visibles del usuario."""
+    return ResumenMensualArchivado.objects.filter(
+        Q(anio__gt=desde.year) | Q(anio=desde.year, mes__gte=desde.month),
+        usuario_id__in=propietarios(usuario),
+        cuenta_id__in=cuentas_visibles(usuario),
+        es_transferencia=False,
+    )
+
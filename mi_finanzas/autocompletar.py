@@ -0,0 +1,223 @@
+"""
+Autocompletado de descripciones, categorías y cuentas al registrar transacciones.
+
+- Índice por usuario en memoria del proceso: listas ordenadas de claves
+  normalizadas (normalizar_descripcion) y búsqueda del prefijo con bisect;
+  de las que casan se devuelven las más frecuentes con su combinación
+  habitual (tipo, categoría, cuenta, monto).
+- Se construye al primer uso con tres consultas agrupadas (descripciones
+  por combinación, categorías y cuentas), sin recorrer transacciones.
+- Caché LRU de como mucho MI_FINANZAS_AUTOCOMPLETAR_USUARIOS índices por
+  proceso. Cada índice guarda la versión de datos del usuario
+  (mi_finanzas/versiones.py) con la que está al día: si cambia por una
+  escritura que el índice no ha visto (otro proceso, rutas en bloque,
+  ediciones, renombrados...), se reconstruye en la siguiente consulta.
+- Las transacciones nuevas (Transaccion.save(), la ruta habitual al
+  registrar) se añaden al índice al confirmarse, sin reconstruirlo.
+"""
+import heapq
+import threading
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import Count, Max
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Categoria, Cuenta, Transaccion, normalizar_descripcion
+from .versiones import version_datos
+
+LIMITE = 8
+# Con una sola letra casaría buena parte del índice: las descripciones se sugieren desde dos
+MINIMO_CARACTERES = 2
+_FIN_PREFIJO = '￿'
+
+
+def _maximo_usuarios():
+    return getattr(settings, 'MI_FINANZAS_AUTOCOMPLETAR_USUARIOS', 256)
+
+
+class _Descripcion:
+    """Una descripción normalizada: cuántas veces se usó y con qué combinaciones."""
+    __slots__ = ('texto', 'veces', 'ultima', 'combinaciones')
+
+    def __init__(self, texto, fecha):
+        self.texto = texto
+        self.veces = 0
+        self.ultima = fecha
+        # {(tipo, categoria_id, cuenta_id, monto): [veces, última fecha]}
+        self.combinaciones = {}
+
+    def sumar(self, texto, combinacion, veces, fecha):
+        self.veces += veces
+        actual = self.combinaciones.setdefault(combinacion, [0, fecha])
+        actual[0] += veces
+        actual[1] = max(actual[1], fecha)
+        if fecha >= self.ultima:
+            # Se muestra la forma escrita más reciente
+            self.ultima, self.texto = fecha, texto
+
+    def habitual(self):
+        """Combinación más usada (a igualdad, la más reciente)."""
+        return max(self.combinaciones.items(), key=lambda item: (item[1][0], item[1][1]))[0]
+
+    def orden(self):
+        return self.veces, self.ultima
+
+
+class IndiceUsuario:
+    """Claves ordenadas de descripciones, categorías y cuentas de un usuario."""
+
+    def __init__(self, version):
+        self.version = version
+        self.claves = []
+        self.descripciones = {}
+        self.categorias = []  # [(clave, id, nombre, tipo)], ordenada
+        self.cuentas = []     # [(clave, id, nombre)], ordenada
+        self.nombres_categoria = {}
+        self.nombres_cuenta = {}
+
+    @classmethod
+    def construir(cls, usuario_id, alias, version):
+        indice = cls(version)
+        filas = (
+            Transaccion.objects.using(alias)
+            .filter(usuario_id=usuario_id, es_transferencia=False)
+            .exclude(descripcion__isnull=True).exclude(descripcion='')
+            .values('descripcion', 'tipo', 'categoria_id', 'cuenta_id', 'monto')
+            .annotate(veces=Count('id'), ultima=Max('fecha')).order_by()
+        )
+        for fila in filas:
+            combinacion = (fila['tipo'], fila['categoria_id'], fila['cuenta_id'], fila['monto'])
+            indice._sumar(fila['descripcion'], combinacion, fila['veces'], fila['ultima'])
+        indice.claves.sort()
+
+        categorias = Categoria.objects.using(alias).filter(usuario_id=usuario_id).values_list('pk', 'nombre', 'tipo')
+        for pk, nombre, tipo in categorias:
+            indice.categorias.append((normalizar_descripcion(nombre), pk, nombre, tipo))
+            indice.nombres_categoria[pk] = nombre
+        for pk, nombre in Cuenta.objects.using(alias).filter(usuario_id=usuario_id).values_list('pk', 'nombre'):
+            indice.cuentas.append((normalizar_descripcion(nombre), pk, nombre))
+            indice.nombres_cuenta[pk] = nombre
+        indice.categorias.sort()
+        indice.cuentas.sort()
+        return indice
+
+    def _sumar(self, descripcion, combinacion, veces, fecha, ordenado=False):
+        clave = normalizar_descripcion(descripcion)
+        if not clave:
+            return
+        if clave not in self.descripciones:
+            self.descripciones[clave] = _Descripcion(descripcion, fecha)
+            if ordenado:
+                insort(self.claves, clave)
+            else:
+                self.claves.append(clave)
+        self.descripciones[clave].sumar(descripcion, combinacion, veces, fecha)
+
+    def anadir(self, transaccion):
+        """Suma una transacción nueva (mantiene las claves ordenadas)."""
+        if transaccion.es_transferencia:
+            return
+        combinacion = (transaccion.tipo, transaccion.categoria_id, transaccion.cuenta_id, transaccion.monto)
+        self._sumar(transaccion.descripcion, combinacion, 1, transaccion.fecha, ordenado=True)
+
+    @staticmethod
+    def _rango(ordenada, prefijo, tupla=False):
+        """[inicio, fin) de los elementos de 'ordenada' cuya clave empieza por 'prefijo'."""
+        desde, hasta = prefijo, prefijo + _FIN_PREFIJO
+        if tupla:
+            desde, hasta = (desde,), (hasta,)
+        return bisect_left(ordenada, desde), bisect_left(ordenada, hasta)
+
+    def sugerir(self, texto, limite=LIMITE):
+        prefijo = normalizar_descripcion(texto)
+        if not prefijo:
+            return {'descripciones': [], 'categorias': [], 'cuentas': []}
+
+        inicio, fin = self._rango(self.claves, prefijo) if len(prefijo) >= MINIMO_CARACTERES else (0, 0)
+        mejores = heapq.nlargest(limite, self.claves[inicio:fin], key=lambda clave: self.descripciones[clave].orden())
+        descripciones = []
+        for clave in mejores:
+            entrada = self.descripciones[clave]
+            tipo, categoria_id, cuenta_id, monto = entrada.habitual()
+            descripciones.append({
+                'descripcion': entrada.texto,
+                'veces': entrada.veces,
+                'tipo': tipo,
+                'categoria': {'id': categoria_id, 'nombre': self.nombres_categoria[categoria_id]}
+                if categoria_id in self.nombres_categoria else None,
+                'cuenta': {'id': cuenta_id, 'nombre': self.nombres_cuenta.get(cuenta_id, '')},
+                'monto': monto,
+            })
+
+        inicio, fin = self._rango(self.categorias, prefijo, tupla=True)
+        categorias = [{'id': pk, 'nombre': nombre, 'tipo': tipo}
+                      for _, pk, nombre, tipo in self.categorias[inicio:fin][:limite]]
+        inicio, fin = self._rango(self.cuentas, prefijo, tupla=True)
+        cuentas = [{'id': pk, 'nombre': nombre} for _, pk, nombre in self.cuentas[inicio:fin][:limite]]
+        return {'descripciones': descripciones, 'categorias': categorias, 'cuentas': cuentas}
+
+
+# ========================================================
+# --- CACHÉ POR PROCESO (LRU) ---
+# ========================================================
+
+_indices = OrderedDict()
+_cerrojo = threading.Lock()
+
+
+def _guardar(usuario_id, indice):
+    with _cerrojo:
+        _indices[usuario_id] = indice
+        _indices.move_to_end(usuario_id)
+        while len(_indices) > _maximo_usuarios():
+            _indices.popitem(last=False)
+
+
+def indice_de(usuario_id, alias=None):
+    """Índice del usuario al día con su versión de datos (se construye si falta o está atrasado)."""
+    version = version_datos(usuario_id)
+    with _cerrojo:
+        indice = _indices.get(usuario_id)
+        if indice is not None:
+            _indices.move_to_end(usuario_id)
+    if indice is None or indice.version != version:
+        indice = IndiceUsuario.construir(usuario_id, alias or router.db_for_read(Transaccion), version)
+        _guardar(usuario_id, indice)
+    return indice
+
+
+def sugerencias(usuario, texto, limite=LIMITE):
+    return indice_de(usuario.pk).sugerir(texto, limite)
+
+
+def olvidar(usuario_id=None):
+    """Descarta el índice de un usuario (o todos)."""
+    with _cerrojo:
+        if usuario_id is None:
+            _indices.clear()
+        else:
+            _indices.pop(usuario_id, None)
+
+
+def _anadir_confirmada(transaccion):
+    with _cerrojo:
+        indice = _indices.get(transaccion.usuario_id)
+        if indice is None:
+            return
+        # Este callback va después del de versiones.datos_cambiados() (su receptor
+        # se conecta al importar versiones, antes que este): la versión ya la cuenta
+        version = version_datos(transaccion.usuario_id)
+        if indice.version == version - 1:
+            indice.anadir(transaccion)
+            indice.version = version
+        # Si no, hubo otras escrituras que el índice no ha visto: se reconstruirá
+
+
+@receiver(post_save, sender=Transaccion, dispatch_uid='mi_finanzas_autocompletar')
+def _transaccion_guardada(sender, instance, created, raw=False, using=None, **kwargs):
+    if created and not raw:
+        transaction.on_commit(lambda: _anadir_confirmada(instance), using=using)
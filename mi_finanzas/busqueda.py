@@ -0,0 +1,196 @@
+"""
+Búsqueda de texto en las transacciones (descripción, categoría y cuenta).
+
+Motores intercambiables (settings.MI_FINANZAS_BUSCADOR = ruta de la clase;
+por defecto se elige según la base):
+
+- BuscadorFTS5 (SQLite): tabla virtual FTS5 'mi_finanzas_busqueda' con una
+  fila por transacción (rowid = id). La mantienen triggers de la propia base
+  sobre transacciones, categorías y cuentas, así que queda al día con
+  cualquier ruta de escritura: save()/delete(), bulk_create, update(),
+  borrados en cascada, archivo, restauraciones... Resultados ordenados por
+  bm25 (descripción > categoría > cuenta) y filtrados por las cuentas
+  visibles del usuario (las propias y las compartidas con él) dentro del
+  propio índice (columna 'id_cuenta' con el token 'c<id>').
+- BuscadorBasico (cualquier base): icontains sobre los mismos campos, por
+  fecha. Recorre la tabla: solo para bases sin motor de texto.
+
+La tabla y los triggers los crean las migraciones 0011 y 0020 (con una
+copia fija de este SQL) en cada base SQLite con FTS5; manage.py
+reindexar_busqueda los rehace desde cero.
+"""
+import re
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .compartidas import cuentas_visibles
+from .models import Transaccion
+
+TABLA = 'mi_finanzas_busqueda'
+LIMITE = 100
+_MAXIMO_TERMINOS = 10
+
+_FILA = f"""
+    INSERT INTO {TABLA} (rowid, id_cuenta, descripcion, categoria, cuenta)
+    SELECT new.id, 'c' || new.cuenta_id, coalesce(new.descripcion, ''),
+           coalesce((SELECT nombre FROM mi_finanzas_categoria WHERE id = new.categoria_id), ''),
+           coalesce((SELECT nombre FROM mi_finanzas_cuenta WHERE id = new.cuenta_id), '');
+"""
+
+SQL_INSTALAR = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA} USING fts5(
+        id_cuenta, descripcion, categoria, cuenta,
+        tokenize = 'unicode61 remove_diacritics 2',
+        -- Índices de prefijos: las búsquedas son "palabra"* (mientras se escribe)
+        prefix = '2 3 4'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLA}_ai AFTER INSERT ON mi_finanzas_transaccion BEGIN {_FILA} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLA}_ad AFTER DELETE ON mi_finanzas_transaccion BEGIN
+        DELETE FROM {TABLA} WHERE rowid = old.id;
+    END""",
+    # Solo si cambia algo indexado (save() reescribe todas las columnas)
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLA}_au
+        AFTER UPDATE OF descripcion, categoria_id, cuenta_id ON mi_finanzas_transaccion
+        WHEN old.descripcion IS NOT new.descripcion
+          OR old.categoria_id IS NOT new.categoria_id OR old.cuenta_id IS NOT new.cuenta_id
+    BEGIN
+        DELETE FROM {TABLA} WHERE rowid = old.id; {_FILA}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLA}_categoria AFTER UPDATE OF nombre ON mi_finanzas_categoria
+        WHEN old.nombre IS NOT new.nombre
+    BEGIN
+        UPDATE {TABLA} SET categoria = new.nombre
+        WHERE rowid IN (SELECT id FROM mi_finanzas_transaccion WHERE categoria_id = new.id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLA}_cuenta AFTER UPDATE OF nombre ON mi_finanzas_cuenta
+        WHEN old.nombre IS NOT new.nombre
+    BEGIN
+        UPDATE {TABLA} SET cuenta = new.nombre
+        WHERE rowid IN (SELECT id FROM mi_finanzas_transaccion WHERE cuenta_id = new.id);
+    END""",
+]
+
+SQL_DESINSTALAR = [
+    f'DROP TRIGGER IF EXISTS {TABLA}_{sufijo}' for sufijo in ('ai', 'ad', 'au', 'categoria', 'cuenta')
+] + [f'DROP TABLE IF EXISTS {TABLA}']
+
+SQL_CARGAR = f"""
+    INSERT INTO {TABLA} (rowid, id_cuenta, descripcion, categoria, cuenta)
+    SELECT t.id, 'c' || t.cuenta_id, coalesce(t.descripcion, ''), coalesce(cat.nombre, ''), coalesce(c.nombre, '')
+    FROM mi_finanzas_transaccion t
+    LEFT JOIN mi_finanzas_categoria cat ON cat.id = t.categoria_id
+    LEFT JOIN mi_finanzas_cuenta c ON c.id = t.cuenta_id
+"""
+
+
+def fts5_disponible(conexion):
+    if conexion.vendor != 'sqlite':
+        return False
+    with conexion.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return any(opcion == 'ENABLE_FTS5' for (opcion,) in cursor.fetchall())
+
+
+def instalar_fts(conexion):
+    """Crea tabla, triggers y carga el índice (si la base es SQLite con FTS5). Devuelve si se instaló."""
+    if not fts5_disponible(conexion):
+        return False
+    with conexion.cursor() as cursor:
+        for sql in SQL_INSTALAR:
+            cursor.execute(sql)
+        cursor.execute(f'DELETE FROM {TABLA}')
+        cursor.execute(SQL_CARGAR)
+    return True
+
+
+def desinstalar_fts(conexion):
+    if conexion.vendor != 'sqlite':
+        return
+    with conexion.cursor() as cursor:
+        for sql in SQL_DESINSTALAR:
+            cursor.execute(sql)
+
+
+def terminos(texto):
+    """Palabras de la búsqueda (letras y números), como mucho _MAXIMO_TERMINOS."""
+    return re.findall(r'\w+', (texto or '').lower())[:_MAXIMO_TERMINOS]
+
+
+# ========================================================
+# --- MOTORES ---
+# ========================================================
+
+class Buscador:
+    """Interfaz de un motor: ids de transacciones de esas cuentas, del más relevante al menos."""
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    def buscar(self, cuenta_ids, texto, limite=LIMITE):
+        raise NotImplementedError
+
+    def reconstruir(self):
+        """Rehace el índice desde las transacciones (nada que hacer si el motor no tiene índice)."""
+
+
+class BuscadorBasico(Buscador):
+    def buscar(self, cuenta_ids, texto, limite=LIMITE):
+        consulta = Transaccion.objects.using(self.alias).filter(cuenta_id__in=cuenta_ids)
+        for termino in terminos(texto):
+            consulta = consulta.filter(
+                Q(descripcion__icontains=termino) | Q(categoria__nombre__icontains=termino) |
+                Q(cuenta__nombre__icontains=termino)
+            )
+        return list(consulta.order_by('-fecha', '-pk').values_list('pk', flat=True)[:limite])
+
+
+class BuscadorFTS5(Buscador):
+    # Pesos de bm25 por columna: id_cuenta (solo filtra), descripción, categoría, cuenta
+    PESOS = (0.0, 10.0, 4.0, 2.0)
+
+    def buscar(self, cuenta_ids, texto, limite=LIMITE):
+        palabras = terminos(texto)
+        if not palabras or not cuenta_ids:
+            return []
+        # Prefijos entre comillas: \w+ no deja pasar operadores de FTS5
+        expresion = ' AND '.join(f'"{palabra}"*' for palabra in palabras)
+        cuentas = ' OR '.join(f'"c{int(cuenta_id)}"' for cuenta_id in cuenta_ids)
+        consulta = f'id_cuenta : ({cuentas}) AND {{descripcion categoria cuenta}} : ({expresion})'
+        pesos = ', '.join(str(peso) for peso in self.PESOS)
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {TABLA} WHERE {TABLA} MATCH %s ORDER BY bm25({TABLA}, {pesos}) LIMIT %s',
+                [consulta, limite],
+            )
+            return [fila[0] for fila in cursor.fetchall()]
+
+    def reconstruir(self):
+        instalar_fts(connections[self.alias])
+
+
+_motores = {}
+
+
+def buscador(alias):
+    """Motor para la base 'alias': el de settings.MI_FINANZAS_BUSCADOR o, si no, FTS5 si la base lo tiene."""
+    if alias not in _motores:
+        ruta = getattr(settings, 'MI_FINANZAS_BUSCADOR', None)
+        if ruta:
+            clase = import_string(ruta)
+        else:
+            conexion = connections[alias]
+            clase = BuscadorFTS5 if fts5_disponible(conexion) and TABLA in conexion.introspection.table_names() \
+                else BuscadorBasico
+        _motores[alias] = clase(alias)
+    return _motores[alias]
+
+
+def buscar_transacciones(usuario, texto, limite=LIMITE):
+    """Transacciones de las cuentas visibles del usuario que casan con 'texto', por relevancia."""
+    alias = router.db_for_read(Transaccion)
+    ids = buscador(alias).buscar(cuentas_visibles(usuario), texto, limite)
+    encontradas = Transaccion.objects.using(alias).select_related('cuenta', 'categoria').in_bulk(ids)
+    return [encontradas[pk] for pk in ids if pk in encontradas]
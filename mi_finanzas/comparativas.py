@@ -0,0 +1,267 @@
+"""
+Reportes comparativos: este mes frente al mismo mes del año anterior, medias
+móviles de 3 y 12 meses por categoría y evolución de la tasa de ahorro.
+
+- Las sumas mensuales salen de las transacciones vivas (sin transferencias),
+  agrupadas primero por día con un GROUP BY nativo, unidas con UNION ALL a
+  los resúmenes del archivo en frío; las de categoría van por líneas de
+  reparto (divisiones.anotar_lineas).
+- Las comparaciones son funciones de ventana SQL sobre esas sumas agrupadas
+  por mes (índice entero año·12 + mes − 1):
+  · serie mensual: un calendario (CTE recursiva) sin huecos, LAG(…, 12) para
+    el año anterior y ROWS 2/11 PRECEDING para las medias móviles;
+  · por categoría: PARTITION BY categoría con marcos RANGE sobre el índice
+    del mes (los meses sin gasto no tienen fila y cuentan como 0).
+  Son siempre dos consultas (más los nombres de las categorías), sea cual sea
+  el rango.
+- Caché:
+  · periodo abierto (llega al mes en curso): por usuario, periodo y versión
+    de sus datos (mi_finanzas/versiones.py), que cambia con cada escritura;
+  · periodo cerrado: solo por usuario y periodo (mes final y número de
+    meses). Cada escritura marca con un sello los meses que toca
+    (versiones.meses_cambiados(): transacciones, repartos, inserciones en
+    bloque, archivo); el resultado guardado vale mientras ningún mes de su rango
+    (incluidos los 12 de carga) tenga un sello posterior a su cálculo. Los
+    cambios sin fecha (categorías, cuentas borradas, restauraciones) sellan
+    todos los meses del usuario. Apuntar un gasto de hoy no invalida el año
+    pasado.
+"""
+import time
+from datetime import date
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .divisiones import anotar_lineas
+from .models import Categoria, ResumenMensualArchivado, Transaccion
+from .versiones import sello_meses, version_datos
+
+MESES = 12
+MAXIMO_MESES = 120
+_CACHE_SEGUNDOS = 24 * 60 * 60
+_CENTIMO = Decimal('0.01')
+
+
+def _indice_mes(fecha):
+    return fecha.year * 12 + fecha.month - 1
+
+
+def _fecha_mes(indice):
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def _decimal(valor):
+    # SQLite suma en coma flotante: se redondea al céntimo
+    return Decimal(str(valor or 0)).quantize(_CENTIMO)
+
+
+def _porcentaje(parte, total):
+    return (parte / total * 100).quantize(_CENTIMO) if total else None
+
+
+def _sql(consulta):
+    """SQL y parámetros de un queryset compilado en su base (como en archivo._copiar)."""
+    return consulta.order_by().query.get_compiler(using=consulta.db).as_sql()
+
+
+def _mes_sql(conexion, columna):
+    """Índice del mes de una columna de fecha, con las funciones de fecha del motor."""
+    anio, params_anio = conexion.ops.date_extract_sql('year', columna, ())
+    mes, params_mes = conexion.ops.date_extract_sql('month', columna, ())
+    return f"({anio} * 12 + {mes} - 1)", (*params_anio, *params_mes)
+
+
+# ========================================================
+# --- CONSULTAS ---
+# ========================================================
+
+def _vivas(usuario, desde, hasta):
+    return Transaccion.objects.filter(
+        usuario=usuario, es_transferencia=False, fecha__gte=_fecha_mes(desde), fecha__lt=_fecha_mes(hasta + 1),
+    )
+
+
+def _archivadas(usuario, desde, hasta):
+    return ResumenMensualArchivado.objects.filter(usuario=usuario, es_transferencia=False).annotate(
+        indice=F('anio') * 12 + F('mes') - 1,
+    ).filter(indice__gte=desde, indice__lte=hasta)
+
+
+def _movimientos(vivas, archivadas):
+    """
+    CTE 'movimientos(mes, clave, importe)': las vivas agrupadas antes por día
+    (GROUP BY nativo; el mes se calcula sobre cada día, no sobre cada fila)
+    más los resúmenes archivados, ya mensuales.
+    """
+    conexion = connections[vivas.db]
+    sql_vivas, params_vivas = _sql(vivas)
+    sql_archivadas, params_archivadas = _sql(archivadas)
+    mes, params_mes = _mes_sql(conexion, 'v.fecha')
+    sql = f"""
+        movimientos(mes, clave, importe) AS (
+            SELECT {mes}, v.clave, v.importe FROM ({sql_vivas}) v
+            UNION ALL {sql_archivadas}
+        )"""
+    return conexion, sql, (*params_mes, *params_vivas, *params_archivadas)
+
+
+def _serie_mensual(usuario, desde, hasta, carga):
+    """Filas (mes, ingresos, egresos, ingresos y egresos hace 12 meses, egresos de 3 y 12 meses, ingresos de 12)."""
+    conexion, movimientos, params = _movimientos(
+        _vivas(usuario, carga, hasta).values('fecha', clave=F('tipo')).annotate(importe=Sum('monto')),
+        _archivadas(usuario, carga, hasta).values_list('indice', 'tipo', 'total'),
+    )
+    with conexion.cursor() as cursor:
+        cursor.execute(f"""
+            WITH RECURSIVE calendario(mes) AS (
+                SELECT %s UNION ALL SELECT mes + 1 FROM calendario WHERE mes < %s
+            ),
+            {movimientos},
+            sumas AS (
+                SELECT mes,
+                       SUM(CASE WHEN clave = 'INGRESO' THEN importe ELSE 0 END) AS ingresos,
+                       SUM(CASE WHEN clave = 'EGRESO' THEN importe ELSE 0 END) AS egresos
+                FROM movimientos GROUP BY mes
+            ),
+            -- Un mes por fila, sin huecos: LAG(…, 12) y ROWS n PRECEDING son meses de calendario
+            mensual AS (
+                SELECT c.mes, COALESCE(s.ingresos, 0) AS ingresos, COALESCE(s.egresos, 0) AS egresos
+                FROM calendario c LEFT JOIN sumas s ON s.mes = c.mes
+            )
+            SELECT * FROM (
+                SELECT mes, ingresos, egresos,
+                       LAG(ingresos, 12) OVER (ORDER BY mes),
+                       LAG(egresos, 12) OVER (ORDER BY mes),
+                       SUM(egresos) OVER (ORDER BY mes ROWS BETWEEN 2 PRECEDING AND CURRENT ROW),
+                       SUM(egresos) OVER (ORDER BY mes ROWS BETWEEN 11 PRECEDING AND CURRENT ROW),
+                       SUM(ingresos) OVER (ORDER BY mes ROWS BETWEEN 11 PRECEDING AND CURRENT ROW)
+                FROM mensual
+            ) ventanas
+            WHERE mes >= %s
+            ORDER BY mes
+        """, (carga, hasta, *params, desde))
+        return cursor.fetchall()
+
+
+def _por_categoria(usuario, mes, carga):
+    """Filas (categoria_id, gasto del mes, hace 12 meses, suma de los 3 y de los 12 meses anteriores)."""
+    conexion, movimientos, params = _movimientos(
+        anotar_lineas(_vivas(usuario, carga, mes).filter(tipo='EGRESO'))
+        .filter(linea_categoria__isnull=False)
+        .values('fecha', clave=F('linea_categoria')).annotate(importe=Sum('importe')),
+        _archivadas(usuario, carga, mes).filter(tipo='EGRESO', categoria__isnull=False)
+        .values_list('indice', 'categoria_id', 'total'),
+    )
+    with conexion.cursor() as cursor:
+        cursor.execute(f"""
+            WITH {movimientos},
+            mensual AS (
+                SELECT clave AS cat, mes, SUM(importe) AS total FROM movimientos GROUP BY clave, mes
+                UNION ALL
+                -- Fila del mes comparado para toda categoría con gasto en el rango
+                SELECT DISTINCT clave, %s, 0 FROM movimientos
+            ),
+            agrupado AS (SELECT cat, mes, SUM(total) AS total FROM mensual GROUP BY cat, mes)
+            SELECT cat, total, anio_anterior, suma_3, suma_12 FROM (
+                SELECT cat, mes, total,
+                       SUM(total) OVER (PARTITION BY cat ORDER BY mes RANGE BETWEEN 12 PRECEDING AND 12 PRECEDING)
+                           AS anio_anterior,
+                       SUM(total) OVER (PARTITION BY cat ORDER BY mes RANGE BETWEEN 3 PRECEDING AND 1 PRECEDING)
+                           AS suma_3,
+                       SUM(total) OVER (PARTITION BY cat ORDER BY mes RANGE BETWEEN 12 PRECEDING AND 1 PRECEDING)
+                           AS suma_12
+                FROM agrupado
+            ) ventanas
+            WHERE mes = %s
+        """, (*params, mes, mes))
+        return cursor.fetchall()
+
+
+# ========================================================
+# --- REPORTE ---
+# ========================================================
+
+def calcular_comparativa(usuario, hasta=None, meses=MESES):
+    """
+    Comparativa sin caché de los 'meses' meses que terminan en 'hasta' (por
+    defecto, el mes en curso). Devuelve {'hasta', 'meses', 'serie', 'categorias'}:
+
+    - serie: por mes, ingresos, egresos, ahorro, tasa de ahorro, egresos del
+      mismo mes del año anterior y su variación, medias móviles de egresos
+      (3 y 12 meses, incluido el propio) y tasa de ahorro de los últimos 12 meses;
+    - categorias: gasto de 'hasta' por categoría frente al mismo mes del año
+      anterior y a la media de los 3 y 12 meses anteriores, de mayor a menor.
+    """
+    hasta = _indice_mes(hasta or timezone.localdate())
+    meses = max(1, min(int(meses), MAXIMO_MESES))
+    desde = hasta - meses + 1
+    # 12 meses más para el año anterior y las medias móviles del primer mes
+    carga = desde - 12
+
+    serie = []
+    for mes, ingresos, egresos, ingresos_previos, egresos_previos, egresos_3, egresos_12, ingresos_12 in (
+        _serie_mensual(usuario, desde, hasta, carga)
+    ):
+        ingresos, egresos = _decimal(ingresos), _decimal(egresos)
+        ahorro_12 = _decimal(ingresos_12) - _decimal(egresos_12)
+        egresos_previos = _decimal(egresos_previos)
+        serie.append({
+            'mes': _fecha_mes(mes),
+            'ingresos': ingresos,
+            'egresos': egresos,
+            'ahorro': ingresos - egresos,
+            'tasa_ahorro': _porcentaje(ingresos - egresos, ingresos),
+            'ingresos_anio_anterior': _decimal(ingresos_previos),
+            'egresos_anio_anterior': egresos_previos,
+            'variacion_anual': _porcentaje(egresos - egresos_previos, egresos_previos),
+            'media_egresos_3': (_decimal(egresos_3) / 3).quantize(_CENTIMO),
+            'media_egresos_12': (_decimal(egresos_12) / 12).quantize(_CENTIMO),
+            'tasa_ahorro_12': _porcentaje(ahorro_12, _decimal(ingresos_12)),
+        })
+
+    filas = _por_categoria(usuario, hasta, carga)
+    nombres = dict(Categoria.objects.filter(pk__in=[fila[0] for fila in filas]).values_list('pk', 'nombre'))
+    categorias = []
+    for categoria_id, total, anio_anterior, suma_3, suma_12 in filas:
+        total, anio_anterior = _decimal(total), _decimal(anio_anterior)
+        categorias.append({
+            'categoria_id': categoria_id,
+            'nombre': nombres.get(categoria_id, 'Sin Categoría'),
+            'total': total,
+            'anio_anterior': anio_anterior,
+            'variacion_anual': _porcentaje(total - anio_anterior, anio_anterior),
+            'media_3': (_decimal(suma_3) / 3).quantize(_CENTIMO),
+            'media_12': (_decimal(suma_12) / 12).quantize(_CENTIMO),
+        })
+    categorias.sort(key=lambda fila: (-fila['total'], -fila['media_12'], fila['nombre']))
+    return {'hasta': _fecha_mes(hasta), 'meses': meses, 'serie': serie, 'categorias': categorias}
+
+
+def comparativa(usuario, hasta=None, meses=MESES):
+    """calcular_comparativa() cacheada: por versión de los datos si el periodo está abierto, por periodo si está cerrado."""
+    mes_actual = timezone.localdate().replace(day=1)
+    hasta = (hasta or mes_actual).replace(day=1)
+    meses = max(1, min(int(meses), MAXIMO_MESES))
+    if hasta >= mes_actual:
+        clave = f'mi_finanzas:comparativa:{usuario.pk}:{version_datos(usuario.pk)}:{hasta:%Y-%m}:{meses}'
+        resultado = cache.get(clave)
+        if resultado is None:
+            resultado = calcular_comparativa(usuario, hasta, meses)
+            cache.set(clave, resultado, _CACHE_SEGUNDOS)
+        return resultado
+
+    clave = f'mi_finanzas:comparativa:{usuario.pk}:{hasta:%Y-%m}:{meses}'
+    guardado = cache.get(clave)
+    # Misma carga que calcular_comparativa(): los 12 meses anteriores al primero también cuentan
+    indice = _indice_mes(hasta)
+    sello = sello_meses(usuario.pk, _fecha_mes(indice - meses + 1 - 12), hasta)
+    if guardado is not None and sello < guardado[0]:
+        return guardado[1]
+    calculado = time.time_ns()
+    resultado = calcular_comparativa(usuario, hasta, meses)
+    cache.set(clave, (calculado, resultado), _CACHE_SEGUNDOS)
+    return resultado
+
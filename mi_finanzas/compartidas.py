@@ -0,0 +1,176 @@
+"""
+Cuentas compartidas (hogar): el propietario de una cuenta (Cuenta.usuario) la
+comparte con otros usuarios como EDITOR (registra movimientos y transferencias)
+o LECTOR (solo la ve). Editar, borrar o compartir la cuenta sigue siendo solo
+del propietario.
+
+- Las transacciones de una cuenta son siempre de su propietario
+  (Transaccion.usuario = Cuenta.usuario), las registre quien las registre: el
+  archivo, la búsqueda, los reportes y las versiones de datos de cada usuario
+  siguen viendo el historial completo de sus cuentas.
+- permisos_cuentas(usuario) resuelve {cuenta_id: (rol, propietario_id)} con
+  dos consultas (cuentas propias y membresías), lo guarda en la caché por
+  usuario y lo memoriza en la instancia (request.user: una vez por petición).
+  Las vistas filtran después por cuenta_id IN (...), sobre el índice de la
+  FK, sin unir la tabla de miembros en cada agregado.
+- Se invalida al crear o borrar cuentas, al cambiar miembros y al restaurar
+  respaldos (las cuentas cambian de id). Se borra al momento y otra vez al
+  confirmar la transacción, por si otra petición lo leyó entretanto.
+- MiembroCuenta vive en el shard de la cuenta: con varios shards solo se
+  comparte entre usuarios del mismo shard (mover antes a uno de ellos con
+  'manage.py rebalancear_shards'). Los respaldos son por usuario y no llevan
+  los miembros de sus cuentas.
+"""
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.shortcuts import get_object_or_404
+
+from .models import Cuenta, MiembroCuenta, Transaccion
+from .shards import alias_actual, alias_para, atomico, en_shard
+from .versiones import datos_cambiados
+
+User = get_user_model()
+
+PROPIETARIO = 'PROPIETARIO'
+# Roles que pueden registrar movimientos en la cuenta
+ROLES_EDICION = (PROPIETARIO, 'EDITOR')
+_CACHE_SEGUNDOS = 24 * 60 * 60
+_ATRIBUTO = '_mi_finanzas_permisos_cuentas'
+
+
+class ErrorCompartir(ValueError):
+    """La cuenta no se puede compartir con ese usuario."""
+
+
+def _clave(usuario_id):
+    return f'mi_finanzas:permisos_cuentas:{usuario_id}'
+
+
+# ========================================================
+# --- RESOLUCIÓN (cacheada) ---
+# ========================================================
+
+def _resolver(usuario_id):
+    with en_shard(alias_para(usuario_id)):
+        permisos = {
+            cuenta_id: (PROPIETARIO, usuario_id)
+            for cuenta_id in Cuenta.objects.filter(usuario_id=usuario_id).values_list('pk', flat=True)
+        }
+        for cuenta_id, rol, propietario_id in MiembroCuenta.objects.filter(usuario_id=usuario_id).values_list(
+            'cuenta_id', 'rol', 'cuenta__usuario_id',
+        ):
+            permisos.setdefault(cuenta_id, (rol, propietario_id))
+    return permisos
+
+
+def permisos_cuentas(usuario):
+    """{cuenta_id: (rol, propietario_id)} de todas las cuentas a las que accede el usuario."""
+    permisos = getattr(usuario, _ATRIBUTO, None)
+    if permisos is None:
+        permisos = cache.get(_clave(usuario.pk))
+        if permisos is None:
+            permisos = _resolver(usuario.pk)
+            cache.set(_clave(usuario.pk), permisos, _CACHE_SEGUNDOS)
+        setattr(usuario, _ATRIBUTO, permisos)
+    return permisos
+
+
+def cuentas_visibles(usuario):
+    return sorted(permisos_cuentas(usuario))
+
+
+def cuentas_editables(usuario):
+    return sorted(pk for pk, (rol, _) in permisos_cuentas(usuario).items() if rol in ROLES_EDICION)
+
+
+def propietarios(usuario, editar=False):
+    """Usuarios dueños de las cuentas visibles (o editables), el propio incluido: sus categorías se pueden usar."""
+    ids = cuentas_editables(usuario) if editar else cuentas_visibles(usuario)
+    permisos = permisos_cuentas(usuario)
+    return sorted({usuario.pk} | {permisos[pk][1] for pk in ids})
+
+
+def rol_en(usuario, cuenta):
+    """Rol del usuario en la cuenta (instancia o id) o None."""
+    permiso = permisos_cuentas(usuario).get(getattr(cuenta, 'pk', cuenta))
+    return permiso[0] if permiso else None
+
+
+def cuenta_accesible(usuario, pk, editar=False, **filtros):
+    """get_object_or_404 de una cuenta visible (o editable) para el usuario."""
+    ids = cuentas_editables(usuario) if editar else cuentas_visibles(usuario)
+    return get_object_or_404(Cuenta, pk=pk, pk__in=ids, **filtros)
+
+
+def transacciones_visibles(usuario, editar=False):
+    """Transacciones de las cuentas visibles (o editables): filtro cuenta_id IN (...)."""
+    ids = cuentas_editables(usuario) if editar else cuentas_visibles(usuario)
+    return Transaccion.objects.filter(cuenta_id__in=ids)
+
+
+# ========================================================
+# --- MIEMBROS ---
+# ========================================================
+
+@atomico
+def compartir_cuenta(cuenta, usuario, rol='LECTOR'):
+    """Da (o cambia) el rol de 'usuario' en la cuenta. Devuelve el MiembroCuenta."""
+    if usuario.pk == cuenta.usuario_id:
+        raise ErrorCompartir("La cuenta ya es tuya.")
+    if rol not in dict(MiembroCuenta._meta.get_field('rol').choices):
+        raise ErrorCompartir(f"Rol desconocido: {rol}.")
+    if alias_para(usuario) != alias_para(cuenta.usuario_id):
+        raise ErrorCompartir(f"'{usuario.username}' está en otro shard: no se le puede compartir la cuenta.")
+    miembro, _ = MiembroCuenta.objects.using(cuenta._state.db).update_or_create(
+        cuenta=cuenta, usuario=usuario, defaults={'rol': rol},
+    )
+    return miembro
+
+
+@atomico
+def dejar_de_compartir(cuenta, usuario_id):
+    """Quita el acceso del usuario (delete() de la instancia: pasa por post_delete e invalida)."""
+    for miembro in MiembroCuenta.objects.using(cuenta._state.db).filter(cuenta=cuenta, usuario_id=usuario_id):
+        miembro.delete()
+
+
+# ========================================================
+# --- INVALIDACIÓN ---
+# ========================================================
+
+def permisos_cambiados(usuario_ids, using=None):
+    """Descarta los permisos cacheados de esos usuarios ahora y al confirmar la transacción en curso (del shard activo)."""
+    claves = [_clave(usuario_id) for usuario_id in set(usuario_ids)]
+    if claves:
+        cache.delete_many(claves)
+        transaction.on_commit(lambda: cache.delete_many(claves), using=using or alias_actual())
+
+
+@receiver(post_save, sender=Cuenta, dispatch_uid='mi_finanzas_permisos_cuenta_guardada')
+def _cuenta_guardada(sender, instance, created, using=None, **kwargs):
+    if created:
+        permisos_cambiados([instance.usuario_id], using=using)
+
+
+@receiver(post_delete, sender=Cuenta, dispatch_uid='mi_finanzas_permisos_cuenta_borrada')
+def _cuenta_borrada(sender, instance, using=None, **kwargs):
+    # Los miembros se borran en cascada y pasan por _miembro_cambiado
+    permisos_cambiados([instance.usuario_id], using=using)
+
+
+@receiver(post_save, sender=MiembroCuenta, dispatch_uid='mi_finanzas_permisos_miembro_guardado')
+@receiver(post_delete, sender=MiembroCuenta, dispatch_uid='mi_finanzas_permisos_miembro_borrado')
+def _miembro_cambiado(sender, instance, using=None, **kwargs):
+    permisos_cambiados([instance.usuario_id], using=using)
+    # Lo que ve el miembro cambia: sus cálculos cacheados por versión (valoración...) caducan
+    datos_cambiados([instance.usuario_id], using=using)
+
+
+@receiver(post_save, sender=User, dispatch_uid='mi_finanzas_permisos_usuario_nuevo')
+def _usuario_nuevo(sender, instance, created, using=None, **kwargs):
+    # Un id reutilizado (p. ej. tras deshacer una transacción) no hereda permisos cacheados
+    if created:
+        permisos_cambiados([instance.pk], using=using)
@@ -0,0 +1,80 @@
+"""
+Transacciones divididas entre varias categorías (un ticket con comida y hogar).
+
+- Las líneas (DivisionTransaccion) reparten el monto de la transacción; la
+  cuenta se mueve una sola vez, por la transacción (Transaccion.save()).
+- Transaccion.categoria queda como la categoría principal (la de la línea
+  mayor), para listados y búsquedas.
+- Los agregados por categoría (jerarquia.totales_por_subarbol, anotar_lineas)
+  leen las líneas con un LEFT JOIN: una transacción sin líneas cuenta como una
+  única línea con su propia categoría, así que no hace falta unir dos consultas.
+- Cambiar el monto o el tipo de la transacción deshace el reparto.
+"""
+from decimal import Decimal
+
+from django.db import router
+from django.db.models import Case, F, When
+from django.db.models.functions import Coalesce
+
+from .models import DivisionTransaccion, Transaccion
+from .shards import atomico
+from .versiones import datos_cambiados, meses_cambiados
+
+
+class ErrorDivision(ValueError):
+    """Reparto que no cuadra con la transacción."""
+
+
+def anotar_lineas(consulta):
+    """
+    Una fila por línea de reparto de cada transacción (o de las archivadas):
+    'linea_categoria' e 'importe' son los de la línea o, si no está dividida,
+    su categoría y su monto (LEFT JOIN con las líneas).
+    """
+    return consulta.annotate(
+        linea_categoria=Case(When(divisiones__id__isnull=True, then=F('categoria_id')),
+                             default=F('divisiones__categoria_id')),
+        importe=Coalesce('divisiones__monto', 'monto'),
+    )
+
+
+def validar_lineas(transaccion, lineas):
+    """Comprueba [(categoria, monto)]: al menos dos líneas, categorías del usuario y tipo, y suma = monto."""
+    if len(lineas) < 2:
+        raise ErrorDivision("Una división necesita al menos dos líneas.")
+    for categoria, monto in lineas:
+        if monto is None or monto <= 0:
+            raise ErrorDivision("Cada línea debe tener un monto positivo.")
+        if categoria is not None and (categoria.usuario_id != transaccion.usuario_id or categoria.tipo != transaccion.tipo):
+            raise ErrorDivision(f"La categoría '{categoria.nombre}' no es del mismo tipo que la transacción.")
+    total = sum((monto for _, monto in lineas), Decimal('0.00'))
+    if total != transaccion.monto:
+        raise ErrorDivision(f"Las líneas suman {total} y la transacción es de {transaccion.monto}.")
+
+
+@atomico
+def dividir_transaccion(transaccion, lineas):
+    """Sustituye el reparto de la transacción por 'lineas' ([(categoria, monto)]). Devuelve las líneas creadas."""
+    validar_lineas(transaccion, lineas)
+    db = router.db_for_write(Transaccion, instance=transaccion)
+    DivisionTransaccion.objects.using(db).filter(transaccion=transaccion).delete()
+    creadas = DivisionTransaccion.objects.using(db).bulk_create([
+        DivisionTransaccion(usuario_id=transaccion.usuario_id, transaccion=transaccion, categoria=categoria, monto=monto)
+        for categoria, monto in lineas
+    ])
+    principal = max(lineas, key=lambda linea: linea[1])[0]
+    # Solo cambia la categoría: sin pasar por save(), que revertiría y reaplicaría el saldo
+    Transaccion.objects.using(db).filter(pk=transaccion.pk).update(categoria=principal)
+    transaccion.categoria = principal
+    datos_cambiados([transaccion.usuario_id], using=db)
+    meses_cambiados([transaccion.usuario_id], transaccion.fecha, transaccion.fecha, using=db)
+    return creadas
+
+
+@atomico
+def quitar_division(transaccion):
+    """Vuelve a una única categoría (la principal)."""
+    db = router.db_for_write(Transaccion, instance=transaccion)
+    DivisionTransaccion.objects.using(db).filter(transaccion=transaccion).delete()
+    datos_cambiados([transaccion.usuario_id], using=db)
+    meses_cambiados([transaccion.usuario_id], transaccion.fecha, transaccion.fecha, using=db)
@@ -0,0 +1,165 @@
+"""
+Detección de transacciones duplicadas mediante la huella normalizada
+(cuenta, fecha, monto con signo, descripción) guardada en Transaccion.huella.
+
+- insertar_sin_duplicados(): inserción por lotes con UNA consulta de huellas
+  por lote (en lugar de una consulta por fila). bulk_create no envía
+  post_save: los ingresos en cuentas de préstamo se registran aquí como pagos.
+- escanear_duplicados(): recorre los datos existentes en bloques (streaming)
+  y devuelve los grupos de transacciones con la misma huella.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import F
+
+from .models import TIPOS_CUENTA_PRESTAMO, Cuenta, Prestamo, Transaccion, TransaccionArchivada
+from .historial import mover_saldo_mensual
+from .prestamos import registrar_pago
+from .shards import alias_actual, atomico
+from .versiones import datos_cambiados, meses_cambiados
+
+# ========================================================
+# --- POLÍTICA DE UNICIDAD ---
+# ========================================================
+
+POLITICA_OMITIR = 'OMITIR'        # Se descartan los duplicados en silencio
+POLITICA_ERROR = 'ERROR'          # Se aborta el lote completo
+POLITICA_PERMITIR = 'PERMITIR'    # Se insertan igualmente (comportamiento anterior)
+
+POLITICAS = (POLITICA_OMITIR, POLITICA_ERROR, POLITICA_PERMITIR)
+
+
+class TransaccionDuplicadaError(Exception):
+    """Se lanza con la política ERROR cuando un lote contiene duplicados."""
+
+    def __init__(self, huellas):
+        self.huellas = sorted(huellas)
+        super().__init__(f"Se detectaron {len(self.huellas)} transacciones duplicadas.")
+
+
+def politica_por_defecto():
+    return getattr(settings, 'MI_FINANZAS_POLITICA_DUPLICADOS', POLITICA_OMITIR)
+
+
+# ========================================================
+# --- INSERCIÓN POR LOTES ---
+# ========================================================
+
+def huellas_existentes(huellas):
+    """
+    Conjunto de huellas (de las dadas) que ya están en la base de datos,
+    incluidas las transacciones archivadas. Una sola consulta.
+    """
+    if not huellas:
+        return set()
+    huellas = list(huellas)
+    vivas = Transaccion.objects.filter(huella__in=huellas).values_list('huella', flat=True).order_by()
+    archivadas = TransaccionArchivada.objects.filter(huella__in=huellas).values_list('huella', flat=True).order_by()
+    return set(vivas.union(archivadas, all=True))
+
+
+def _registrar_pagos(nuevas):
+    """Enlaza como pagos (por fecha) los ingresos en cuentas de préstamo: un solo SELECT de préstamos por lote."""
+    ingresos = [tx for tx in nuevas if tx.tipo == 'INGRESO']
+    if not ingresos:
+        return
+    prestamos = {
+        prestamo.cuenta_id: prestamo
+        for prestamo in Prestamo.objects.filter(
+            cuenta_id__in={tx.cuenta_id for tx in ingresos}, cuenta__tipo__in=TIPOS_CUENTA_PRESTAMO,
+        )
+    }
+    for tx in sorted(ingresos, key=lambda tx: (tx.fecha, tx.pk)):
+        if tx.cuenta_id in prestamos:
+            registrar_pago(prestamos[tx.cuenta_id], tx)
+
+
+@atomico
+def insertar_sin_duplicados(transacciones, politica=None, batch_size=500):
+    """
+    Inserta instancias (sin guardar) de Transaccion aplicando la política de unicidad.
+
+    Por cada lote se hace una única consulta de huellas; los duplicados dentro
+    del mismo lote también se detectan. Los saldos se actualizan con un UPDATE
+    por cuenta y lote en lugar de uno por fila, y los ingresos en cuentas de
+    préstamo se registran como pagos (como haría post_save).
+
+    Devuelve (insertadas, omitidas).
+    """
+    politica = politica or politica_por_defecto()
+    if politica not in POLITICAS:
+        raise ValueError(f"Política de duplicados desconocida: {politica}")
+
+    insertadas, omitidas = [], []
+
+    for inicio in range(0, len(transacciones), batch_size):
+        lote = transacciones[inicio:inicio + batch_size]
+        for tx in lote:
+            tx.huella = tx.calcular_huella()
+
+        if politica == POLITICA_PERMITIR:
+            nuevas = list(lote)
+        else:
+            vistas = huellas_existentes({tx.huella for tx in lote})
+            nuevas, duplicadas = [], []
+            for tx in lote:
+                if tx.huella in vistas:
+                    duplicadas.append(tx)
+                else:
+                    vistas.add(tx.huella)
+                    nuevas.append(tx)
+
+            if duplicadas and politica == POLITICA_ERROR:
+                raise TransaccionDuplicadaError({tx.huella for tx in duplicadas})
+            omitidas.extend(duplicadas)
+
+        if not nuevas:
+            continue
+
+        # bulk_create no pasa por Transaccion.save(): aplicamos el saldo agrupado por cuenta.
+        Transaccion.objects.bulk_create(nuevas)
+        deltas = defaultdict(Decimal)
+        por_mes = defaultdict(Decimal)
+        for tx in nuevas:
+            deltas[tx.cuenta_id] += tx._get_signed_monto(tx.monto, tx.tipo)
+            por_mes[(tx.cuenta_id, tx.fecha.replace(day=1))] += tx._get_signed_monto(tx.monto, tx.tipo)
+        for cuenta_id, delta in deltas.items():
+            Cuenta.objects.filter(pk=cuenta_id).update(saldo=F('saldo') + delta)
+        for (cuenta_id, mes), delta in por_mes.items():
+            mover_saldo_mensual(alias_actual(), cuenta_id, mes, delta)
+        datos_cambiados({tx.usuario_id for tx in nuevas})
+        meses_cambiados({tx.usuario_id for tx in nuevas}, min(tx.fecha for tx in nuevas), max(tx.fecha for tx in nuevas))
+        _registrar_pagos(nuevas)
+
+        insertadas.extend(nuevas)
+
+    return insertadas, omitidas
+
+
+# ========================================================
+# --- ESCANEO DE DATOS EXISTENTES ---
+# ========================================================
+
+def escanear_duplicados(usuario=None, chunk_size=2000):
+    """
+    Genera listas de PKs (ordenadas) que comparten huella.
+
+    Recorre la tabla ordenada por huella con .iterator(), de modo que solo
+    se mantiene en memoria un bloque y el grupo actual.
+    """
+    qs = Transaccion.objects.exclude(huella='')
+    if usuario is not None:
+        qs = qs.filter(usuario=usuario)
+    filas = qs.order_by('huella', 'pk').values_list('huella', 'pk').iterator(chunk_size=chunk_size)
+
+    huella_actual, grupo = None, []
+    for huella, pk in filas:
+        if huella != huella_actual:
+            if len(grupo) > 1:
+                yield grupo
+            huella_actual, grupo = huella, []
+        grupo.append(pk)
+    if len(grupo) > 1:
+        yield grupo
@@ -0,0 +1,229 @@
+"""
+Prueba de estrés concurrente contra las vistas (transferir, añadir, editar y
+eliminar transacciones) y verificación de invariantes al terminar:
+
+- Cuenta.saldo == saldo inicial + Σ transacciones (con signo) de la cuenta;
+- cada transferencia está enlazada con su par (y el par con ella), en otra
+  cuenta, por el mismo monto y con el tipo contrario.
+
+Las peticiones pasan por el cliente de pruebas de Django (middleware, vistas,
+atomic, select_for_update y F() reales) contra la base configurada, así que
+NO debe lanzarse contra producción. Se usa con 'manage.py estres_concurrente'.
+"""
+import random
+import time
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, connections
+from django.db.models import Sum
+from django.test import Client
+from django.urls import reverse
+
+from .models import Categoria, Cuenta, Transaccion, monto_firmado
+from .shards import alias_para, en_shard
+
+User = get_user_model()
+
+OPERACIONES = ['transferir', 'crear', 'editar', 'eliminar']
+PESOS = [3, 4, 2, 1]
+
+CENTIMO = Decimal('0.01')
+
+# Fuera de INTERNAL_IPS: sin debug toolbar, que falsearía las latencias
+_IP_CLIENTE = '10.255.0.1'
+# Como el panel (fetch): las vistas responden JSON, 200 si se escribió y 400 si se rechazó
+_CABECERAS = {'X-Requested-With': 'XMLHttpRequest'}
+
+
+# ========================================================
+# --- ESCENARIO ---
+# ========================================================
+
+def preparar_escenario(usuarios=2, cuentas=4, saldo_inicial=Decimal('1000.00'), prefijo='estres'):
+    """
+    Crea usuarios con sus cuentas y categorías. Devuelve un diccionario
+    serializable (se pasa a los procesos hijos): {'usuarios': [...], 'saldos_iniciales': {...}}.
+    """
+    sello = int(time.time())
+    escenario = {'usuarios': [], 'saldos_iniciales': {}}
+    for i in range(usuarios):
+        usuario = User.objects.create_user(username=f'{prefijo}_{sello}_{i}', password=None)
+        with en_shard(alias_para(usuario)):
+            for j in range(cuentas):
+                cuenta = Cuenta.objects.create(usuario=usuario, nombre=f'Cuenta {j}', tipo='CHEQUES', saldo=saldo_inicial)
+                escenario['saldos_iniciales'][str(cuenta.pk)] = str(saldo_inicial)
+            for tipo in ('INGRESO', 'EGRESO'):
+                Categoria.objects.create(usuario=usuario, nombre=f'Estrés {tipo.lower()}', tipo=tipo)
+        escenario['usuarios'].append(usuario.pk)
+    return escenario
+
+
+def limpiar_escenario(escenario):
+    User.objects.filter(pk__in=escenario['usuarios']).delete()
+
+
+# ========================================================
+# --- OPERACIONES ---
+# ========================================================
+
+def _fecha(azar):
+    return (date.today() - timedelta(days=azar.randint(0, 60))).isoformat()
+
+
+def _monto(azar):
+    return f"{azar.randint(1, 5000) / 100:.2f}"
+
+
+def _una_transaccion(usuario_id, azar, solo_normales):
+    qs = Transaccion.objects.filter(usuario_id=usuario_id)
+    if solo_normales:
+        qs = qs.filter(es_transferencia=False)
+    pks = list(qs.values_list('pk', flat=True).order_by('-pk')[:50])
+    return azar.choice(pks) if pks else None
+
+
+def _peticion(cliente, operacion, usuario_id, cuentas, categorias, azar):
+    """Devuelve la respuesta, o None si no había sobre qué operar."""
+    if operacion == 'transferir':
+        origen, destino = azar.sample(cuentas, 2)
+        return cliente.post(reverse('mi_finanzas:transferir_monto'), {
+            'cuenta_origen': origen, 'cuenta_destino': destino, 'monto': _monto(azar),
+            'fecha': _fecha(azar), 'descripcion': 'estrés',
+        }, headers=_CABECERAS)
+
+    if operacion == 'eliminar':
+        pk = _una_transaccion(usuario_id, azar, solo_normales=False)
+        return pk and cliente.post(reverse('mi_finanzas:eliminar_transaccion', args=[pk]), headers=_CABECERAS)
+
+    tipo = azar.choice(['INGRESO', 'EGRESO'])
+    datos = {
+        'monto': _monto(azar), 'tipo': tipo, 'categoria': categorias[tipo], 'fecha': _fecha(azar),
+        'descripcion': f'estrés {azar.randint(0, 10 ** 6)}', 'cuenta': azar.choice(cuentas),
+    }
+    if operacion == 'editar':
+        pk = _una_transaccion(usuario_id, azar, solo_normales=True)
+        return pk and cliente.post(reverse('mi_finanzas:editar_transaccion', args=[pk]), datos, headers=_CABECERAS)
+    return cliente.post(reverse('mi_finanzas:anadir_transaccion'), datos, headers=_CABECERAS)
+
+
+def _clasificar(respuesta):
+    """
+    Estado de una respuesta parcial: 200 con ok es una escritura hecha y 400
+    con errores, una rechazada por validación (saldo insuficiente...). Un 302
+    o cualquier otra cosa es un error: la vista no contestó como al panel.
+    """
+    if respuesta.status_code == 404:
+        # Otro hilo la borró entre la elección y la petición
+        return 'conflicto'
+    if respuesta.status_code not in (200, 400) or respuesta.get('Content-Type') != 'application/json':
+        return 'error'
+    datos = respuesta.json()
+    if respuesta.status_code == 200 and datos.get('ok') is True:
+        return 'ok'
+    if respuesta.status_code == 400 and datos.get('ok') is False and datos.get('errores'):
+        return 'rechazada'
+    return 'error'
+
+
+def ejecutar_operaciones(usuario_id, cantidad, semilla=None):
+    """
+    Lanza 'cantidad' operaciones aleatorias como el usuario. Devuelve
+    [(operacion, estado, segundos)] con estado ok / rechazada / conflicto / bloqueo / error.
+    """
+    azar = random.Random(semilla)
+    usuario = User.objects.get(pk=usuario_id)
+    cliente = Client(REMOTE_ADDR=_IP_CLIENTE)
+    cliente.force_login(usuario)
+    with en_shard(alias_para(usuario)):
+        cuentas = list(Cuenta.objects.filter(usuario=usuario).values_list('pk', flat=True))
+        categorias = dict(Categoria.objects.filter(usuario=usuario).values_list('tipo', 'pk'))
+
+    muestras = []
+    try:
+        for _ in range(cantidad):
+            operacion = azar.choices(OPERACIONES, PESOS)[0]
+            with en_shard(alias_para(usuario)):
+                inicio = time.perf_counter()
+                try:
+                    respuesta = _peticion(cliente, operacion, usuario_id, cuentas, categorias, azar)
+                    if respuesta is None:
+                        continue
+                    estado = _clasificar(respuesta)
+                except OperationalError as e:
+                    estado = 'bloqueo' if 'locked' in str(e) else 'error'
+                except Exception:
+                    estado = 'error'
+                muestras.append((operacion, estado, time.perf_counter() - inicio))
+    finally:
+        # Cada hilo/proceso abre sus propias conexiones
+        connections.close_all()
+    return muestras
+
+
+# ========================================================
+# --- INVARIANTES E INFORME ---
+# ========================================================
+
+def verificar_invariantes(escenario):
+    """Lista de incumplimientos (vacía si todo cuadra)."""
+    problemas = []
+    iniciales = {int(pk): Decimal(saldo) for pk, saldo in escenario['saldos_iniciales'].items()}
+    for usuario_id in escenario['usuarios']:
+        with en_shard(alias_para(usuario_id)):
+            sumas = dict(
+                Transaccion.objects.filter(usuario_id=usuario_id).values('cuenta_id')
+                .annotate(total=Sum(monto_firmado())).order_by().values_list('cuenta_id', 'total')
+            )
+            for cuenta_id, saldo in Cuenta.objects.filter(usuario_id=usuario_id).values_list('pk', 'saldo'):
+                # SQLite suma en coma flotante: se compara a céntimos
+                esperado = (iniciales[cuenta_id] + (sumas.get(cuenta_id) or Decimal('0'))).quantize(CENTIMO)
+                if saldo != esperado:
+                    problemas.append(f"Cuenta {cuenta_id}: saldo {saldo} != libro {esperado}")
+
+            transferencias = {
+                fila['pk']: fila for fila in Transaccion.objects.filter(usuario_id=usuario_id, es_transferencia=True)
+                .values('pk', 'transaccion_relacionada_id', 'cuenta_id', 'monto', 'tipo')
+            }
+            for pk, tx in transferencias.items():
+                par = transferencias.get(tx['transaccion_relacionada_id'])
+                if par is None or par['transaccion_relacionada_id'] != pk:
+                    problemas.append(f"Transferencia {pk}: sin par enlazado")
+                elif par['cuenta_id'] == tx['cuenta_id'] or par['monto'] != tx['monto'] or par['tipo'] == tx['tipo']:
+                    problemas.append(f"Transferencia {pk}: par {par['pk']} incoherente")
+    return problemas
+
+
+def _percentil(ordenadas, p):
+    if not ordenadas:
+        return 0.0
+    return ordenadas[min(len(ordenadas) - 1, int(p / 100 * len(ordenadas)))]
+
+
+def resumir(muestras, segundos):
+    """Rendimiento, tasas de error/bloqueo y percentiles de latencia (ms), en total y por operación."""
+    def bloque(filas):
+        latencias = sorted(s * 1000 for _, _, s in filas)
+        estados = Counter(estado for _, estado, _ in filas)
+        total = len(filas) or 1
+        return {
+            'peticiones': len(filas),
+            'estados': dict(estados),
+            'tasa_error': estados['error'] / total,
+            'tasa_bloqueo': estados['bloqueo'] / total,
+            'p50_ms': _percentil(latencias, 50),
+            'p95_ms': _percentil(latencias, 95),
+            'p99_ms': _percentil(latencias, 99),
+            'max_ms': latencias[-1] if latencias else 0.0,
+        }
+
+    por_operacion = defaultdict(list)
+    for muestra in muestras:
+        por_operacion[muestra[0]].append(muestra)
+    informe = bloque(muestras)
+    informe['segundos'] = segundos
+    informe['por_segundo'] = len(muestras) / segundos if segundos else 0.0
+    informe['por_operacion'] = {op: bloque(filas) for op, filas in sorted(por_operacion.items())}
+    return informe
@@ -0,0 +1,108 @@
+"""
+Etiquetas libres en las transacciones ("vacaciones-2026", "deducible").
+
+- Etiqueta (por usuario) y la tabla intermedia TransaccionEtiqueta, con
+  índice único (etiqueta, transaccion): los filtros se resuelven en el
+  índice, sin leer la tabla de transacciones.
+- filtrar_por_etiquetas(): semi-join con la tabla intermedia. Las etiquetas
+  son del dueño de cada transacción, así que en cuentas compartidas se buscan
+  por nombre entre los propietarios de las cuentas visibles.
+  · 'o' (cualquiera): transaccion_id IN (... etiqueta_id IN (...));
+  · 'y' (todas): la intersección con GROUP BY transaccion_id
+    HAVING COUNT(*) = número de etiquetas.
+- totales_por_etiqueta(): ingresos y egresos por etiqueta (dimensión de
+  reportes) con un join + GROUP BY.
+- Las etiquetas de las transacciones archivadas se conservan en el archivo
+  (TransaccionEtiquetaArchivada), pero filtros y totales miran las vivas.
+"""
+import re
+from decimal import Decimal
+
+from django.db import router
+from django.db.models import Count, Q, Sum
+
+from .compartidas import propietarios
+from .models import Etiqueta, Transaccion, TransaccionEtiqueta
+from .shards import atomico
+from .versiones import datos_cambiados
+
+MODOS = ('y', 'o')
+_MAXIMO_ETIQUETAS = 20
+_CENTIMO = Decimal('0.01')
+
+
+def normalizar_etiqueta(texto):
+    """'Vacaciones 2026 ' -> 'vacaciones-2026' (sin '#', comas ni espacios)."""
+    return re.sub(r'[\s,#]+', '-', (texto or '').strip().lower()).strip('-')[:50]
+
+
+def leer_etiquetas(texto):
+    """Lista de etiquetas normalizadas (sin repetir) de un texto separado por comas o espacios."""
+    vistas = []
+    for parte in re.split(r'[\s,]+', texto or ''):
+        etiqueta = normalizar_etiqueta(parte)
+        if etiqueta and etiqueta not in vistas:
+            vistas.append(etiqueta)
+    return vistas[:_MAXIMO_ETIQUETAS]
+
+
+@atomico
+def etiquetar(transaccion, nombres):
+    """Deja en la transacción exactamente esas etiquetas (las crea si no existen)."""
+    db = router.db_for_write(Transaccion, instance=transaccion)
+    nombres = [n for n in (normalizar_etiqueta(nombre) for nombre in nombres) if n]
+    etiquetas = Etiqueta.objects.using(db)
+    etiquetas.bulk_create([Etiqueta(usuario_id=transaccion.usuario_id, nombre=nombre) for nombre in nombres],
+                          ignore_conflicts=True)
+    ids = set(etiquetas.filter(usuario_id=transaccion.usuario_id, nombre__in=nombres).values_list('pk', flat=True))
+
+    enlaces = TransaccionEtiqueta.objects.using(db).filter(transaccion_id=transaccion.pk)
+    actuales = set(enlaces.values_list('etiqueta_id', flat=True))
+    enlaces.exclude(etiqueta_id__in=ids).delete()
+    TransaccionEtiqueta.objects.using(db).bulk_create(
+        [TransaccionEtiqueta(transaccion_id=transaccion.pk, etiqueta_id=etiqueta_id) for etiqueta_id in ids - actuales]
+    )
+    if ids != actuales:
+        datos_cambiados([transaccion.usuario_id], using=db)
+
+
+def filtrar_por_etiquetas(consulta, usuario, nombres, modo='y'):
+    """Restringe 'consulta' (transacciones) a las que tienen todas ('y') o alguna ('o') de las etiquetas."""
+    nombres = {normalizar_etiqueta(nombre) for nombre in nombres} - {''}
+    if not nombres:
+        return consulta
+    etiquetas = dict(Etiqueta.objects.filter(usuario_id__in=propietarios(usuario), nombre__in=nombres)
+                     .values_list('pk', 'nombre'))
+    if modo == 'y' and len(set(etiquetas.values())) < len(nombres):
+        # Alguna etiqueta no existe: ninguna transacción las tiene todas
+        return consulta.none()
+    enlaces = TransaccionEtiqueta.objects.filter(etiqueta_id__in=list(etiquetas)).values('transaccion_id')
+    if modo == 'y' and len(nombres) > 1:
+        # Las etiquetas de una transacción son todas de su dueño: un id por nombre
+        enlaces = enlaces.annotate(n=Count('etiqueta_id')).filter(n=len(nombres)).values('transaccion_id')
+    return consulta.filter(pk__in=enlaces)
+
+
+def totales_por_etiqueta(consulta):
+    """[{'etiqueta', 'ingresos', 'egresos', 'cantidad'}] de las transacciones de 'consulta', de mayor a menor gasto."""
+    filas = (
+        consulta.filter(etiquetas__isnull=False)
+        .values('etiquetas__nombre')
+        .annotate(
+            ingresos=Sum('monto', filter=Q(tipo='INGRESO')),
+            egresos=Sum('monto', filter=Q(tipo='EGRESO')),
+            cantidad=Count('pk'),
+        )
+        .order_by()
+    )
+    resultado = [
+        {
+            'etiqueta': fila['etiquetas__nombre'],
+            # Sum en SQLite pasa por coma flotante: se redondea al céntimo
+            'ingresos': (fila['ingresos'] or Decimal(0)).quantize(_CENTIMO),
+            'egresos': (fila['egresos'] or Decimal(0)).quantize(_CENTIMO),
+            'cantidad': fila['cantidad'],
+        }
+        for fila in filas
+    ]
+    return sorted(resultado, key=lambda fila: (-fila['egresos'], fila['etiqueta']))
@@ -0,0 +1,205 @@
+"""
+Exportación columnar (Parquet / Arrow IPC) del historial para análisis offline.
+
+Cada tabla se lee con values_list(...).iterator() en bloques y cada bloque se
+convierte en un RecordBatch, así la memoria queda acotada al tamaño del bloque.
+Tipos:
+
+- importes (Decimal) -> int64 en centavos (metadato del campo: escala=2)
+- fechas -> date32, marcas de tiempo -> timestamp[us, UTC]
+
+Transacciones se puede particionar por año/mes (directorios estilo Hive:
+transacciones/anio=2025/mes=03/parte-0.parquet).
+"""
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.ipc as pa_ipc
+import pyarrow.parquet as pq
+
+from .models import Categoria, Cuenta, Presupuesto, Transaccion, TransaccionArchivada
+
+FORMATOS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+TABLAS = ['cuentas', 'categorias', 'presupuestos', 'transacciones']
+
+
+def _centavos(valor):
+    return None if valor is None else int(valor * 100)
+
+
+def _definiciones():
+    """{tabla: (modelo, [(columna, campo ORM, tipo arrow, conversión)])}"""
+    entero, texto = pa.int64(), pa.string()
+    fecha, marca = pa.date32(), pa.timestamp('us', tz='UTC')
+    return {
+        'cuentas': (Cuenta, [
+            ('id', 'id', entero, None),
+            ('usuario_id', 'usuario_id', entero, None),
+            ('nombre', 'nombre', texto, None),
+            ('tipo', 'tipo', texto, None),
+            ('saldo_centavos', 'saldo', entero, _centavos),
+        ]),
+        'categorias': (Categoria, [
+            ('id', 'id', entero, None),
+            ('usuario_id', 'usuario_id', entero, None),
+            ('nombre', 'nombre', texto, None),
+            ('tipo', 'tipo', texto, None),
+            ('padre_id', 'padre_id', entero, None),
+        ]),
+        'presupuestos': (Presupuesto, [
+            ('id', 'id', entero, None),
+            ('usuario_id', 'usuario_id', entero, None),
+            ('categoria_id', 'categoria_id', entero, None),
+            ('monto_limite_centavos', 'monto_limite', entero, _centavos),
+            ('mes', 'mes', pa.int8(), None),
+            ('anio', 'anio', pa.int16(), None),
+            ('fecha_creacion', 'fecha_creacion', marca, None),
+        ]),
+        'transacciones': (Transaccion, [
+            ('id', 'id', entero, None),
+            ('usuario_id', 'usuario_id', entero, None),
+            ('cuenta_id', 'cuenta_id', entero, None),
+            ('categoria_id', 'categoria_id', entero, None),
+            ('monto_centavos', 'monto', entero, _centavos),
+            ('tipo', 'tipo', texto, None),
+            ('fecha', 'fecha', fecha, None),
+            ('descripcion', 'descripcion', texto, None),
+            ('fecha_creacion', 'fecha_creacion', marca, None),
+            ('es_transferencia', 'es_transferencia', pa.bool_(), None),
+            ('transaccion_relacionada_id', 'transaccion_relacionada_id', entero, None),
+        ]),
+    }
+
+
+def _esquema(columnas):
+    return pa.schema([
+        pa.field(nombre, tipo, metadata={'escala': '2'} if nombre.endswith('_centavos') else None)
+        for nombre, _, tipo, _ in columnas
+    ])
+
+
+def _lote(filas, columnas, esquema):
+    """Convierte un bloque de tuplas de values_list en un RecordBatch tipado."""
+    arrays = []
+    for i, (_, _, tipo, conversion) in enumerate(columnas):
+        valores = [fila[i] for fila in filas]
+        if conversion is not None:
+            valores = [conversion(v) for v in valores]
+        arrays.append(pa.array(valores, type=tipo))
+    return pa.RecordBatch.from_arrays(arrays, schema=esquema)
+
+
+class _Escritor:
+    """
+    Mantiene abierto un fichero por partición. Si una partición ya cerrada
+    vuelve a recibir filas, se abre un nuevo 'parte-N' en lugar de sobrescribirla.
+    """
+
+    def __init__(self, formato, esquema):
+        self.formato = formato
+        self.esquema = esquema
+        self.abiertos = {}
+        self.partes = {}
+        self.filas = 0
+
+    def escribir(self, directorio, nombre, lote):
+        clave = (directorio, nombre)
+        escritor = self.abiertos.get(clave)
+        if escritor is None:
+            parte = self.partes.get(clave, 0)
+            self.partes[clave] = parte + 1
+            directorio.mkdir(parents=True, exist_ok=True)
+            ruta = directorio / f"{nombre}-{parte}{FORMATOS[self.formato]}" if parte else \
+                directorio / f"{nombre}{FORMATOS[self.formato]}"
+            if self.formato == 'parquet':
+                escritor = pq.ParquetWriter(ruta, self.esquema, compression='zstd')
+            else:
+                escritor = pa_ipc.new_file(ruta, self.esquema)
+            self.abiertos[clave] = escritor
+        escritor.write_batch(lote)
+        self.filas += lote.num_rows
+
+    def cerrar(self, excepto=None):
+        for clave in [c for c in self.abiertos if c != excepto]:
+            self.abiertos.pop(clave).close()
+
+
+def _querysets(tabla, modelo, usuario, incluir_archivo):
+    modelos = [modelo]
+    if tabla == 'transacciones' and incluir_archivo:
+        # El archivo es anterior al corte: ponerlo delante mantiene el orden por fecha
+        modelos = [TransaccionArchivada, modelo]
+    orden = ('fecha', 'pk') if tabla == 'transacciones' else ('pk',)
+    querysets = []
+    for m in modelos:
+        qs = m.objects.all()
+        if usuario is not None:
+            qs = qs.filter(usuario=usuario)
+        querysets.append(qs.order_by(*orden))
+    return querysets
+
+
+def _escribir_bloque(escritor, destino, tabla, bloque, columnas, esquema, indice_fecha):
+    if indice_fecha is None:
+        escritor.escribir(destino, tabla, _lote(bloque, columnas, esquema))
+        return
+
+    # Bloque ordenado por fecha: se corta en tramos de un mismo año/mes
+    inicio = 0
+    while inicio < len(bloque):
+        fecha = bloque[inicio][indice_fecha]
+        fin = inicio + 1
+        while fin < len(bloque) and bloque[fin][indice_fecha].month == fecha.month \
+                and bloque[fin][indice_fecha].year == fecha.year:
+            fin += 1
+        directorio = destino / tabla / f"anio={fecha.year}" / f"mes={fecha.month:02d}"
+        # Las particiones anteriores ya no recibirán más filas: se cierran
+        escritor.cerrar(excepto=(directorio, 'parte'))
+        escritor.escribir(directorio, 'parte', _lote(bloque[inicio:fin], columnas, esquema))
+        inicio = fin
+
+
+def exportar_columnar(destino, formato='parquet', usuario=None, particionar=False,
+                      incluir_archivo=False, chunk_size=50000, progreso=None):
+    """
+    Escribe cuentas, categorias, presupuestos y transacciones bajo 'destino'.
+    'progreso' (opcional) recibe (porcentaje, mensaje). Devuelve {tabla: filas}.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no soportado: {formato}")
+
+    destino = Path(destino)
+    definiciones = _definiciones()
+    resumen = {}
+
+    for numero, tabla in enumerate(TABLAS, start=1):
+        modelo, columnas = definiciones[tabla]
+        esquema = _esquema(columnas)
+        campos = [campo for _, campo, _, _ in columnas]
+        particionada = particionar and tabla == 'transacciones'
+        indice_fecha = campos.index('fecha') if particionada else None
+        escritor = _Escritor(formato, esquema)
+
+        try:
+            for qs in _querysets(tabla, modelo, usuario, incluir_archivo):
+                bloque = []
+                for fila in qs.values_list(*campos).iterator(chunk_size=chunk_size):
+                    bloque.append(fila)
+                    if len(bloque) >= chunk_size:
+                        _escribir_bloque(escritor, destino, tabla, bloque, columnas, esquema, indice_fecha)
+                        bloque = []
+                if bloque:
+                    _escribir_bloque(escritor, destino, tabla, bloque, columnas, esquema, indice_fecha)
+
+            if not escritor.filas and not particionada:
+                # Tabla vacía: se deja igualmente el fichero con su esquema
+                escritor.escribir(destino, tabla, pa.RecordBatch.from_pylist([], schema=esquema))
+        finally:
+            escritor.cerrar()
+
+        resumen[tabla] = escritor.filas
+        if progreso:
+            progreso(100 * numero // len(TABLAS), f"{tabla}: {escritor.filas} filas")
+
+    return resumen
@@ -0,0 +1,124 @@
+"""
+Extracto de cuenta: transacciones de una cuenta (más recientes primero) con
+el saldo tras cada una, paginadas por cursor (keyset).
+
+- Orden total: (fecha, pk). El cursor es la clave de la última fila vista
+  ('AAAA-MM-DD.pk'); la página siguiente es "las N anteriores a la clave",
+  que el índice (cuenta, fecha, id) resuelve sin OFFSET: la página 500 cuesta
+  lo mismo que la primera.
+- Saldo de apertura de la página: el cierre del mes de su fila más antigua
+  (SaldoMensual, mi_finanzas/historial.py) menos la suma con signo de lo
+  posterior a esa fila dentro del mismo mes: el aggregate recorre como mucho
+  un mes, no todo el historial. Incluye así el archivo en frío (se archivan
+  meses enteros) y los ajustes manuales, que ya están en la serie. Si la
+  cuenta aún no tiene serie se construye (en la primaria) y, mientras, se
+  parte de Cuenta.saldo restando todo lo posterior.
+- Saldo acumulado dentro de la página: Window(Sum(monto_firmado())) sobre
+  las filas de la página (como mucho 'tamano' filas), en SQL.
+"""
+from datetime import date
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.db.models import F, Q, Sum, Window
+from django.db.models.functions import Coalesce
+
+from .historial import inicio_de_mes, reconstruir_saldos_mensuales
+from .models import Cuenta, SaldoMensual, Transaccion, monto_firmado
+from .replicas import primario_de
+
+TAMANO_PAGINA = 50
+MAXIMO_PAGINA = 500
+CENTIMO = Decimal('0.01')
+
+
+def clave_cursor(transaccion):
+    return f'{transaccion.fecha.isoformat()}.{transaccion.pk}'
+
+
+def leer_cursor(valor):
+    """'AAAA-MM-DD.pk' -> (fecha, pk), o None si falta o no es válido."""
+    try:
+        fecha, pk = valor.split('.')
+        return date.fromisoformat(fecha), int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+
+def _anteriores(fecha, pk):
+    return Q(fecha__lt=fecha) | Q(fecha=fecha, pk__lt=pk)
+
+
+def _posteriores(fecha, pk):
+    return Q(fecha__gt=fecha) | Q(fecha=fecha, pk__gt=pk)
+
+
+def _cierre_del_mes(cuenta, mes):
+    """Saldo de la cuenta al cierre de 'mes' según su serie mensual, o None si no está (la serie se construye)."""
+    serie = SaldoMensual.objects.using(cuenta._state.db).filter(cuenta_id=cuenta.pk)
+    cierre = serie.filter(mes=mes).values_list('saldo', flat=True).first()
+    if cierre is None and not serie.exists():
+        # Para las páginas siguientes; desde una réplica se escribe en la primaria
+        reconstruir_saldos_mensuales(Cuenta.objects.using(primario_de(cuenta._state.db)).filter(pk=cuenta.pk))
+    return cierre
+
+
+def pagina_extracto(cuenta, antes=None, despues=None, tamano=TAMANO_PAGINA):
+    """
+    Una página del extracto de 'cuenta'. 'antes'/'despues' son cursores
+    (leer_cursor): filas más antiguas que 'antes' o más recientes que 'despues';
+    sin ninguno, la página más reciente.
+
+    Devuelve {'transacciones': [...], 'saldo_apertura', 'saldo_cierre',
+    'anterior', 'siguiente'}; cada transacción lleva 'saldo_tras' y
+    'anterior'/'siguiente' son los cursores de las páginas más recientes/más
+    antiguas (None si no hay).
+    """
+    tamano = max(1, min(int(tamano), MAXIMO_PAGINA))
+    movimientos = Transaccion.objects.using(cuenta._state.db).filter(cuenta=cuenta)
+
+    # 1. Claves de la página (+1 para saber si hay más), por el índice
+    if despues is not None:
+        claves = movimientos.filter(_posteriores(*despues)).order_by('fecha', 'pk')
+    else:
+        claves = movimientos.filter(_anteriores(*antes)) if antes is not None else movimientos
+        claves = claves.order_by('-fecha', '-pk')
+    claves = list(claves.values_list('fecha', 'pk')[:tamano + 1])
+    hay_mas = len(claves) > tamano
+    claves = sorted(claves[:tamano], reverse=True)
+    if not claves:
+        return {'transacciones': [], 'saldo_apertura': cuenta.saldo, 'saldo_cierre': cuenta.saldo,
+                'anterior': None, 'siguiente': None}
+
+    # 2. Saldo antes de la fila más antigua de la página: cierre de su mes menos lo posterior en ese mes
+    mes = inicio_de_mes(claves[-1][0])
+    posteriores = movimientos.filter(Q(pk=claves[-1][1]) | _posteriores(*claves[-1]))
+    cierre = _cierre_del_mes(cuenta, mes)
+    if cierre is None:
+        # Sin serie todavía: Cuenta.saldo menos todo lo posterior
+        cierre = cuenta.saldo
+    else:
+        posteriores = posteriores.filter(fecha__lt=mes + relativedelta(months=1))
+    posterior = posteriores.aggregate(total=Coalesce(Sum(monto_firmado()), Decimal('0')))['total']
+    apertura = (cierre - posterior).quantize(CENTIMO)
+
+    # 3. Saldo acumulado de la página con una función ventana
+    transacciones = list(
+        movimientos.filter(pk__in=[pk for _, pk in claves]).select_related('categoria')
+        .annotate(acumulado=Window(Sum(monto_firmado()), order_by=[F('fecha').asc(), F('pk').asc()]))
+        .order_by('-fecha', '-pk')
+    )
+    for transaccion in transacciones:
+        # SQLite suma en coma flotante: se redondea a céntimos
+        transaccion.saldo_tras = (apertura + transaccion.acumulado).quantize(CENTIMO)
+
+    # Hacia lo reciente hay más si se pidió 'antes' o si la consulta 'despues' no cupo
+    mas_recientes = hay_mas if despues is not None else antes is not None
+    mas_antiguas = hay_mas if despues is None else True
+    return {
+        'transacciones': transacciones,
+        'saldo_apertura': apertura,
+        'saldo_cierre': transacciones[0].saldo_tras,
+        'anterior': clave_cursor(transacciones[0]) if mas_recientes else None,
+        'siguiente': clave_cursor(transacciones[-1]) if mas_antiguas else None,
+    }
@@ -1,6 +1,7 @@
 from django import forms
 from django.forms.widgets import TextInput, NumberInput, Select, Textarea, DateInput
 from django.utils import timezone
+from decimal import Decimal
 import calendar 
 from django.contrib.auth import get_user_model
 
@@ -9,7 +10,9 @@ from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Layout, Row, Column 
 
 # Importaciones de Modelos
-from .models import Cuenta, Transaccion, Categoria, Presupuesto 
+from .models import Cuenta, Transaccion, Categoria, Presupuesto, Prestamo, Posicion, ROLES_MIEMBRO
+from .compartidas import cuentas_editables, propietarios
+from .etiquetas import leer_etiquetas
 
 User = get_user_model() 
 
@@ -49,6 +52,11 @@ class TransaccionForm(forms.ModelForm):
     fecha = forms.DateField(
         widget=DateInput(attrs={'type': 'date', 'class': 'form-control'})
     )
+    # Etiquetas separadas por comas; la vista las guarda con etiquetas.etiquetar()
+    etiquetas_texto = forms.CharField(
+        label="Etiquetas", required=False,
+        widget=TextInput(attrs={'class': 'form-control', 'placeholder': 'Ej: vacaciones-2026, deducible'}),
+    )
     
     def __init__(self, *args, **kwargs):
         # Acepta 'user' para filtrar querysets
@@ -61,14 +69,29 @@ class TransaccionForm(forms.ModelForm):
             user = request.user
 
         if user is not None:
-            # Filtra Cuentas y Categorías del usuario
-            self.fields['cuenta'].queryset = Cuenta.objects.filter(usuario=user)
-            self.fields['categoria'].queryset = Categoria.objects.filter(usuario=user)
+            # Cuentas en las que el usuario puede registrar movimientos (propias y compartidas
+            # como editor) y categorías de sus propietarios (mi_finanzas/compartidas.py)
+            self.fields['cuenta'].queryset = Cuenta.objects.filter(pk__in=cuentas_editables(user))
+            self.fields['categoria'].queryset = Categoria.objects.filter(usuario_id__in=propietarios(user, editar=True))
 
             # Aplica estilos a los Select
             self.fields['cuenta'].widget.attrs.update({'class': 'form-select'})
             self.fields['categoria'].widget.attrs.update({'class': 'form-select'})
 
+        if self.instance.pk and not self.is_bound:
+            self.initial['etiquetas_texto'] = ', '.join(self.instance.etiquetas.values_list('nombre', flat=True))
+
+    def clean_etiquetas_texto(self):
+        return leer_etiquetas(self.cleaned_data['etiquetas_texto'])
+
+    def clean(self):
+        cleaned_data = super().clean()
+        cuenta, categoria = cleaned_data.get('cuenta'), cleaned_data.get('categoria')
+        # La transacción será del propietario de la cuenta: la categoría también
+        if cuenta and categoria and categoria.usuario_id != cuenta.usuario_id:
+            self.add_error('categoria', "La categoría no pertenece al propietario de la cuenta.")
+        return cleaned_data
+
     class Meta:
         model = Transaccion
         fields = ['monto', 'tipo', 'categoria', 'fecha', 'descripcion', 'cuenta']
@@ -121,7 +144,7 @@ class TransferenciaForm(forms.Form):
             user = request.user
 
         if user is not None:
-            cuentas_del_usuario = Cuenta.objects.filter(usuario=user)
+            cuentas_del_usuario = Cuenta.objects.filter(pk__in=cuentas_editables(user))
             self.fields['cuenta_origen'].queryset = cuentas_del_usuario
             self.fields['cuenta_destino'].queryset = cuentas_del_usuario
             
@@ -216,7 +239,14 @@ class CategoriaForm(forms.ModelForm):
     """Formulario para la creación y edición de categorías."""
     
     def __init__(self, *args, **kwargs):
+        user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
+        if user is not None:
+            # Padre: otra categoría del usuario (el modelo valida tipo y ciclos en clean())
+            padres = Categoria.objects.filter(usuario=user).order_by('nombre')
+            if self.instance.pk:
+                padres = padres.exclude(pk=self.instance.pk)
+            self.fields['padre'].queryset = padres
         # Aplicar estilo Bootstrap a los campos
         for field in self.fields.values():
             if field.widget.__class__ in [Select, forms.Select]:
@@ -226,10 +256,100 @@ class CategoriaForm(forms.ModelForm):
 
     class Meta:
         model = Categoria
-        fields = ('nombre', 'tipo') 
+        fields = ('nombre', 'tipo', 'padre')
         
         widgets = {
             'nombre': TextInput(attrs={'class': 'form-control', 'placeholder': 'Ej: Alimentación'}),
             'tipo': Select(attrs={'class': 'form-select'}),
+            'padre': Select(attrs={'class': 'form-select'}),
+        }
+        labels = {'padre': "Subcategoría de"}
+
+
+# ----------------------------------------------------
+# 6. Formulario de Préstamos (condiciones)
+# ----------------------------------------------------
+
+class PrestamoForm(forms.ModelForm):
+    """Condiciones de un préstamo; la cuenta y el usuario los asigna la vista."""
+    fecha_inicio = forms.DateField(
+        label='Fecha de la primera cuota',
+        widget=DateInput(attrs={'type': 'date', 'class': 'form-control'})
+    )
+
+    class Meta:
+        model = Prestamo
+        fields = ('principal', 'tasa_anual', 'plazo_meses', 'fecha_inicio', 'dia_pago')
+        widgets = {
+            'principal': NumberInput(attrs={'class': 'form-control', 'step': '0.01', 'min': '0.01', 'placeholder': 'Ej: 150000.00'}),
+            'tasa_anual': NumberInput(attrs={'class': 'form-control', 'step': '0.001', 'min': '0', 'placeholder': 'Ej: 4.5'}),
+            'plazo_meses': NumberInput(attrs={'class': 'form-control', 'min': '1', 'placeholder': 'Ej: 360'}),
+            'dia_pago': NumberInput(attrs={'class': 'form-control', 'min': '1', 'max': '31'}),
+        }
+
+# ----------------------------------------------------
+# 7. Formulario de Posiciones (cuentas de inversión)
+# ----------------------------------------------------
+
+class PosicionForm(forms.ModelForm):
+    """Alta o cambio de una posición; la vista la busca por (cuenta, activo)."""
+
+    class Meta:
+        model = Posicion
+        fields = ('activo', 'cantidad')
+        widgets = {
+            'activo': TextInput(attrs={'class': 'form-control', 'placeholder': 'Ej: VWCE o BTC'}),
+            'cantidad': NumberInput(attrs={'class': 'form-control', 'step': 'any', 'min': '0', 'placeholder': '0 para eliminar'}),
         }
 
+    def clean_activo(self):
+        return self.cleaned_data['activo'].strip().upper()
+
+    def validate_unique(self):
+        # (cuenta, activo) existente es una actualización, no un error
+        pass
+
+# ----------------------------------------------------
+# 8. Formulario de Divisiones (una transacción en varias categorías)
+# ----------------------------------------------------
+
+class DivisionForm(forms.Form):
+    """Una línea del reparto: categoría y parte del monto."""
+    categoria = forms.ModelChoiceField(
+        queryset=Categoria.objects.none(),
+        empty_label="Selecciona una categoría...",
+        widget=Select(attrs={'class': 'form-select'}),
+    )
+    monto = forms.DecimalField(
+        max_digits=15, decimal_places=2, min_value=Decimal('0.01'),
+        widget=NumberInput(attrs={'class': 'form-control', 'step': '0.01', 'placeholder': '0.00'}),
+    )
+
+    def __init__(self, *args, **kwargs):
+        transaccion = kwargs.pop('transaccion')
+        super().__init__(*args, **kwargs)
+        # Solo categorías del usuario y del mismo tipo que la transacción
+        self.fields['categoria'].queryset = Categoria.objects.filter(
+            usuario_id=transaccion.usuario_id, tipo=transaccion.tipo
+        ).order_by('nombre')
+
+
+DivisionFormSet = forms.formset_factory(DivisionForm, extra=2)
+
+# ----------------------------------------------------
+# 9. Formulario de Miembros (cuentas compartidas)
+# ----------------------------------------------------
+
+class MiembroCuentaForm(forms.Form):
+    """Usuario con quien se comparte una cuenta y su rol."""
+    username = forms.CharField(
+        label="Usuario", max_length=150,
+        widget=TextInput(attrs={'class': 'form-control', 'placeholder': 'Nombre de usuario'}),
+    )
+    rol = forms.ChoiceField(choices=ROLES_MIEMBRO, widget=Select(attrs={'class': 'form-select'}))
+
+    def clean_username(self):
+        try:
+            return User.objects.get(username=self.cleaned_data['username'].strip())
+        except User.DoesNotExist:
+            raise forms.ValidationError("No existe ningún usuario con ese nombre.")
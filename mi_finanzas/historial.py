@@ -0,0 +1,174 @@
+"""
+Historial de saldos: saldo de cada cuenta al cierre de cada mes (SaldoMensual).
+
+- Reconstrucción (una vez, o cuando hace falta): se parte de Cuenta.saldo y
+  se camina hacia atrás restando la suma mensual con signo de la cuenta
+  (transacciones vivas agrupadas por mes + resúmenes del archivo en frío).
+  Son dos consultas agrupadas por lote de cuentas, sin recorrer transacciones.
+- Mantenimiento incremental: cada movimiento de saldo con fecha (save/delete
+  de Transaccion, transferencias, inserciones en bloque, ajustes de saldo)
+  suma su importe al mes de su fecha y a todos los posteriores con un UPDATE.
+  Un movimiento anterior al inicio de la serie la borra y se reconstruye en
+  la siguiente lectura.
+- Lectura: serie_patrimonio() lee como mucho meses x cuentas filas, de las
+  cuentas visibles del usuario (las propias y las compartidas con él, como
+  la tarjeta de saldos del panel).
+
+Antes del primer movimiento de una cuenta no hay serie (la cuenta no suma).
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.db.models import F, Max, Min, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .compartidas import cuentas_visibles
+from .models import Cuenta, ResumenMensualArchivado, SaldoMensual, Transaccion, monto_firmado
+
+
+def inicio_de_mes(fecha):
+    return fecha.replace(day=1)
+
+
+def _meses(desde, hasta):
+    """Primeros días de mes de 'desde' a 'hasta', ambos incluidos."""
+    mes = desde
+    while mes <= hasta:
+        yield mes
+        mes += relativedelta(months=1)
+
+
+def _centimos(valor):
+    # SQLite suma en coma flotante: se redondea a céntimos
+    return int(round((valor or 0) * 100))
+
+
+# ========================================================
+# --- RECONSTRUCCIÓN ---
+# ========================================================
+
+def reconstruir_saldos_mensuales(cuentas, hoy=None):
+    """
+    Recalcula desde cero la serie de las cuentas del queryset (en su base).
+    Devuelve el número de filas creadas.
+    """
+    hasta_mes = inicio_de_mes(hoy or timezone.localdate())
+    db = cuentas.db
+    saldos = {pk: (usuario_id, saldo) for pk, usuario_id, saldo in cuentas.values_list('pk', 'usuario_id', 'saldo')}
+    if not saldos:
+        return 0
+
+    netos = defaultdict(lambda: defaultdict(int))
+    vivas = (
+        Transaccion.objects.using(db).filter(cuenta__in=cuentas.values('pk'))
+        .annotate(mes=TruncMonth('fecha')).values('cuenta_id', 'mes')
+        .annotate(total=Sum(monto_firmado())).order_by().values_list('cuenta_id', 'mes', 'total')
+    )
+    for cuenta_id, mes, total in vivas:
+        netos[cuenta_id][mes] += _centimos(total)
+    archivadas = (
+        ResumenMensualArchivado.objects.using(db).filter(cuenta__in=cuentas.values('pk'))
+        .values('cuenta_id', 'anio', 'mes').annotate(total=Sum(monto_firmado('total'))).order_by()
+        .values_list('cuenta_id', 'anio', 'mes', 'total')
+    )
+    for cuenta_id, anio, mes, total in archivadas:
+        netos[cuenta_id][date(anio, mes, 1)] += _centimos(total)
+
+    filas = []
+    for cuenta_id, (usuario_id, saldo) in saldos.items():
+        por_mes = netos.get(cuenta_id, {})
+        # El saldo actual incluye también las transacciones con fecha futura
+        fin = max([hasta_mes, *por_mes])
+        inicio = min([fin, *por_mes])
+        actual = _centimos(saldo)
+        for mes in reversed(list(_meses(inicio, fin))):
+            filas.append(SaldoMensual(usuario_id=usuario_id, cuenta_id=cuenta_id, mes=mes, saldo=Decimal(actual) / 100))
+            actual -= por_mes.get(mes, 0)
+
+    SaldoMensual.objects.using(db).filter(cuenta__in=cuentas.values('pk')).delete()
+    SaldoMensual.objects.using(db).bulk_create(filas, batch_size=1000)
+    return len(filas)
+
+
+# ========================================================
+# --- MANTENIMIENTO INCREMENTAL ---
+# ========================================================
+
+def mover_saldo_mensual(db, cuenta_id, fecha, delta):
+    """Suma 'delta' al cierre del mes de 'fecha' y de todos los meses posteriores de la cuenta."""
+    if not delta:
+        return
+    mes = inicio_de_mes(fecha)
+    serie = SaldoMensual.objects.using(db).filter(cuenta_id=cuenta_id)
+    limites = serie.aggregate(inicio=Min('mes'), fin=Max('mes'))
+    if limites['inicio'] is None:
+        # Sin serie: se construirá (con este movimiento incluido) al leerla
+        return
+    if mes < limites['inicio']:
+        # Anterior al primer mes: cambia el inicio de la serie, se rehace al leerla
+        serie.delete()
+        return
+    if mes > limites['fin']:
+        _extender(db, serie.get(mes=limites['fin']), mes)
+    serie.filter(mes__gte=mes).update(saldo=F('saldo') + delta)
+
+
+def _extender(db, ultima, hasta_mes):
+    """Rellena los meses sin movimientos tras la última fila de la serie, con su mismo saldo."""
+    SaldoMensual.objects.using(db).bulk_create([
+        SaldoMensual(usuario_id=ultima.usuario_id, cuenta_id=ultima.cuenta_id, mes=mes, saldo=ultima.saldo)
+        for mes in _meses(ultima.mes + relativedelta(months=1), hasta_mes)
+    ])
+
+
+# ========================================================
+# --- LECTURA ---
+# ========================================================
+
+def preparar_series(usuario, hoy=None):
+    """Construye las series que falten y las extiende hasta el mes actual (cuentas visibles del usuario)."""
+    hasta_mes = inicio_de_mes(hoy or timezone.localdate())
+    ids = cuentas_visibles(usuario)
+    cuentas = Cuenta.objects.filter(pk__in=ids)
+    sin_serie = cuentas.exclude(pk__in=SaldoMensual.objects.filter(cuenta_id__in=ids).values('cuenta_id'))
+    if sin_serie.exists():
+        reconstruir_saldos_mensuales(sin_serie, hoy=hoy)
+
+    atrasadas = (
+        SaldoMensual.objects.filter(cuenta_id__in=ids).values('cuenta_id')
+        .annotate(fin=Max('mes')).filter(fin__lt=hasta_mes).order_by().values_list('cuenta_id', 'fin')
+    )
+    condiciones = Q()
+    for cuenta_id, fin in atrasadas:
+        condiciones |= Q(cuenta_id=cuenta_id, mes=fin)
+    if condiciones:
+        for ultima in SaldoMensual.objects.filter(condiciones):
+            _extender(ultima._state.db, ultima, hasta_mes)
+
+
+def serie_patrimonio(usuario, desde=None, hasta=None, hoy=None):
+    """
+    Saldos a fin de mes entre 'desde' y 'hasta' (por defecto, los últimos 5 años).
+    Devuelve {'meses': [date...], 'total': [Decimal...], 'cuentas': [{'id', 'nombre', 'saldos'}]};
+    en 'saldos' hay None en los meses anteriores al primer movimiento de la cuenta.
+    """
+    hoy = hoy or timezone.localdate()
+    hasta = inicio_de_mes(hasta or hoy)
+    desde = inicio_de_mes(desde or hasta - relativedelta(years=5))
+    preparar_series(usuario, hoy=hoy)
+
+    meses = list(_meses(desde, hasta))
+    posicion = {mes: i for i, mes in enumerate(meses)}
+    ids = cuentas_visibles(usuario)
+    cuentas = {pk: {'id': pk, 'nombre': nombre, 'saldos': [None] * len(meses)}
+               for pk, nombre in Cuenta.objects.filter(pk__in=ids).order_by('nombre').values_list('pk', 'nombre')}
+    total = [Decimal('0.00')] * len(meses)
+    filas = SaldoMensual.objects.filter(cuenta_id__in=ids, mes__range=(desde, hasta)).values_list('cuenta_id', 'mes', 'saldo')
+    for cuenta_id, mes, saldo in filas:
+        if cuenta_id in cuentas:
+            cuentas[cuenta_id]['saldos'][posicion[mes]] = saldo
+            total[posicion[mes]] += saldo
+    return {'meses': meses, 'total': total, 'cuentas': list(cuentas.values())}
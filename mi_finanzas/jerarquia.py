@@ -0,0 +1,168 @@
+"""
+Árbol de categorías (Categoria.padre) guardado como tabla de cierre.
+
+CategoriaRelacion tiene una fila por cada par (ancestro, descendiente) del
+árbol, con la propia categoría a profundidad 0. Así, el total de un subárbol
+(una categoría y todas sus subcategorías) es un único join de las
+transacciones con esa tabla agrupado por ancestro: totales_por_subarbol().
+
+Mantenimiento:
+- Categoria.save(): alta (insertar_categoria) o cambio de padre
+  (mover_categoria), con consultas en bloque sobre el subárbol;
+- borrado: pre_delete descuelga las subcategorías de los ancestros de la
+  borrada (sus filas propias se borran en cascada y Categoria.padre pasa a
+  NULL: las hijas quedan como raíces);
+- rutas en bloque (restauración de respaldos): reconstruir_jerarquia().
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connections
+from django.db.models import F, Sum
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from .models import Categoria, CategoriaRelacion, DivisionTransaccion, Transaccion
+
+_CENTIMO = Decimal('0.01')
+
+
+def insertar_categoria(categoria, using):
+    """Filas de cierre de una categoría nueva: ella misma y los ancestros de su padre."""
+    filas = [CategoriaRelacion(ancestro_id=categoria.pk, descendiente_id=categoria.pk, profundidad=0)]
+    if categoria.padre_id is not None:
+        ancestros = (CategoriaRelacion.objects.using(using).filter(descendiente_id=categoria.padre_id)
+                     .values_list('ancestro_id', 'profundidad'))
+        filas += [CategoriaRelacion(ancestro_id=ancestro, descendiente_id=categoria.pk, profundidad=profundidad + 1)
+                  for ancestro, profundidad in ancestros]
+    CategoriaRelacion.objects.using(using).bulk_create(filas)
+
+
+def mover_categoria(categoria, using):
+    """Cuelga el subárbol de 'categoria' de su nuevo padre (o lo deja como raíz)."""
+    relaciones = CategoriaRelacion.objects.using(using)
+    subarbol = list(relaciones.filter(ancestro_id=categoria.pk).values_list('descendiente_id', 'profundidad'))
+    ids = [descendiente for descendiente, _ in subarbol]
+    # Fuera los ancestros anteriores (los de fuera del subárbol)
+    relaciones.filter(descendiente_id__in=ids).exclude(ancestro_id__in=ids).delete()
+    if categoria.padre_id is not None:
+        ancestros = list(relaciones.filter(descendiente_id=categoria.padre_id).values_list('ancestro_id', 'profundidad'))
+        relaciones.bulk_create([
+            CategoriaRelacion(ancestro_id=ancestro, descendiente_id=descendiente, profundidad=hasta_padre + 1 + desde_raiz)
+            for ancestro, hasta_padre in ancestros
+            for descendiente, desde_raiz in subarbol
+        ])
+
+
+def reconstruir_jerarquia(usuario_ids, using=None):
+    """Rehace desde Categoria.padre las filas de cierre de las categorías de esos usuarios."""
+    categorias = Categoria.objects.using(using) if using else Categoria.objects
+    padres = dict(categorias.filter(usuario_id__in=usuario_ids).values_list('pk', 'padre_id'))
+    relaciones = CategoriaRelacion.objects.using(using) if using else CategoriaRelacion.objects
+    relaciones.filter(descendiente_id__in=padres).delete()
+
+    filas = []
+    for categoria_id in padres:
+        actual, profundidad = categoria_id, 0
+        # Cada categoría sube hasta su raíz (el árbol es poco profundo); el límite corta ciclos
+        while actual is not None and profundidad <= len(padres):
+            filas.append(CategoriaRelacion(ancestro_id=actual, descendiente_id=categoria_id, profundidad=profundidad))
+            actual, profundidad = padres.get(actual), profundidad + 1
+    relaciones.bulk_create(filas, batch_size=2000)
+    return len(filas)
+
+
+@receiver(pre_delete, sender=Categoria, dispatch_uid='mi_finanzas_jerarquia_borrado')
+def _al_borrar(sender, instance, using, **kwargs):
+    relaciones = CategoriaRelacion.objects.using(using)
+    descendientes = list(relaciones.filter(ancestro_id=instance.pk).exclude(descendiente_id=instance.pk)
+                         .values_list('descendiente_id', flat=True))
+    if descendientes:
+        relaciones.filter(descendiente_id__in=descendientes).exclude(ancestro_id__in=descendientes).delete()
+
+
+# ========================================================
+# --- AGREGADOS POR SUBÁRBOL ---
+# ========================================================
+
+def _totales_transacciones(consulta, ancestros):
+    """
+    Como totales_por_subarbol() para transacciones: cada una aporta sus líneas
+    de reparto (DivisionTransaccion) o, si no tiene, su monto en su categoría
+    (LEFT JOIN: la "línea implícita"). Una sola consulta agrupada.
+    """
+    alias = consulta.db
+    conexion = connections[alias]
+    sql, params = (
+        consulta.order_by()
+        .values(tid=F('id'), cid=F('categoria_id'), importe=F('monto'))
+        .query.get_compiler(using=alias).as_sql()
+    )
+    filtro = ''
+    if ancestros is not None:
+        filtro = f"WHERE r.ancestro_id IN ({', '.join(['%s'] * len(ancestros))})"
+        params = (*params, *ancestros)
+    nombre = conexion.ops.quote_name
+    with conexion.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT r.ancestro_id, SUM(COALESCE(d.monto, t.importe))
+            FROM ({sql}) t
+            LEFT JOIN {nombre(DivisionTransaccion._meta.db_table)} d ON d.transaccion_id = t.tid
+            INNER JOIN {nombre(CategoriaRelacion._meta.db_table)} r
+                ON r.descendiente_id = CASE WHEN d.id IS NULL THEN t.cid ELSE d.categoria_id END
+            {filtro}
+            GROUP BY r.ancestro_id
+        """, params)
+        return {ancestro: Decimal(str(total)) for ancestro, total in cursor.fetchall()}
+
+
+def totales_por_subarbol(consulta, campo='monto', ancestros=None):
+    """
+    {categoria_id: total} de 'consulta' (transacciones o resúmenes archivados,
+    con FK 'categoria') donde el total de cada categoría incluye el de todas
+    sus subcategorías. Con 'ancestros', solo esas categorías.
+    """
+    if ancestros is not None:
+        ancestros = list(ancestros)
+        if not ancestros:
+            return {}
+    if consulta.model is Transaccion:
+        # Transacciones divididas: por sus líneas (ver mi_finanzas/divisiones.py)
+        totales = _totales_transacciones(consulta, ancestros)
+    else:
+        filas = consulta.filter(categoria__isnull=False)
+        if ancestros is not None:
+            filas = filas.filter(categoria__ancestros__ancestro_id__in=ancestros)
+        filas = filas.values(ancestro=F('categoria__ancestros__ancestro_id')).annotate(total=Sum(campo)).order_by()
+        totales = {fila['ancestro']: fila['total'] for fila in filas}
+    # Sum en SQLite pasa por coma flotante: se redondea al céntimo
+    return {ancestro: total.quantize(_CENTIMO) for ancestro, total in totales.items()}
+
+
+def sumar_totales(*totales):
+    """Suma varios {categoria_id: total} (p. ej., transacciones vivas y archivadas)."""
+    suma = defaultdict(lambda: Decimal('0.00'))
+    for parcial in totales:
+        for categoria_id, total in parcial.items():
+            suma[categoria_id] += total
+    return dict(suma)
+
+
+def filas_arbol(categorias, totales):
+    """
+    Categorías con total en orden de árbol (cada raíz seguida de sus
+    subcategorías, de mayor a menor total): [{'categoria', 'nivel', 'total'}].
+    """
+    hijas = defaultdict(list)
+    for categoria in categorias:
+        if categoria.pk in totales:
+            hijas[categoria.padre_id].append(categoria)
+    filas = []
+
+    def recorrer(padre_id, nivel):
+        for categoria in sorted(hijas[padre_id], key=lambda c: totales[c.pk], reverse=True):
+            filas.append({'categoria': categoria, 'nivel': nivel, 'total': totales[categoria.pk]})
+            recorrer(categoria.pk, nivel + 1)
+
+    recorrer(None, 0)
+    return filas
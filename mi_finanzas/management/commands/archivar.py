@@ -0,0 +1,65 @@
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from mi_finanzas.archivo import archivar_transacciones, horizonte_por_defecto, restaurar_archivo
+from mi_finanzas.shards import en_shard, shards_de
+from mi_finanzas.tareas import encolar
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Mueve al archivo en frío las transacciones anteriores al horizonte '
+        '(o las restaura con --restaurar).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', help='Nombre de usuario (por defecto, todos).')
+        parser.add_argument('--meses', type=int, help='Horizonte en meses (por defecto, MI_FINANZAS_HORIZONTE_ARCHIVO_MESES).')
+        parser.add_argument('--antes-de', type=date.fromisoformat, help='Fecha de corte explícita (AAAA-MM-DD).')
+        parser.add_argument('--restaurar', action='store_true', help='Devuelve las transacciones archivadas a la tabla principal.')
+        parser.add_argument('--desde', type=date.fromisoformat, help='Con --restaurar: solo las de fecha >= desde (AAAA-MM-DD).')
+        parser.add_argument('--en-segundo-plano', action='store_true',
+                            help='Encola la tarea para trabajador_tareas y muestra su id en lugar de esperar.')
+
+    def handle(self, *args, **options):
+        usuario = None
+        if options['usuario']:
+            try:
+                usuario = User.objects.get(username=options['usuario'])
+            except User.DoesNotExist:
+                raise CommandError(f"No existe el usuario '{options['usuario']}'.")
+
+        fecha_corte = options['antes_de'] or horizonte_por_defecto(meses=options['meses'])
+        if options['en_segundo_plano']:
+            usuario_id = usuario.pk if usuario else None
+            if options['restaurar']:
+                desde = options['desde'].isoformat() if options['desde'] else None
+                tarea = encolar('restaurar_archivo', usuario=usuario, usuario_id=usuario_id, desde=desde)
+            else:
+                tarea = encolar('archivar', usuario=usuario, usuario_id=usuario_id, fecha_corte=fecha_corte.isoformat())
+            self.stdout.write(self.style.SUCCESS(
+                f"Tarea #{tarea.pk} encolada; estado en {reverse('mi_finanzas:estado_tarea', args=[tarea.pk])}."
+            ))
+            return
+
+        # El shard del usuario o, sin usuario, todos los shards
+        if options['restaurar']:
+            restauradas = 0
+            for alias in shards_de(usuario):
+                with en_shard(alias):
+                    restauradas += restaurar_archivo(usuario=usuario, desde=options['desde'])
+            self.stdout.write(self.style.SUCCESS(f"Se restauraron {restauradas} transacciones."))
+            return
+
+        movidas = 0
+        for alias in shards_de(usuario):
+            with en_shard(alias):
+                movidas += archivar_transacciones(fecha_corte=fecha_corte, usuario=usuario)
+        self.stdout.write(self.style.SUCCESS(
+            f"Se archivaron {movidas} transacciones anteriores a {fecha_corte.replace(day=1)}."
+        ))
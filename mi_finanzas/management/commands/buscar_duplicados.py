@@ -0,0 +1,51 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from mi_finanzas.duplicados import escanear_duplicados
+from mi_finanzas.models import Transaccion
+from mi_finanzas.saldos import saldos_diferidos
+from mi_finanzas.shards import en_shard, shards_de
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Busca transacciones duplicadas (misma huella) y opcionalmente elimina las copias.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', help='Nombre de usuario a revisar (por defecto, todos).')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Filas leídas por bloque.')
+        parser.add_argument(
+            '--eliminar', action='store_true',
+            help='Elimina las copias conservando la transacción más antigua de cada grupo (revierte saldos).'
+        )
+
+    def handle(self, *args, **options):
+        usuario = None
+        if options['usuario']:
+            try:
+                usuario = User.objects.get(username=options['usuario'])
+            except User.DoesNotExist:
+                raise CommandError(f"No existe el usuario '{options['usuario']}'.")
+
+        grupos = copias = 0
+        for alias in shards_de(usuario):
+            with en_shard(alias):
+                a_eliminar = []
+                for pks in escanear_duplicados(usuario=usuario, chunk_size=options['chunk_size']):
+                    grupos += 1
+                    a_eliminar.extend(pks[1:])
+                    self.stdout.write(f"Huella repetida en transacciones: {', '.join(map(str, pks))}")
+
+                # Se elimina después del escaneo para no modificar la tabla con el cursor abierto.
+                if options['eliminar'] and a_eliminar:
+                    with saldos_diferidos():
+                        # Transaccion.delete() revierte el saldo de cada copia (un UPDATE por cuenta al final)
+                        for tx in Transaccion.objects.filter(pk__in=a_eliminar).select_related('cuenta'):
+                            tx.delete()
+                copias += len(a_eliminar)
+
+        accion = 'eliminadas' if options['eliminar'] else 'encontradas'
+        self.stdout.write(self.style.SUCCESS(
+            f"Escaneo completado: {grupos} grupos con duplicados, {copias} copias {accion}."
+        ))
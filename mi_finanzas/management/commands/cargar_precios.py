@@ -0,0 +1,32 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mi_finanzas.valoracion import ErrorPrecios, cargar_precios
+
+
+class Command(BaseCommand):
+    help = (
+        'Carga precios de activos desde ficheros CSV locales (columnas activo, fecha, precio). '
+        'Un directorio carga todos sus .csv. Las filas ya cargadas se actualizan.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('rutas', nargs='+', help='Ficheros CSV o directorios con ficheros CSV.')
+        parser.add_argument('--lote', type=int, default=2000, help='Filas por inserción (por defecto 2000).')
+
+    def handle(self, *args, **options):
+        ficheros = []
+        for ruta in map(Path, options['rutas']):
+            if ruta.is_dir():
+                ficheros.extend(sorted(ruta.glob('*.csv')))
+            elif ruta.is_file():
+                ficheros.append(ruta)
+            else:
+                raise CommandError(f"No existe '{ruta}'.")
+
+        try:
+            filas = cargar_precios(ficheros, lote=options['lote'])
+        except ErrorPrecios as error:
+            raise CommandError(str(error))
+        self.stdout.write(self.style.SUCCESS(f"{filas} precios cargados de {len(ficheros)} fichero(s)."))
@@ -0,0 +1,40 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from mi_finanzas.shards import en_shard, shards_de
+from mi_finanzas.sincronizacion import DIAS_LAPIDAS, compactar_cambios
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Compacta el registro de cambios de la sincronización: quita las entradas superadas '
+        'y las lápidas antiguas (los clientes más atrasados vuelven a descargar todo).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', help='Nombre de usuario (por defecto, todos).')
+        parser.add_argument('--dias', type=int, default=DIAS_LAPIDAS,
+                            help=f'Días que se conservan las lápidas (por defecto, {DIAS_LAPIDAS}).')
+
+    def handle(self, *args, **options):
+        usuario = None
+        if options['usuario']:
+            try:
+                usuario = User.objects.get(username=options['usuario'])
+            except User.DoesNotExist:
+                raise CommandError(f"No existe el usuario '{options['usuario']}'.")
+        if options['dias'] < 0:
+            raise CommandError('Los días no pueden ser negativos.')
+
+        # El shard del usuario o, sin usuario, todos los shards
+        superadas = lapidas = 0
+        for alias in shards_de(usuario):
+            with en_shard(alias):
+                quitadas = compactar_cambios(usuario=usuario, dias=options['dias'])
+            superadas += quitadas[0]
+            lapidas += quitadas[1]
+        self.stdout.write(self.style.SUCCESS(
+            f"Se quitaron {superadas} entradas superadas y {lapidas} lápidas de más de {options['dias']} días."
+        ))
@@ -1,53 +1,90 @@
+from itertools import groupby
+
 from django.core.management.base import BaseCommand
+from django.db.models import F
 from django.utils import timezone
-from mi_finanzas.models import Transaccion, TransaccionRecurrente 
+from mi_finanzas.models import OcurrenciaRecurrente, Transaccion, TransaccionRecurrente
+from mi_finanzas.duplicados import insertar_sin_duplicados, POLITICA_OMITIR
+from mi_finanzas.recurrencia import avanzar_ocurrencias
+from mi_finanzas.shards import en_shard, shards
+from mi_finanzas.versiones import datos_cambiados
 # 🚨 ASUMIENDO que TransaccionRecurrente y Transaccion están en mi_finanzas/models.py
-from datetime import timedelta 
 
 class Command(BaseCommand):
-    help = 'Crea transacciones regulares a partir de registros recurrentes si es su fecha.'
+    help = (
+        'Crea transacciones regulares a partir de registros recurrentes si es su fecha; '
+        'las ocurrencias atrasadas se contabilizan todas, cada una con su fecha.'
+    )
 
     def handle(self, *args, **options):
-        
+
         # Usamos localdate() para comparaciones con campos DateField
         hoy = timezone.localdate()
-        
+
         self.stdout.write(f"Iniciando verificación de transacciones recurrentes para la fecha: {hoy}")
 
-        # 1. Buscar transacciones recurrentes cuyo 'proximo_pago' sea hoy o anterior
-        recurrentes_a_crear = TransaccionRecurrente.objects.filter(
-            proximo_pago__lte=hoy,
-            esta_activa=True
-        )
+        # Fan-out: cada shard tiene sus propias recurrentes (con un único shard es una sola vuelta)
+        total_creadas = total_omitidas = 0
+        for alias in shards():
+            with en_shard(alias):
+                creadas, omitidas = self._procesar_shard(hoy)
+            total_creadas += creadas
+            total_omitidas += omitidas
+
+        if total_omitidas:
+            self.stdout.write(self.style.WARNING(f"Se omitieron {total_omitidas} transacciones duplicadas."))
+        self.stdout.write(self.style.SUCCESS(f'Proceso de recurrencia completado. Se crearon {total_creadas} transacciones.'))
+
+    def _procesar_shard(self, hoy):
+        """Crea las transacciones vencidas del shard activo. Devuelve (creadas, omitidas)."""
+        # 1. La tabla de ocurrencias cubre todo hasta el horizonte: también las atrasadas
+        #    (p. ej. si el comando no se ejecutó durante unos días)
+        avanzar_ocurrencias(hoy=hoy)
+
+        # 2. Ocurrencias vencidas (desde 'proximo_pago' hasta hoy) de las recurrentes activas,
+        #    agrupadas por recurrente y en orden de fecha
+        vencidas = OcurrenciaRecurrente.objects.filter(
+            fecha__lte=hoy,
+            fecha__gte=F('recurrente__proximo_pago'),
+            recurrente__esta_activa=True,
+        ).select_related('recurrente').order_by('recurrente_id', 'fecha')
 
-        creadas_count = 0
-        
-        # 2. Iterar, crear la transacción y actualizar la fecha de pago
-        for recurrente in recurrentes_a_crear:
+        # 3. Una transacción por ocurrencia, con la fecha de la ocurrencia, y la siguiente fecha de pago
+        nuevas_transacciones = []
+        procesadas = []
+        for _, grupo in groupby(vencidas, key=lambda ocurrencia: ocurrencia.recurrente_id):
+            grupo = list(grupo)
+            recurrente = grupo[0].recurrente
             try:
-                # 🚨 CORRECCIÓN CLAVE: Asignar el campo 'usuario' 🚨
-                nueva_transaccion = Transaccion.objects.create(
-                    cuenta=recurrente.cuenta,
-                    tipo=recurrente.tipo,
-                    monto=recurrente.monto,
-                    categoria=recurrente.categoria,
+                transacciones = [Transaccion(
+                    cuenta_id=ocurrencia.cuenta_id,
+                    tipo=ocurrencia.tipo,
+                    monto=ocurrencia.monto,
+                    categoria_id=recurrente.categoria_id,
                     descripcion=recurrente.descripcion + ' (Recurrente)',
-                    fecha=hoy,
-                    # Obtiene el usuario a través de la relación de la cuenta
-                    usuario=recurrente.cuenta.usuario 
-                )
-                
-                # 3. Calcula la siguiente fecha de pago (debe estar en el modelo)
-                # NOTA: Esto asume que el modelo TransaccionRecurrente tiene el método:
-                # 'calcular_siguiente_fecha()'
-                recurrente.proximo_pago = recurrente.calcular_siguiente_fecha() 
-                recurrente.save()
-                
-                creadas_count += 1
-                
+                    fecha=ocurrencia.fecha,
+                    # Del propietario de la cuenta, como la recurrente
+                    usuario_id=ocurrencia.usuario_id,
+                ) for ocurrencia in grupo]
+                recurrente.proximo_pago = grupo[-1].fecha
+                siguiente = recurrente.calcular_siguiente_fecha()
+                if siguiente is None:
+                    # La regla terminó (fecha_fin o max_ocurrencias)
+                    recurrente.esta_activa = False
+                else:
+                    recurrente.proximo_pago = siguiente
+                nuevas_transacciones.extend(transacciones)
+                procesadas.append(recurrente)
             except Exception as e:
                 # Muestra el error de forma clara
                 self.stderr.write(self.style.ERROR(f"Error al procesar recurrente ID {recurrente.pk}: {e}"))
 
-        self.stdout.write(self.style.SUCCESS(f'Proceso de recurrencia completado. Se crearon {creadas_count} transacciones.'))
+        # 4. Insertar en lote descartando duplicados (p. ej. si el comando se ejecuta dos veces el mismo día).
+        #    Una sola consulta de huellas por lote en lugar de una por ocurrencia.
+        creadas, omitidas = insertar_sin_duplicados(nuevas_transacciones, politica=POLITICA_OMITIR)
+        TransaccionRecurrente.objects.bulk_update(procesadas, ['proximo_pago', 'esta_activa'])
+        datos_cambiados({recurrente.usuario_id for recurrente in procesadas})
 
+        # 5. Tabla de próximas ocurrencias: quita las contabilizadas y completa el horizonte
+        avanzar_ocurrencias(hoy=hoy)
+        return len(creadas), len(omitidas)
@@ -0,0 +1,72 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+# Como en trabajador_tareas: los procesos hijos ('spawn') importan este módulo
+# antes de django.setup(), así que mi_finanzas se importa dentro de las funciones.
+
+
+def _detectar(usuario_id, ventana, umbral):
+    """Punto de entrada en el proceso del pool: cada uno usa su propia conexión."""
+    from mi_finanzas.anomalias import detectar_anomalias
+
+    try:
+        return usuario_id, detectar_anomalias(usuario_id, ventana=ventana, umbral=umbral)
+    finally:
+        connections.close_all()
+
+
+def _inicializar_proceso():
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula las anomalías de gasto por categoría (mediana y MAD móviles) de cada usuario '
+        'y las guarda para el panel.'
+    )
+
+    def add_arguments(self, parser):
+        from mi_finanzas.anomalias import UMBRAL, VENTANA_MESES
+
+        parser.add_argument('--usuario', help='Nombre de usuario (por defecto, todos).')
+        parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1,
+                            help='Procesos del pool (1 = en este proceso).')
+        parser.add_argument('--ventana', type=int, default=VENTANA_MESES, help='Meses anteriores que se comparan.')
+        parser.add_argument('--umbral', type=float, default=UMBRAL, help='Puntuación z robusta mínima.')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        usuarios = User.objects.order_by('pk')
+        if options['usuario']:
+            usuarios = usuarios.filter(username=options['usuario'])
+            if not usuarios.exists():
+                raise CommandError(f"No existe el usuario '{options['usuario']}'.")
+        if options['ventana'] < 2:
+            raise CommandError('La ventana debe tener al menos 2 meses.')
+        ids = list(usuarios.values_list('pk', flat=True))
+        parametros = (options['ventana'], options['umbral'])
+
+        procesos = max(1, min(options['procesos'], len(ids)))
+        if procesos == 1:
+            resultados = [_detectar(usuario_id, *parametros) for usuario_id in ids]
+        else:
+            pool = ProcessPoolExecutor(
+                max_workers=procesos, mp_context=multiprocessing.get_context('spawn'),
+                initializer=_inicializar_proceso,
+            )
+            with pool:
+                futuros = [pool.submit(_detectar, usuario_id, *parametros) for usuario_id in ids]
+                resultados = [futuro.result() for futuro in futuros]
+
+        total = sum(cantidad for _, cantidad in resultados)
+        con_anomalias = sum(1 for _, cantidad in resultados if cantidad)
+        self.stdout.write(self.style.SUCCESS(
+            f"Anomalías recalculadas para {len(ids)} usuarios ({procesos} procesos): "
+            f"{total} anomalías en {con_anomalias} usuarios."
+        ))
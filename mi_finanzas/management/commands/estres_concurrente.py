@@ -0,0 +1,97 @@
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+
+# Como en trabajador_tareas: los procesos hijos ('spawn') importan este módulo
+# antes de django.setup(), así que mi_finanzas se importa dentro de las funciones.
+
+
+def _trabajador(usuario_id, cantidad, semilla):
+    from mi_finanzas.estres import ejecutar_operaciones
+    return ejecutar_operaciones(usuario_id, cantidad, semilla)
+
+
+def _silenciar_errores_de_peticion():
+    # Los bloqueos se cuentan en el informe: no volcar una traza por cada uno
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+
+
+def _inicializar_proceso():
+    django.setup()
+    _silenciar_errores_de_peticion()
+
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de estrés: muchos clientes concurrentes transfieren, crean, editan y borran '
+        'transacciones a través de las vistas; al final verifica saldos y pares de transferencias. '
+        'Escribe en la base configurada: no usar en producción.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=8, help='Clientes concurrentes.')
+        parser.add_argument('--procesos', action='store_true', help='Usa procesos en lugar de hilos.')
+        parser.add_argument('--operaciones', type=int, default=50, help='Operaciones por cliente.')
+        parser.add_argument('--usuarios', type=int, default=2, help='Usuarios (los clientes se reparten entre ellos).')
+        parser.add_argument('--cuentas', type=int, default=4, help='Cuentas por usuario.')
+        parser.add_argument('--semilla', type=int, help='Semilla aleatoria (reproducible).')
+        parser.add_argument('--conservar', action='store_true', help='No borra los usuarios de prueba al terminar.')
+
+    def handle(self, *args, **options):
+        from mi_finanzas.estres import limpiar_escenario, preparar_escenario, resumir, verificar_invariantes
+
+        if options['cuentas'] < 2:
+            raise CommandError('Se necesitan al menos 2 cuentas por usuario para transferir.')
+        hilos = max(1, options['hilos'])
+        escenario = preparar_escenario(usuarios=max(1, options['usuarios']), cuentas=options['cuentas'])
+        semilla = options['semilla']
+        _silenciar_errores_de_peticion()
+
+        if options['procesos']:
+            pool = ProcessPoolExecutor(
+                max_workers=hilos, mp_context=multiprocessing.get_context('spawn'), initializer=_inicializar_proceso,
+            )
+        else:
+            pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='estres')
+
+        self.stdout.write(f"{hilos} clientes x {options['operaciones']} operaciones...")
+        inicio = time.perf_counter()
+        with pool:
+            futuros = [
+                pool.submit(
+                    _trabajador, escenario['usuarios'][i % len(escenario['usuarios'])], options['operaciones'],
+                    None if semilla is None else semilla + i,
+                )
+                for i in range(hilos)
+            ]
+            muestras = [muestra for futuro in futuros for muestra in futuro.result()]
+        informe = resumir(muestras, time.perf_counter() - inicio)
+
+        self._escribir_informe(informe)
+        problemas = verificar_invariantes(escenario)
+        if not options['conservar']:
+            limpiar_escenario(escenario)
+
+        if problemas:
+            for problema in problemas:
+                self.stderr.write(self.style.ERROR(problema))
+            raise CommandError(f"Invariantes incumplidas: {len(problemas)}.")
+        self.stdout.write(self.style.SUCCESS('Invariantes verificadas: saldos = libro y transferencias enlazadas.'))
+
+    def _escribir_informe(self, informe):
+        self.stdout.write(
+            f"{informe['peticiones']} peticiones en {informe['segundos']:.2f} s "
+            f"({informe['por_segundo']:.1f}/s); errores {informe['tasa_error']:.1%}, "
+            f"bloqueos {informe['tasa_bloqueo']:.1%}"
+        )
+        self.stdout.write(f"{'operación':<12}{'n':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'máx':>9}  estados")
+        for operacion, datos in list(informe['por_operacion'].items()) + [('TOTAL', informe)]:
+            estados = ', '.join(f"{estado}={n}" for estado, n in sorted(datos['estados'].items()))
+            self.stdout.write(
+                f"{operacion:<12}{datos['peticiones']:>6}{datos['p50_ms']:>9.1f}{datos['p95_ms']:>9.1f}"
+                f"{datos['p99_ms']:>9.1f}{datos['max_ms']:>9.1f}  {estados}"
+            )
@@ -0,0 +1,65 @@
+import os
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from mi_finanzas.exportar import FORMATOS, exportar_columnar
+from mi_finanzas.replicas import en_replica
+from mi_finanzas.shards import alias_para, en_shard
+from mi_finanzas.tareas import encolar
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Exporta cuentas, categorías, presupuestos y transacciones en formato columnar '
+        '(Parquet o Arrow IPC) para análisis offline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('destino', help='Directorio de salida.')
+        parser.add_argument('--formato', choices=sorted(FORMATOS), default='parquet')
+        parser.add_argument('--usuario', help='Nombre de usuario a exportar (por defecto, todos).')
+        parser.add_argument('--shard', default='default', help='Shard a usar si no se indica --usuario.')
+        parser.add_argument('--particionar', action='store_true', help='Particiona las transacciones por año/mes.')
+        parser.add_argument('--incluir-archivo', action='store_true', help='Incluye las transacciones archivadas.')
+        parser.add_argument('--chunk-size', type=int, default=50000, help='Filas por bloque (RecordBatch).')
+        parser.add_argument('--en-segundo-plano', action='store_true',
+                            help='Encola la tarea para trabajador_tareas y muestra su id en lugar de esperar.')
+
+    def handle(self, *args, **options):
+        usuario = None
+        if options['usuario']:
+            try:
+                usuario = User.objects.get(username=options['usuario'])
+            except User.DoesNotExist:
+                raise CommandError(f"No existe el usuario '{options['usuario']}'.")
+
+        if options['en_segundo_plano']:
+            tarea = encolar(
+                'exportar_columnar', usuario=usuario, destino=os.path.abspath(options['destino']),
+                formato=options['formato'], usuario_id=usuario.pk if usuario else None,
+                particionar=options['particionar'], incluir_archivo=options['incluir_archivo'],
+                shard=None if usuario else options['shard'],
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f"Tarea #{tarea.pk} encolada; estado en {reverse('mi_finanzas:estado_tarea', args=[tarea.pk])}."
+            ))
+            return
+
+        # Los datos del usuario están en su shard; se leen de su réplica si la hay
+        with en_shard(alias_para(usuario) if usuario else options['shard']), en_replica():
+            resumen = exportar_columnar(
+                options['destino'],
+                formato=options['formato'],
+                usuario=usuario,
+                particionar=options['particionar'],
+                incluir_archivo=options['incluir_archivo'],
+                chunk_size=options['chunk_size'],
+            )
+
+        for tabla, filas in resumen.items():
+            self.stdout.write(f"{tabla}: {filas} filas")
+        self.stdout.write(self.style.SUCCESS(f"Exportación completada en {options['destino']}."))
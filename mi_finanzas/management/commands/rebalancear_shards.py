@@ -0,0 +1,49 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from mi_finanzas.shards import ErrorMoverUsuario, alias_deterministico, alias_para, mover_usuario, shards
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Mueve usuarios entre shards: cada usuario va a su shard determinista según '
+        'MI_FINANZAS_SHARDS (o al indicado con --destino). Ejecutar sin actividad de esos usuarios.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', help='Nombre de usuario a mover (por defecto, todos).')
+        parser.add_argument('--destino', help='Alias de destino (por defecto, el determinista).')
+        parser.add_argument('--simular', action='store_true', help='Solo muestra los movimientos previstos.')
+
+    def handle(self, *args, **options):
+        destino = options['destino']
+        # Solo shards: la réplica (o 'default' si no es shard) nunca recibe escrituras del router
+        if destino and destino not in shards():
+            raise CommandError(f"'{destino}' no es un shard configurado ({', '.join(shards())}).")
+
+        usuarios = User.objects.order_by('pk')
+        if options['usuario']:
+            usuarios = usuarios.filter(username=options['usuario'])
+            if not usuarios.exists():
+                raise CommandError(f"No existe el usuario '{options['usuario']}'.")
+
+        self.stdout.write(f"Shards configurados: {', '.join(shards())}")
+        movidos = 0
+        for usuario in usuarios.iterator():
+            origen = alias_para(usuario)
+            objetivo = destino or alias_deterministico(usuario.pk)
+            if origen == objetivo:
+                continue
+            self.stdout.write(f"{usuario.username}: {origen} -> {objetivo}")
+            if not options['simular']:
+                try:
+                    mover_usuario(usuario, objetivo)
+                except ErrorMoverUsuario as error:
+                    self.stdout.write(self.style.WARNING(f"  Omitido: {error}"))
+                    continue
+            movidos += 1
+
+        accion = 'a mover' if options['simular'] else 'movidos'
+        self.stdout.write(self.style.SUCCESS(f"Rebalanceo completado: {movidos} usuarios {accion}."))
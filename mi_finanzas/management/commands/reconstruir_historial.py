@@ -0,0 +1,33 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from mi_finanzas.historial import reconstruir_saldos_mensuales
+from mi_finanzas.models import Cuenta
+from mi_finanzas.shards import atomico, en_shard, shards_de
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconstruye el historial de saldos a fin de mes caminando hacia atrás desde el saldo '
+        'actual (carga inicial; después se mantiene solo con cada escritura).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', help='Nombre de usuario (por defecto, todos).')
+
+    def handle(self, *args, **options):
+        usuario = None
+        if options['usuario']:
+            try:
+                usuario = User.objects.get(username=options['usuario'])
+            except User.DoesNotExist:
+                raise CommandError(f"No existe el usuario '{options['usuario']}'.")
+
+        filas = 0
+        for alias in shards_de(usuario):
+            with en_shard(alias), atomico():
+                cuentas = Cuenta.objects.all() if usuario is None else Cuenta.objects.filter(usuario=usuario)
+                filas += reconstruir_saldos_mensuales(cuentas)
+        self.stdout.write(self.style.SUCCESS(f"Historial reconstruido: {filas} saldos mensuales."))
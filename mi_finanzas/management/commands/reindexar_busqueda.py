@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from mi_finanzas.busqueda import buscador
+from mi_finanzas.shards import shards
+
+
+class Command(BaseCommand):
+    help = (
+        'Rehace el índice de búsqueda de transacciones en cada shard (los triggers lo mantienen '
+        'al día; esto solo hace falta si se ha tocado la base por fuera).'
+    )
+
+    def handle(self, *args, **options):
+        for alias in shards():
+            motor = buscador(alias)
+            motor.reconstruir()
+            self.stdout.write(f"{alias}: {motor.__class__.__name__}")
+        self.stdout.write(self.style.SUCCESS("Índice de búsqueda reconstruido."))
@@ -0,0 +1,52 @@
+import os
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from mi_finanzas.respaldo import respaldar
+from mi_finanzas.replicas import en_replica
+from mi_finanzas.shards import alias_para, en_shard
+from mi_finanzas.tareas import encolar
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Respalda los datos de un usuario (o de todos) en un fichero JSON Lines comprimido (.jsonl.gz).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('salida', help='Ruta del fichero de respaldo (p. ej. respaldo.jsonl.gz).')
+        parser.add_argument('--usuario', help='Nombre de usuario a respaldar (por defecto, todos).')
+        parser.add_argument('--shard', default='default', help='Shard a usar si no se indica --usuario.')
+        parser.add_argument('--en-segundo-plano', action='store_true',
+                            help='Encola la tarea para trabajador_tareas y muestra su id en lugar de esperar.')
+
+    def handle(self, *args, **options):
+        usuario = None
+        if options['usuario']:
+            try:
+                usuario = User.objects.get(username=options['usuario'])
+            except User.DoesNotExist:
+                raise CommandError(f"No existe el usuario '{options['usuario']}'.")
+
+        if options['en_segundo_plano']:
+            # Ruta absoluta: el trabajador puede arrancar en otro directorio
+            tarea = encolar('respaldar', usuario=usuario, salida=os.path.abspath(options['salida']),
+                            usuario_id=usuario.pk if usuario else None,
+                            shard=None if usuario else options['shard'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Tarea #{tarea.pk} encolada; estado en {reverse('mi_finanzas:estado_tarea', args=[tarea.pk])}."
+            ))
+            return
+
+        inicio = time.monotonic()
+        # Los datos del usuario están en su shard; se leen de su réplica si la hay
+        with en_shard(alias_para(usuario) if usuario else options['shard']), en_replica():
+            resumen = respaldar(options['salida'], usuario=usuario)
+        for tabla, filas in resumen.items():
+            self.stdout.write(f"{tabla}: {filas} filas")
+        self.stdout.write(self.style.SUCCESS(
+            f"Respaldo escrito en {options['salida']} ({time.monotonic() - inicio:.1f} s)."
+        ))
@@ -0,0 +1,60 @@
+import os
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+from django.urls import reverse
+
+from mi_finanzas.respaldo import restaurar
+from mi_finanzas.shards import alias_para, en_shard
+from mi_finanzas.tareas import encolar
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Restaura un respaldo creado con "respaldar". Inserta en bloque, reasigna claves '
+        'y escribe los saldos directamente (sin reaplicar transacciones).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('entrada', help='Fichero de respaldo (.jsonl.gz).')
+        parser.add_argument('--usuario', help='Asigna todos los datos a este usuario existente.')
+        parser.add_argument('--shard', default='default', help='Shard a usar si no se indica --usuario.')
+        parser.add_argument(
+            '--reemplazar', action='store_true',
+            help='Borra antes los datos existentes de los usuarios restaurados.'
+        )
+        parser.add_argument('--en-segundo-plano', action='store_true',
+                            help='Encola la tarea para trabajador_tareas y muestra su id en lugar de esperar.')
+
+    def handle(self, *args, **options):
+        usuario = None
+        if options['usuario']:
+            try:
+                usuario = User.objects.get(username=options['usuario'])
+            except User.DoesNotExist:
+                raise CommandError(f"No existe el usuario '{options['usuario']}'.")
+
+        if options['en_segundo_plano']:
+            tarea = encolar('restaurar', usuario=usuario, entrada=os.path.abspath(options['entrada']),
+                            usuario_id=usuario.pk if usuario else None, reemplazar=options['reemplazar'],
+                            shard=None if usuario else options['shard'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Tarea #{tarea.pk} encolada; estado en {reverse('mi_finanzas:estado_tarea', args=[tarea.pk])}."
+            ))
+            return
+
+        inicio = time.monotonic()
+        try:
+            # Se restaura en el shard del usuario destino
+            with en_shard(alias_para(usuario) if usuario else options['shard']):
+                resumen = restaurar(options['entrada'], usuario_destino=usuario, reemplazar=options['reemplazar'])
+        except (ValueError, IntegrityError) as e:
+            raise CommandError(f"No se pudo restaurar el respaldo: {e}")
+
+        for tabla, filas in resumen.items():
+            self.stdout.write(f"{tabla}: {filas} filas")
+        self.stdout.write(self.style.SUCCESS(f"Restauración completada ({time.monotonic() - inicio:.1f} s)."))
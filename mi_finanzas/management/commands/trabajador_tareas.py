@@ -0,0 +1,115 @@
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+# Este módulo se importa también en los procesos hijos ('spawn') antes de
+# django.setup(): las importaciones de mi_finanzas se hacen dentro de las funciones.
+
+
+def _ejecutar(tarea_pk):
+    """Punto de entrada en el hilo/proceso del pool: cada uno usa su propia conexión."""
+    from mi_finanzas.models import Tarea
+    from mi_finanzas.tareas import ejecutar_tarea
+
+    try:
+        return ejecutar_tarea(Tarea.objects.get(pk=tarea_pk))
+    finally:
+        connections.close_all()
+
+
+def _inicializar_proceso():
+    django.setup()
+
+
+def _latir(trabajador, cada, detenido):
+    """Hilo del trabajador: renueva el latido de sus tareas en curso hasta que se detiene."""
+    from mi_finanzas.tareas import latir
+
+    try:
+        while not detenido.wait(cada):
+            latir(trabajador)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Arranca un trabajador que reclama y ejecuta tareas en segundo plano desde la base de datos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrencia', type=int, default=2, help='Tareas simultáneas (tamaño del pool).')
+        parser.add_argument('--procesos', action='store_true', help='Usa un pool de procesos en lugar de hilos.')
+        parser.add_argument('--intervalo', type=float, default=2.0, help='Segundos de espera cuando no hay tareas.')
+        parser.add_argument('--una-vez', action='store_true', help='Procesa las tareas disponibles y termina.')
+        parser.add_argument('--latido', type=float, default=getattr(settings, 'MI_FINANZAS_TAREAS_LATIDO', 30),
+                            help='Segundos entre latidos de las tareas en curso.')
+        parser.add_argument('--recuperar-cada', type=float,
+                            default=getattr(settings, 'MI_FINANZAS_TAREAS_RECUPERAR_CADA', 60),
+                            help='Segundos entre búsquedas de tareas colgadas de otros trabajadores.')
+
+    def handle(self, *args, **options):
+        from mi_finanzas.tareas import reclamar_tarea, recuperar_tareas_colgadas
+
+        nombre = f"{socket.gethostname()}:{os.getpid()}"
+        concurrencia = max(1, options['concurrencia'])
+        detener = []
+        signal.signal(signal.SIGTERM, lambda *_: detener.append(True))
+
+        if options['procesos']:
+            pool = ProcessPoolExecutor(
+                max_workers=concurrencia,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_inicializar_proceso,
+            )
+        else:
+            pool = ThreadPoolExecutor(max_workers=concurrencia, thread_name_prefix='tarea')
+
+        # Latidos desde un hilo aparte: una tarea larga sin progreso no parece colgada
+        detenido = threading.Event()
+        latidos = threading.Thread(target=_latir, args=(nombre, options['latido'], detenido),
+                                   name='latido', daemon=True)
+        latidos.start()
+        self.stdout.write(f"Trabajador {nombre} iniciado (concurrencia={concurrencia}).")
+
+        en_curso = set()
+        completadas = 0
+        proxima_recuperacion = time.monotonic()
+        try:
+            while not detener:
+                # Tareas de trabajadores caídos: al arrancar y después periódicamente
+                if time.monotonic() >= proxima_recuperacion:
+                    recuperadas = recuperar_tareas_colgadas()
+                    if recuperadas:
+                        self.stdout.write(self.style.WARNING(f"Se reencolaron {recuperadas} tareas colgadas."))
+                    proxima_recuperacion = time.monotonic() + options['recuperar_cada']
+                en_curso = {futuro for futuro in en_curso if not futuro.done()}
+                reclamadas = 0
+                while len(en_curso) < concurrencia:
+                    tarea = reclamar_tarea(nombre)
+                    if tarea is None:
+                        break
+                    self.stdout.write(f"Ejecutando {tarea}")
+                    en_curso.add(pool.submit(_ejecutar, tarea.pk))
+                    reclamadas += 1
+                completadas += reclamadas
+
+                if options['una_vez'] and not reclamadas and not en_curso:
+                    break
+                if not reclamadas:
+                    time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            pool.shutdown(wait=True)
+            detenido.set()
+            latidos.join()
+
+        self.stdout.write(self.style.SUCCESS(f"Trabajador {nombre} detenido. Tareas ejecutadas: {completadas}."))
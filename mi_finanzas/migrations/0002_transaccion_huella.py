@@ -0,0 +1,65 @@
+# Generated by Django 5.2.7 on 2026-10-19 06:34
+
+import hashlib
+import re
+import unicodedata
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+# Copia fija de la huella de mi_finanzas.models en el momento de esta migración:
+# si la huella cambia más adelante, esta migración sigue calculando la de entonces.
+_NO_ALFANUMERICO = re.compile(r'[^0-9a-z]+')
+
+
+def normalizar_descripcion(descripcion):
+    if not descripcion:
+        return ''
+    texto = unicodedata.normalize('NFKD', descripcion)
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).casefold()
+    return _NO_ALFANUMERICO.sub(' ', texto).strip()
+
+
+def calcular_huella(cuenta_id, fecha, monto_firmado, descripcion):
+    clave = '|'.join([
+        str(cuenta_id),
+        fecha.isoformat(),
+        f"{Decimal(monto_firmado):.2f}",
+        normalizar_descripcion(descripcion),
+    ])
+    return hashlib.sha1(clave.encode('utf-8')).hexdigest()
+
+
+def calcular_huellas_existentes(apps, schema_editor):
+    """Rellena la huella de las transacciones existentes, en bloques."""
+    Transaccion = apps.get_model('mi_finanzas', 'Transaccion')
+    # Cada shard se migra por separado (migrate --database=<alias>)
+    db = schema_editor.connection.alias
+    pendientes = []
+    filas = Transaccion.objects.using(db).only('id', 'cuenta_id', 'fecha', 'monto', 'tipo', 'descripcion').iterator(chunk_size=2000)
+    for tx in filas:
+        monto = -tx.monto if tx.tipo == 'EGRESO' else tx.monto
+        tx.huella = calcular_huella(tx.cuenta_id, tx.fecha, monto, tx.descripcion)
+        pendientes.append(tx)
+        if len(pendientes) >= 2000:
+            Transaccion.objects.using(db).bulk_update(pendientes, ['huella'])
+            pendientes = []
+    if pendientes:
+        Transaccion.objects.using(db).bulk_update(pendientes, ['huella'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mi_finanzas', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaccion',
+            name='huella',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=40),
+        ),
+        migrations.RunPython(calcular_huellas_existentes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.7 on 2026-10-19 06:37
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mi_finanzas', '0002_transaccion_huella'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoApertura',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_corte', models.DateField()),
+                ('saldo', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15)),
+                ('cuenta', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='saldo_apertura', to='mi_finanzas.cuenta')),
+            ],
+            options={
+                'verbose_name': 'Saldo de Apertura',
+                'verbose_name_plural': 'Saldos de Apertura',
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenMensualArchivado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('anio', models.PositiveSmallIntegerField()),
+                ('mes', models.PositiveSmallIntegerField()),
+                ('tipo', models.CharField(choices=[('INGRESO', 'Ingreso'), ('EGRESO', 'Egreso')], max_length=7)),
+                ('es_transferencia', models.BooleanField(default=False)),
+                ('total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15)),
+                ('cantidad', models.PositiveIntegerField(default=0)),
+                ('categoria', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='mi_finanzas.categoria')),
+                ('cuenta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='mi_finanzas.cuenta')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Resumen Mensual Archivado',
+                'verbose_name_plural': 'Resúmenes Mensuales Archivados',
+                'indexes': [models.Index(fields=['usuario', 'anio', 'mes'], name='mi_finanzas_usuario_712252_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TransaccionArchivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('monto', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('tipo', models.CharField(choices=[('INGRESO', 'Ingreso'), ('EGRESO', 'Egreso')], max_length=7)),
+                ('fecha', models.DateField()),
+                ('descripcion', models.TextField(blank=True, null=True)),
+                ('fecha_creacion', models.DateTimeField()),
+                ('es_transferencia', models.BooleanField(default=False)),
+                ('transaccion_relacionada_id', models.BigIntegerField(blank=True, null=True)),
+                ('huella', models.CharField(blank=True, db_index=True, default='', max_length=40)),
+                ('categoria', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='mi_finanzas.categoria')),
+                ('cuenta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='mi_finanzas.cuenta')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Transacción Archivada',
+                'verbose_name_plural': 'Transacciones Archivadas',
+                'ordering': ['-fecha', '-fecha_creacion'],
+                'indexes': [models.Index(fields=['usuario', 'fecha'], name='mi_finanzas_usuario_aecb7d_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,141 @@
+# Generated by Django 5.2.7 on 2026-10-19 07:07
+
+import django.core.validators
+import django.db.models.deletion
+from calendar import monthrange
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+# Copia fija del calendario de mi_finanzas.recurrencia en el momento de esta migración:
+# si el motor cambia más adelante, esta migración sigue expandiendo las reglas de entonces.
+_MESES_POR_PERIODO = {'MENSUAL': 1, 'ANUAL': 12}
+_DIAS_POR_PERIODO = {'DIARIA': 1, 'SEMANAL': 7}
+
+
+def sumar_meses(fecha, meses, fin_de_mes=False):
+    total = fecha.month - 1 + meses
+    anio, mes = fecha.year + total // 12, total % 12 + 1
+    ultimo = monthrange(anio, mes)[1]
+    return date(anio, mes, ultimo if fin_de_mes else min(fecha.day, ultimo))
+
+
+def _ancla(recurrente):
+    return recurrente.fecha_inicio or recurrente.proximo_pago
+
+
+def fecha_ocurrencia(recurrente, n):
+    ancla, paso = _ancla(recurrente), n * (recurrente.intervalo or 1)
+    if recurrente.frecuencia in _MESES_POR_PERIODO:
+        return sumar_meses(ancla, paso * _MESES_POR_PERIODO[recurrente.frecuencia], recurrente.fin_de_mes)
+    return ancla + timedelta(days=paso * _DIAS_POR_PERIODO.get(recurrente.frecuencia, 1))
+
+
+def indice_desde(recurrente, fecha):
+    ancla = _ancla(recurrente)
+    if fecha <= ancla:
+        return 0
+    intervalo = recurrente.intervalo or 1
+    if recurrente.frecuencia in _MESES_POR_PERIODO:
+        meses = (fecha.year - ancla.year) * 12 + fecha.month - ancla.month
+        n = max(0, meses // (intervalo * _MESES_POR_PERIODO[recurrente.frecuencia]))
+    else:
+        dias = intervalo * _DIAS_POR_PERIODO.get(recurrente.frecuencia, 1)
+        n = (fecha - ancla).days // dias
+    while fecha_ocurrencia(recurrente, n) < fecha:
+        n += 1
+    return n
+
+
+def ocurrencias(recurrente):
+    """(n, fecha) desde proximo_pago, respetando fecha_fin y max_ocurrencias."""
+    n = indice_desde(recurrente, recurrente.proximo_pago)
+    while True:
+        fecha = fecha_ocurrencia(recurrente, n)
+        if recurrente.max_ocurrencias is not None and n >= recurrente.max_ocurrencias:
+            return
+        if recurrente.fecha_fin is not None and fecha > recurrente.fecha_fin:
+            return
+        yield n, fecha
+        n += 1
+
+
+def anclar_y_precalcular(apps, schema_editor):
+    """Ancla las recurrentes existentes en su próximo pago y precalcula sus ocurrencias."""
+    TransaccionRecurrente = apps.get_model('mi_finanzas', 'TransaccionRecurrente')
+    OcurrenciaRecurrente = apps.get_model('mi_finanzas', 'OcurrenciaRecurrente')
+    db = schema_editor.connection.alias
+    TransaccionRecurrente.objects.using(db).update(fecha_inicio=models.F('proximo_pago'))
+
+    minimo = getattr(settings, 'MI_FINANZAS_OCURRENCIAS', 12)
+    hasta = timezone.localdate() + timedelta(days=getattr(settings, 'MI_FINANZAS_HORIZONTE_OCURRENCIAS', 400))
+    filas = []
+    for recurrente in TransaccionRecurrente.objects.using(db).filter(esta_activa=True).iterator():
+        for numero, (n, fecha) in enumerate(ocurrencias(recurrente)):
+            if numero >= minimo and fecha > hasta:
+                break
+            filas.append(OcurrenciaRecurrente(
+                usuario_id=recurrente.usuario_id, recurrente_id=recurrente.pk, cuenta_id=recurrente.cuenta_id,
+                tipo=recurrente.tipo, monto=recurrente.monto, fecha=fecha, indice=n,
+            ))
+    OcurrenciaRecurrente.objects.using(db).bulk_create(filas, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mi_finanzas', '0005_shards'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaccionrecurrente',
+            name='fecha_fin',
+            field=models.DateField(blank=True, help_text='Última fecha posible (incluida).', null=True),
+        ),
+        migrations.AddField(
+            model_name='transaccionrecurrente',
+            name='fecha_inicio',
+            field=models.DateField(blank=True, help_text='Ancla de la regla. Por defecto, el primer próximo pago.', null=True),
+        ),
+        migrations.AddField(
+            model_name='transaccionrecurrente',
+            name='fin_de_mes',
+            field=models.BooleanField(default=False, help_text='Mensual/anual: siempre el último día del mes.'),
+        ),
+        migrations.AddField(
+            model_name='transaccionrecurrente',
+            name='intervalo',
+            field=models.PositiveSmallIntegerField(default=1, help_text='Cada cuántos periodos (2 = quincenal si es semanal...).', validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AddField(
+            model_name='transaccionrecurrente',
+            name='max_ocurrencias',
+            field=models.PositiveIntegerField(blank=True, help_text='Número total de ocurrencias desde la fecha de inicio.', null=True),
+        ),
+        migrations.CreateModel(
+            name='OcurrenciaRecurrente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('INGRESO', 'Ingreso'), ('EGRESO', 'Egreso')], max_length=7)),
+                ('monto', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('fecha', models.DateField()),
+                ('indice', models.PositiveIntegerField()),
+                ('cuenta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='mi_finanzas.cuenta')),
+                ('recurrente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ocurrencias', to='mi_finanzas.transaccionrecurrente')),
+                ('usuario', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Ocurrencia Programada',
+                'verbose_name_plural': 'Ocurrencias Programadas',
+                'ordering': ['fecha'],
+                'indexes': [models.Index(fields=['usuario', 'fecha'], name='mi_finanzas_usuario_5f7b28_idx')],
+                'unique_together': {('recurrente', 'indice')},
+            },
+        ),
+        migrations.RunPython(anclar_y_precalcular, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-19 07:17
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mi_finanzas', '0006_recurrencia'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoMensual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField()),
+                ('saldo', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15)),
+                ('cuenta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saldos_mensuales', to='mi_finanzas.cuenta')),
+                ('usuario', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Saldo Mensual',
+                'verbose_name_plural': 'Saldos Mensuales',
+                'ordering': ['cuenta', 'mes'],
+                'indexes': [models.Index(fields=['usuario', 'mes'], name='mi_finanzas_usuario_1b938e_idx')],
+                'unique_together': {('cuenta', 'mes')},
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-19 07:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mi_finanzas', '0007_saldos_mensuales'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaccion',
+            index=models.Index(fields=['cuenta', 'fecha', 'id'], name='transaccion_cuenta_fecha'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.7 on 2026-10-19 07:26
+
+import django.core.validators
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mi_finanzas', '0008_indice_extracto'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Prestamo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('principal', models.DecimalField(decimal_places=2, max_digits=15, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))])),
+                ('tasa_anual', models.DecimalField(decimal_places=3, help_text='Tasa nominal anual en %.', max_digits=6, validators=[django.core.validators.MinValueValidator(Decimal('0'))])),
+                ('plazo_meses', models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('fecha_inicio', models.DateField(help_text='Mes de la primera cuota.')),
+                ('dia_pago', models.PositiveSmallIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(31)])),
+                ('cuota', models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=15)),
+                ('capital_pendiente', models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=15)),
+                ('cuotas_pagadas', models.PositiveIntegerField(default=0, editable=False)),
+                ('cuenta', models.OneToOneField(limit_choices_to={'tipo__in': ('PRESTAMO', 'HIPOTECA', 'AUTO')}, on_delete=django.db.models.deletion.CASCADE, related_name='prestamo', to='mi_finanzas.cuenta')),
+                ('usuario', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Préstamo',
+                'verbose_name_plural': 'Préstamos',
+            },
+        ),
+        migrations.CreateModel(
+            name='CuotaPrestamo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero', models.PositiveIntegerField()),
+                ('fecha', models.DateField()),
+                ('cuota', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('interes', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('capital', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('saldo', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('transaccion', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cuotas_prestamo', to='mi_finanzas.transaccion')),
+                ('usuario', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('prestamo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cuotas', to='mi_finanzas.prestamo')),
+            ],
+            options={
+                'verbose_name': 'Cuota de Préstamo',
+                'verbose_name_plural': 'Cuotas de Préstamo',
+                'ordering': ['prestamo', 'numero'],
+                'unique_together': {('prestamo', 'numero')},
+            },
+        ),
+    ]
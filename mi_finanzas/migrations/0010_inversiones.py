@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-19 07:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mi_finanzas', '0009_prestamos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrecioActivo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('activo', models.CharField(max_length=20)),
+                ('fecha', models.DateField()),
+                ('precio', models.DecimalField(decimal_places=8, max_digits=20)),
+            ],
+            options={
+                'verbose_name': 'Precio de Activo',
+                'verbose_name_plural': 'Precios de Activos',
+                'unique_together': {('activo', 'fecha')},
+            },
+        ),
+        migrations.CreateModel(
+            name='Posicion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('activo', models.CharField(help_text='Símbolo del activo, p. ej. VWCE o BTC.', max_length=20)),
+                ('cantidad', models.DecimalField(decimal_places=8, max_digits=24)),
+                ('cuenta', models.ForeignKey(limit_choices_to={'tipo__in': ('INVERSION', 'CRYPTO')}, on_delete=django.db.models.deletion.CASCADE, related_name='posiciones', to='mi_finanzas.cuenta')),
+                ('usuario', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Posición',
+                'verbose_name_plural': 'Posiciones',
+                'unique_together': {('cuenta', 'activo')},
+            },
+        ),
+    ]
@@ -0,0 +1,97 @@
+from django.db import migrations
+
+
+# Copia fija del índice de mi_finanzas.busqueda en el momento de esta migración:
+# si el índice cambia más adelante, esta migración sigue creando el de entonces.
+TABLA = 'mi_finanzas_busqueda'
+
+_FILA = f"""
+    INSERT INTO {TABLA} (rowid, usuario, descripcion, categoria, cuenta)
+    SELECT new.id, 'u' || new.usuario_id, coalesce(new.descripcion, ''),
+           coalesce((SELECT nombre FROM mi_finanzas_categoria WHERE id = new.categoria_id), ''),
+           coalesce((SELECT nombre FROM mi_finanzas_cuenta WHERE id = new.cuenta_id), '');
+"""
+
+SQL_INSTALAR = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA} USING fts5(
+        usuario, descripcion, categoria, cuenta,
+        tokenize = 'unicode61 remove_diacritics 2',
+        -- Índices de prefijos: las búsquedas son "palabra"* (mientras se escribe)
+        prefix = '2 3 4'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLA}_ai AFTER INSERT ON mi_finanzas_transaccion BEGIN {_FILA} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLA}_ad AFTER DELETE ON mi_finanzas_transaccion BEGIN
+        DELETE FROM {TABLA} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLA}_au
+        AFTER UPDATE OF usuario_id, descripcion, categoria_id, cuenta_id ON mi_finanzas_transaccion
+        WHEN old.usuario_id IS NOT new.usuario_id OR old.descripcion IS NOT new.descripcion
+          OR old.categoria_id IS NOT new.categoria_id OR old.cuenta_id IS NOT new.cuenta_id
+    BEGIN
+        DELETE FROM {TABLA} WHERE rowid = old.id; {_FILA}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLA}_categoria AFTER UPDATE OF nombre ON mi_finanzas_categoria
+        WHEN old.nombre IS NOT new.nombre
+    BEGIN
+        UPDATE {TABLA} SET categoria = new.nombre
+        WHERE rowid IN (SELECT id FROM mi_finanzas_transaccion WHERE categoria_id = new.id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLA}_cuenta AFTER UPDATE OF nombre ON mi_finanzas_cuenta
+        WHEN old.nombre IS NOT new.nombre
+    BEGIN
+        UPDATE {TABLA} SET cuenta = new.nombre
+        WHERE rowid IN (SELECT id FROM mi_finanzas_transaccion WHERE cuenta_id = new.id);
+    END""",
+]
+
+SQL_DESINSTALAR = [
+    f'DROP TRIGGER IF EXISTS {TABLA}_{sufijo}' for sufijo in ('ai', 'ad', 'au', 'categoria', 'cuenta')
+] + [f'DROP TABLE IF EXISTS {TABLA}']
+
+SQL_CARGAR = f"""
+    INSERT INTO {TABLA} (rowid, usuario, descripcion, categoria, cuenta)
+    SELECT t.id, 'u' || t.usuario_id, coalesce(t.descripcion, ''), coalesce(cat.nombre, ''), coalesce(c.nombre, '')
+    FROM mi_finanzas_transaccion t
+    LEFT JOIN mi_finanzas_categoria cat ON cat.id = t.categoria_id
+    LEFT JOIN mi_finanzas_cuenta c ON c.id = t.cuenta_id
+"""
+
+
+def fts5_disponible(conexion):
+    if conexion.vendor != 'sqlite':
+        return False
+    with conexion.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return any(opcion == 'ENABLE_FTS5' for (opcion,) in cursor.fetchall())
+
+
+def instalar(apps, schema_editor):
+    """Tabla FTS5, triggers y carga inicial del índice (solo en bases SQLite con FTS5)."""
+    conexion = schema_editor.connection
+    if not fts5_disponible(conexion):
+        return
+    with conexion.cursor() as cursor:
+        for sql in SQL_INSTALAR:
+            cursor.execute(sql)
+        cursor.execute(f'DELETE FROM {TABLA}')
+        cursor.execute(SQL_CARGAR)
+
+
+def desinstalar(apps, schema_editor):
+    conexion = schema_editor.connection
+    if conexion.vendor != 'sqlite':
+        return
+    with conexion.cursor() as cursor:
+        for sql in SQL_DESINSTALAR:
+            cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mi_finanzas', '0010_inversiones'),
+    ]
+
+    operations = [
+        migrations.RunPython(instalar, desinstalar),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-19 07:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def cerrar_categorias(apps, schema_editor):
+    """Las categorías existentes son planas: solo la fila de cada una consigo misma."""
+    alias = schema_editor.connection.alias
+    Categoria = apps.get_model('mi_finanzas', 'Categoria')
+    CategoriaRelacion = apps.get_model('mi_finanzas', 'CategoriaRelacion')
+    CategoriaRelacion.objects.using(alias).bulk_create(
+        (CategoriaRelacion(ancestro_id=pk, descendiente_id=pk, profundidad=0)
+         for pk in Categoria.objects.using(alias).values_list('pk', flat=True).iterator()),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mi_finanzas', '0011_busqueda_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categoria',
+            name='padre',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='hijas', to='mi_finanzas.categoria'),
+        ),
+        migrations.CreateModel(
+            name='CategoriaRelacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('profundidad', models.PositiveSmallIntegerField()),
+                ('ancestro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendientes', to='mi_finanzas.categoria')),
+                ('descendiente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestros', to='mi_finanzas.categoria')),
+            ],
+            options={
+                'verbose_name': 'Relación de Categorías',
+                'verbose_name_plural': 'Relaciones de Categorías',
+                'indexes': [models.Index(fields=['descendiente', 'ancestro'], name='mi_finanzas_descend_e5d04e_idx')],
+                'unique_together': {('ancestro', 'descendiente')},
+            },
+        ),
+        migrations.RunPython(cerrar_categorias, migrations.RunPython.noop),
+    ]
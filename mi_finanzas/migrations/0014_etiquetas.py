@@ -0,0 +1,66 @@
+# Generated by Django 5.2.7 on 2026-10-19 07:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mi_finanzas', '0013_divisiones'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Etiqueta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50)),
+                ('usuario', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Etiqueta',
+                'verbose_name_plural': 'Etiquetas',
+                'ordering': ['nombre'],
+                'unique_together': {('usuario', 'nombre')},
+            },
+        ),
+        migrations.CreateModel(
+            name='TransaccionEtiqueta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('etiqueta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='mi_finanzas.etiqueta')),
+                ('transaccion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='mi_finanzas.transaccion')),
+            ],
+            options={
+                'verbose_name': 'Etiqueta de Transacción',
+                'verbose_name_plural': 'Etiquetas de Transacción',
+                'unique_together': {('etiqueta', 'transaccion')},
+            },
+        ),
+        # Con tabla intermedia propia no hay columna que añadir; en SQLite un AddField
+        # rehace la tabla de transacciones (y rompe los triggers del índice de búsqueda)
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddField(
+                    model_name='transaccion',
+                    name='etiquetas',
+                    field=models.ManyToManyField(blank=True, related_name='transacciones', through='mi_finanzas.TransaccionEtiqueta', to='mi_finanzas.etiqueta'),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TransaccionEtiquetaArchivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('etiqueta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='mi_finanzas.etiqueta')),
+                ('transaccion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='etiquetas', to='mi_finanzas.transaccionarchivada')),
+            ],
+            options={
+                'verbose_name': 'Etiqueta Archivada',
+                'verbose_name_plural': 'Etiquetas Archivadas',
+            },
+        ),
+    ]
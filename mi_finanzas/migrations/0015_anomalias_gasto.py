@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-19 07:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mi_finanzas', '0014_etiquetas'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnomaliaGasto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField()),
+                ('gasto', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('mediana', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('desviacion', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('puntuacion', models.FloatField(help_text='Puntuación z robusta: 0.6745 · (gasto − mediana) / MAD.')),
+                ('fecha_calculo', models.DateTimeField(auto_now_add=True)),
+                ('categoria', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='anomalias', to='mi_finanzas.categoria')),
+                ('usuario', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Anomalía de Gasto',
+                'verbose_name_plural': 'Anomalías de Gasto',
+                'ordering': ['-mes', '-puntuacion'],
+                'indexes': [models.Index(fields=['usuario', 'mes'], name='mi_finanzas_usuario_3c078b_idx')],
+                'unique_together': {('categoria', 'mes')},
+            },
+        ),
+    ]
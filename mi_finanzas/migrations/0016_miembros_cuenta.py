@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-19 08:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mi_finanzas', '0015_anomalias_gasto'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MiembroCuenta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rol', models.CharField(choices=[('EDITOR', 'Editor'), ('LECTOR', 'Lector')], default='LECTOR', max_length=6)),
+                ('fecha_alta', models.DateTimeField(auto_now_add=True)),
+                ('cuenta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='miembros', to='mi_finanzas.cuenta')),
+                ('usuario', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='cuentas_compartidas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Miembro de Cuenta',
+                'verbose_name_plural': 'Miembros de Cuenta',
+                'unique_together': {('cuenta', 'usuario')},
+            },
+        ),
+    ]
@@ -0,0 +1,127 @@
+# Generated by Django 5.2.7 on 2026-10-19 08:24
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Copia fija de los triggers de mi_finanzas.sincronizacion en el momento de esta migración:
+# si el registro cambia más adelante, esta migración sigue creando el de entonces.
+TABLAS = {
+    'cuenta': 'mi_finanzas_cuenta',
+    'categoria': 'mi_finanzas_categoria',
+    'transaccion': 'mi_finanzas_transaccion',
+    'presupuesto': 'mi_finanzas_presupuesto',
+    'transaccionrecurrente': 'mi_finanzas_transaccionrecurrente',
+}
+_TABLA_CAMBIOS = 'mi_finanzas_cambioregistrado'
+_TABLA_SECUENCIAS = 'mi_finanzas_secuenciacambios'
+
+
+def _registrar(fila, modelo, borrado):
+    return f"""
+        INSERT INTO {_TABLA_SECUENCIAS} (usuario_id, ultima, horizonte) VALUES ({fila}.usuario_id, 1, 0)
+            ON CONFLICT (usuario_id) DO UPDATE SET ultima = ultima + 1;
+        INSERT INTO {_TABLA_CAMBIOS} (usuario_id, secuencia, modelo, objeto_id, borrado, fecha)
+            SELECT {fila}.usuario_id, ultima, '{modelo}', {fila}.id, {int(borrado)},
+                   strftime('%Y-%m-%d %H:%M:%f', 'now')
+            FROM {_TABLA_SECUENCIAS} WHERE usuario_id = {fila}.usuario_id;
+    """
+
+
+def _triggers(nombre, tabla):
+    prefijo = f'mi_finanzas_cambios_{nombre}'
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {prefijo}_ai AFTER INSERT ON {tabla} BEGIN {_registrar('new', nombre, False)} END",
+        f"CREATE TRIGGER IF NOT EXISTS {prefijo}_au AFTER UPDATE ON {tabla} BEGIN {_registrar('new', nombre, False)} END",
+        f"""CREATE TRIGGER IF NOT EXISTS {prefijo}_au_usuario AFTER UPDATE OF usuario_id ON {tabla}
+            WHEN old.usuario_id IS NOT new.usuario_id
+        BEGIN {_registrar('old', nombre, True)} END""",
+        f"CREATE TRIGGER IF NOT EXISTS {prefijo}_ad AFTER DELETE ON {tabla} BEGIN {_registrar('old', nombre, True)} END",
+    ]
+
+
+SQL_INSTALAR = [sql for nombre, tabla in TABLAS.items() for sql in _triggers(nombre, tabla)]
+
+SQL_DESINSTALAR = [
+    f'DROP TRIGGER IF EXISTS mi_finanzas_cambios_{nombre}_{sufijo}'
+    for nombre in TABLAS for sufijo in ('ai', 'au', 'au_usuario', 'ad')
+]
+
+SQL_CARGAR = [
+    f"""
+    WITH filas(usuario_id, modelo, objeto_id) AS (
+        {' UNION ALL '.join(f"SELECT usuario_id, '{nombre}', id FROM {tabla}" for nombre, tabla in TABLAS.items())}
+    )
+    INSERT INTO {_TABLA_CAMBIOS} (usuario_id, secuencia, modelo, objeto_id, borrado, fecha)
+    SELECT usuario_id, ROW_NUMBER() OVER (PARTITION BY usuario_id ORDER BY modelo, objeto_id),
+           modelo, objeto_id, 0, strftime('%Y-%m-%d %H:%M:%f', 'now')
+    FROM filas
+    """,
+    f"""
+    INSERT INTO {_TABLA_SECUENCIAS} (usuario_id, ultima, horizonte)
+    SELECT usuario_id, MAX(secuencia), 0 FROM {_TABLA_CAMBIOS} GROUP BY usuario_id
+    """,
+]
+
+
+def instalar(apps, schema_editor):
+    """Triggers del registro de cambios y una entrada inicial por fila existente (solo en bases SQLite)."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for sql in SQL_INSTALAR + SQL_CARGAR:
+            cursor.execute(sql)
+
+
+def desinstalar(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for sql in SQL_DESINSTALAR:
+            cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('mi_finanzas', '0016_miembros_cuenta'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SecuenciaCambios',
+            fields=[
+                ('usuario', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('ultima', models.BigIntegerField(default=0)),
+                ('horizonte', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Secuencia de cambios',
+                'verbose_name_plural': 'Secuencias de cambios',
+            },
+        ),
+        migrations.CreateModel(
+            name='CambioRegistrado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('secuencia', models.BigIntegerField()),
+                ('modelo', models.CharField(max_length=30)),
+                ('objeto_id', models.BigIntegerField()),
+                ('borrado', models.BooleanField(default=False)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('usuario', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Cambio registrado',
+                'verbose_name_plural': 'Cambios registrados',
+                'ordering': ['usuario', 'secuencia'],
+                'indexes': [models.Index(fields=['usuario', 'modelo', 'objeto_id', 'secuencia'], name='mi_finanzas_usuario_468032_idx')],
+                'unique_together': {('usuario', 'secuencia')},
+            },
+        ),
+        migrations.RunPython(instalar, desinstalar),
+    ]
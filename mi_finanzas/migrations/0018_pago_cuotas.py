@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-19 08:46
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copiar_importes_pagados(apps, schema_editor):
+    """Las cuotas ya enlazadas guardan el importe de su pago."""
+    CuotaPrestamo = apps.get_model('mi_finanzas', 'CuotaPrestamo')
+    Transaccion = apps.get_model('mi_finanzas', 'Transaccion')
+    db = schema_editor.connection.alias
+    CuotaPrestamo.objects.using(db).filter(transaccion__isnull=False).update(
+        pago=Subquery(Transaccion.objects.using(db).filter(pk=OuterRef('transaccion_id')).values('monto')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mi_finanzas', '0017_registro_cambios'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cuotaprestamo',
+            name='pago',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=15, null=True),
+        ),
+        migrations.RunPython(copiar_importes_pagados, migrations.RunPython.noop),
+    ]
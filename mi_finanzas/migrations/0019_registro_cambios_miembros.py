@@ -0,0 +1,136 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:02
+
+from django.db import migrations
+
+
+# Copia fija de los triggers de miembros de mi_finanzas.sincronizacion en el momento de esta
+# migración: si el registro cambia más adelante, esta migración sigue creando el de entonces.
+TABLAS = {
+    'cuenta': 'mi_finanzas_cuenta',
+    'transaccion': 'mi_finanzas_transaccion',
+    'transaccionrecurrente': 'mi_finanzas_transaccionrecurrente',
+}
+# Modelo -> columna con la cuenta
+MODELOS_CUENTA = {'cuenta': 'id', 'transaccion': 'cuenta_id', 'transaccionrecurrente': 'cuenta_id'}
+_TABLA_CAMBIOS = 'mi_finanzas_cambioregistrado'
+_TABLA_SECUENCIAS = 'mi_finanzas_secuenciacambios'
+_TABLA_MIEMBROS = 'mi_finanzas_miembrocuenta'
+_AHORA = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+_PREFIJO_ACCESO = 'mi_finanzas_cambios_acceso'
+
+
+def _registrar_miembros(fila, columna, modelo, borrado, excepto=None):
+    miembros = f"cuenta_id = {fila}.{columna}"
+    if excepto:
+        miembros += f" AND usuario_id NOT IN (SELECT usuario_id FROM {_TABLA_MIEMBROS} WHERE cuenta_id = {excepto})"
+    return f"""
+        INSERT INTO {_TABLA_SECUENCIAS} (usuario_id, ultima, horizonte)
+            SELECT usuario_id, 1, 0 FROM {_TABLA_MIEMBROS} WHERE {miembros}
+            ON CONFLICT (usuario_id) DO UPDATE SET ultima = ultima + 1;
+        INSERT INTO {_TABLA_CAMBIOS} (usuario_id, secuencia, modelo, objeto_id, borrado, fecha)
+            SELECT m.usuario_id, s.ultima, '{modelo}', {fila}.id, {int(borrado)}, {_AHORA}
+            FROM (SELECT usuario_id FROM {_TABLA_MIEMBROS} WHERE {miembros}) AS m
+            JOIN {_TABLA_SECUENCIAS} AS s ON s.usuario_id = m.usuario_id;
+    """
+
+
+def _filas_cuenta(cuenta):
+    return ' UNION ALL '.join(
+        f"SELECT '{nombre}' AS modelo, id AS objeto_id FROM {TABLAS[nombre]} WHERE {columna} = {cuenta}"
+        for nombre, columna in MODELOS_CUENTA.items()
+    )
+
+
+def _registrar_cuenta(miembro, borrado):
+    return f"""
+        INSERT INTO {_TABLA_SECUENCIAS} (usuario_id, ultima, horizonte) VALUES ({miembro}.usuario_id, 0, 0)
+            ON CONFLICT (usuario_id) DO NOTHING;
+        INSERT INTO {_TABLA_CAMBIOS} (usuario_id, secuencia, modelo, objeto_id, borrado, fecha)
+            SELECT {miembro}.usuario_id, s.ultima + ROW_NUMBER() OVER (ORDER BY f.modelo, f.objeto_id),
+                   f.modelo, f.objeto_id, {int(borrado)}, {_AHORA}
+            FROM ({_filas_cuenta(f'{miembro}.cuenta_id')}) AS f
+            JOIN {_TABLA_SECUENCIAS} AS s ON s.usuario_id = {miembro}.usuario_id;
+        UPDATE {_TABLA_SECUENCIAS}
+            SET ultima = (SELECT MAX(secuencia) FROM {_TABLA_CAMBIOS} WHERE usuario_id = {miembro}.usuario_id)
+            WHERE usuario_id = {miembro}.usuario_id;
+    """
+
+
+def _triggers_miembros(nombre, columna):
+    prefijo = f'mi_finanzas_cambios_miembros_{nombre}'
+    tabla = TABLAS[nombre]
+    triggers = [
+        f"CREATE TRIGGER IF NOT EXISTS {prefijo}_ai AFTER INSERT ON {tabla} BEGIN {_registrar_miembros('new', columna, nombre, False)} END",
+        f"CREATE TRIGGER IF NOT EXISTS {prefijo}_au AFTER UPDATE ON {tabla} BEGIN {_registrar_miembros('new', columna, nombre, False)} END",
+        f"CREATE TRIGGER IF NOT EXISTS {prefijo}_ad AFTER DELETE ON {tabla} BEGIN {_registrar_miembros('old', columna, nombre, True)} END",
+    ]
+    if columna != 'id':
+        triggers.append(f"""CREATE TRIGGER IF NOT EXISTS {prefijo}_au_cuenta AFTER UPDATE OF {columna} ON {tabla}
+            WHEN old.{columna} IS NOT new.{columna}
+        BEGIN {_registrar_miembros('old', columna, nombre, True, excepto=f'new.{columna}')} END""")
+    return triggers
+
+
+SQL_INSTALAR_MIEMBROS = [
+    sql for nombre, columna in MODELOS_CUENTA.items() for sql in _triggers_miembros(nombre, columna)
+] + [
+    f"CREATE TRIGGER IF NOT EXISTS {_PREFIJO_ACCESO}_ai AFTER INSERT ON {_TABLA_MIEMBROS} BEGIN {_registrar_cuenta('new', False)} END",
+    f"CREATE TRIGGER IF NOT EXISTS {_PREFIJO_ACCESO}_ad AFTER DELETE ON {_TABLA_MIEMBROS} BEGIN {_registrar_cuenta('old', True)} END",
+    f"""CREATE TRIGGER IF NOT EXISTS {_PREFIJO_ACCESO}_au AFTER UPDATE OF cuenta_id, usuario_id ON {_TABLA_MIEMBROS}
+        WHEN old.cuenta_id IS NOT new.cuenta_id OR old.usuario_id IS NOT new.usuario_id
+    BEGIN {_registrar_cuenta('old', True)} {_registrar_cuenta('new', False)} END""",
+]
+
+SQL_DESINSTALAR_MIEMBROS = [
+    f'DROP TRIGGER IF EXISTS mi_finanzas_cambios_miembros_{nombre}_{sufijo}'
+    for nombre in MODELOS_CUENTA for sufijo in ('ai', 'au', 'ad', 'au_cuenta')
+] + [f'DROP TRIGGER IF EXISTS {_PREFIJO_ACCESO}_{sufijo}' for sufijo in ('ai', 'ad', 'au')]
+
+SQL_CARGAR_MIEMBROS = [
+    f"""
+    WITH filas(usuario_id, modelo, objeto_id) AS (
+        {' UNION ALL '.join(
+            f"SELECT m.usuario_id, '{nombre}', f.id FROM {_TABLA_MIEMBROS} AS m "
+            f"JOIN {TABLAS[nombre]} AS f ON f.{columna} = m.cuenta_id"
+            for nombre, columna in MODELOS_CUENTA.items())}
+    )
+    INSERT INTO {_TABLA_CAMBIOS} (usuario_id, secuencia, modelo, objeto_id, borrado, fecha)
+    SELECT f.usuario_id,
+           COALESCE(s.ultima, 0) + ROW_NUMBER() OVER (PARTITION BY f.usuario_id ORDER BY f.modelo, f.objeto_id),
+           f.modelo, f.objeto_id, 0, {_AHORA}
+    FROM filas AS f LEFT JOIN {_TABLA_SECUENCIAS} AS s ON s.usuario_id = f.usuario_id
+    """,
+    f"""
+    INSERT INTO {_TABLA_SECUENCIAS} (usuario_id, ultima, horizonte)
+    SELECT usuario_id, MAX(secuencia), 0 FROM {_TABLA_CAMBIOS} WHERE true GROUP BY usuario_id
+    ON CONFLICT (usuario_id) DO UPDATE SET ultima = MAX(ultima, excluded.ultima)
+    """,
+]
+
+
+def instalar(apps, schema_editor):
+    """Triggers de los miembros de cuentas compartidas y las cuentas ya compartidas (solo en bases SQLite)."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for sql in SQL_INSTALAR_MIEMBROS + SQL_CARGAR_MIEMBROS:
+            cursor.execute(sql)
+
+
+def desinstalar(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for sql in SQL_DESINSTALAR_MIEMBROS:
+            cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mi_finanzas', '0018_pago_cuotas'),
+    ]
+
+    operations = [
+        migrations.RunPython(instalar, desinstalar),
+    ]
@@ -0,0 +1,100 @@
+from importlib import import_module
+
+from django.db import migrations
+
+
+# Copia fija del índice de mi_finanzas.busqueda en el momento de esta migración:
+# si el índice cambia más adelante, esta migración sigue creando el de entonces.
+# Filtra por cuenta (token 'c<id>') en vez de por usuario: también las cuentas compartidas.
+TABLA = 'mi_finanzas_busqueda'
+
+_FILA = f"""
+    INSERT INTO {TABLA} (rowid, id_cuenta, descripcion, categoria, cuenta)
+    SELECT new.id, 'c' || new.cuenta_id, coalesce(new.descripcion, ''),
+           coalesce((SELECT nombre FROM mi_finanzas_categoria WHERE id = new.categoria_id), ''),
+           coalesce((SELECT nombre FROM mi_finanzas_cuenta WHERE id = new.cuenta_id), '');
+"""
+
+SQL_INSTALAR = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA} USING fts5(
+        id_cuenta, descripcion, categoria, cuenta,
+        tokenize = 'unicode61 remove_diacritics 2',
+        -- Índices de prefijos: las búsquedas son "palabra"* (mientras se escribe)
+        prefix = '2 3 4'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLA}_ai AFTER INSERT ON mi_finanzas_transaccion BEGIN {_FILA} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLA}_ad AFTER DELETE ON mi_finanzas_transaccion BEGIN
+        DELETE FROM {TABLA} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLA}_au
+        AFTER UPDATE OF descripcion, categoria_id, cuenta_id ON mi_finanzas_transaccion
+        WHEN old.descripcion IS NOT new.descripcion
+          OR old.categoria_id IS NOT new.categoria_id OR old.cuenta_id IS NOT new.cuenta_id
+    BEGIN
+        DELETE FROM {TABLA} WHERE rowid = old.id; {_FILA}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLA}_categoria AFTER UPDATE OF nombre ON mi_finanzas_categoria
+        WHEN old.nombre IS NOT new.nombre
+    BEGIN
+        UPDATE {TABLA} SET categoria = new.nombre
+        WHERE rowid IN (SELECT id FROM mi_finanzas_transaccion WHERE categoria_id = new.id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLA}_cuenta AFTER UPDATE OF nombre ON mi_finanzas_cuenta
+        WHEN old.nombre IS NOT new.nombre
+    BEGIN
+        UPDATE {TABLA} SET cuenta = new.nombre
+        WHERE rowid IN (SELECT id FROM mi_finanzas_transaccion WHERE cuenta_id = new.id);
+    END""",
+]
+
+SQL_DESINSTALAR = [
+    f'DROP TRIGGER IF EXISTS {TABLA}_{sufijo}' for sufijo in ('ai', 'ad', 'au', 'categoria', 'cuenta')
+] + [f'DROP TABLE IF EXISTS {TABLA}']
+
+SQL_CARGAR = f"""
+    INSERT INTO {TABLA} (rowid, id_cuenta, descripcion, categoria, cuenta)
+    SELECT t.id, 'c' || t.cuenta_id, coalesce(t.descripcion, ''), coalesce(cat.nombre, ''), coalesce(c.nombre, '')
+    FROM mi_finanzas_transaccion t
+    LEFT JOIN mi_finanzas_categoria cat ON cat.id = t.categoria_id
+    LEFT JOIN mi_finanzas_cuenta c ON c.id = t.cuenta_id
+"""
+
+# El índice anterior (por usuario) es el de la 0011
+_ANTERIOR = import_module('mi_finanzas.migrations.0011_busqueda_fts')
+
+
+def _desinstalar(conexion):
+    with conexion.cursor() as cursor:
+        for sql in SQL_DESINSTALAR:
+            cursor.execute(sql)
+
+
+def instalar(apps, schema_editor):
+    """Rehace la tabla FTS5 y sus triggers con el token de la cuenta (solo en bases SQLite con FTS5)."""
+    conexion = schema_editor.connection
+    if not _ANTERIOR.fts5_disponible(conexion):
+        return
+    _desinstalar(conexion)
+    with conexion.cursor() as cursor:
+        for sql in SQL_INSTALAR:
+            cursor.execute(sql)
+        cursor.execute(SQL_CARGAR)
+
+
+def desinstalar(apps, schema_editor):
+    conexion = schema_editor.connection
+    if not _ANTERIOR.fts5_disponible(conexion):
+        return
+    _desinstalar(conexion)
+    _ANTERIOR.instalar(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mi_finanzas', '0019_registro_cambios_miembros'),
+    ]
+
+    operations = [
+        migrations.RunPython(instalar, desinstalar),
+    ]
@@ -1,11 +1,17 @@
-from django.db import models
+from django.db import models, router
 from django.contrib.auth import get_user_model
-from django.core.validators import MinValueValidator 
+from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.utils import timezone
 from datetime import timedelta 
 from decimal import Decimal 
+import hashlib
+import re
+import unicodedata
+
+from .saldos import aplicar_saldo
 # IMPORTACIÓN CRÍTICA: Se necesita F para operaciones atómicas
-from django.db.models import F 
+from django.db.models import F, Case, When, DecimalField
 
 User = get_user_model() 
 
@@ -31,11 +37,24 @@ TIPOS_CUENTA = [
     ('COBRO', 'Cuentas por Cobrar'), 
 ]
 
+# Cuentas de crédito/deuda: pueden tener saldo negativo
+TIPOS_CUENTA_CREDITO = ('TARJETA', 'PRESTAMO', 'HIPOTECA', 'AUTO')
+# Cuentas que pueden llevar condiciones de préstamo y calendario de amortización
+TIPOS_CUENTA_PRESTAMO = ('PRESTAMO', 'HIPOTECA', 'AUTO')
+# Cuentas valoradas a precio de mercado por sus posiciones (mi_finanzas/valoracion.py)
+TIPOS_CUENTA_INVERSION = ('INVERSION', 'CRYPTO')
+
 TIPO_INGRESO_EGRESO = [
     ('INGRESO', 'Ingreso'),
     ('EGRESO', 'Egreso'),
 ]
 
+# Rol de un usuario en una cuenta ajena (el propietario es Cuenta.usuario): ver mi_finanzas/compartidas.py
+ROLES_MIEMBRO = [
+    ('EDITOR', 'Editor'),
+    ('LECTOR', 'Lector'),
+]
+
 FRECUENCIA_CHOICES = [
     ('DIARIA', 'Diaria'),
     ('SEMANAL', 'Semanal'),
@@ -43,12 +62,51 @@ FRECUENCIA_CHOICES = [
     ('ANUAL', 'Anual'),
 ]
 
+# ========================================================
+# --- HUELLA DE TRANSACCIONES (detección de duplicados) ---
+# ========================================================
+
+_NO_ALFANUMERICO = re.compile(r'[^0-9a-z]+')
+
+
+def normalizar_descripcion(descripcion):
+    """Minúsculas, sin acentos ni puntuación y con espacios colapsados."""
+    if not descripcion:
+        return ''
+    texto = unicodedata.normalize('NFKD', descripcion)
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).casefold()
+    return _NO_ALFANUMERICO.sub(' ', texto).strip()
+
+
+def calcular_huella(cuenta_id, fecha, monto_firmado, descripcion):
+    """
+    Huella normalizada (cuenta, fecha, monto con signo, descripción).
+    Dos transacciones con la misma huella se consideran duplicadas.
+    """
+    clave = '|'.join([
+        str(cuenta_id),
+        fecha.isoformat(),
+        f"{Decimal(monto_firmado):.2f}",
+        normalizar_descripcion(descripcion),
+    ])
+    return hashlib.sha1(clave.encode('utf-8')).hexdigest()
+
+def monto_firmado(campo_monto='monto', campo_tipo='tipo'):
+    """Expresión SQL del monto con signo (EGRESO negativo) para usar en Sum()/Window()."""
+    return Case(
+        When(**{campo_tipo: 'EGRESO'}, then=-F(campo_monto)),
+        default=F(campo_monto),
+        output_field=DecimalField(max_digits=15, decimal_places=2),
+    )
+
 # ========================================================
 # --- 1. MODELO CUENTA (sin cambios) ---
 # ========================================================
 
 class Cuenta(models.Model):
-    usuario = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Sin restricción FK en la base: con varios shards auth_user solo existe en
+    # 'default' (ver mi_finanzas/shards.py). Igual en el resto de modelos por usuario.
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False)
     nombre = models.CharField(max_length=100)
     tipo = models.CharField(max_length=15, choices=TIPOS_CUENTA) 
     saldo = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00')) 
@@ -61,17 +119,42 @@ class Cuenta(models.Model):
         return f"{self.nombre} ({self.usuario.username})"
 
 # ========================================================
-# --- 2. MODELO CATEGORIA (sin cambios) ---
+# --- 1b. MIEMBROS DE CUENTA (cuentas compartidas) ---
+# ========================================================
+
+class MiembroCuenta(models.Model):
+    """
+    Acceso de otro usuario a una cuenta: EDITOR (registra movimientos) o
+    LECTOR (solo la ve). Vive en el shard de la cuenta (ver mi_finanzas/compartidas.py).
+    """
+    cuenta = models.ForeignKey(Cuenta, on_delete=models.CASCADE, related_name='miembros')
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='cuentas_compartidas',
+                                db_constraint=False)
+    rol = models.CharField(max_length=6, choices=ROLES_MIEMBRO, default='LECTOR')
+    fecha_alta = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Miembro de Cuenta"
+        verbose_name_plural = "Miembros de Cuenta"
+        unique_together = ('cuenta', 'usuario')
+
+    def __str__(self):
+        return f"{self.usuario_id} en {self.cuenta_id} ({self.rol})"
+
+# ========================================================
+# --- 2. MODELO CATEGORIA (jerárquica) ---
 # ========================================================
 
 class Categoria(models.Model):
-    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='categorias')
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='categorias', db_constraint=False)
     nombre = models.CharField(max_length=100)
     tipo = models.CharField(
         max_length=7, 
         choices=TIPO_INGRESO_EGRESO, 
         default='EGRESO'
     )
+    # Subcategoría de 'padre' (mismo usuario y tipo). Al borrar el padre, sus hijas pasan a ser raíces
+    padre = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='hijas')
     
     class Meta:
         unique_together = ('usuario', 'nombre', 'tipo') 
@@ -80,12 +163,54 @@ class Categoria(models.Model):
     def __str__(self):
         return f"[{self.get_tipo_display()}] {self.nombre}"
 
+    def clean(self):
+        if self.padre_id is None:
+            return
+        if (self.usuario_id is not None and self.padre.usuario_id != self.usuario_id) or self.padre.tipo != self.tipo:
+            raise ValidationError({'padre': "La categoría padre debe ser tuya y del mismo tipo."})
+        if self.pk is not None and CategoriaRelacion.objects.filter(ancestro_id=self.pk, descendiente_id=self.padre_id).exists():
+            raise ValidationError({'padre': "Una categoría no puede colgar de sí misma ni de una de sus subcategorías."})
+
+    def save(self, *args, **kwargs):
+        # El árbol se guarda como tabla de cierre (CategoriaRelacion, ver mi_finanzas/jerarquia.py)
+        from .jerarquia import insertar_categoria, mover_categoria
+        db = kwargs.get('using') or router.db_for_write(Categoria, instance=self)
+        anterior = None
+        if self.pk is not None:
+            anterior = Categoria.objects.using(db).filter(pk=self.pk).values_list('padre_id').first()
+        super().save(*args, **kwargs)
+        if anterior is None:
+            insertar_categoria(self, db)
+        elif anterior[0] != self.padre_id:
+            mover_categoria(self, db)
+
+
+class CategoriaRelacion(models.Model):
+    """
+    Tabla de cierre del árbol de categorías: una fila por cada par
+    (ancestro, descendiente), incluida la de cada categoría consigo misma
+    (profundidad 0). Sumar un subárbol es un join con esta tabla + GROUP BY.
+    """
+    ancestro = models.ForeignKey(Categoria, on_delete=models.CASCADE, related_name='descendientes')
+    descendiente = models.ForeignKey(Categoria, on_delete=models.CASCADE, related_name='ancestros')
+    profundidad = models.PositiveSmallIntegerField()
+
+    class Meta:
+        verbose_name = "Relación de Categorías"
+        verbose_name_plural = "Relaciones de Categorías"
+        unique_together = ('ancestro', 'descendiente')
+        # Las sumas entran por la categoría de cada transacción (descendiente)
+        indexes = [models.Index(fields=['descendiente', 'ancestro'])]
+
+    def __str__(self):
+        return f"{self.ancestro_id} > {self.descendiente_id} ({self.profundidad})"
+
 # ========================================================
 # --- 3. MODELO TRANSACCION (Lógica Crítica Corregida) ---
 # ========================================================
 
 class Transaccion(models.Model):
-    usuario = models.ForeignKey(User, on_delete=models.CASCADE)
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False)
     cuenta = models.ForeignKey(Cuenta, on_delete=models.CASCADE) 
     # Monto se almacena como POSITIVO (valor absoluto).
     monto = models.DecimalField(max_digits=15, decimal_places=2) 
@@ -106,10 +231,18 @@ class Transaccion(models.Model):
         blank=True,
         related_name='par_transferencia'
     )
+
+    # Huella para detectar duplicados (ver calcular_huella). Se recalcula en save().
+    huella = models.CharField(max_length=40, db_index=True, blank=True, default='', editable=False)
+
+    # Etiquetas libres ("vacaciones-2026", "deducible"): ver mi_finanzas/etiquetas.py
+    etiquetas = models.ManyToManyField('Etiqueta', through='TransaccionEtiqueta', related_name='transacciones', blank=True)
     
     class Meta:
         verbose_name_plural = "Transacciones"
         ordering = ['-fecha', '-fecha_creacion']
+        # Extracto de cuenta paginado por (fecha, id): ver mi_finanzas/extracto.py
+        indexes = [models.Index(fields=['cuenta', 'fecha', 'id'], name='transaccion_cuenta_fecha')]
 
     def __str__(self):
         return f"{self.tipo} de {self.monto} en {self.cuenta.nombre}"
@@ -123,6 +256,12 @@ class Transaccion(models.Model):
         if tipo == 'EGRESO':
             return -monto
         return monto
+
+    def calcular_huella(self) -> str:
+        """Huella de esta transacción según sus valores actuales."""
+        return calcular_huella(
+            self.cuenta_id, self.fecha, self._get_signed_monto(self.monto, self.tipo), self.descripcion
+        )
     
     # ------------------------------------------------------------------
     # LÓGICA CRÍTICA DE MANTENIMIENTO DE SALDO (Save) - ✅ CORREGIDO con F()
@@ -130,12 +269,16 @@ class Transaccion(models.Model):
 
     def save(self, *args, **kwargs):
         is_new = self.pk is None
+        # Base de datos (shard) de esta transacción: los saldos se tocan en la misma
+        db = kwargs.get('using') or router.db_for_write(Transaccion, instance=self)
+        
+        old_transaccion = None
         
         # 1. Reversión (Solo si es Edición)
         if not is_new:
             try:
                 # Obtener la transacción y cuenta ANTERIORES
-                old_transaccion = Transaccion.objects.get(pk=self.pk)
+                old_transaccion = Transaccion.objects.using(db).get(pk=self.pk)
                 old_cuenta = old_transaccion.cuenta
                 
                 # Calcular el monto anterior con signo
@@ -146,38 +289,44 @@ class Transaccion(models.Model):
                 
                 # a. Si la cuenta fue cambiada: Revertir de la cuenta ANTERIOR
                 if old_cuenta != self.cuenta:
-                    Cuenta.objects.filter(pk=old_cuenta.pk).update(
-                        saldo=F('saldo') - old_signed_monto # Revertir el saldo antiguo
-                    )
+                    aplicar_saldo(db, old_cuenta.pk, -old_signed_monto, old_transaccion.fecha) # Revertir el saldo antiguo
                     
                 # b. Revertir de la cuenta ACTUAL (aplica si la cuenta no fue cambiada o para el punto a)
                 # OJO: La reversión debe hacerse SIEMPRE sobre la cuenta antes de aplicar el nuevo monto.
                 # Si la cuenta no fue cambiada, F('saldo') - old_signed_monto ya contiene el monto revertido.
                 # Simplificamos: revertimos de la cuenta actual para evitar doble reversión si la cuenta no cambió.
                 if old_cuenta == self.cuenta:
-                    Cuenta.objects.filter(pk=self.cuenta.pk).update(
-                        saldo=F('saldo') - old_signed_monto # Revertir en la misma cuenta
-                    )
+                    aplicar_saldo(db, self.cuenta.pk, -old_signed_monto, old_transaccion.fecha) # Revertir en la misma cuenta
 
             except Transaccion.DoesNotExist:
                 # Si no existe, no hay nada que revertir (esto no debería pasar en una edición)
                 pass 
 
-        # 2. Llamar al save original
+        # 2. Llamar al save original (con la huella al día)
+        self.huella = self.calcular_huella()
         super().save(*args, **kwargs)
 
+        # Un reparto entre categorías deja de cuadrar si cambian el monto o el tipo: se deshace
+        if old_transaccion is not None and (old_transaccion.monto, old_transaccion.tipo) != (self.monto, self.tipo):
+            DivisionTransaccion.objects.using(db).filter(transaccion_id=self.pk).delete()
+
         # 3. Aplicación del Nuevo Saldo
         
         # Calcular el nuevo monto con signo
         current_signed_monto = self._get_signed_monto(self.monto, self.tipo)
         
         # Aplicar el nuevo monto a la cuenta actual:
-        # F('saldo') + current_signed_monto (suma si es INGRESO, resta si es EGRESO)
-        Cuenta.objects.filter(pk=self.cuenta.pk).update(
-            saldo=F('saldo') + current_signed_monto
-        )
+        # F('saldo') + current_signed_monto (suma si es INGRESO, resta si es EGRESO).
+        # Dentro de saldos_diferidos() (mi_finanzas/saldos.py) se acumula y se aplica al final.
+        aplicar_saldo(db, self.cuenta.pk, current_signed_monto, self.fecha)
         # Nota: Los tests requerirán self.cuenta.refresh_from_db() para ver el nuevo saldo.
 
+        # Meses tocados (el anterior y el nuevo, si cambió la fecha): solo se recalculan esos periodos cerrados
+        from .versiones import meses_cambiados
+        fechas = [self.fecha] + ([old_transaccion.fecha] if old_transaccion is not None else [])
+        usuarios = [self.usuario_id] + ([old_transaccion.usuario_id] if old_transaccion is not None else [])
+        meses_cambiados(usuarios, min(fechas), max(fechas), using=db)
+
     # ------------------------------------------------------------------
     # LÓGICA CRÍTICA DE MANTENIMIENTO DE SALDO (Delete) - ✅ IMPLEMENTADO con F()
     # ------------------------------------------------------------------
@@ -187,16 +336,87 @@ class Transaccion(models.Model):
         
         # Calcular el monto de la transacción a eliminar con su signo
         signed_monto = self._get_signed_monto(self.monto, self.tipo)
+        db = kwargs.get('using') or self._state.db or router.db_for_write(Transaccion, instance=self)
         
         # Revertir el impacto de la transacción en la cuenta
         # Sumar el inverso del monto firmado: si era un EGRESO (-100), sumamos 100.
         # Si era un INGRESO (100), restamos 100.
-        Cuenta.objects.filter(pk=self.cuenta.pk).update(
-            saldo=F('saldo') - signed_monto 
-        )
+        aplicar_saldo(db, self.cuenta.pk, -signed_monto, self.fecha)
+
+        # Un pago de préstamo enlazado a su calendario: se rehace sin él (ver mi_finanzas/prestamos.py)
+        prestamos = []
+        if self.tipo == 'INGRESO' and self.cuenta.tipo in TIPOS_CUENTA_PRESTAMO:
+            from .prestamos import prestamos_enlazados, recalcular_prestamo
+            prestamos = prestamos_enlazados(self)
+            # Borrado (no archivado): la cuota deja de estar pagada
+            CuotaPrestamo.objects.using(db).filter(transaccion=self).update(pago=None)
         
         # Llamar al delete original
         super().delete(*args, **kwargs)
+        for prestamo in prestamos:
+            recalcular_prestamo(prestamo)
+        # Sin receptor de post_delete (los borrados masivos seguirían fila a fila): se avisa aquí
+        from .versiones import datos_cambiados, meses_cambiados
+        datos_cambiados([self.usuario_id], using=db)
+        meses_cambiados([self.usuario_id], self.fecha, self.fecha, using=db)
+
+
+# ========================================================
+# --- 3b. DIVISIONES (una transacción repartida entre varias categorías) ---
+# ========================================================
+
+class DivisionTransaccion(models.Model):
+    """
+    Línea de una transacción dividida: parte del monto (positivo, como el de
+    la transacción) asignada a una categoría. Las líneas suman el monto de la
+    transacción y no tocan saldos: la cuenta se mueve una vez, por la transacción.
+    Una transacción sin líneas equivale a una única línea con su categoría.
+    """
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False)
+    transaccion = models.ForeignKey(Transaccion, on_delete=models.CASCADE, related_name='divisiones')
+    categoria = models.ForeignKey(Categoria, on_delete=models.SET_NULL, null=True, blank=True)
+    monto = models.DecimalField(max_digits=15, decimal_places=2, validators=[MinValueValidator(Decimal('0.01'))])
+
+    class Meta:
+        verbose_name = "División de Transacción"
+        verbose_name_plural = "Divisiones de Transacción"
+        ordering = ['transaccion', 'id']
+
+    def __str__(self):
+        return f"{self.transaccion_id}: {self.monto} en {self.categoria_id}"
+
+
+# ========================================================
+# --- 3c. ETIQUETAS ---
+# ========================================================
+
+class Etiqueta(models.Model):
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False)
+    # Normalizada: minúsculas y guiones en lugar de espacios (ver etiquetas.normalizar_etiqueta)
+    nombre = models.CharField(max_length=50)
+
+    class Meta:
+        verbose_name = "Etiqueta"
+        verbose_name_plural = "Etiquetas"
+        unique_together = ('usuario', 'nombre')
+        ordering = ['nombre']
+
+    def __str__(self):
+        return self.nombre
+
+
+class TransaccionEtiqueta(models.Model):
+    """Tabla intermedia. El índice único (etiqueta, transaccion) resuelve los filtros sin leer transacciones."""
+    transaccion = models.ForeignKey(Transaccion, on_delete=models.CASCADE)
+    etiqueta = models.ForeignKey(Etiqueta, on_delete=models.CASCADE)
+
+    class Meta:
+        verbose_name = "Etiqueta de Transacción"
+        verbose_name_plural = "Etiquetas de Transacción"
+        unique_together = ('etiqueta', 'transaccion')
+
+    def __str__(self):
+        return f"{self.transaccion_id} #{self.etiqueta_id}"
 
 
 # ========================================================
@@ -204,7 +424,7 @@ class Transaccion(models.Model):
 # ========================================================
 
 class TransaccionRecurrente(models.Model):
-    usuario = models.ForeignKey(User, on_delete=models.CASCADE) 
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False) 
     cuenta = models.ForeignKey(Cuenta, on_delete=models.CASCADE)
     categoria = models.ForeignKey(Categoria, on_delete=models.SET_NULL, null=True, blank=True)
     
@@ -215,19 +435,135 @@ class TransaccionRecurrente(models.Model):
     frecuencia = models.CharField(max_length=10, choices=FRECUENCIA_CHOICES)
     proximo_pago = models.DateField(default=timezone.localdate) 
     esta_activa = models.BooleanField(default=True)
+
+    # Regla de recurrencia (ver mi_finanzas/recurrencia.py)
+    intervalo = models.PositiveSmallIntegerField(default=1, validators=[MinValueValidator(1)],
+                                                 help_text="Cada cuántos periodos (2 = quincenal si es semanal...).")
+    fecha_inicio = models.DateField(null=True, blank=True,
+                                    help_text="Ancla de la regla. Por defecto, el primer próximo pago.")
+    fin_de_mes = models.BooleanField(default=False, help_text="Mensual/anual: siempre el último día del mes.")
+    fecha_fin = models.DateField(null=True, blank=True, help_text="Última fecha posible (incluida).")
+    max_ocurrencias = models.PositiveIntegerField(null=True, blank=True,
+                                                  help_text="Número total de ocurrencias desde la fecha de inicio.")
     
     fecha_creacion = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"Recurrente: {self.descripcion} - {self.frecuencia}"
+
+    def save(self, *args, **kwargs):
+        from .recurrencia import fecha_ocurrencia, indice_desde, regenerar_ocurrencias
+        # Sin ancla, o con un próximo pago movido a mano fuera de la regla: se reancla en él
+        if self.fecha_inicio is None or self.proximo_pago < self.fecha_inicio or \
+                fecha_ocurrencia(self, indice_desde(self, self.proximo_pago)) != self.proximo_pago:
+            self.fecha_inicio = self.proximo_pago
+        super().save(*args, **kwargs)
+        # La regla puede haber cambiado: se regeneran solo las ocurrencias de esta recurrente
+        regenerar_ocurrencias(self, using=kwargs.get('using'))
         
     def calcular_siguiente_fecha(self):
-        if self.frecuencia == 'MENSUAL':
-            return self.proximo_pago + timedelta(days=30) 
-        elif self.frecuencia == 'SEMANAL':
-            return self.proximo_pago + timedelta(days=7)
-        else:
-            return self.proximo_pago + timedelta(days=1)
+        """Ocurrencia siguiente a proximo_pago según la regla, o None si la regla ha terminado."""
+        from .recurrencia import siguiente_fecha
+        return siguiente_fecha(self)
+
+
+class OcurrenciaRecurrente(models.Model):
+    """
+    Próximas ocurrencias precalculadas de una TransaccionRecurrente (ver
+    mi_finanzas/recurrencia.py). Cuenta, tipo y monto se copian para que los
+    vencimientos y previsiones se lean sin join.
+    """
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False)
+    recurrente = models.ForeignKey(TransaccionRecurrente, on_delete=models.CASCADE, related_name='ocurrencias')
+    cuenta = models.ForeignKey(Cuenta, on_delete=models.CASCADE)
+    tipo = models.CharField(max_length=7, choices=TIPO_INGRESO_EGRESO)
+    monto = models.DecimalField(max_digits=10, decimal_places=2)
+    fecha = models.DateField()
+    # Número de ocurrencia contado desde fecha_inicio
+    indice = models.PositiveIntegerField()
+
+    class Meta:
+        verbose_name = "Ocurrencia Programada"
+        verbose_name_plural = "Ocurrencias Programadas"
+        ordering = ['fecha']
+        unique_together = ('recurrente', 'indice')
+        indexes = [models.Index(fields=['usuario', 'fecha'])]
+
+    def __str__(self):
+        return f"{self.recurrente_id} #{self.indice}: {self.fecha}"
+
+# ========================================================
+# --- 4b. PRÉSTAMOS (condiciones y calendario de amortización) ---
+# ========================================================
+
+class Prestamo(models.Model):
+    """
+    Condiciones de una cuenta de préstamo (PRESTAMO/HIPOTECA/AUTO), con cuota
+    fija (sistema francés). El calendario está en CuotaPrestamo y lo mantiene
+    mi_finanzas/prestamos.py; cuota, capital_pendiente y cuotas_pagadas se
+    guardan aquí para el panel.
+    """
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False)
+    cuenta = models.OneToOneField(Cuenta, on_delete=models.CASCADE, related_name='prestamo',
+                                  limit_choices_to={'tipo__in': TIPOS_CUENTA_PRESTAMO})
+    principal = models.DecimalField(max_digits=15, decimal_places=2, validators=[MinValueValidator(Decimal('0.01'))])
+    tasa_anual = models.DecimalField(max_digits=6, decimal_places=3, validators=[MinValueValidator(Decimal('0'))],
+                                     help_text="Tasa nominal anual en %.")
+    plazo_meses = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+    fecha_inicio = models.DateField(help_text="Mes de la primera cuota.")
+    dia_pago = models.PositiveSmallIntegerField(default=1, validators=[MinValueValidator(1), MaxValueValidator(31)])
+
+    cuota = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'), editable=False)
+    capital_pendiente = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'), editable=False)
+    cuotas_pagadas = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        verbose_name = "Préstamo"
+        verbose_name_plural = "Préstamos"
+
+    def __str__(self):
+        return f"Préstamo {self.cuenta_id}: {self.principal} al {self.tasa_anual}%"
+
+    def save(self, *args, **kwargs):
+        from .prestamos import CAMPOS_CONDICIONES, recalcular_prestamo
+        condiciones = [getattr(self, campo) for campo in CAMPOS_CONDICIONES]
+        anteriores = None
+        if self.pk is not None:
+            anteriores = list(Prestamo.objects.using(kwargs.get('using') or router.db_for_write(Prestamo, instance=self))
+                              .filter(pk=self.pk).values_list(*CAMPOS_CONDICIONES).first() or ())
+        super().save(*args, **kwargs)
+        # Condiciones nuevas o cambiadas: calendario completo desde la primera cuota
+        if anteriores != condiciones:
+            recalcular_prestamo(self)
+
+
+class CuotaPrestamo(models.Model):
+    """
+    Fila del calendario de amortización; 'transaccion' es el pago real que la
+    cubrió y 'pago' su importe. Al archivar el pago (mi_finanzas/archivo.py) el
+    enlace queda a NULL, pero 'pago' mantiene la cuota como pagada.
+    """
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False)
+    prestamo = models.ForeignKey(Prestamo, on_delete=models.CASCADE, related_name='cuotas')
+    numero = models.PositiveIntegerField()
+    fecha = models.DateField()
+    cuota = models.DecimalField(max_digits=15, decimal_places=2)
+    interes = models.DecimalField(max_digits=15, decimal_places=2)
+    capital = models.DecimalField(max_digits=15, decimal_places=2)
+    # Capital pendiente tras esta cuota
+    saldo = models.DecimalField(max_digits=15, decimal_places=2)
+    transaccion = models.ForeignKey(Transaccion, on_delete=models.SET_NULL, null=True, blank=True,
+                                    related_name='cuotas_prestamo')
+    pago = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True, editable=False)
+
+    class Meta:
+        verbose_name = "Cuota de Préstamo"
+        verbose_name_plural = "Cuotas de Préstamo"
+        ordering = ['prestamo', 'numero']
+        unique_together = ('prestamo', 'numero')
+
+    def __str__(self):
+        return f"{self.prestamo_id} #{self.numero}: {self.cuota}"
 
 # ========================================================
 # --- 5. MODELO PRESUPUESTO (sin cambios) ---
@@ -236,7 +572,7 @@ class TransaccionRecurrente(models.Model):
 class Presupuesto(models.Model):
     """Define el límite de gasto para una categoría en un periodo específico."""
     
-    usuario = models.ForeignKey(User, on_delete=models.CASCADE)
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False)
     categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE) 
     
     monto_limite = models.DecimalField(
@@ -259,3 +595,336 @@ class Presupuesto(models.Model):
     def __str__(self):
         return f"Presupuesto {self.categoria.nombre} ({self.mes}/{self.anio}) - ${self.monto_limite}"
 
+
+
+# ========================================================
+# --- 6. ARCHIVO (almacenamiento en frío de transacciones antiguas) ---
+# ========================================================
+
+class TransaccionArchivada(models.Model):
+    """
+    Copia de una Transaccion anterior al horizonte de archivo.
+    Conserva el id original para poder restaurarla tal cual.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False)
+    cuenta = models.ForeignKey(Cuenta, on_delete=models.CASCADE)
+    monto = models.DecimalField(max_digits=15, decimal_places=2)
+    tipo = models.CharField(max_length=7, choices=TIPO_INGRESO_EGRESO)
+    categoria = models.ForeignKey(Categoria, on_delete=models.SET_NULL, null=True, blank=True)
+    fecha = models.DateField()
+    descripcion = models.TextField(blank=True, null=True)
+    fecha_creacion = models.DateTimeField()
+    es_transferencia = models.BooleanField(default=False)
+    # Id (no FK) de la transacción par: ambas se archivan y restauran juntas.
+    transaccion_relacionada_id = models.BigIntegerField(null=True, blank=True)
+    huella = models.CharField(max_length=40, db_index=True, blank=True, default='')
+
+    class Meta:
+        verbose_name = "Transacción Archivada"
+        verbose_name_plural = "Transacciones Archivadas"
+        ordering = ['-fecha', '-fecha_creacion']
+        indexes = [models.Index(fields=['usuario', 'fecha'])]
+
+    def __str__(self):
+        return f"[Archivo] {self.tipo} de {self.monto} ({self.fecha})"
+
+
+class DivisionArchivada(models.Model):
+    """Línea de una transacción archivada (mismo id que la DivisionTransaccion original)."""
+    id = models.BigIntegerField(primary_key=True)
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False)
+    transaccion = models.ForeignKey(TransaccionArchivada, on_delete=models.CASCADE, related_name='divisiones')
+    categoria = models.ForeignKey(Categoria, on_delete=models.SET_NULL, null=True, blank=True)
+    monto = models.DecimalField(max_digits=15, decimal_places=2)
+
+    class Meta:
+        verbose_name = "División Archivada"
+        verbose_name_plural = "Divisiones Archivadas"
+
+    def __str__(self):
+        return f"[Archivo] {self.transaccion_id}: {self.monto} en {self.categoria_id}"
+
+
+class TransaccionEtiquetaArchivada(models.Model):
+    """Etiqueta de una transacción archivada (mismo id que la TransaccionEtiqueta original)."""
+    id = models.BigIntegerField(primary_key=True)
+    transaccion = models.ForeignKey(TransaccionArchivada, on_delete=models.CASCADE, related_name='etiquetas')
+    etiqueta = models.ForeignKey(Etiqueta, on_delete=models.CASCADE)
+
+    class Meta:
+        verbose_name = "Etiqueta Archivada"
+        verbose_name_plural = "Etiquetas Archivadas"
+
+    def __str__(self):
+        return f"[Archivo] {self.transaccion_id} #{self.etiqueta_id}"
+
+
+class SaldoApertura(models.Model):
+    """
+    Saldo de la cuenta al inicio del horizonte (fecha_corte): lo que aportan
+    el saldo inicial y todas las transacciones archivadas.
+    Se cumple: saldo_apertura + Σ transacciones vivas = Cuenta.saldo
+    """
+    cuenta = models.OneToOneField(Cuenta, on_delete=models.CASCADE, related_name='saldo_apertura')
+    fecha_corte = models.DateField()
+    saldo = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        verbose_name = "Saldo de Apertura"
+        verbose_name_plural = "Saldos de Apertura"
+
+    def __str__(self):
+        return f"Apertura {self.cuenta.nombre} al {self.fecha_corte}: {self.saldo}"
+
+
+class ResumenMensualArchivado(models.Model):
+    """Totales mensuales de las transacciones archivadas (para reportes sin leer el archivo)."""
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False)
+    cuenta = models.ForeignKey(Cuenta, on_delete=models.CASCADE)
+    categoria = models.ForeignKey(Categoria, on_delete=models.SET_NULL, null=True, blank=True)
+    anio = models.PositiveSmallIntegerField()
+    mes = models.PositiveSmallIntegerField()
+    tipo = models.CharField(max_length=7, choices=TIPO_INGRESO_EGRESO)
+    es_transferencia = models.BooleanField(default=False)
+    total = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    cantidad = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Resumen Mensual Archivado"
+        verbose_name_plural = "Resúmenes Mensuales Archivados"
+        indexes = [models.Index(fields=['usuario', 'anio', 'mes'])]
+
+    def __str__(self):
+        return f"{self.cuenta.nombre} {self.mes}/{self.anio} {self.tipo}: {self.total}"
+
+
+# ========================================================
+# --- 6b. HISTORIAL DE SALDOS (cierre de cada mes por cuenta) ---
+# ========================================================
+
+class SaldoMensual(models.Model):
+    """
+    Saldo de la cuenta al cierre de un mes (ver mi_finanzas/historial.py).
+    La serie de cada cuenta es contigua: un registro por mes desde su primer
+    movimiento hasta el último mes con datos.
+    """
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False)
+    cuenta = models.ForeignKey(Cuenta, on_delete=models.CASCADE, related_name='saldos_mensuales')
+    # Primer día del mes
+    mes = models.DateField()
+    saldo = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        verbose_name = "Saldo Mensual"
+        verbose_name_plural = "Saldos Mensuales"
+        ordering = ['cuenta', 'mes']
+        unique_together = ('cuenta', 'mes')
+        indexes = [models.Index(fields=['usuario', 'mes'])]
+
+    def __str__(self):
+        return f"{self.cuenta_id} {self.mes:%Y-%m}: {self.saldo}"
+
+
+# ========================================================
+# --- 6c. INVERSIONES (posiciones y precios de mercado) ---
+# ========================================================
+
+class Posicion(models.Model):
+    """Cantidad de un activo (ticker/símbolo) en una cuenta INVERSION/CRYPTO."""
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False)
+    cuenta = models.ForeignKey(Cuenta, on_delete=models.CASCADE, related_name='posiciones',
+                               limit_choices_to={'tipo__in': TIPOS_CUENTA_INVERSION})
+    activo = models.CharField(max_length=20, help_text="Símbolo del activo, p. ej. VWCE o BTC.")
+    cantidad = models.DecimalField(max_digits=24, decimal_places=8)
+
+    class Meta:
+        verbose_name = "Posición"
+        verbose_name_plural = "Posiciones"
+        unique_together = ('cuenta', 'activo')
+
+    def __str__(self):
+        return f"{self.cantidad} {self.activo} en {self.cuenta_id}"
+
+    def save(self, *args, **kwargs):
+        self.activo = self.activo.strip().upper()
+        super().save(*args, **kwargs)
+
+
+class PrecioActivo(models.Model):
+    """
+    Precio de cierre de un activo en una fecha, cargado de ficheros CSV locales
+    (manage.py cargar_precios). Compartido por todos los usuarios: vive en 'default'.
+    """
+    activo = models.CharField(max_length=20)
+    fecha = models.DateField()
+    precio = models.DecimalField(max_digits=20, decimal_places=8)
+
+    class Meta:
+        verbose_name = "Precio de Activo"
+        verbose_name_plural = "Precios de Activos"
+        # Índice (activo, fecha): cargas con upsert y último precio de cada activo
+        unique_together = ('activo', 'fecha')
+
+    def __str__(self):
+        return f"{self.activo} {self.fecha}: {self.precio}"
+
+
+# ========================================================
+# --- 6d. ANOMALÍAS DE GASTO (precalculadas para el panel) ---
+# ========================================================
+
+class AnomaliaGasto(models.Model):
+    """
+    Mes en que el gasto de una categoría se sale de lo normal frente a su
+    mediana móvil (ver mi_finanzas/anomalias.py, 'manage.py detectar_anomalias').
+    """
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False)
+    categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE, related_name='anomalias')
+    # Primer día del mes
+    mes = models.DateField()
+    gasto = models.DecimalField(max_digits=15, decimal_places=2)
+    mediana = models.DecimalField(max_digits=15, decimal_places=2)
+    # Desviación absoluta mediana (MAD) de la ventana
+    desviacion = models.DecimalField(max_digits=15, decimal_places=2)
+    puntuacion = models.FloatField(help_text="Puntuación z robusta: 0.6745 · (gasto − mediana) / MAD.")
+    fecha_calculo = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Anomalía de Gasto"
+        verbose_name_plural = "Anomalías de Gasto"
+        ordering = ['-mes', '-puntuacion']
+        unique_together = ('categoria', 'mes')
+        indexes = [models.Index(fields=['usuario', 'mes'])]
+
+    def __str__(self):
+        return f"{self.categoria_id} {self.mes:%Y-%m}: {self.gasto} (mediana {self.mediana})"
+
+    @property
+    def veces(self):
+        """Gasto del mes como múltiplo de la mediana (p. ej. 3.0 = el triple de lo normal)."""
+        return self.gasto / self.mediana if self.mediana else None
+
+
+# ========================================================
+# --- 6e. REGISTRO DE CAMBIOS (sincronización de clientes) ---
+# ========================================================
+
+class SecuenciaCambios(models.Model):
+    """
+    Contador de cambios de un usuario (ver mi_finanzas/sincronizacion.py). Lo
+    incrementan los triggers de la base en cada escritura de sus datos.
+    """
+    usuario = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='+',
+                                   db_constraint=False)
+    ultima = models.BigIntegerField(default=0)
+    # Borrados compactados hasta esta secuencia: un cliente anterior descarga todo de nuevo
+    horizonte = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Secuencia de cambios"
+        verbose_name_plural = "Secuencias de cambios"
+
+    def __str__(self):
+        return f"{self.usuario_id}: {self.ultima} (horizonte {self.horizonte})"
+
+
+class CambioRegistrado(models.Model):
+    """Alta, modificación o borrado (lápida) de una fila del usuario, con su número de secuencia."""
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', db_constraint=False)
+    secuencia = models.BigIntegerField()
+    # model_name del modelo cambiado ('cuenta', 'transaccion'...)
+    modelo = models.CharField(max_length=30)
+    objeto_id = models.BigIntegerField()
+    borrado = models.BooleanField(default=False)
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Cambio registrado"
+        verbose_name_plural = "Cambios registrados"
+        ordering = ['usuario', 'secuencia']
+        unique_together = ('usuario', 'secuencia')
+        indexes = [models.Index(fields=['usuario', 'modelo', 'objeto_id', 'secuencia'])]
+
+    def __str__(self):
+        return f"{self.usuario_id} #{self.secuencia}: {self.modelo} {self.objeto_id}{' (borrado)' if self.borrado else ''}"
+
+# ========================================================
+# --- 7. COLA DE TAREAS EN SEGUNDO PLANO (la base de datos es la cola) ---
+# ========================================================
+
+ESTADOS_TAREA = [
+    ('PENDIENTE', 'Pendiente'),
+    ('EN_CURSO', 'En curso'),
+    ('COMPLETADA', 'Completada'),
+    ('FALLIDA', 'Fallida'),
+]
+
+
+class Tarea(models.Model):
+    """
+    Trabajo pesado (importaciones, exportaciones, archivo...) que se ejecuta
+    fuera de la petición web. Lo reclaman los trabajadores de
+    'manage.py trabajador_tareas' (ver mi_finanzas/tareas.py).
+    """
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    nombre = models.CharField(max_length=100)
+    parametros = models.JSONField(default=dict, blank=True)
+
+    estado = models.CharField(max_length=10, choices=ESTADOS_TAREA, default='PENDIENTE')
+    progreso = models.PositiveSmallIntegerField(default=0)
+    mensaje = models.CharField(max_length=255, blank=True, default='')
+    resultado = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+
+    intentos = models.PositiveSmallIntegerField(default=0)
+    max_intentos = models.PositiveSmallIntegerField(default=3)
+    # Reintentos con espera: la tarea no se reclama antes de esta fecha
+    disponible_desde = models.DateTimeField(default=timezone.now)
+
+    trabajador = models.CharField(max_length=100, blank=True, default='')
+    latido = models.DateTimeField(null=True, blank=True)
+
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Tarea"
+        verbose_name_plural = "Tareas"
+        ordering = ['-fecha_creacion']
+        indexes = [models.Index(fields=['estado', 'disponible_desde'])]
+
+    def __str__(self):
+        return f"Tarea {self.nombre} #{self.pk} ({self.estado})"
+
+    def actualizar_progreso(self, progreso, mensaje=''):
+        """Guarda el progreso (0-100) y renueva el latido sin tocar el resto de campos."""
+        self.progreso = max(0, min(int(progreso), 100))
+        self.mensaje = mensaje[:255]
+        self.latido = timezone.now()
+        Tarea.objects.filter(pk=self.pk).update(
+            progreso=self.progreso, mensaje=self.mensaje, latido=self.latido
+        )
+
+
+# ========================================================
+# --- 8. ASIGNACIÓN DE USUARIOS A SHARDS (vive siempre en 'default') ---
+# ========================================================
+
+class AsignacionShard(models.Model):
+    """
+    Alias de base de datos donde están los datos de un usuario (ver
+    mi_finanzas/shards.py). Se fija la primera vez que se consulta y solo la
+    cambia 'manage.py rebalancear_shards'.
+    """
+    usuario = models.OneToOneField(User, on_delete=models.CASCADE, related_name='asignacion_shard')
+    alias = models.CharField(max_length=100)
+    fecha_asignacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Asignación de shard"
+        verbose_name_plural = "Asignaciones de shard"
+
+    def __str__(self):
+        return f"{self.usuario_id} -> {self.alias}"
@@ -0,0 +1,132 @@
+"""
+Tarjetas del panel (dashboard), cada una con su propio fragmento.
+
+- Cada tarjeta es una función (usuario, hoy) -> contexto con su plantilla
+  parcial en templates/mi_finanzas/panel/. La página del panel solo dibuja el
+  esqueleto y cada tarjeta se pide aparte (GET panel/<tarjeta>/) y en
+  paralelo: la primera pintura no espera al agregado más lento.
+- Las escrituras enviadas con fetch/HTMX (añadir transacción, transferir) no
+  redirigen a la página completa: responden con las tarjetas afectadas
+  (TARJETAS_AFECTADAS) y solo esas se vuelven a pedir.
+- Todas filtran por las cuentas visibles del usuario (mi_finanzas/compartidas.py).
+"""
+import json
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.db.models import DecimalField, Q, Sum
+from django.db.models.functions import Coalesce
+
+from .compartidas import cuentas_visibles, permisos_cuentas, propietarios, transacciones_visibles
+from .jerarquia import totales_por_subarbol
+from .models import Categoria, Cuenta, Presupuesto
+from .valoracion import valorar_cuentas
+
+
+def _gastos_mes(usuario, hoy):
+    """Transacciones del mes de 'hoy' de las cuentas visibles, sin transferencias."""
+    primer_dia_mes = hoy.replace(day=1)
+    return transacciones_visibles(usuario).filter(
+        fecha__gte=primer_dia_mes, fecha__lt=primer_dia_mes + relativedelta(months=1), es_transferencia=False,
+    )
+
+
+# ========================================================
+# --- TARJETAS ---
+# ========================================================
+
+def saldos(usuario, hoy):
+    """Cuentas con su saldo (o valor de mercado) y el saldo total neto."""
+    permisos = permisos_cuentas(usuario)
+    cuentas = list(Cuenta.objects.filter(pk__in=cuentas_visibles(usuario)))
+    # Las cuentas con posiciones cuentan a precio de mercado (valoración cacheada, mi_finanzas/valoracion.py)
+    valoracion = valorar_cuentas(usuario)
+    for cuenta in cuentas:
+        cuenta.rol = permisos[cuenta.pk][0]
+        cuenta.valor_mercado = valoracion[cuenta.pk]['valor'] if cuenta.pk in valoracion else None
+    saldo_total = sum((cuenta.saldo if cuenta.valor_mercado is None else cuenta.valor_mercado for cuenta in cuentas),
+                      Decimal('0.00'))
+    return {'cuentas': cuentas, 'saldo_total': saldo_total}
+
+
+def totales_mes(usuario, hoy):
+    """Ingresos y gastos del mes. El monto se guarda POSITIVO: el signo lo da el campo 'tipo'."""
+    totales = _gastos_mes(usuario, hoy).aggregate(
+        ingresos=Coalesce(Sum('monto', filter=Q(tipo='INGRESO')), Decimal(0), output_field=DecimalField()),
+        gastos=Coalesce(Sum('monto', filter=Q(tipo='EGRESO')), Decimal(0), output_field=DecimalField()),
+    )
+    return {'ingresos_mes': totales['ingresos'], 'gastos_mes': totales['gastos'], 'mes_actual_str': hoy.strftime("%B %Y")}
+
+
+def presupuestos(usuario, hoy):
+    """Presupuestos del mes con lo gastado en su categoría y subcategorías (una sola consulta)."""
+    lista = list(Presupuesto.objects.filter(usuario=usuario, mes=hoy.month, anio=hoy.year).select_related('categoria'))
+    gastado = totales_por_subarbol(_gastos_mes(usuario, hoy).filter(tipo='EGRESO'),
+                                   ancestros=[p.categoria_id for p in lista])
+
+    resultados = []
+    for presupuesto in lista:
+        gasto_actual = gastado.get(presupuesto.categoria_id, Decimal('0.00'))
+        porcentaje = (gasto_actual / presupuesto.monto_limite) * 100 if presupuesto.monto_limite > 0 else 0
+        color_barra = 'bg-success'
+        if porcentaje > 75:
+            color_barra = 'bg-warning'
+        if porcentaje > 100:
+            color_barra = 'bg-danger'
+        resultados.append({
+            'pk': presupuesto.pk,
+            'categoria': presupuesto.categoria,
+            'monto_limite': presupuesto.monto_limite,
+            'gasto_actual': gasto_actual,
+            'restante': presupuesto.monto_limite - gasto_actual,
+            'porcentaje': min(porcentaje, 100),  # Limita el % de la barra visualmente a 100
+            'color_barra': color_barra,
+        })
+    return {'resultados_presupuesto': resultados, 'mes_actual_str': hoy.strftime("%B %Y")}
+
+
+def grafico(usuario, hoy):
+    """Gasto del mes por categoría raíz (con todo su subárbol, mi_finanzas/jerarquia.py)."""
+    # Con cuentas compartidas, las raíces de cada propietario se juntan por nombre
+    raices = dict(Categoria.objects.filter(
+        usuario_id__in=propietarios(usuario), padre__isnull=True
+    ).values_list('pk', 'nombre'))
+    gasto_por_raiz = {}
+    gastos = _gastos_mes(usuario, hoy).filter(tipo='EGRESO')
+    for categoria_id, gasto in totales_por_subarbol(gastos, ancestros=list(raices)).items():
+        gasto_por_raiz[raices[categoria_id]] = gasto_por_raiz.get(raices[categoria_id], Decimal('0.00')) + gasto
+    gastos_por_categoria = sorted(gasto_por_raiz.items(), key=lambda item: item[1], reverse=True)
+
+    chart_data = {
+        'labels': [nombre for nombre, _ in gastos_por_categoria],
+        'data': [float(gasto) for _, gasto in gastos_por_categoria],  # Decimal a float para JSON
+    }
+    return {'chart_data_json': json.dumps(chart_data), 'mes_actual_str': hoy.strftime("%B %Y")}
+
+
+def ultimas(usuario, hoy):
+    """Las 5 transacciones más recientes de las cuentas visibles."""
+    return {'ultimas_transacciones': list(
+        transacciones_visibles(usuario).select_related('cuenta').order_by('-fecha', '-fecha_creacion')[:5]
+    )}
+
+
+# Nombre en la URL -> (función, plantilla parcial)
+TARJETAS = {
+    'saldos': (saldos, 'mi_finanzas/panel/saldos.html'),
+    'totales': (totales_mes, 'mi_finanzas/panel/totales.html'),
+    'presupuestos': (presupuestos, 'mi_finanzas/panel/presupuestos.html'),
+    'grafico': (grafico, 'mi_finanzas/panel/grafico.html'),
+    'ultimas': (ultimas, 'mi_finanzas/panel/ultimas.html'),
+}
+
+# Tarjetas que cambia cada escritura (las transferencias no son ingresos ni gastos del mes)
+TARJETAS_AFECTADAS = {
+    'transaccion': ['saldos', 'totales', 'presupuestos', 'grafico', 'ultimas'],
+    'transferencia': ['saldos', 'ultimas'],
+}
+
+
+def contexto_tarjeta(nombre, usuario, hoy):
+    funcion, _ = TARJETAS[nombre]
+    return funcion(usuario, hoy)
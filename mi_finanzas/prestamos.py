@@ -0,0 +1,220 @@
+"""
+Calendario de amortización de préstamos (sistema francés: cuota fija).
+
+- El calendario se guarda en CuotaPrestamo (es la caché): el panel lee
+  Prestamo.capital_pendiente y no recalcula cientos de cuotas por petición.
+- Las cuotas pendientes se calculan de una vez, en forma cerrada: el capital
+  pendiente tras k cuotas es S0·(1+r)^k − C·((1+r)^k − 1)/r, evaluado para
+  todos los k a la vez (NumPy).
+  Todo en céntimos enteros: el interés de cada fila absorbe el redondeo y la
+  última cuota liquida el resto.
+- Pagos reales: registrar_pago() enlaza la Transaccion con la primera cuota
+  pendiente y guarda su importe en CuotaPrestamo.pago (la cuota sigue pagada
+  aunque el pago se archive). Si el importe no es el de la cuota, la diferencia va a capital
+  y se recalcula solo desde esa cuota en adelante, con la misma cuota: un
+  pago extra acorta el plazo; uno menor deja más capital para la última.
+- Cambiar las condiciones o borrar un pago enlazado rehace el calendario
+  entero (recalcular_prestamo), repitiendo los pagos enlazados.
+
+Los ingresos en una cuenta de préstamo (transacciones y transferencias) se
+registran como pagos automáticamente: post_save, transferir_monto e
+insertar_sin_duplicados (recurrentes e importaciones, con bulk_create).
+"""
+import math
+from calendar import monthrange
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import TIPOS_CUENTA_PRESTAMO, CuotaPrestamo, Prestamo, Transaccion
+from .recurrencia import sumar_meses
+
+CAMPOS_CONDICIONES = ('principal', 'tasa_anual', 'plazo_meses', 'fecha_inicio', 'dia_pago')
+
+
+def _centimos(valor):
+    return int((valor * 100).to_integral_value())
+
+
+def _decimal(centimos):
+    return Decimal(int(centimos)) / 100
+
+
+def tasa_mensual(prestamo):
+    return float(prestamo.tasa_anual) / 1200
+
+
+def cuota_fija(principal, tasa, plazo):
+    """Cuota (céntimos) que amortiza 'principal' (céntimos) en 'plazo' meses a la tasa mensual 'tasa'."""
+    if tasa == 0:
+        return math.ceil(principal / plazo)
+    return round(principal * tasa / (1 - (1 + tasa) ** -plazo))
+
+
+def fecha_cuota(prestamo, numero):
+    mes = sumar_meses(prestamo.fecha_inicio.replace(day=1), numero - 1)
+    return date(mes.year, mes.month, min(prestamo.dia_pago, monthrange(mes.year, mes.month)[1]))
+
+
+# ========================================================
+# --- CÁLCULO ---
+# ========================================================
+
+def _tabla(saldo, tasa, cuota, limite):
+    """
+    (cuotas, intereses, capitales, saldos) en céntimos de las cuotas pendientes
+    a partir de un capital 'saldo', como mucho 'limite' filas.
+    """
+    k = np.arange(1, limite + 1, dtype=np.float64)
+    if tasa:
+        factor = (1 + tasa) ** k
+        saldos = np.rint(saldo * factor - cuota * (factor - 1) / tasa).astype(np.int64)
+    else:
+        saldos = saldo - cuota * k.astype(np.int64)
+    liquidadas = np.flatnonzero(saldos <= 0)
+    filas = int(liquidadas[0]) + 1 if liquidadas.size else limite
+    saldos = saldos[:filas].copy()
+    saldos[-1] = 0
+    previos = np.concatenate(([saldo], saldos[:-1]))
+    capitales = previos - saldos
+    cuotas = np.full(filas, cuota, dtype=np.int64)
+    intereses = cuotas - capitales
+    # La última liquida el capital restante más su interés
+    intereses[-1] = round(int(previos[-1]) * tasa)
+    cuotas[-1] = capitales[-1] + intereses[-1]
+    return cuotas.tolist(), intereses.tolist(), capitales.tolist(), saldos.tolist()
+
+
+def _pendientes(prestamo, desde_numero, saldo, cuota):
+    """CuotaPrestamo sin guardar desde 'desde_numero', con 'saldo' céntimos por amortizar."""
+    if saldo <= 0:
+        return []
+    # El plazo no se alarga: lo que falte va a la última cuota
+    limite = max(1, prestamo.plazo_meses - desde_numero + 1)
+    cuotas, intereses, capitales, saldos = _tabla(saldo, tasa_mensual(prestamo), cuota, limite)
+    return [
+        CuotaPrestamo(
+            usuario_id=prestamo.usuario_id, prestamo=prestamo, numero=desde_numero + i,
+            fecha=fecha_cuota(prestamo, desde_numero + i), cuota=_decimal(c), interes=_decimal(interes),
+            capital=_decimal(capital), saldo=_decimal(s),
+        )
+        for i, (c, interes, capital, s) in enumerate(zip(cuotas, intereses, capitales, saldos))
+    ]
+
+
+def _pagada(prestamo, numero, saldo, monto, transaccion_id):
+    """Cuota 'numero' cubierta por un pago real de 'monto' céntimos sobre un capital 'saldo'."""
+    interes = round(saldo * tasa_mensual(prestamo))
+    capital = min(monto - interes, saldo)
+    return CuotaPrestamo(
+        usuario_id=prestamo.usuario_id, prestamo=prestamo, numero=numero, fecha=fecha_cuota(prestamo, numero),
+        cuota=_decimal(capital + interes), interes=_decimal(interes), capital=_decimal(capital),
+        saldo=_decimal(saldo - capital), transaccion_id=transaccion_id, pago=_decimal(monto),
+    )
+
+
+# ========================================================
+# --- MANTENIMIENTO ---
+# ========================================================
+
+def recalcular_prestamo(prestamo):
+    """Rehace el calendario completo con las condiciones actuales, repitiendo los pagos registrados."""
+    db = prestamo._state.db
+    with transaction.atomic(using=db):
+        # Importe actual del pago enlazado o, si está archivado, el guardado en la cuota
+        pagos = [
+            (transaccion_id, monto if transaccion_id is not None else pago)
+            for transaccion_id, monto, pago in CuotaPrestamo.objects.using(db)
+            .filter(prestamo=prestamo, pago__isnull=False).order_by('numero')
+            .values_list('transaccion_id', 'transaccion__monto', 'pago')
+        ]
+        cuota = cuota_fija(_centimos(prestamo.principal), tasa_mensual(prestamo), prestamo.plazo_meses)
+        saldo = _centimos(prestamo.principal)
+        plan = _pendientes(prestamo, 1, saldo, cuota)
+        # Los pagos se repiten igual que en registrar_pago(): solo un importe
+        # distinto de la cuota replanifica lo que queda
+        filas = []
+        for transaccion_id, monto in pagos:
+            if not plan:
+                break
+            fila, plan = plan[0], plan[1:]
+            if _centimos(monto) != _centimos(fila.cuota):
+                fila = _pagada(prestamo, fila.numero, _centimos(fila.saldo + fila.capital), _centimos(monto),
+                               transaccion_id)
+                plan = _pendientes(prestamo, fila.numero + 1, _centimos(fila.saldo), cuota)
+            fila.transaccion_id, fila.pago = transaccion_id, monto
+            filas.append(fila)
+            saldo = _centimos(fila.saldo)
+        pagadas = len(filas)
+        filas += plan
+
+        CuotaPrestamo.objects.using(db).filter(prestamo=prestamo).delete()
+        CuotaPrestamo.objects.using(db).bulk_create(filas, batch_size=500)
+        Prestamo.objects.using(db).filter(pk=prestamo.pk).update(
+            cuota=_decimal(cuota), capital_pendiente=_decimal(saldo), cuotas_pagadas=pagadas,
+        )
+    prestamo.cuota, prestamo.capital_pendiente, prestamo.cuotas_pagadas = _decimal(cuota), _decimal(saldo), pagadas
+
+
+def registrar_pago(prestamo, transaccion):
+    """
+    Enlaza el pago con la primera cuota pendiente y, si su importe no es el de
+    la cuota, recalcula las siguientes. Devuelve la cuota, o None si el
+    préstamo ya está liquidado.
+    """
+    db = prestamo._state.db
+    with transaction.atomic(using=db):
+        fila = (CuotaPrestamo.objects.using(db).select_for_update()
+                .filter(prestamo=prestamo, pago__isnull=True).order_by('numero').first())
+        if fila is None:
+            return None
+        monto = _centimos(transaccion.monto)
+        if monto == _centimos(fila.cuota):
+            # Pago exacto: el resto del calendario no cambia
+            fila.transaccion, fila.pago = transaccion, transaccion.monto
+            fila.save(update_fields=['transaccion', 'pago'])
+        else:
+            pagada = _pagada(prestamo, fila.numero, _centimos(fila.saldo + fila.capital), monto, transaccion.pk)
+            pagada.pk = fila.pk
+            pagada.save(using=db)
+            CuotaPrestamo.objects.using(db).filter(prestamo=prestamo, numero__gt=fila.numero).delete()
+            CuotaPrestamo.objects.using(db).bulk_create(
+                _pendientes(prestamo, fila.numero + 1, _centimos(pagada.saldo), _centimos(prestamo.cuota)),
+                batch_size=500,
+            )
+            fila = pagada
+        Prestamo.objects.using(db).filter(pk=prestamo.pk).update(
+            capital_pendiente=fila.saldo, cuotas_pagadas=F('cuotas_pagadas') + 1,
+        )
+    return fila
+
+
+def prestamo_de_pago(transaccion):
+    """El Prestamo de la cuenta si 'transaccion' puede ser un pago suyo (ingreso en cuenta de préstamo)."""
+    if transaccion.tipo != 'INGRESO' or transaccion.cuenta.tipo not in TIPOS_CUENTA_PRESTAMO:
+        return None
+    return Prestamo.objects.using(transaccion._state.db).filter(cuenta_id=transaccion.cuenta_id).first()
+
+
+def prestamos_enlazados(transaccion):
+    """Préstamos con alguna cuota cubierta por 'transaccion'."""
+    return list(Prestamo.objects.using(transaccion._state.db).filter(cuotas__transaccion=transaccion).distinct())
+
+
+@receiver(post_save, sender=Transaccion, dispatch_uid='mi_finanzas_pago_prestamo')
+def _pago_guardado(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        prestamo = prestamo_de_pago(instance)
+        if prestamo is not None:
+            registrar_pago(prestamo, instance)
+        return
+    # Un pago enlazado editado (importe, cuenta...): se rehace el calendario
+    for prestamo in prestamos_enlazados(instance):
+        recalcular_prestamo(prestamo)
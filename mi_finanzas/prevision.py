@@ -0,0 +1,127 @@
+"""
+Previsión de flujo de caja: saldo diario proyectado de cada cuenta visible
+del usuario (propias y compartidas con él) a partir de su saldo actual y de
+las transacciones recurrentes activas.
+
+- Las ocurrencias salen de la tabla precalculada OcurrenciaRecurrente (una
+  consulta agrupada por cuenta y día) si el horizonte cabe en la suya; si
+  no, se expanden las reglas con mi_finanzas/recurrencia.py. Las ocurrencias
+  vencidas y aún sin contabilizar cuentan desde hoy.
+- Los movimientos se acumulan en una matriz cuentas x días (en céntimos,
+  enteros) y el saldo diario es su suma acumulada por filas (NumPy).
+- Se marca la primera fecha en que cada cuenta queda en negativo (salvo en
+  cuentas de crédito, que lo están por naturaleza).
+- El resultado se cachea por versión de los datos de cada propietario de
+  esas cuentas (mi_finanzas/versiones.py): cualquier escritura suya lo
+  invalida, y también dar o quitar acceso al usuario.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Sum
+from django.utils import timezone
+
+from .compartidas import cuentas_visibles, propietarios
+from .models import TIPOS_CUENTA_CREDITO, Cuenta, OcurrenciaRecurrente, TransaccionRecurrente, monto_firmado
+from .recurrencia import horizonte_ocurrencias, ocurrencias
+from .versiones import version_datos
+
+HORIZONTE_DIAS = 365
+MAXIMO_DIAS = 5 * 366
+_CACHE_SEGUNDOS = 24 * 60 * 60
+
+
+def _centimos(monto, tipo):
+    centimos = int(monto * 100)
+    return -centimos if tipo == 'EGRESO' else centimos
+
+
+def _movimientos(cuenta_ids, hoy, dias):
+    """(cuenta_id, dia, céntimos con signo) de las recurrentes activas de esas cuentas hasta hoy + dias."""
+    hasta = hoy + timedelta(days=dias)
+    if dias <= horizonte_ocurrencias():
+        # Agrupado en SQL: como mucho una fila por cuenta y día
+        filas = (
+            OcurrenciaRecurrente.objects.filter(cuenta_id__in=cuenta_ids, fecha__lte=hasta)
+            .values('cuenta_id', 'fecha').annotate(total=Sum(monto_firmado())).order_by()
+            .values_list('cuenta_id', 'fecha', 'total')
+        )
+        for cuenta_id, fecha, total in filas:
+            # SQLite suma en coma flotante: se redondea a céntimos
+            yield cuenta_id, max(0, (fecha - hoy).days), int(round(total * 100))
+        return
+
+    for rec in TransaccionRecurrente.objects.filter(cuenta_id__in=cuenta_ids, esta_activa=True):
+        centimos = _centimos(rec.monto, rec.tipo)
+        for _, fecha in ocurrencias(rec, hasta=hasta):
+            yield rec.cuenta_id, max(0, (fecha - hoy).days), centimos
+
+
+def _proyectar(iniciales, movimientos, dias):
+    """Matriz cuentas x (dias + 1) de saldos diarios en céntimos."""
+    deltas = np.zeros((len(iniciales), dias + 1), dtype=np.int64)
+    if movimientos:
+        filas, columnas, valores = (np.asarray(v, dtype=np.int64) for v in zip(*movimientos))
+        # add.at acumula también los índices repetidos (varias ocurrencias el mismo día)
+        np.add.at(deltas, (filas, columnas), valores)
+    return np.asarray(iniciales, dtype=np.int64)[:, None] + np.cumsum(deltas, axis=1)
+
+
+def _resumen_cuenta(serie, hoy, es_credito):
+    """Mínimo, su fecha y primer día en negativo de una fila de la matriz."""
+    dia_minimo = int(np.argmin(serie))
+    negativos = np.flatnonzero(serie < 0)
+    primer_negativo = int(negativos[0]) if negativos.size else None
+    return {
+        'saldo_final': Decimal(int(serie[-1])) / 100,
+        'minimo': Decimal(int(serie[dia_minimo])) / 100,
+        'fecha_minimo': hoy + timedelta(days=dia_minimo),
+        'primer_negativo': None if es_credito or primer_negativo is None else hoy + timedelta(days=primer_negativo),
+    }
+
+
+def calcular_prevision(usuario, dias=HORIZONTE_DIAS, hoy=None):
+    """
+    Previsión sin caché. Devuelve {'desde', 'dias', 'cuentas': [...], 'total': [...]}
+    donde cada cuenta lleva su saldo actual, final y mínimo, la fecha del primer
+    saldo negativo (o None) y 'serie', el saldo de cada día (float, para gráficos).
+    """
+    hoy = hoy or timezone.localdate()
+    dias = max(1, min(int(dias), MAXIMO_DIAS))
+    cuentas = list(
+        Cuenta.objects.filter(pk__in=cuentas_visibles(usuario)).order_by('nombre')
+        .values_list('pk', 'nombre', 'tipo', 'saldo')
+    )
+    posicion = {pk: i for i, (pk, _, _, _) in enumerate(cuentas)}
+
+    movimientos = [
+        (posicion[cuenta_id], dia, centimos)
+        for cuenta_id, dia, centimos in _movimientos(list(posicion), hoy, dias) if cuenta_id in posicion
+    ]
+    saldos = _proyectar([int(saldo * 100) for _, _, _, saldo in cuentas], movimientos, dias)
+
+    resultado = {'desde': hoy, 'dias': dias, 'cuentas': [], 'total': []}
+    for (pk, nombre, tipo, saldo), serie in zip(cuentas, saldos):
+        fila = {'id': pk, 'nombre': nombre, 'tipo': tipo, 'saldo_actual': saldo}
+        fila.update(_resumen_cuenta(serie, hoy, tipo in TIPOS_CUENTA_CREDITO))
+        fila['serie'] = [int(c) / 100 for c in serie]
+        resultado['cuentas'].append(fila)
+    if cuentas:
+        resultado['total'] = [int(c) / 100 for c in saldos.sum(axis=0)]
+    return resultado
+
+
+def prevision(usuario, dias=HORIZONTE_DIAS, hoy=None):
+    """calcular_prevision() cacheada por (usuario, versión de los datos de cada propietario, día, horizonte)."""
+    hoy = hoy or timezone.localdate()
+    dias = max(1, min(int(dias), MAXIMO_DIAS))
+    # El propio usuario va entre los propietarios: su versión cambia también al darle o quitarle acceso
+    versiones = '.'.join(str(version_datos(propietario_id)) for propietario_id in propietarios(usuario))
+    clave = f'mi_finanzas:prevision:{usuario.pk}:{versiones}:{hoy.isoformat()}:{dias}'
+    resultado = cache.get(clave)
+    if resultado is None:
+        resultado = calcular_prevision(usuario, dias, hoy)
+        cache.set(clave, resultado, _CACHE_SEGUNDOS)
+    return resultado
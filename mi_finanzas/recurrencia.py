@@ -0,0 +1,194 @@
+"""
+Motor de recurrencia con calendario real (semántica tipo RRULE) e índice de
+próximas ocurrencias.
+
+Una TransaccionRecurrente define una regla:
+- frecuencia (DIARIA, SEMANAL, MENSUAL, ANUAL) cada 'intervalo' periodos;
+- anclada en fecha_inicio: la ocurrencia n es fecha_inicio + n*intervalo
+  periodos, calculada siempre desde el ancla (no acumulando pasos), así que
+  un 31 de enero mensual da 28/29 feb, 31 mar, 30 abr...; con fin_de_mes
+  siempre es el último día del mes;
+- termina en fecha_fin (incluida) y/o tras max_ocurrencias ocurrencias
+  contadas desde fecha_inicio (COUNT).
+
+proximo_pago es la ocurrencia pendiente. La tabla OcurrenciaRecurrente guarda
+las siguientes (al menos MI_FINANZAS_OCURRENCIAS y todas las que caen dentro
+de MI_FINANZAS_HORIZONTE_OCURRENCIAS días), indexada por (usuario, fecha),
+de modo que "qué vence en los próximos 30 días" es una consulta por rango:
+
+- TransaccionRecurrente.save() regenera las filas de esa recurrente;
+- crear_recurrentes contabiliza cada ocurrencia vencida de la tabla (todas
+  las atrasadas, cada una con su fecha) y llama a avanzar_ocurrencias():
+  borra las ya pasadas y completa las que faltan, sin tocar el resto.
+"""
+from calendar import monthrange
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db.models import Count, F, Max
+from django.utils import timezone
+
+_MESES_POR_PERIODO = {'MENSUAL': 1, 'ANUAL': 12}
+_DIAS_POR_PERIODO = {'DIARIA': 1, 'SEMANAL': 7}
+
+
+def ocurrencias_minimas():
+    return getattr(settings, 'MI_FINANZAS_OCURRENCIAS', 12)
+
+
+def horizonte_ocurrencias():
+    return getattr(settings, 'MI_FINANZAS_HORIZONTE_OCURRENCIAS', 400)
+
+
+# ========================================================
+# --- CALENDARIO ---
+# ========================================================
+
+def sumar_meses(fecha, meses, fin_de_mes=False):
+    """'fecha' + 'meses', recortando al último día del mes (o fijándolo en él con fin_de_mes)."""
+    total = fecha.month - 1 + meses
+    anio, mes = fecha.year + total // 12, total % 12 + 1
+    ultimo = monthrange(anio, mes)[1]
+    return date(anio, mes, ultimo if fin_de_mes else min(fecha.day, ultimo))
+
+
+def _ancla(recurrente):
+    return recurrente.fecha_inicio or recurrente.proximo_pago
+
+
+def fecha_ocurrencia(recurrente, n):
+    """Fecha de la ocurrencia n (0 = fecha_inicio), sin tener en cuenta el final de la regla."""
+    ancla, paso = _ancla(recurrente), n * (recurrente.intervalo or 1)
+    if recurrente.frecuencia in _MESES_POR_PERIODO:
+        return sumar_meses(ancla, paso * _MESES_POR_PERIODO[recurrente.frecuencia], recurrente.fin_de_mes)
+    return ancla + timedelta(days=paso * _DIAS_POR_PERIODO.get(recurrente.frecuencia, 1))
+
+
+def indice_desde(recurrente, fecha):
+    """Menor n >= 0 cuya ocurrencia cae en 'fecha' o después."""
+    ancla = _ancla(recurrente)
+    if fecha <= ancla:
+        return 0
+    intervalo = recurrente.intervalo or 1
+    if recurrente.frecuencia in _MESES_POR_PERIODO:
+        meses = (fecha.year - ancla.year) * 12 + fecha.month - ancla.month
+        n = max(0, meses // (intervalo * _MESES_POR_PERIODO[recurrente.frecuencia]))
+    else:
+        dias = intervalo * _DIAS_POR_PERIODO.get(recurrente.frecuencia, 1)
+        n = (fecha - ancla).days // dias
+    while fecha_ocurrencia(recurrente, n) < fecha:
+        n += 1
+    return n
+
+
+def _dentro_de_la_regla(recurrente, n, fecha):
+    if recurrente.max_ocurrencias is not None and n >= recurrente.max_ocurrencias:
+        return False
+    return recurrente.fecha_fin is None or fecha <= recurrente.fecha_fin
+
+
+def ocurrencias(recurrente, desde=None, hasta=None, limite=None):
+    """
+    Genera (n, fecha) de las ocurrencias desde 'desde' (incluida; por defecto
+    proximo_pago) hasta 'hasta' (incluida) o 'limite' ocurrencias, respetando
+    fecha_fin y max_ocurrencias.
+    """
+    n = indice_desde(recurrente, desde or recurrente.proximo_pago)
+    generadas = 0
+    while limite is None or generadas < limite:
+        fecha = fecha_ocurrencia(recurrente, n)
+        if (hasta is not None and fecha > hasta) or not _dentro_de_la_regla(recurrente, n, fecha):
+            return
+        yield n, fecha
+        n += 1
+        generadas += 1
+
+
+def siguiente_fecha(recurrente):
+    """Ocurrencia posterior a proximo_pago, o None si la regla ha terminado."""
+    for _, fecha in ocurrencias(recurrente, desde=recurrente.proximo_pago + timedelta(days=1), limite=1):
+        return fecha
+    return None
+
+
+# ========================================================
+# --- TABLA DE PRÓXIMAS OCURRENCIAS ---
+# ========================================================
+
+def _nuevas_filas(recurrente, desde_indice, existentes, hoy):
+    """Filas que faltan para cubrir el mínimo y el horizonte a partir de 'desde_indice'."""
+    from .models import OcurrenciaRecurrente
+
+    if not recurrente.esta_activa:
+        return []
+    minimo, hasta = ocurrencias_minimas(), hoy + timedelta(days=horizonte_ocurrencias())
+    filas = []
+    n = desde_indice
+    while True:
+        fecha = fecha_ocurrencia(recurrente, n)
+        if not _dentro_de_la_regla(recurrente, n, fecha) or (existentes + len(filas) >= minimo and fecha > hasta):
+            return filas
+        filas.append(OcurrenciaRecurrente(
+            usuario_id=recurrente.usuario_id, recurrente_id=recurrente.pk, cuenta_id=recurrente.cuenta_id,
+            tipo=recurrente.tipo, monto=recurrente.monto, fecha=fecha, indice=n,
+        ))
+        n += 1
+
+
+def regenerar_ocurrencias(recurrente, using=None, hoy=None):
+    """Vuelve a calcular las ocurrencias de una recurrente (al crearla o cambiar su regla)."""
+    from .models import OcurrenciaRecurrente
+
+    db = using or recurrente._state.db
+    OcurrenciaRecurrente.objects.using(db).filter(recurrente_id=recurrente.pk).delete()
+    filas = _nuevas_filas(
+        recurrente, indice_desde(recurrente, recurrente.proximo_pago), 0, hoy or timezone.localdate()
+    )
+    OcurrenciaRecurrente.objects.using(db).bulk_create(filas)
+
+
+def avanzar_ocurrencias(recurrentes=None, hoy=None):
+    """
+    Mantenimiento incremental tras contabilizar (o a diario): borra las
+    ocurrencias anteriores a proximo_pago y las de recurrentes inactivas, y
+    completa las que faltan. Sin 'recurrentes', todas las del shard activo.
+    Devuelve el número de filas creadas.
+    """
+    from .models import OcurrenciaRecurrente, TransaccionRecurrente
+
+    hoy = hoy or timezone.localdate()
+    if recurrentes is None:
+        recurrentes = TransaccionRecurrente.objects.all()
+        ocurrencias_qs = OcurrenciaRecurrente.objects.all()
+    else:
+        recurrentes = list(recurrentes)
+        ocurrencias_qs = OcurrenciaRecurrente.objects.filter(recurrente_id__in=[r.pk for r in recurrentes])
+
+    # Un DELETE con join: consumidas (antes de proximo_pago) o de recurrentes desactivadas
+    ocurrencias_qs.filter(fecha__lt=F('recurrente__proximo_pago')).delete()
+    ocurrencias_qs.filter(recurrente__esta_activa=False).delete()
+
+    estado = {
+        fila['recurrente_id']: (fila['ultimo'], fila['cantidad'])
+        for fila in ocurrencias_qs.values('recurrente_id').annotate(ultimo=Max('indice'), cantidad=Count('pk')).order_by()
+    }
+    filas = []
+    for recurrente in recurrentes:
+        ultimo, cantidad = estado.get(recurrente.pk, (None, 0))
+        desde = indice_desde(recurrente, recurrente.proximo_pago) if ultimo is None else ultimo + 1
+        filas.extend(_nuevas_filas(recurrente, desde, cantidad, hoy))
+    OcurrenciaRecurrente.objects.bulk_create(filas, batch_size=1000)
+    return len(filas)
+
+
+def proximos_vencimientos(usuario, dias=30, desde=None):
+    """Ocurrencias del usuario entre 'desde' (hoy) y 'desde' + 'dias': una consulta por rango."""
+    from .models import OcurrenciaRecurrente
+
+    desde = desde or timezone.localdate()
+    return (
+        OcurrenciaRecurrente.objects
+        .filter(usuario=usuario, fecha__range=(desde, desde + timedelta(days=dias)))
+        .select_related('recurrente', 'cuenta')
+        .order_by('fecha', 'recurrente_id')
+    )
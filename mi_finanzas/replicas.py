@@ -0,0 +1,123 @@
+"""
+Lecturas en réplica para vistas de solo lectura (reportes, exportaciones,
+listados del admin).
+
+settings.MI_FINANZAS_REPLICAS = {'default': 'replica', 'shard_1': 'replica_1', ...}
+empareja cada base primaria (o shard) con su réplica. Solo se lee de la
+réplica dentro de en_replica(): el decorador @lectura_en_replica lo activa
+en una vista y RouterShards (mi_finanzas/shards.py) traduce el alias. Las
+escrituras van siempre a la primaria.
+
+Lectura de lo propio escrito: tras un POST (u otro método no seguro),
+ReplicaMiddleware hace que las siguientes MI_FINANZAS_PRIMARIO_TRAS_ESCRITURA
+peticiones de ese usuario lean de la primaria (como mucho durante
+MI_FINANZAS_PRIMARIO_TRAS_ESCRITURA_SEGUNDOS), para no ver datos sin replicar.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+
+_leer_de_replica = ContextVar('mi_finanzas_replica', default=False)
+
+METODOS_SEGUROS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+
+def replicas():
+    return getattr(settings, 'MI_FINANZAS_REPLICAS', {})
+
+
+def replica_de(alias):
+    """Alias desde el que leer: la réplica de 'alias' si hay una y en_replica() está activo."""
+    if _leer_de_replica.get():
+        return replicas().get(alias, alias)
+    return alias
+
+
+def primario_de(alias):
+    """Alias primario de una réplica (o el mismo alias si no es réplica)."""
+    for primario, replica in replicas().items():
+        if replica == alias:
+            return primario
+    return alias
+
+
+@contextmanager
+def en_replica(activar=True):
+    token = _leer_de_replica.set(bool(activar))
+    try:
+        yield
+    finally:
+        _leer_de_replica.reset(token)
+
+
+# ========================================================
+# --- LECTURA DE LO PROPIO ESCRITO ---
+# ========================================================
+
+def _clave(usuario_id):
+    return f'mi_finanzas:primario:{usuario_id}'
+
+
+def marcar_escritura(usuario_id):
+    """Las próximas peticiones del usuario leerán de la primaria."""
+    cache.set(
+        _clave(usuario_id),
+        getattr(settings, 'MI_FINANZAS_PRIMARIO_TRAS_ESCRITURA', 3),
+        getattr(settings, 'MI_FINANZAS_PRIMARIO_TRAS_ESCRITURA_SEGUNDOS', 30),
+    )
+
+
+def _consumir_lectura_primaria(usuario_id):
+    """True si al usuario le quedan lecturas en la primaria (y gasta una)."""
+    clave = _clave(usuario_id)
+    restantes = cache.get(clave)
+    if not restantes:
+        return False
+    try:
+        if cache.decr(clave) <= 0:
+            cache.delete(clave)
+    except ValueError:
+        # Caducó entre get y decr
+        pass
+    return True
+
+
+def usar_replica(request):
+    """Si esta petición puede leer de la réplica."""
+    if not replicas() or request.method not in METODOS_SEGUROS:
+        return False
+    usuario = getattr(request, 'user', None)
+    if usuario is not None and usuario.is_authenticated and _consumir_lectura_primaria(usuario.pk):
+        return False
+    return True
+
+
+def lectura_en_replica(vista):
+    """Decorador de vistas de solo lectura: sus consultas van a la réplica."""
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        with en_replica(usar_replica(request)):
+            respuesta = vista(request, *args, **kwargs)
+            # TemplateResponse: las consultas del renderizado también van a la réplica
+            if hasattr(respuesta, 'render') and not respuesta.is_rendered:
+                respuesta.render()
+        return respuesta
+    return envoltura
+
+
+class ReplicaMiddleware:
+    """Tras una petición que escribe (POST, PUT, PATCH, DELETE) fija al usuario en la primaria."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        respuesta = self.get_response(request)
+        usuario = getattr(request, 'user', None)
+        if replicas() and request.method not in METODOS_SEGUROS and usuario is not None \
+                and usuario.is_authenticated:
+            marcar_escritura(usuario.pk)
+        return respuesta
@@ -0,0 +1,407 @@
+"""
+Respaldo y restauración rápidos por usuario (sustituye a dumpdata/loaddata).
+
+Formato: JSON Lines comprimido con gzip. Cada tabla empieza con una línea de
+cabecera {"tabla": ..., "columnas": [...]} seguida de una fila por línea como
+lista de valores (sin repetir los nombres de columna).
+
+La restauración:
+- inserta con bulk_create en orden de dependencias (usuarios, cuentas,
+  categorías, etiquetas, transacciones, divisiones, etiquetas de cada
+  transacción, recurrentes, presupuestos, préstamos con su calendario,
+  posiciones y miembros de las cuentas compartidas);
+- reasigna las claves primarias, incluidos los enlaces transaccion_relacionada
+  y Categoria.padre (y rehace el árbol de categorías, mi_finanzas/jerarquia.py),
+  y las cuotas conservan su pago (CuotaPrestamo.pago) aunque esté archivado;
+- los miembros de una cuenta que no están en el respaldo se enlazan por id si
+  el usuario existe (si no, se omiten);
+- escribe Cuenta.saldo directamente (no se reaplica cada transacción, que es
+  lo que hacía loaddata a través de Transaccion.save());
+- vuelve a archivar con el mismo corte las transacciones que estaban archivadas
+  y rehace los saldos mensuales (mi_finanzas/historial.py).
+"""
+import gzip
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from .archivo import archivar_transacciones
+from .compartidas import permisos_cambiados
+from .historial import reconstruir_saldos_mensuales
+from .jerarquia import reconstruir_jerarquia
+from .models import (
+    Categoria, Cuenta, CuotaPrestamo, DivisionArchivada, DivisionTransaccion, Etiqueta, MiembroCuenta, Posicion,
+    Prestamo, Presupuesto, SaldoApertura, Transaccion, TransaccionArchivada, TransaccionEtiqueta,
+    TransaccionEtiquetaArchivada, TransaccionRecurrente, calcular_huella,
+)
+from .recurrencia import avanzar_ocurrencias
+from .shards import atomico
+from .versiones import datos_cambiados, meses_cambiados
+
+User = get_user_model()
+
+FORMATO = 'mi_finanzas.respaldo'
+# 2: préstamos, cuotas, posiciones y miembros de cuenta
+VERSION = 2
+
+COLUMNAS = {
+    'usuarios': ['id', 'username', 'password', 'email', 'first_name', 'last_name',
+                 'is_active', 'is_staff', 'is_superuser', 'date_joined'],
+    'cuentas': ['id', 'usuario_id', 'nombre', 'tipo', 'saldo'],
+    'categorias': ['id', 'usuario_id', 'nombre', 'tipo', 'padre_id'],
+    'etiquetas': ['id', 'usuario_id', 'nombre'],
+    'transacciones': ['id', 'usuario_id', 'cuenta_id', 'monto', 'tipo', 'categoria_id', 'fecha',
+                      'descripcion', 'fecha_creacion', 'es_transferencia', 'transaccion_relacionada_id'],
+    'divisiones': ['id', 'usuario_id', 'transaccion_id', 'categoria_id', 'monto'],
+    'transaccion_etiquetas': ['id', 'transaccion_id', 'etiqueta_id'],
+    'recurrentes': ['id', 'usuario_id', 'cuenta_id', 'categoria_id', 'tipo', 'monto', 'descripcion',
+                    'frecuencia', 'proximo_pago', 'esta_activa', 'fecha_creacion',
+                    'intervalo', 'fecha_inicio', 'fin_de_mes', 'fecha_fin', 'max_ocurrencias'],
+    'presupuestos': ['id', 'usuario_id', 'categoria_id', 'monto_limite', 'mes', 'anio', 'fecha_creacion'],
+    'prestamos': ['id', 'usuario_id', 'cuenta_id', 'principal', 'tasa_anual', 'plazo_meses', 'fecha_inicio',
+                  'dia_pago', 'cuota', 'capital_pendiente', 'cuotas_pagadas'],
+    'cuotas_prestamo': ['id', 'usuario_id', 'prestamo_id', 'numero', 'fecha', 'cuota', 'interes', 'capital',
+                        'saldo', 'transaccion_id', 'pago'],
+    'posiciones': ['id', 'usuario_id', 'cuenta_id', 'activo', 'cantidad'],
+    # Accesos de otros usuarios a las cuentas del respaldo
+    'miembros': ['id', 'cuenta_id', 'usuario_id', 'rol', 'fecha_alta'],
+    # Corte del archivo en frío por usuario: se vuelve a archivar al restaurar
+    'cortes_archivo': ['usuario_id', 'fecha_corte'],
+}
+
+_FECHAS = {'fecha', 'proximo_pago', 'fecha_corte', 'fecha_inicio', 'fecha_fin'}
+_MARCAS = {'fecha_creacion', 'fecha_alta', 'date_joined'}
+_DECIMALES = {'saldo', 'monto', 'monto_limite', 'principal', 'tasa_anual', 'cuota', 'capital_pendiente',
+              'interes', 'capital', 'pago', 'cantidad'}
+
+_LOTE = 2000
+
+# Tablas cuyo modelo tiene una marca de alta con auto_now_add
+_MARCA_ALTA = {'transacciones': 'fecha_creacion', 'recurrentes': 'fecha_creacion',
+               'presupuestos': 'fecha_creacion', 'miembros': 'fecha_alta'}
+
+
+def _json(valor):
+    """Decimal como texto (exacto) y fechas en ISO 8601."""
+    if isinstance(valor, Decimal):
+        return str(valor)
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    raise TypeError(f"Tipo no serializable: {type(valor)}")
+
+
+def _convertir(columnas):
+    """Funciones que devuelven cada columna de texto JSON a su tipo Python."""
+    conversiones = []
+    for columna in columnas:
+        if columna in _FECHAS:
+            conversiones.append(lambda v: date.fromisoformat(v) if v else None)
+        elif columna in _MARCAS:
+            conversiones.append(lambda v: datetime.fromisoformat(v) if v else None)
+        elif columna in _DECIMALES:
+            conversiones.append(lambda v: Decimal(v) if v is not None else None)
+        else:
+            conversiones.append(None)
+    return conversiones
+
+
+# ========================================================
+# --- RESPALDAR ---
+# ========================================================
+
+def _consultas(usuario):
+    """(tabla, queryset) en orden de dependencias."""
+    def del_usuario(qs, campo='usuario'):
+        return qs if usuario is None else qs.filter(**{campo: usuario.pk})
+
+    # Las transacciones archivadas (con sus divisiones y etiquetas) se respaldan junto a las vivas (mismas columnas)
+    return [
+        ('usuarios', del_usuario(User.objects.order_by('pk'), 'pk')),
+        ('cuentas', del_usuario(Cuenta.objects.order_by('pk'))),
+        ('categorias', del_usuario(Categoria.objects.order_by('pk'))),
+        ('etiquetas', del_usuario(Etiqueta.objects.order_by('pk'))),
+        ('transacciones', del_usuario(TransaccionArchivada.objects.order_by('pk'))),
+        ('transacciones', del_usuario(Transaccion.objects.order_by('pk'))),
+        ('divisiones', del_usuario(DivisionArchivada.objects.order_by('pk'))),
+        ('divisiones', del_usuario(DivisionTransaccion.objects.order_by('pk'))),
+        ('transaccion_etiquetas', del_usuario(TransaccionEtiquetaArchivada.objects.order_by('pk'), 'transaccion__usuario')),
+        ('transaccion_etiquetas', del_usuario(TransaccionEtiqueta.objects.order_by('pk'), 'transaccion__usuario')),
+        ('recurrentes', del_usuario(TransaccionRecurrente.objects.order_by('pk'))),
+        ('presupuestos', del_usuario(Presupuesto.objects.order_by('pk'))),
+        ('prestamos', del_usuario(Prestamo.objects.order_by('pk'))),
+        ('cuotas_prestamo', del_usuario(CuotaPrestamo.objects.order_by('pk'))),
+        ('posiciones', del_usuario(Posicion.objects.order_by('pk'))),
+        ('miembros', del_usuario(MiembroCuenta.objects.order_by('pk'), 'cuenta__usuario')),
+        ('cortes_archivo', del_usuario(
+            SaldoApertura.objects.order_by('cuenta__usuario_id').distinct(), 'cuenta__usuario'
+        )),
+    ]
+
+
+def respaldar(ruta, usuario=None, chunk_size=_LOTE):
+    """Escribe el respaldo (de un usuario o de todos) en 'ruta'. Devuelve {tabla: filas}."""
+    resumen = {}
+    with gzip.open(ruta, 'wt', encoding='utf-8', compresslevel=6) as salida:
+        salida.write(json.dumps({'formato': FORMATO, 'version': VERSION, 'creado': timezone.now().isoformat()}) + '\n')
+        tabla_actual = None
+        for tabla, qs in _consultas(usuario):
+            columnas = COLUMNAS[tabla]
+            if tabla == 'cortes_archivo':
+                qs = qs.values_list('cuenta__usuario_id', 'fecha_corte')
+            else:
+                qs = qs.values_list(*columnas)
+            if tabla != tabla_actual:
+                salida.write(json.dumps({'tabla': tabla, 'columnas': columnas}) + '\n')
+                tabla_actual = tabla
+            filas = 0
+            for fila in qs.iterator(chunk_size=chunk_size):
+                salida.write(json.dumps(fila, default=_json, separators=(',', ':')) + '\n')
+                filas += 1
+            resumen[tabla] = resumen.get(tabla, 0) + filas
+    return resumen
+
+
+# ========================================================
+# --- RESTAURAR ---
+# ========================================================
+
+def _leer(ruta):
+    """Genera (tabla, columnas, fila_convertida) leyendo el fichero en streaming."""
+    with gzip.open(ruta, 'rt', encoding='utf-8') as entrada:
+        cabecera = json.loads(entrada.readline() or '{}')
+        if cabecera.get('formato') != FORMATO:
+            raise ValueError("El fichero no es un respaldo de mi_finanzas.")
+        if cabecera.get('version', 0) > VERSION:
+            raise ValueError(f"Versión de respaldo no soportada: {cabecera.get('version')}")
+
+        tabla, columnas, conversiones = None, None, None
+        for linea in entrada:
+            dato = json.loads(linea)
+            if isinstance(dato, dict):
+                tabla, columnas = dato['tabla'], dato['columnas']
+                conversiones = _convertir(columnas)
+                continue
+            yield tabla, columnas, [c(v) if c else v for c, v in zip(conversiones, dato)]
+
+
+class _Restauracion:
+    """Estado de una restauración: mapas id_respaldo -> id_nuevo y lotes pendientes."""
+
+    def __init__(self, usuario_destino=None):
+        self.usuario_destino = usuario_destino
+        self.mapas = {tabla: {} for tabla in COLUMNAS}
+        self.pendiente = []
+        self.tabla_pendiente = None
+        self.enlaces = []  # (id_nuevo, id_relacionada_en_respaldo) para enlazar al final
+        self.padres = []  # (id_nuevo, id_padre_en_respaldo) de las subcategorías
+        self.cortes = []
+        self.propietarios = {}  # cuenta_id nuevo -> usuario_id (para los miembros)
+        self.miembros = set()  # usuarios con acceso a cuentas restauradas
+        self.resumen = {}
+
+    # --- construcción de instancias por tabla ---
+
+    def _usuario(self, fila):
+        return self.mapas['usuarios'][fila['usuario_id']]
+
+    def construir(self, tabla, fila):
+        m = self.mapas
+        if tabla == 'cuentas':
+            return Cuenta(usuario_id=self._usuario(fila), nombre=fila['nombre'], tipo=fila['tipo'], saldo=fila['saldo'])
+        if tabla == 'categorias':
+            categoria = Categoria(usuario_id=self._usuario(fila), nombre=fila['nombre'], tipo=fila['tipo'])
+            # El padre puede tener un id mayor (se movió después): se enlaza al final
+            categoria._padre_respaldo = fila.get('padre_id')
+            return categoria
+        if tabla == 'etiquetas':
+            return Etiqueta(usuario_id=self._usuario(fila), nombre=fila['nombre'])
+        if tabla == 'transacciones':
+            cuenta_id = m['cuentas'][fila['cuenta_id']]
+            relacionada = fila['transaccion_relacionada_id']
+            tx = Transaccion(
+                usuario_id=self._usuario(fila), cuenta_id=cuenta_id, monto=fila['monto'], tipo=fila['tipo'],
+                categoria_id=m['categorias'].get(fila['categoria_id']), fecha=fila['fecha'],
+                descripcion=fila['descripcion'], fecha_creacion=fila['fecha_creacion'],
+                es_transferencia=fila['es_transferencia'],
+                # Si el par ya se insertó se enlaza ahora; si no, al final
+                transaccion_relacionada_id=m['transacciones'].get(relacionada),
+            )
+            tx.huella = calcular_huella(cuenta_id, tx.fecha, tx._get_signed_monto(tx.monto, tx.tipo), tx.descripcion)
+            tx._relacionada_respaldo = relacionada
+            return tx
+        if tabla == 'divisiones':
+            return DivisionTransaccion(
+                usuario_id=self._usuario(fila), transaccion_id=m['transacciones'][fila['transaccion_id']],
+                categoria_id=m['categorias'].get(fila['categoria_id']), monto=fila['monto'],
+            )
+        if tabla == 'transaccion_etiquetas':
+            return TransaccionEtiqueta(transaccion_id=m['transacciones'][fila['transaccion_id']],
+                                       etiqueta_id=m['etiquetas'][fila['etiqueta_id']])
+        if tabla == 'recurrentes':
+            return TransaccionRecurrente(
+                usuario_id=self._usuario(fila), cuenta_id=m['cuentas'][fila['cuenta_id']],
+                categoria_id=m['categorias'].get(fila['categoria_id']), tipo=fila['tipo'], monto=fila['monto'],
+                descripcion=fila['descripcion'], frecuencia=fila['frecuencia'], proximo_pago=fila['proximo_pago'],
+                esta_activa=fila['esta_activa'], fecha_creacion=fila['fecha_creacion'],
+                # Respaldos anteriores a la regla de recurrencia: se ancla en proximo_pago
+                intervalo=fila.get('intervalo') or 1, fecha_inicio=fila.get('fecha_inicio') or fila['proximo_pago'],
+                fin_de_mes=fila.get('fin_de_mes', False), fecha_fin=fila.get('fecha_fin'),
+                max_ocurrencias=fila.get('max_ocurrencias'),
+            )
+        if tabla == 'presupuestos':
+            return Presupuesto(
+                usuario_id=self._usuario(fila), categoria_id=m['categorias'][fila['categoria_id']],
+                monto_limite=fila['monto_limite'], mes=fila['mes'], anio=fila['anio'],
+                fecha_creacion=fila['fecha_creacion'],
+            )
+        if tabla == 'prestamos':
+            # Condiciones y calendario tal cual: bulk_create no pasa por Prestamo.save() (no se recalcula)
+            return Prestamo(
+                usuario_id=self._usuario(fila), cuenta_id=m['cuentas'][fila['cuenta_id']],
+                principal=fila['principal'], tasa_anual=fila['tasa_anual'], plazo_meses=fila['plazo_meses'],
+                fecha_inicio=fila['fecha_inicio'], dia_pago=fila['dia_pago'], cuota=fila['cuota'],
+                capital_pendiente=fila['capital_pendiente'], cuotas_pagadas=fila['cuotas_pagadas'],
+            )
+        if tabla == 'cuotas_prestamo':
+            return CuotaPrestamo(
+                usuario_id=self._usuario(fila), prestamo_id=m['prestamos'][fila['prestamo_id']],
+                numero=fila['numero'], fecha=fila['fecha'], cuota=fila['cuota'], interes=fila['interes'],
+                capital=fila['capital'], saldo=fila['saldo'], pago=fila['pago'],
+                transaccion_id=m['transacciones'].get(fila['transaccion_id']),
+            )
+        if tabla == 'posiciones':
+            return Posicion(usuario_id=self._usuario(fila), cuenta_id=m['cuentas'][fila['cuenta_id']],
+                            activo=fila['activo'], cantidad=fila['cantidad'])
+        if tabla == 'miembros':
+            usuario_id = self.miembro(fila['usuario_id'])
+            cuenta_id = m['cuentas'][fila['cuenta_id']]
+            if usuario_id is None or usuario_id == self.propietarios.get(cuenta_id):
+                return None
+            self.miembros.add(usuario_id)
+            return MiembroCuenta(cuenta_id=cuenta_id, usuario_id=usuario_id, rol=fila['rol'],
+                                 fecha_alta=fila['fecha_alta'])
+        raise ValueError(f"Tabla desconocida en el respaldo: {tabla}")
+
+    # --- usuarios: se reutilizan por username (o el usuario destino) ---
+
+    def usuario(self, fila):
+        if self.usuario_destino is not None:
+            self.mapas['usuarios'][fila['id']] = self.usuario_destino.pk
+            return
+        datos = {c: fila[c] for c in COLUMNAS['usuarios'] if c not in ('id', 'username')}
+        existente, _ = User.objects.get_or_create(username=fila['username'], defaults=datos)
+        self.mapas['usuarios'][fila['id']] = existente.pk
+
+    def miembro(self, usuario_id):
+        """Usuario miembro: el restaurado si viene en el respaldo, si no el mismo id si existe."""
+        if usuario_id in self.mapas['usuarios']:
+            return self.mapas['usuarios'][usuario_id]
+        return usuario_id if User.objects.filter(pk=usuario_id).exists() else None
+
+    # --- lotes ---
+
+    def agregar(self, tabla, fila):
+        if tabla != self.tabla_pendiente:
+            # La tabla anterior debe estar insertada para conocer sus nuevos ids
+            self.vaciar()
+            self.tabla_pendiente = tabla
+        instancia = self.construir(tabla, fila)
+        if instancia is None:
+            return
+        self.pendiente.append((fila.get('id'), instancia))
+        if len(self.pendiente) >= _LOTE:
+            self.vaciar()
+
+    def vaciar(self):
+        if not self.pendiente:
+            return
+        tabla = self.tabla_pendiente
+        instancias = [inst for _, inst in self.pendiente]
+        modelo = instancias[0].__class__
+        # bulk_create aplica auto_now_add y pisa la fecha original: se vuelve a escribir después
+        campo = _MARCA_ALTA.get(tabla)
+        marcas = [getattr(inst, campo) for inst in instancias] if campo else None
+        modelo.objects.bulk_create(instancias)
+        if marcas:
+            for inst, marca in zip(instancias, marcas):
+                setattr(inst, campo, marca)
+            modelo.objects.bulk_update(instancias, [campo])
+        mapa = self.mapas[tabla]
+        for (id_respaldo, _), inst in zip(self.pendiente, instancias):
+            mapa[id_respaldo] = inst.pk
+        if tabla == 'cuentas':
+            self.propietarios.update((inst.pk, inst.usuario_id) for inst in instancias)
+        if tabla == 'categorias':
+            self.padres.extend((inst.pk, inst._padre_respaldo) for inst in instancias if inst._padre_respaldo)
+        if tabla == 'transacciones':
+            self.enlaces.extend(
+                (inst.pk, inst._relacionada_respaldo) for inst in instancias
+                if inst._relacionada_respaldo is not None and inst.transaccion_relacionada_id is None
+            )
+        self.resumen[tabla] = self.resumen.get(tabla, 0) + len(instancias)
+        self.pendiente = []
+
+    def enlazar_transferencias(self):
+        mapa = self.mapas['transacciones']
+        for inicio in range(0, len(self.enlaces), _LOTE):
+            lote = [
+                Transaccion(pk=pk, transaccion_relacionada_id=mapa.get(relacionada))
+                for pk, relacionada in self.enlaces[inicio:inicio + _LOTE]
+            ]
+            Transaccion.objects.bulk_update(lote, ['transaccion_relacionada'])
+
+    def enlazar_categorias(self):
+        mapa = self.mapas['categorias']
+        lote = [Categoria(pk=pk, padre_id=mapa.get(padre)) for pk, padre in self.padres]
+        Categoria.objects.bulk_update(lote, ['padre'], batch_size=_LOTE)
+        # bulk_create/bulk_update no pasan por Categoria.save(): tabla de cierre desde cero
+        reconstruir_jerarquia(set(self.mapas['usuarios'].values()))
+
+
+@atomico
+def restaurar(ruta, usuario_destino=None, reemplazar=False):
+    """
+    Restaura un respaldo. Con usuario_destino todos los datos se asignan a ese
+    usuario; si no, los usuarios se emparejan por username (y se crean si faltan).
+    Con reemplazar=True se borran antes los datos existentes de esos usuarios.
+    Devuelve {tabla: filas}.
+    """
+    estado = _Restauracion(usuario_destino)
+    vaciados = set()
+
+    for tabla, columnas, valores in _leer(ruta):
+        fila = dict(zip(columnas, valores))
+        if tabla == 'usuarios':
+            estado.usuario(fila)
+            usuario_id = estado.mapas['usuarios'][fila['id']]
+            if reemplazar and usuario_id not in vaciados:
+                # Borra en cascada transacciones, recurrentes, presupuestos, préstamos, posiciones, miembros y archivo
+                Cuenta.objects.filter(usuario_id=usuario_id).delete()
+                Categoria.objects.filter(usuario_id=usuario_id).delete()
+                Etiqueta.objects.filter(usuario_id=usuario_id).delete()
+                vaciados.add(usuario_id)
+            estado.resumen['usuarios'] = estado.resumen.get('usuarios', 0) + 1
+        elif tabla == 'cortes_archivo':
+            estado.cortes.append((estado.mapas['usuarios'][fila['usuario_id']], fila['fecha_corte']))
+        else:
+            estado.agregar(tabla, fila)
+    estado.vaciar()
+
+    estado.enlazar_transferencias()
+    estado.enlazar_categorias()
+    # bulk_create no pasa por TransaccionRecurrente.save(): se calculan aquí sus ocurrencias
+    avanzar_ocurrencias(TransaccionRecurrente.objects.filter(pk__in=estado.mapas['recurrentes'].values()))
+    datos_cambiados(estado.mapas['usuarios'].values())
+    meses_cambiados(estado.mapas['usuarios'].values())
+    # Cuentas con ids nuevos: los permisos cacheados (propietarios y miembros) ya no valen
+    permisos_cambiados([*estado.mapas['usuarios'].values(), *estado.miembros])
+
+    for usuario_id, fecha_corte in estado.cortes:
+        archivar_transacciones(fecha_corte=fecha_corte, usuario=User.objects.get(pk=usuario_id))
+    # Saldos al cierre de cada mes: bulk_create no los mantiene
+    reconstruir_saldos_mensuales(Cuenta.objects.filter(usuario_id__in=set(estado.mapas['usuarios'].values())))
+
+    return estado.resumen
@@ -0,0 +1,99 @@
+"""
+Saldos diferidos para escrituras masivas de transacciones.
+
+Cada Transaccion.save()/delete() mueve el saldo de su cuenta con un UPDATE
+(dos al editar). Dentro de saldos_diferidos() esos movimientos se acumulan
+en memoria por cuenta y se aplican al salir, con un único UPDATE por cuenta
+y dentro del mismo atomic que las transacciones (igual con el historial de
+saldos mensuales: un UPDATE por cuenta y mes):
+
+    with saldos_diferidos():
+        for tx in nuevas:
+            tx.save()          # sin UPDATE de Cuenta
+    # aquí: un UPDATE por cuenta tocada
+
+Si el bloque lanza una excepción se revierte todo y no se aplica nada. Los
+bloques anidados se suman al exterior. Mientras el bloque está abierto,
+Cuenta.saldo en la base NO incluye aún los movimientos pendientes.
+Fuera del bloque save()/delete() se comportan como siempre.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+
+
+class _Lote:
+    def __init__(self):
+        # {(alias, cuenta_id): delta}
+        self.saldos = defaultdict(Decimal)
+        # {(alias, cuenta_id, primer día del mes): delta} para el historial de saldos
+        self.meses = defaultdict(Decimal)
+
+
+# Lote activo, o None fuera de saldos_diferidos()
+_pendientes = ContextVar('mi_finanzas_saldos_pendientes', default=None)
+
+
+def aplicar_saldo(db, cuenta_id, delta, fecha=None):
+    """
+    Suma 'delta' al saldo de la cuenta: ya, o al cerrar el lote activo. Con
+    'fecha', también al historial de saldos mensuales (mi_finanzas/historial.py).
+    """
+    if not delta:
+        return
+    lote = _pendientes.get()
+    if lote is not None:
+        lote.saldos[(db, cuenta_id)] += delta
+        if fecha is not None:
+            lote.meses[(db, cuenta_id, fecha.replace(day=1))] += delta
+        return
+    from .historial import mover_saldo_mensual
+    from .models import Cuenta
+    Cuenta.objects.using(db).filter(pk=cuenta_id).update(saldo=F('saldo') + delta)
+    if fecha is not None:
+        mover_saldo_mensual(db, cuenta_id, fecha, delta)
+
+
+def _volcar(lote):
+    """Un UPDATE por cuenta, en orden de pk para bloquear siempre en el mismo orden."""
+    from .historial import mover_saldo_mensual
+    from .models import Cuenta
+    por_alias = defaultdict(list)
+    for (db, cuenta_id), delta in lote.saldos.items():
+        if delta:
+            por_alias[db].append((cuenta_id, delta))
+    for db, deltas in por_alias.items():
+        with transaction.atomic(using=db):
+            for cuenta_id, delta in sorted(deltas):
+                Cuenta.objects.using(db).filter(pk=cuenta_id).update(saldo=F('saldo') + delta)
+    # Historial: un UPDATE por cuenta y mes tocado
+    for (db, cuenta_id, mes), delta in sorted(lote.meses.items()):
+        with transaction.atomic(using=db):
+            mover_saldo_mensual(db, cuenta_id, mes, delta)
+
+
+@contextmanager
+def saldos_diferidos(using=None):
+    """
+    Acumula los movimientos de saldo de Transaccion.save()/delete() y los
+    aplica al salir. 'using' es la base del atomic (por defecto, el shard activo).
+    """
+    if _pendientes.get() is not None:
+        # Anidado: el bloque exterior aplica los saldos
+        yield
+        return
+
+    from .shards import alias_actual
+    lote = _Lote()
+    with transaction.atomic(using=using or alias_actual()):
+        token = _pendientes.set(lote)
+        try:
+            yield
+        finally:
+            _pendientes.reset(token)
+        # Solo si el bloque terminó sin excepción
+        _volcar(lote)
@@ -0,0 +1,286 @@
+"""
+Reparto de usuarios entre varias bases de datos (shards).
+
+Cada usuario vive en un alias de settings.MI_FINANZAS_SHARDS: el primero que
+se le asigna es determinista (usuario_id % N) y queda fijado en
+AsignacionShard (en 'default'), así añadir shards no mueve a nadie hasta que
+se ejecuta 'manage.py rebalancear_shards'.
+
+- RouterShards envía Cuenta, Categoria, Transaccion, TransaccionRecurrente,
+  Presupuesto y el archivo al shard del usuario; auth, sesiones, la cola de
+  tareas y las asignaciones se quedan en 'default'.
+- ShardMiddleware activa el shard del usuario durante la petición; fuera de
+  una petición se usa en_shard(alias) (comandos, tareas, fan-out).
+- atomico() es transaction.atomic sobre el shard activo.
+- Las lecturas pueden ir a la réplica de cada shard (mi_finanzas/replicas.py).
+
+Con un único shard (la configuración por defecto) todo va a 'default' sin
+consultas adicionales.
+"""
+import tempfile
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Q
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+from django.http import QueryDict
+
+from .models import AsignacionShard, CambioRegistrado, Categoria, Cuenta, MiembroCuenta, SecuenciaCambios
+from .replicas import primario_de, replica_de
+
+User = get_user_model()
+
+# Modelos de mi_finanzas que NO se reparten (siempre en 'default')
+MODELOS_GLOBALES = {'tarea', 'asignacionshard', 'precioactivo'}
+
+_alias_activo = ContextVar('mi_finanzas_shard', default=None)
+
+
+def shards():
+    return list(getattr(settings, 'MI_FINANZAS_SHARDS', [DEFAULT_DB_ALIAS]))
+
+
+def es_modelo_shard(modelo):
+    """Modelo (o instancia) de mi_finanzas que vive en el shard de su usuario."""
+    meta = modelo._meta
+    return meta.app_label == 'mi_finanzas' and meta.model_name not in MODELOS_GLOBALES
+
+
+# ========================================================
+# --- ASIGNACIÓN USUARIO -> ALIAS ---
+# ========================================================
+
+def alias_deterministico(usuario_id):
+    aliases = shards()
+    return aliases[usuario_id % len(aliases)]
+
+
+def _clave(usuario_id):
+    return f'mi_finanzas:shard:{usuario_id}'
+
+
+def _ubicar(usuario_id):
+    """Shard donde ya hay datos del usuario (p. ej. de antes de añadir shards) o el determinista."""
+    for alias in shards():
+        if Cuenta.objects.using(alias).filter(usuario_id=usuario_id).exists() or \
+                Categoria.objects.using(alias).filter(usuario_id=usuario_id).exists():
+            return alias
+    return alias_deterministico(usuario_id)
+
+
+def alias_para(usuario):
+    """Alias del shard de un usuario (instancia o id). Cacheado; se fija en la primera consulta."""
+    usuario_id = getattr(usuario, 'pk', usuario)
+    aliases = shards()
+    if len(aliases) == 1 or usuario_id is None:
+        return aliases[0]
+
+    alias = cache.get(_clave(usuario_id))
+    if alias is None:
+        asignacion = AsignacionShard.objects.filter(usuario_id=usuario_id).values_list('alias', flat=True).first()
+        if asignacion is None:
+            asignacion = AsignacionShard.objects.get_or_create(
+                usuario_id=usuario_id, defaults={'alias': _ubicar(usuario_id)}
+            )[0].alias
+        alias = asignacion
+        cache.set(_clave(usuario_id), alias, None)
+    return alias
+
+
+def olvidar_asignacion(usuario_id):
+    cache.delete(_clave(usuario_id))
+
+
+# ========================================================
+# --- SHARD ACTIVO ---
+# ========================================================
+
+def alias_actual():
+    return _alias_activo.get() or DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def en_shard(alias):
+    """Las consultas sin instancia de referencia (Modelo.objects...) van a 'alias'."""
+    token = _alias_activo.set(alias)
+    try:
+        yield alias
+    finally:
+        _alias_activo.reset(token)
+
+
+def atomico(funcion=None):
+    """
+    transaction.atomic(using=<shard activo>). El alias se resuelve al entrar,
+    no al decorar: se usa como @atomico o como 'with atomico():'.
+    """
+    if funcion is None:
+        return transaction.atomic(using=alias_actual())
+
+    @wraps(funcion)
+    def envoltura(*args, **kwargs):
+        with transaction.atomic(using=alias_actual()):
+            return funcion(*args, **kwargs)
+    return envoltura
+
+
+def shards_de(usuario=None):
+    """Alias a recorrer: el del usuario o, sin usuario, todos (fan-out)."""
+    return [alias_para(usuario)] if usuario is not None else shards()
+
+
+def en_cada_shard(funcion):
+    """Ejecuta funcion(alias) con cada shard activo. Devuelve {alias: resultado}."""
+    resultados = {}
+    for alias in shards():
+        with en_shard(alias):
+            resultados[alias] = funcion(alias)
+    return resultados
+
+
+# ========================================================
+# --- ROUTER Y MIDDLEWARE ---
+# ========================================================
+
+class RouterShards:
+    """DATABASE_ROUTERS = ['mi_finanzas.shards.RouterShards']"""
+
+    def _alias(self, model, **hints):
+        if not es_modelo_shard(model):
+            return DEFAULT_DB_ALIAS
+        instancia = hints.get('instance')
+        if instancia is not None:
+            if es_modelo_shard(instancia):
+                if instancia._state.db:
+                    return instancia._state.db
+                if getattr(instancia, 'usuario_id', None):
+                    return alias_para(instancia.usuario_id)
+            elif isinstance(instancia, User) and instancia.pk:
+                # user.cuenta_set.all() y similares
+                return alias_para(instancia.pk)
+        return alias_actual()
+
+    def db_for_read(self, model, **hints):
+        alias = self._alias(model, **hints)
+        # Solo los datos de usuario se leen de la réplica (ver mi_finanzas/replicas.py)
+        return replica_de(alias) if es_modelo_shard(model) else alias
+
+    def db_for_write(self, model, **hints):
+        # Una instancia leída de la réplica se guarda en su primaria
+        return primario_de(self._alias(model, **hints))
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if es_modelo_shard(obj1) and es_modelo_shard(obj2):
+            # Misma base primaria (una réplica cuenta como su primaria)
+            return primario_de(obj1._state.db) == primario_de(obj2._state.db)
+        if es_modelo_shard(obj1) or es_modelo_shard(obj2):
+            # Relación con el usuario (en 'default'): permitida, sin FK en la base
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if app_label == 'mi_finanzas':
+            if model_name in MODELOS_GLOBALES:
+                return db == DEFAULT_DB_ALIAS
+            return True
+        return db == DEFAULT_DB_ALIAS
+
+
+class ShardMiddleware:
+    """Activa el shard del usuario autenticado durante toda la petición (incluido el renderizado)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        usuario = getattr(request, 'user', None)
+        if usuario is None or not usuario.is_authenticated:
+            return self.get_response(request)
+        with en_shard(alias_para(usuario.pk)):
+            return self.get_response(request)
+
+
+def alias_admin(request):
+    """Shard elegido en el admin con ?shard=<alias> (se conserva en _changelist_filters)."""
+    alias = request.GET.get('shard') or QueryDict(request.GET.get('_changelist_filters', '')).get('shard')
+    return alias if alias in settings.DATABASES else DEFAULT_DB_ALIAS
+
+
+# ========================================================
+# --- MOVER Y BORRAR DATOS DE UN USUARIO ---
+# ========================================================
+
+def borrar_datos_usuario(usuario_id):
+    """Borra todos los datos del usuario en el shard activo (cuentas y categorías en cascada)."""
+    with atomico():
+        Cuenta.objects.filter(usuario_id=usuario_id).delete()
+        Categoria.objects.filter(usuario_id=usuario_id).delete()
+        # Después de los borrados: sus lápidas tampoco se quedan en este shard
+        CambioRegistrado.objects.filter(usuario_id=usuario_id).delete()
+        SecuenciaCambios.objects.filter(usuario_id=usuario_id).delete()
+
+
+class ErrorMoverUsuario(ValueError):
+    """El usuario no se puede mover de shard (p. ej. comparte cuentas en el suyo)."""
+
+
+def mover_usuario(usuario, destino):
+    """
+    Copia los datos del usuario a 'destino' (respaldo + restauración en bloque,
+    con claves nuevas), cambia la asignación y borra el origen. Debe hacerse
+    sin actividad del usuario. Devuelve el resumen de la restauración o None.
+
+    Los datos derivados (saldos mensuales y anomalías) se recalculan en el
+    destino. Un usuario con cuentas compartidas, propias o ajenas, no se mueve
+    (ErrorMoverUsuario): las cuentas cambian de id y los miembros deben estar
+    en el mismo shard que la cuenta (mi_finanzas/compartidas.py).
+    """
+    # Importación diferida: respaldo, anomalías y sincronizacion dependen de este módulo (atomico)
+    from .anomalias import detectar_anomalias
+    from .respaldo import respaldar, restaurar
+    from .sincronizacion import continuar_secuencia, ultima_secuencia
+
+    origen = alias_para(usuario)
+    if origen == destino:
+        return None
+    with en_shard(origen):
+        if MiembroCuenta.objects.filter(Q(cuenta__usuario_id=usuario.pk) | Q(usuario_id=usuario.pk)).exists():
+            raise ErrorMoverUsuario(
+                f"{usuario.username} comparte cuentas en '{origen}': deja de compartirlas antes de moverlo."
+            )
+    with tempfile.NamedTemporaryFile(suffix='.jsonl.gz') as temporal:
+        with en_shard(origen):
+            respaldar(temporal.name, usuario=usuario)
+            secuencia = ultima_secuencia(usuario.pk)
+        with en_shard(destino):
+            resumen = restaurar(temporal.name, usuario_destino=usuario, reemplazar=True)
+            # Ids nuevos: los clientes sin conexión del usuario descargan todo de nuevo
+            continuar_secuencia(usuario.pk, secuencia)
+
+    AsignacionShard.objects.update_or_create(usuario=usuario, defaults={'alias': destino})
+    olvidar_asignacion(usuario.pk)
+    detectar_anomalias(usuario.pk)
+    with en_shard(origen):
+        borrar_datos_usuario(usuario.pk)
+    return resumen
+
+
+@receiver(pre_delete, sender=User)
+def _borrar_en_su_shard(sender, instance, using, **kwargs):
+    """
+    El borrado en cascada de Django solo alcanza la base del usuario ('default').
+    Se limpian todos los demás shards (sin fijar una asignación nueva).
+    """
+    if len(shards()) == 1:
+        return
+    for alias in shards():
+        if alias != using:
+            with en_shard(alias):
+                borrar_datos_usuario(instance.pk)
+    olvidar_asignacion(instance.pk)
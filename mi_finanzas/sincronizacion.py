@@ -0,0 +1,388 @@
+"""
+Sincronización incremental para clientes sin conexión (app móvil): en vez de
+volver a descargar cuentas y transacciones enteras, el cliente pide los
+cambios posteriores a su cursor (GET sincronizar/cambios/?desde=<cursor>).
+
+- Cada usuario tiene una secuencia de cambios creciente (SecuenciaCambios).
+  Triggers de la propia base sobre cuentas, categorías, transacciones,
+  presupuestos y recurrentes apuntan cada alta, modificación o borrado en
+  CambioRegistrado con el siguiente número, así que no se escapa ninguna
+  ruta de escritura: save()/delete(), bulk_create y update() (transferencias,
+  saldos, divisiones...), borrados en cascada, archivo y restauraciones.
+- Un lote son las entradas siguientes al cursor, reducidas a la última de
+  cada fila: las filas vivas van como listas de valores (con los nombres de
+  columna una vez por modelo) y las borradas como lápidas (solo el id).
+- La compactación ('manage.py compactar_cambios') quita las entradas
+  superadas por otra más reciente de la misma fila y las lápidas antiguas.
+  Quitar lápidas sube el horizonte del usuario: un cursor anterior podría
+  haberse perdido un borrado y el lote pide al cliente que empiece de cero
+  ('reiniciar').
+- El cursor es '<secuencia>.<horizonte>' (el horizonte vigente cuando se
+  emitió): una descarga desde cero iniciada tras la compactación avanza por
+  debajo del horizonte sin volver a reiniciarse.
+
+Los triggers los crea la migración 0017 (con una copia fija de este SQL) en
+cada base SQLite, con una entrada inicial por fila existente.
+
+Cuentas compartidas (mi_finanzas/compartidas.py): la fila es del propietario
+y va en su secuencia, pero los triggers de la migración 0019
+(instalar_registro_miembros) apuntan también la cuenta, sus transacciones y
+sus recurrentes en la secuencia de cada miembro. Al darle acceso recibe la
+cuenta entera y al quitárselo, sus lápidas. Las categorías y presupuestos
+del propietario no viajan: un 'categoria_id' de una transacción compartida
+puede no estar entre las categorías del miembro.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db.models import Exists, Max, OuterRef
+from django.utils import timezone
+
+from .compartidas import cuentas_visibles
+from .models import (
+    CambioRegistrado, Categoria, Cuenta, MiembroCuenta, Presupuesto, SecuenciaCambios, Transaccion, TransaccionRecurrente,
+)
+from .shards import atomico
+
+LOTE = 500
+MAXIMO_LOTE = 5000
+# Las lápidas se guardan al menos estos días antes de compactarlas
+DIAS_LAPIDAS = 30
+
+MODELOS = {modelo._meta.model_name: modelo for modelo in (
+    Cuenta, Categoria, Transaccion, Presupuesto, TransaccionRecurrente,
+)}
+# Modelos que llegan a los miembros de una cuenta compartida -> columna con la cuenta
+MODELOS_CUENTA = {'cuenta': 'id', 'transaccion': 'cuenta_id', 'transaccionrecurrente': 'cuenta_id'}
+# Columnas que no viajan: el usuario es el propietario (el propio salvo en cuentas compartidas)
+# y la huella es interna (duplicados)
+_OMITIDAS = {'usuario_id', 'huella'}
+
+_TABLA_CAMBIOS = CambioRegistrado._meta.db_table
+_TABLA_SECUENCIAS = SecuenciaCambios._meta.db_table
+_TABLA_MIEMBROS = MiembroCuenta._meta.db_table
+
+
+def _registrar(fila, modelo, borrado):
+    """Cuerpo de trigger: siguiente número de la secuencia del usuario de 'fila' (new/old) y su entrada."""
+    return f"""
+        INSERT INTO {_TABLA_SECUENCIAS} (usuario_id, ultima, horizonte) VALUES ({fila}.usuario_id, 1, 0)
+            ON CONFLICT (usuario_id) DO UPDATE SET ultima = ultima + 1;
+        INSERT INTO {_TABLA_CAMBIOS} (usuario_id, secuencia, modelo, objeto_id, borrado, fecha)
+            SELECT {fila}.usuario_id, ultima, '{modelo}', {fila}.id, {int(borrado)},
+                   strftime('%Y-%m-%d %H:%M:%f', 'now')
+            FROM {_TABLA_SECUENCIAS} WHERE usuario_id = {fila}.usuario_id;
+    """
+
+
+def _triggers(nombre, tabla):
+    prefijo = f'mi_finanzas_cambios_{nombre}'
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {prefijo}_ai AFTER INSERT ON {tabla} BEGIN {_registrar('new', nombre, False)} END",
+        f"CREATE TRIGGER IF NOT EXISTS {prefijo}_au AFTER UPDATE ON {tabla} BEGIN {_registrar('new', nombre, False)} END",
+        # Si la fila cambia de usuario, para el anterior es un borrado
+        f"""CREATE TRIGGER IF NOT EXISTS {prefijo}_au_usuario AFTER UPDATE OF usuario_id ON {tabla}
+            WHEN old.usuario_id IS NOT new.usuario_id
+        BEGIN {_registrar('old', nombre, True)} END""",
+        f"CREATE TRIGGER IF NOT EXISTS {prefijo}_ad AFTER DELETE ON {tabla} BEGIN {_registrar('old', nombre, True)} END",
+    ]
+
+
+SQL_INSTALAR = [sql for nombre, modelo in MODELOS.items() for sql in _triggers(nombre, modelo._meta.db_table)]
+
+SQL_DESINSTALAR = [
+    f'DROP TRIGGER IF EXISTS mi_finanzas_cambios_{nombre}_{sufijo}'
+    for nombre in MODELOS for sufijo in ('ai', 'au', 'au_usuario', 'ad')
+]
+
+# Una entrada por fila existente, numerada por usuario (categorías y cuentas antes que transacciones)
+SQL_CARGAR = [
+    f"""
+    WITH filas(usuario_id, modelo, objeto_id) AS (
+        {' UNION ALL '.join(f"SELECT usuario_id, '{nombre}', id FROM {modelo._meta.db_table}"
+                            for nombre, modelo in MODELOS.items())}
+    )
+    INSERT INTO {_TABLA_CAMBIOS} (usuario_id, secuencia, modelo, objeto_id, borrado, fecha)
+    SELECT usuario_id, ROW_NUMBER() OVER (PARTITION BY usuario_id ORDER BY modelo, objeto_id),
+           modelo, objeto_id, 0, strftime('%Y-%m-%d %H:%M:%f', 'now')
+    FROM filas
+    """,
+    f"""
+    INSERT INTO {_TABLA_SECUENCIAS} (usuario_id, ultima, horizonte)
+    SELECT usuario_id, MAX(secuencia), 0 FROM {_TABLA_CAMBIOS} GROUP BY usuario_id
+    """,
+]
+
+
+# ========================================================
+# --- MIEMBROS DE CUENTAS COMPARTIDAS ---
+# ========================================================
+
+_AHORA = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+
+def _registrar_miembros(fila, columna, modelo, borrado, excepto=None):
+    """Cuerpo de trigger: una entrada de 'fila' en la secuencia de cada miembro de su cuenta ('excepto' los de otra)."""
+    miembros = f"cuenta_id = {fila}.{columna}"
+    if excepto:
+        miembros += f" AND usuario_id NOT IN (SELECT usuario_id FROM {_TABLA_MIEMBROS} WHERE cuenta_id = {excepto})"
+    return f"""
+        INSERT INTO {_TABLA_SECUENCIAS} (usuario_id, ultima, horizonte)
+            SELECT usuario_id, 1, 0 FROM {_TABLA_MIEMBROS} WHERE {miembros}
+            ON CONFLICT (usuario_id) DO UPDATE SET ultima = ultima + 1;
+        INSERT INTO {_TABLA_CAMBIOS} (usuario_id, secuencia, modelo, objeto_id, borrado, fecha)
+            SELECT m.usuario_id, s.ultima, '{modelo}', {fila}.id, {int(borrado)}, {_AHORA}
+            FROM (SELECT usuario_id FROM {_TABLA_MIEMBROS} WHERE {miembros}) AS m
+            JOIN {_TABLA_SECUENCIAS} AS s ON s.usuario_id = m.usuario_id;
+    """
+
+
+def _filas_cuenta(cuenta):
+    """SELECT (modelo, objeto_id) de la cuenta 'cuenta' (expresión SQL) y de todo lo que cuelga de ella."""
+    return ' UNION ALL '.join(
+        f"SELECT '{nombre}' AS modelo, id AS objeto_id FROM {MODELOS[nombre]._meta.db_table} WHERE {columna} = {cuenta}"
+        for nombre, columna in MODELOS_CUENTA.items()
+    )
+
+
+def _registrar_cuenta(miembro, borrado):
+    """Cuerpo de trigger: la cuenta entera (viva o en lápidas) en la secuencia del miembro 'miembro' (new/old)."""
+    return f"""
+        INSERT INTO {_TABLA_SECUENCIAS} (usuario_id, ultima, horizonte) VALUES ({miembro}.usuario_id, 0, 0)
+            ON CONFLICT (usuario_id) DO NOTHING;
+        INSERT INTO {_TABLA_CAMBIOS} (usuario_id, secuencia, modelo, objeto_id, borrado, fecha)
+            SELECT {miembro}.usuario_id, s.ultima + ROW_NUMBER() OVER (ORDER BY f.modelo, f.objeto_id),
+                   f.modelo, f.objeto_id, {int(borrado)}, {_AHORA}
+            FROM ({_filas_cuenta(f'{miembro}.cuenta_id')}) AS f
+            JOIN {_TABLA_SECUENCIAS} AS s ON s.usuario_id = {miembro}.usuario_id;
+        UPDATE {_TABLA_SECUENCIAS}
+            SET ultima = (SELECT MAX(secuencia) FROM {_TABLA_CAMBIOS} WHERE usuario_id = {miembro}.usuario_id)
+            WHERE usuario_id = {miembro}.usuario_id;
+    """
+
+
+def _triggers_miembros(nombre, columna):
+    prefijo = f'mi_finanzas_cambios_miembros_{nombre}'
+    tabla = MODELOS[nombre]._meta.db_table
+    triggers = [
+        f"CREATE TRIGGER IF NOT EXISTS {prefijo}_ai AFTER INSERT ON {tabla} BEGIN {_registrar_miembros('new', columna, nombre, False)} END",
+        f"CREATE TRIGGER IF NOT EXISTS {prefijo}_au AFTER UPDATE ON {tabla} BEGIN {_registrar_miembros('new', columna, nombre, False)} END",
+        f"CREATE TRIGGER IF NOT EXISTS {prefijo}_ad AFTER DELETE ON {tabla} BEGIN {_registrar_miembros('old', columna, nombre, True)} END",
+    ]
+    if columna != 'id':
+        # Si la fila pasa a otra cuenta, para los miembros que solo tenían la anterior es un borrado
+        triggers.append(f"""CREATE TRIGGER IF NOT EXISTS {prefijo}_au_cuenta AFTER UPDATE OF {columna} ON {tabla}
+            WHEN old.{columna} IS NOT new.{columna}
+        BEGIN {_registrar_miembros('old', columna, nombre, True, excepto=f'new.{columna}')} END""")
+    return triggers
+
+
+_PREFIJO_ACCESO = 'mi_finanzas_cambios_acceso'
+
+SQL_INSTALAR_MIEMBROS = [
+    sql for nombre, columna in MODELOS_CUENTA.items() for sql in _triggers_miembros(nombre, columna)
+] + [
+    # Al darle acceso, el miembro recibe la cuenta entera; al quitárselo, sus lápidas
+    f"CREATE TRIGGER IF NOT EXISTS {_PREFIJO_ACCESO}_ai AFTER INSERT ON {_TABLA_MIEMBROS} BEGIN {_registrar_cuenta('new', False)} END",
+    f"CREATE TRIGGER IF NOT EXISTS {_PREFIJO_ACCESO}_ad AFTER DELETE ON {_TABLA_MIEMBROS} BEGIN {_registrar_cuenta('old', True)} END",
+    f"""CREATE TRIGGER IF NOT EXISTS {_PREFIJO_ACCESO}_au AFTER UPDATE OF cuenta_id, usuario_id ON {_TABLA_MIEMBROS}
+        WHEN old.cuenta_id IS NOT new.cuenta_id OR old.usuario_id IS NOT new.usuario_id
+    BEGIN {_registrar_cuenta('old', True)} {_registrar_cuenta('new', False)} END""",
+]
+
+SQL_DESINSTALAR_MIEMBROS = [
+    f'DROP TRIGGER IF EXISTS mi_finanzas_cambios_miembros_{nombre}_{sufijo}'
+    for nombre in MODELOS_CUENTA for sufijo in ('ai', 'au', 'ad', 'au_cuenta')
+] + [f'DROP TRIGGER IF EXISTS {_PREFIJO_ACCESO}_{sufijo}' for sufijo in ('ai', 'ad', 'au')]
+
+# Una entrada por fila de cada cuenta ya compartida, a continuación de la secuencia de cada miembro
+SQL_CARGAR_MIEMBROS = [
+    f"""
+    WITH filas(usuario_id, modelo, objeto_id) AS (
+        {' UNION ALL '.join(
+            f"SELECT m.usuario_id, '{nombre}', f.id FROM {_TABLA_MIEMBROS} AS m "
+            f"JOIN {MODELOS[nombre]._meta.db_table} AS f ON f.{columna} = m.cuenta_id"
+            for nombre, columna in MODELOS_CUENTA.items())}
+    )
+    INSERT INTO {_TABLA_CAMBIOS} (usuario_id, secuencia, modelo, objeto_id, borrado, fecha)
+    SELECT f.usuario_id,
+           COALESCE(s.ultima, 0) + ROW_NUMBER() OVER (PARTITION BY f.usuario_id ORDER BY f.modelo, f.objeto_id),
+           f.modelo, f.objeto_id, 0, {_AHORA}
+    FROM filas AS f LEFT JOIN {_TABLA_SECUENCIAS} AS s ON s.usuario_id = f.usuario_id
+    """,
+    f"""
+    INSERT INTO {_TABLA_SECUENCIAS} (usuario_id, ultima, horizonte)
+    SELECT usuario_id, MAX(secuencia), 0 FROM {_TABLA_CAMBIOS} WHERE true GROUP BY usuario_id
+    ON CONFLICT (usuario_id) DO UPDATE SET ultima = MAX(ultima, excluded.ultima)
+    """,
+]
+
+
+def instalar_registro(conexion, cargar=False):
+    """Crea los triggers (solo SQLite) y, con 'cargar', la entrada inicial de cada fila. Devuelve si se instaló."""
+    if conexion.vendor != 'sqlite':
+        return False
+    with conexion.cursor() as cursor:
+        for sql in SQL_INSTALAR:
+            cursor.execute(sql)
+        if cargar:
+            for sql in SQL_CARGAR:
+                cursor.execute(sql)
+    return True
+
+
+def desinstalar_registro(conexion):
+    if conexion.vendor != 'sqlite':
+        return
+    with conexion.cursor() as cursor:
+        for sql in SQL_DESINSTALAR:
+            cursor.execute(sql)
+
+
+def instalar_registro_miembros(conexion, cargar=False):
+    """Triggers de los miembros de cuentas compartidas (solo SQLite) y, con 'cargar', las cuentas ya compartidas."""
+    if conexion.vendor != 'sqlite':
+        return False
+    with conexion.cursor() as cursor:
+        for sql in SQL_INSTALAR_MIEMBROS:
+            cursor.execute(sql)
+        if cargar:
+            for sql in SQL_CARGAR_MIEMBROS:
+                cursor.execute(sql)
+    return True
+
+
+def desinstalar_registro_miembros(conexion):
+    if conexion.vendor != 'sqlite':
+        return
+    with conexion.cursor() as cursor:
+        for sql in SQL_DESINSTALAR_MIEMBROS:
+            cursor.execute(sql)
+
+
+# ========================================================
+# --- LOTES DE CAMBIOS ---
+# ========================================================
+
+def clave_cursor(secuencia, horizonte):
+    return f'{secuencia}.{horizonte}'
+
+
+def leer_cursor_cambios(valor):
+    """'<secuencia>.<horizonte>' -> (secuencia, horizonte), o None si falta o no es válido (desde cero)."""
+    try:
+        secuencia, horizonte = (int(parte) for parte in valor.split('.'))
+    except (AttributeError, ValueError):
+        return None
+    return (secuencia, horizonte) if secuencia >= 0 and horizonte >= 0 else None
+
+
+def _columnas(nombre):
+    return [campo.attname for campo in MODELOS[nombre]._meta.concrete_fields if campo.attname not in _OMITIDAS]
+
+
+def _visibles(nombre, usuario):
+    """Filas del modelo que el usuario recibe: las propias y, si cuelgan de una cuenta, las de sus cuentas compartidas."""
+    if nombre in MODELOS_CUENTA:
+        return MODELOS[nombre].objects.filter(**{f'{MODELOS_CUENTA[nombre]}__in': cuentas_visibles(usuario)})
+    return MODELOS[nombre].objects.filter(usuario=usuario)
+
+
+def cambios_desde(usuario, desde=None, limite=LOTE):
+    """
+    Siguiente lote de cambios del usuario tras el cursor 'desde' (leer_cursor_cambios;
+    None = desde cero). Devuelve {'cursor', 'mas', 'reiniciar', 'columnas',
+    'filas', 'borrados'}:
+
+    - columnas: por modelo, los nombres de columna de sus filas;
+    - filas: por modelo, las filas vivas cambiadas (listas de valores);
+    - borrados: por modelo, los ids borrados;
+    - reiniciar: el cursor es anterior a una compactación; el cliente debe
+      vaciar sus datos y aplicar este lote, que empieza desde cero;
+    - mas: quedan cambios; se pide el siguiente lote con 'cursor'.
+    """
+    limite = max(1, min(int(limite), MAXIMO_LOTE))
+    horizonte = SecuenciaCambios.objects.filter(usuario=usuario).values_list('horizonte', flat=True).first() or 0
+    secuencia, horizonte_cursor = desde or (0, horizonte)
+    # Solo si hubo compactación después de emitir el cursor y le afecta
+    reiniciar = 0 < secuencia < horizonte and horizonte_cursor < horizonte
+    if reiniciar or secuencia == 0:
+        secuencia, horizonte_cursor = 0, horizonte
+
+    entradas = list(CambioRegistrado.objects.filter(usuario=usuario, secuencia__gt=secuencia).order_by(
+        'secuencia').values_list('secuencia', 'modelo', 'objeto_id', 'borrado')[:limite + 1])
+    mas = len(entradas) > limite
+    entradas = entradas[:limite]
+
+    # La última entrada de cada fila decide: viva o lápida
+    ultima = {}
+    for _, nombre, objeto_id, borrado in entradas:
+        ultima[(nombre, objeto_id)] = borrado
+    vivas, borrados = defaultdict(list), defaultdict(list)
+    for (nombre, objeto_id), borrado in ultima.items():
+        (borrados if borrado else vivas)[nombre].append(objeto_id)
+
+    columnas, filas = {}, {}
+    for nombre, ids in vivas.items():
+        columnas[nombre] = _columnas(nombre)
+        # Una fila que ya no existe tiene su lápida en un lote posterior
+        filas[nombre] = list(_visibles(nombre, usuario).filter(pk__in=ids).order_by('pk')
+                             .values_list(*columnas[nombre]))
+
+    if entradas:
+        secuencia = entradas[-1][0]
+    return {
+        'cursor': clave_cursor(secuencia, horizonte_cursor),
+        'mas': mas,
+        'reiniciar': reiniciar,
+        'columnas': columnas,
+        'filas': filas,
+        'borrados': {nombre: sorted(ids) for nombre, ids in borrados.items()},
+    }
+
+
+# ========================================================
+# --- COMPACTACIÓN ---
+# ========================================================
+
+@atomico
+def compactar_cambios(usuario=None, dias=DIAS_LAPIDAS):
+    """
+    Compacta el registro del shard activo (de un usuario o de todos):
+    quita las entradas superadas por otra posterior de la misma fila y las
+    lápidas de más de 'dias' días, subiendo el horizonte de sus usuarios.
+    Devuelve (superadas, lapidas) quitadas.
+    """
+    cambios = CambioRegistrado.objects.all()
+    if usuario is not None:
+        cambios = cambios.filter(usuario=usuario)
+
+    # 1. Entradas superadas: el cliente que las necesite recibe la más reciente
+    superadas, _ = cambios.filter(Exists(CambioRegistrado.objects.filter(
+        usuario_id=OuterRef('usuario_id'), modelo=OuterRef('modelo'), objeto_id=OuterRef('objeto_id'),
+        secuencia__gt=OuterRef('secuencia'),
+    ))).delete()
+
+    # 2. Lápidas antiguas: quien no las haya leído tendrá que empezar de cero
+    lapidas = cambios.filter(borrado=True, fecha__lt=timezone.now() - timedelta(days=dias))
+    horizontes = dict(lapidas.values('usuario_id').annotate(hasta=Max('secuencia')).values_list('usuario_id', 'hasta'))
+    for usuario_id, hasta in horizontes.items():
+        SecuenciaCambios.objects.filter(usuario_id=usuario_id, horizonte__lt=hasta).update(horizonte=hasta)
+    quitadas, _ = lapidas.delete()
+    return superadas, quitadas
+
+
+def continuar_secuencia(usuario_id, desde):
+    """
+    Tras mover al usuario a otro shard (ids nuevos, secuencia de otra base):
+    la secuencia del shard activo sigue por encima de 'desde' y todo cursor
+    anterior queda bajo el horizonte, así que sus clientes empiezan de cero.
+    """
+    secuencia, _ = SecuenciaCambios.objects.get_or_create(usuario_id=usuario_id)
+    secuencia.ultima = max(secuencia.ultima, desde) + 1
+    secuencia.horizonte = secuencia.ultima
+    secuencia.save(update_fields=['ultima', 'horizonte'])
+
+
+def ultima_secuencia(usuario_id):
+    return SecuenciaCambios.objects.filter(usuario_id=usuario_id).values_list('ultima', flat=True).first() or 0
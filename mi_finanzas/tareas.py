@@ -0,0 +1,201 @@
+"""
+Cola de tareas en segundo plano sobre la propia base de datos (sin broker externo).
+
+- @registrar_tarea('nombre') declara la función que ejecuta una tarea.
+- encolar('nombre', usuario=..., **parametros) crea la fila PENDIENTE.
+- reclamar_tarea() la toma de forma atómica (UPDATE condicionado al estado),
+  por lo que dos trabajadores nunca ejecutan la misma tarea.
+- ejecutar_tarea() la corre y, si falla, la reprograma con espera exponencial.
+- El trabajador renueva el latido de sus tareas en curso (latir()) desde un
+  hilo propio, aunque la tarea no informe de su progreso, y reencola
+  periódicamente las tareas de trabajadores caídos (recuperar_tareas_colgadas()).
+
+Los trabajadores se arrancan con 'python manage.py trabajador_tareas'. Los
+comandos archivar, exportar_columnar, respaldar y restaurar encolan su tarea
+con --en-segundo-plano (el estado se consulta en tareas/<id>/estado/).
+"""
+import logging
+import traceback
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from .anomalias import detectar_anomalias
+from .archivo import archivar_transacciones, restaurar_archivo
+from .duplicados import escanear_duplicados
+from .exportar import exportar_columnar
+from .respaldo import respaldar, restaurar
+from .models import Tarea
+from .replicas import en_replica
+from .shards import alias_actual, alias_para, en_shard, shards_de
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+_REGISTRO = {}
+
+
+def registrar_tarea(nombre):
+    """Decorador: la función recibe (tarea, **parametros) y devuelve un resultado serializable a JSON."""
+    def decorador(funcion):
+        _REGISTRO[nombre] = funcion
+        return funcion
+    return decorador
+
+
+def tareas_registradas():
+    return sorted(_REGISTRO)
+
+
+# ========================================================
+# --- ENCOLAR / RECLAMAR / EJECUTAR ---
+# ========================================================
+
+def encolar(nombre, usuario=None, max_intentos=3, **parametros):
+    """Crea una tarea PENDIENTE. Los parámetros deben ser serializables a JSON."""
+    if nombre not in _REGISTRO:
+        raise ValueError(f"Tarea desconocida: {nombre}")
+    return Tarea.objects.create(
+        nombre=nombre, usuario=usuario, parametros=parametros, max_intentos=max_intentos
+    )
+
+
+def reclamar_tarea(trabajador, candidatas=5):
+    """
+    Toma la siguiente tarea disponible. El reclamo es un UPDATE condicionado
+    a estado=PENDIENTE: si otro trabajador se adelanta, afecta 0 filas y se
+    prueba con la siguiente candidata. Devuelve la Tarea o None.
+    """
+    ahora = timezone.now()
+    ids = list(
+        Tarea.objects.filter(estado='PENDIENTE', disponible_desde__lte=ahora)
+        .order_by('disponible_desde', 'pk').values_list('pk', flat=True)[:candidatas]
+    )
+    for pk in ids:
+        reclamada = Tarea.objects.filter(pk=pk, estado='PENDIENTE').update(
+            estado='EN_CURSO', trabajador=trabajador, fecha_inicio=ahora, latido=ahora,
+        )
+        if reclamada:
+            return Tarea.objects.get(pk=pk)
+    return None
+
+
+def espera_reintento(intentos):
+    """Espera exponencial: base, 2·base, 4·base... con tope."""
+    base = getattr(settings, 'MI_FINANZAS_TAREAS_ESPERA_BASE', 30)
+    tope = getattr(settings, 'MI_FINANZAS_TAREAS_ESPERA_MAXIMA', 3600)
+    return timedelta(seconds=min(base * 2 ** max(intentos - 1, 0), tope))
+
+
+def ejecutar_tarea(tarea):
+    """Ejecuta una tarea ya reclamada y registra el resultado o el fallo."""
+    funcion = _REGISTRO.get(tarea.nombre)
+    try:
+        if funcion is None:
+            raise LookupError(f"No hay ninguna función registrada para '{tarea.nombre}'.")
+        # Las tareas de un usuario se ejecutan sobre su shard
+        with en_shard(alias_para(tarea.usuario_id) if tarea.usuario_id else alias_actual()):
+            resultado = funcion(tarea, **tarea.parametros)
+    except Exception:
+        intentos = tarea.intentos + 1
+        error = traceback.format_exc()
+        logger.warning("Tarea %s #%s falló (intento %s)", tarea.nombre, tarea.pk, intentos)
+        cambios = {'intentos': intentos, 'error': error, 'trabajador': ''}
+        if funcion is not None and intentos < tarea.max_intentos:
+            cambios.update(estado='PENDIENTE', disponible_desde=timezone.now() + espera_reintento(intentos))
+        else:
+            cambios.update(estado='FALLIDA', fecha_fin=timezone.now())
+        Tarea.objects.filter(pk=tarea.pk).update(**cambios)
+        return False
+
+    Tarea.objects.filter(pk=tarea.pk).update(
+        estado='COMPLETADA', progreso=100, resultado=resultado, error='', fecha_fin=timezone.now(),
+    )
+    return True
+
+
+def latir(trabajador):
+    """Renueva el latido de las tareas EN_CURSO de 'trabajador'. Devuelve cuántas."""
+    return Tarea.objects.filter(estado='EN_CURSO', trabajador=trabajador).update(latido=timezone.now())
+
+
+def recuperar_tareas_colgadas(limite_segundos=None):
+    """Devuelve a PENDIENTE las tareas EN_CURSO cuyo trabajador dejó de dar latidos."""
+    limite_segundos = limite_segundos or getattr(settings, 'MI_FINANZAS_TAREAS_TIEMPO_LIMITE', 900)
+    limite = timezone.now() - timedelta(seconds=limite_segundos)
+    return Tarea.objects.filter(estado='EN_CURSO', latido__lt=limite).update(
+        estado='PENDIENTE', trabajador='', disponible_desde=timezone.now(),
+    )
+
+
+# ========================================================
+# --- TAREAS REGISTRADAS ---
+# ========================================================
+
+def _usuario(usuario_id):
+    return User.objects.get(pk=usuario_id) if usuario_id else None
+
+
+def _fecha(valor):
+    return date.fromisoformat(valor) if valor else None
+
+
+@registrar_tarea('archivar')
+def _tarea_archivar(tarea, fecha_corte=None, usuario_id=None):
+    # El shard del usuario o, sin usuario, todos los shards
+    usuario, movidas = _usuario(usuario_id), 0
+    for alias in shards_de(usuario):
+        with en_shard(alias):
+            movidas += archivar_transacciones(fecha_corte=_fecha(fecha_corte), usuario=usuario)
+    return {'archivadas': movidas}
+
+
+@registrar_tarea('restaurar_archivo')
+def _tarea_restaurar_archivo(tarea, desde=None, usuario_id=None):
+    usuario, restauradas = _usuario(usuario_id), 0
+    for alias in shards_de(usuario):
+        with en_shard(alias):
+            restauradas += restaurar_archivo(usuario=usuario, desde=_fecha(desde))
+    return {'restauradas': restauradas}
+
+
+@registrar_tarea('buscar_duplicados')
+def _tarea_buscar_duplicados(tarea, usuario_id=None):
+    # El shard del usuario o, sin usuario, todos los shards; los ids son de cada shard
+    usuario, grupos = _usuario(usuario_id), {}
+    for alias in shards_de(usuario):
+        with en_shard(alias):
+            grupos[alias] = list(escanear_duplicados(usuario=usuario))
+    return {'grupos': grupos}
+
+
+@registrar_tarea('exportar_columnar')
+def _tarea_exportar_columnar(tarea, destino, formato='parquet', usuario_id=None, particionar=False,
+                             incluir_archivo=False, shard=None):
+    # Solo lectura: se lee de la réplica si la hay ('shard': el elegido sin usuario)
+    with en_shard(shard or alias_actual()), en_replica():
+        return exportar_columnar(
+            destino, formato=formato, usuario=_usuario(usuario_id), particionar=particionar,
+            incluir_archivo=incluir_archivo, progreso=tarea.actualizar_progreso,
+        )
+
+
+@registrar_tarea('respaldar')
+def _tarea_respaldar(tarea, salida, usuario_id=None, shard=None):
+    with en_shard(shard or alias_actual()), en_replica():
+        return respaldar(salida, usuario=_usuario(usuario_id))
+
+
+@registrar_tarea('restaurar')
+def _tarea_restaurar(tarea, entrada, usuario_id=None, reemplazar=False, shard=None):
+    with en_shard(shard or alias_actual()):
+        return restaurar(entrada, usuario_destino=_usuario(usuario_id), reemplazar=reemplazar)
+
+
+@registrar_tarea('detectar_anomalias')
+def _tarea_detectar_anomalias(tarea, usuario_id=None):
+    usuario_id = usuario_id or tarea.usuario_id
+    return {'anomalias': detectar_anomalias(usuario_id)}
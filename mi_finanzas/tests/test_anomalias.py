@@ -0,0 +1,92 @@
+# mi_finanzas/tests/test_anomalias.py
+
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from mi_finanzas import anomalias as modulo_anomalias
+from mi_finanzas.anomalias import calcular_anomalias, detectar_anomalias
+from mi_finanzas.archivo import archivar_transacciones
+from mi_finanzas.divisiones import dividir_transaccion
+from mi_finanzas.models import AnomaliaGasto, Categoria, Cuenta, Transaccion
+
+User = get_user_model()
+
+
+class AnomaliasTestCase(TestCase):
+    """Gasto mensual por categoría frente a su mediana y MAD móviles."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='anomuser', password='x')
+        self.cuenta = Cuenta.objects.create(usuario=self.user, nombre='Banco', tipo='CHEQUES', saldo=Decimal('5000.00'))
+        self.luz = Categoria.objects.create(usuario=self.user, nombre='Luz', tipo='EGRESO')
+        self.comida = Categoria.objects.create(usuario=self.user, nombre='Comida', tipo='EGRESO')
+        self.hoy = date.today().replace(day=15)
+        self.mes = self.hoy.year * 12 + self.hoy.month - 1
+
+    def _fecha(self, meses_atras):
+        indice = self.mes - meses_atras
+        return date(indice // 12, indice % 12 + 1, 10)
+
+    def _gasto(self, categoria, monto, meses_atras):
+        return Transaccion.objects.create(usuario=self.user, cuenta=self.cuenta, categoria=categoria, tipo='EGRESO',
+                                          monto=Decimal(monto), fecha=self._fecha(meses_atras), descripcion='Gasto')
+
+    def _historial(self):
+        """Luz: 100 (±5) durante 8 meses y 300 el mes en curso. Comida: variable y sin sobresaltos."""
+        for meses_atras, luz, comida in zip(range(8, 0, -1), (100, 95, 104, 100, 98, 105, 100, 101),
+                                            (400, 520, 380, 450, 610, 470, 500, 430)):
+            self._gasto(self.luz, luz, meses_atras)
+            self._gasto(self.comida, comida, meses_atras)
+        self._gasto(self.luz, '300.00', 0)
+        self._gasto(self.comida, '560.00', 0)
+
+    def test_factura_triple_se_senala(self):
+        movimientos = [(self.mes - m, self.luz.pk, -10000) for m in range(1, 7)] + [(self.mes, self.luz.pk, -30000)]
+        anomalia, = calcular_anomalias(movimientos, {self.luz.pk}, self.mes)
+
+        self.assertEqual((anomalia['mes'], anomalia['gasto'], anomalia['mediana']), (self.mes, 30000, 10000))
+        # Un poco por encima de lo normal no es una anomalía
+        movimientos[-1] = (self.mes, self.luz.pk, -10500)
+        self.assertEqual(calcular_anomalias(movimientos, {self.luz.pk}, self.mes), [])
+        # Sin historial suficiente no se juzga
+        recientes = movimientos[:2] + [(self.mes, self.luz.pk, -30000)]
+        self.assertEqual(calcular_anomalias(recientes, {self.luz.pk}, self.mes), [])
+
+    def test_detectar_guarda_y_el_panel_muestra(self):
+        self._historial()
+        self.assertEqual(detectar_anomalias(self.user.pk, hoy=self.hoy), 1)
+
+        anomalia = AnomaliaGasto.objects.get(usuario=self.user)
+        self.assertEqual((anomalia.categoria, anomalia.gasto, anomalia.mediana), (self.luz, Decimal('300'), Decimal('100')))
+        self.client.force_login(self.user)
+        with mock.patch.object(modulo_anomalias, 'calcular_anomalias') as calcular:
+            respuesta = self.client.get(reverse('mi_finanzas:resumen_financiero'))
+        calcular.assert_not_called()
+        self.assertEqual(list(respuesta.context['anomalias']), [anomalia])
+        self.assertContains(respuesta, '3.0× lo normal')
+
+    def test_divisiones_y_archivo(self):
+        self._historial()
+        # Parte de la compra de este mes era de luz: ya no es anómala la comida, pero la luz sí
+        compra = self._gasto(self.comida, '200.00', 0)
+        dividir_transaccion(compra, [(self.comida, Decimal('20.00')), (self.luz, Decimal('180.00'))])
+        archivar_transacciones(fecha_corte=self._fecha(4).replace(day=1), usuario=self.user)
+
+        detectar_anomalias(self.user.pk, hoy=self.hoy)
+        anomalia = AnomaliaGasto.objects.get(usuario=self.user)
+        self.assertEqual((anomalia.categoria, anomalia.gasto, anomalia.mediana), (self.luz, Decimal('480'), Decimal('100')))
+
+    def test_comando(self):
+        self._historial()
+        salida = StringIO()
+        call_command('detectar_anomalias', procesos=1, stdout=salida)
+
+        self.assertIn('1 anomalías en 1 usuarios', salida.getvalue())
+        self.assertEqual(AnomaliaGasto.objects.filter(usuario=self.user).count(), 1)
@@ -0,0 +1,90 @@
+# mi_finanzas/tests/test_archivo.py
+
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db.models import Sum
+from django.test import TestCase
+
+from mi_finanzas.archivo import archivar_transacciones, resumenes_desde, restaurar_archivo
+from mi_finanzas.duplicados import huellas_existentes
+from mi_finanzas.models import (
+    Categoria, Cuenta, ResumenMensualArchivado, SaldoApertura, Transaccion, TransaccionArchivada,
+    monto_firmado,
+)
+
+User = get_user_model()
+
+
+class ArchivoTestCase(TestCase):
+    """Archivo en frío: mover, resumir, conciliar y restaurar."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='archiuser', password='x')
+        self.cuenta = Cuenta.objects.create(usuario=self.user, nombre='Banco', tipo='CHEQUES', saldo=Decimal('1000.00'))
+        self.ahorro = Cuenta.objects.create(usuario=self.user, nombre='Ahorro', tipo='AHORROS', saldo=Decimal('0.00'))
+        self.comida = Categoria.objects.create(usuario=self.user, nombre='Comida', tipo='EGRESO')
+
+        self.vieja = self._tx('EGRESO', '100.00', date(2020, 3, 10), categoria=self.comida)
+        self._tx('EGRESO', '50.00', date(2020, 3, 20), categoria=self.comida)
+        self._tx('INGRESO', '300.00', date(2020, 4, 1))
+        self.reciente = self._tx('EGRESO', '25.00', date(2026, 1, 5))
+
+        # Par de transferencia antiguo enlazado
+        self.origen = self._tx('EGRESO', '10.00', date(2020, 4, 2), cuenta=self.cuenta, es_transferencia=True)
+        self.destino = self._tx('INGRESO', '10.00', date(2020, 4, 2), cuenta=self.ahorro, es_transferencia=True)
+        Transaccion.objects.filter(pk=self.origen.pk).update(transaccion_relacionada=self.destino)
+        Transaccion.objects.filter(pk=self.destino.pk).update(transaccion_relacionada=self.origen)
+
+    def _tx(self, tipo, monto, fecha, cuenta=None, **extra):
+        return Transaccion.objects.create(
+            usuario=self.user, cuenta=cuenta or self.cuenta, tipo=tipo, monto=Decimal(monto),
+            fecha=fecha, descripcion=f'{tipo} {monto}', **extra
+        )
+
+    def _vivos(self, cuenta):
+        return Transaccion.objects.filter(cuenta=cuenta).aggregate(t=Sum(monto_firmado()))['t'] or Decimal('0')
+
+    def test_archivar_mueve_resume_y_concilia(self):
+        movidas = archivar_transacciones(fecha_corte=date(2021, 1, 15), usuario=self.user)
+
+        self.assertEqual(movidas, 5)
+        self.assertEqual(list(Transaccion.objects.values_list('pk', flat=True)), [self.reciente.pk])
+        self.assertEqual(TransaccionArchivada.objects.count(), 5)
+
+        # Resumen de marzo 2020: dos egresos de Comida
+        marzo = ResumenMensualArchivado.objects.get(anio=2020, mes=3)
+        self.assertEqual((marzo.total, marzo.cantidad, marzo.categoria), (Decimal('150.00'), 2, self.comida))
+
+        # Los saldos no cambian y la apertura + movimientos vivos cuadra con el saldo
+        for cuenta in (self.cuenta, self.ahorro):
+            cuenta.refresh_from_db()
+            apertura = SaldoApertura.objects.get(cuenta=cuenta)
+            self.assertEqual(apertura.fecha_corte, date(2021, 1, 1))
+            self.assertEqual(apertura.saldo + self._vivos(cuenta), cuenta.saldo)
+
+        # Las huellas archivadas siguen contando como duplicados
+        self.assertIn(self.vieja.huella, huellas_existentes({self.vieja.huella}))
+
+    def test_restaurar_devuelve_ids_y_enlaces(self):
+        archivar_transacciones(fecha_corte=date(2021, 1, 1))
+        restauradas = restaurar_archivo(usuario=self.user)
+
+        self.assertEqual(restauradas, 5)
+        self.assertEqual(Transaccion.objects.count(), 6)
+        self.assertFalse(TransaccionArchivada.objects.exists())
+        self.assertFalse(SaldoApertura.objects.exists())
+        self.assertFalse(ResumenMensualArchivado.objects.exists())
+
+        origen = Transaccion.objects.get(pk=self.origen.pk)
+        self.assertEqual(origen.transaccion_relacionada_id, self.destino.pk)
+        self.assertEqual(origen.fecha_creacion, self.origen.fecha_creacion)
+
+    def test_restauracion_parcial_mueve_el_corte(self):
+        archivar_transacciones(fecha_corte=date(2021, 1, 1))
+        restaurar_archivo(usuario=self.user, desde=date(2020, 4, 1))
+
+        self.assertEqual(TransaccionArchivada.objects.count(), 2)
+        self.assertEqual(SaldoApertura.objects.get(cuenta=self.cuenta).fecha_corte, date(2020, 4, 1))
+        self.assertEqual(list(resumenes_desde(self.user, date(2020, 4, 1))), [])
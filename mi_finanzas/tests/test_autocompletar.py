@@ -0,0 +1,105 @@
+# mi_finanzas/tests/test_autocompletar.py
+
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from mi_finanzas import autocompletar
+from mi_finanzas.models import Categoria, Cuenta, Transaccion
+
+User = get_user_model()
+
+
+class AutocompletarTestCase(TestCase):
+    """Índice de prefijos por usuario: ranking por frecuencia, altas incrementales e invalidación."""
+
+    def setUp(self):
+        cache.clear()
+        autocompletar.olvidar()
+        self.addCleanup(cache.clear)
+        self.addCleanup(autocompletar.olvidar)
+        self.user = User.objects.create_user(username='autouser', password='x')
+        self.banco = Cuenta.objects.create(usuario=self.user, nombre='Banco', tipo='CHEQUES', saldo=Decimal('0'))
+        self.tarjeta = Cuenta.objects.create(usuario=self.user, nombre='Tarjeta', tipo='TARJETA', saldo=Decimal('0'))
+        self.comida = Categoria.objects.create(usuario=self.user, nombre='Comida', tipo='EGRESO')
+        self.ocio = Categoria.objects.create(usuario=self.user, nombre='Ocio', tipo='EGRESO')
+        for dia in range(1, 4):
+            self._crear('Mercadona', '42.10', dia=dia)
+        self._crear('MERCADONA', '15.00', cuenta=self.tarjeta, dia=4)
+        self._crear('Mercado central', '8.00', categoria=self.ocio, dia=5)
+        self._crear('Cine', '9.00', categoria=self.ocio, dia=6)
+
+    def _crear(self, descripcion, monto, cuenta=None, categoria=None, dia=1):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Transaccion.objects.create(
+                usuario=self.user, cuenta=cuenta or self.banco, categoria=categoria or self.comida, tipo='EGRESO',
+                monto=Decimal(monto), fecha=date(2026, 5, dia), descripcion=descripcion,
+            )
+
+    def test_mas_frecuentes_con_su_combinacion_habitual(self):
+        resultado = autocompletar.sugerencias(self.user, 'merc')
+
+        primera, segunda = resultado['descripciones']
+        # Mayúsculas/acentos agrupados; se muestra la forma escrita más reciente
+        self.assertEqual((primera['descripcion'], primera['veces']), ('MERCADONA', 4))
+        self.assertEqual(primera['monto'], Decimal('42.10'))
+        self.assertEqual(primera['cuenta'], {'id': self.banco.pk, 'nombre': 'Banco'})
+        self.assertEqual(primera['categoria'], {'id': self.comida.pk, 'nombre': 'Comida'})
+        self.assertEqual(segunda['descripcion'], 'Mercado central')
+        self.assertEqual(autocompletar.sugerencias(self.user, 'mercadó')['descripciones'][0]['veces'], 4)
+        self.assertEqual(autocompletar.sugerencias(self.user, 'xyz')['descripciones'], [])
+
+    def test_categorias_y_cuentas_por_prefijo(self):
+        resultado = autocompletar.sugerencias(self.user, 'o')
+        self.assertEqual(resultado['descripciones'], [])
+        self.assertEqual([c['nombre'] for c in resultado['categorias']], ['Ocio'])
+        self.assertEqual(autocompletar.sugerencias(self.user, 'tar')['cuentas'], [{'id': self.tarjeta.pk, 'nombre': 'Tarjeta'}])
+
+    def test_alta_incremental_sin_reconstruir(self):
+        autocompletar.sugerencias(self.user, 'cine')
+        indice = autocompletar.indice_de(self.user.pk)
+
+        self._crear('Cinesa', '7.50', categoria=self.ocio, dia=7)
+        self._crear('Cine', '9.00', categoria=self.ocio, dia=8)
+
+        with self.assertNumQueries(0):
+            resultado = autocompletar.sugerencias(self.user, 'cine')
+        self.assertIs(autocompletar.indice_de(self.user.pk), indice)
+        self.assertEqual([(d['descripcion'], d['veces']) for d in resultado['descripciones']], [('Cine', 2), ('Cinesa', 1)])
+        self.assertEqual(indice.claves, sorted(indice.claves))
+
+    def test_otras_escrituras_reconstruyen(self):
+        autocompletar.sugerencias(self.user, 'cine')
+        transaccion = Transaccion.objects.get(descripcion='Cine')
+        with self.captureOnCommitCallbacks(execute=True):
+            transaccion.descripcion = 'Teatro'
+            transaccion.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ocio.nombre = 'Ocio y cultura'
+            self.ocio.save()
+
+        self.assertEqual(autocompletar.sugerencias(self.user, 'cine')['descripciones'], [])
+        self.assertEqual(autocompletar.sugerencias(self.user, 'teat')['descripciones'][0]['categoria']['nombre'],
+                         'Ocio y cultura')
+
+    @override_settings(MI_FINANZAS_AUTOCOMPLETAR_USUARIOS=1)
+    def test_expulsion_lru(self):
+        otro = User.objects.create_user(username='autootro', password='x')
+        autocompletar.sugerencias(self.user, 'm')
+        autocompletar.sugerencias(otro, 'm')
+
+        self.assertEqual(list(autocompletar._indices), [otro.pk])
+
+    def test_endpoint(self):
+        self.client.force_login(self.user)
+        url = reverse('mi_finanzas:autocompletar')
+        self.client.get(url, {'q': 'mer'})
+
+        with self.assertNumQueries(2):  # sesión y usuario: el índice ya está en memoria
+            datos = self.client.get(url, {'q': 'mer'}).json()
+        self.assertEqual(datos['descripciones'][0]['descripcion'], 'MERCADONA')
+        self.assertEqual(datos['descripciones'][0]['monto'], '42.10')
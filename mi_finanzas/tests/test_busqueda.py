@@ -0,0 +1,98 @@
+# mi_finanzas/tests/test_busqueda.py
+
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from mi_finanzas.busqueda import BuscadorBasico, buscador, buscar_transacciones
+from mi_finanzas.compartidas import compartir_cuenta, cuentas_visibles
+from mi_finanzas.models import Categoria, Cuenta, Transaccion
+
+User = get_user_model()
+
+
+class BusquedaTestCase(TestCase):
+    """Índice FTS5 mantenido por triggers, resultados por relevancia y por usuario."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='bususer', password='x')
+        self.otro = User.objects.create_user(username='otro', password='x')
+        self.banco = Cuenta.objects.create(usuario=self.user, nombre='Banco Amazonas', tipo='CHEQUES')
+        self.compras = Categoria.objects.create(usuario=self.user, nombre='Compras online', tipo='EGRESO')
+        self.amazon = self._tx(self.user, self.banco, 'Pedido Amazon primavera', self.compras)
+        self.luz = self._tx(self.user, self.banco, 'Factura eléctrica')
+        self.cuenta_otro = Cuenta.objects.create(usuario=self.otro, nombre='Banco', tipo='CHEQUES')
+        self.ajena = self._tx(self.otro, self.cuenta_otro, 'Amazon del otro usuario')
+
+    def _tx(self, usuario, cuenta, descripcion, categoria=None):
+        return Transaccion.objects.create(usuario=usuario, cuenta=cuenta, categoria=categoria, tipo='EGRESO',
+                                          monto=Decimal('10.00'), fecha=date(2026, 4, 1), descripcion=descripcion)
+
+    def _ids(self, texto):
+        return [tx.pk for tx in buscar_transacciones(self.user, texto)]
+
+    def test_usa_fts5_en_sqlite(self):
+        self.assertEqual(buscador(connection.alias).__class__.__name__, 'BuscadorFTS5')
+
+    def test_relevancia_prefijos_acentos_y_usuario(self):
+        # 'amazon' está en la descripción de una y en el nombre de la cuenta de las dos
+        self.assertEqual(self._ids('amazon'), [self.amazon.pk, self.luz.pk])
+        self.assertEqual(self._ids('electrica'), [self.luz.pk])
+        self.assertEqual(self._ids('prim amaz'), [self.amazon.pk])
+        self.assertEqual(self._ids('online'), [self.amazon.pk])
+        self.assertEqual(self._ids('"OR" *'), [])
+
+    def test_sincronizado_en_todas_las_rutas_de_escritura(self):
+        self.luz.descripcion = 'Recibo de agua'
+        self.luz.save()
+        self.assertEqual(self._ids('agua'), [self.luz.pk])
+        self.assertEqual(self._ids('electrica'), [])
+
+        nuevas = Transaccion.objects.bulk_create([
+            Transaccion(usuario=self.user, cuenta=self.banco, tipo='EGRESO', monto=Decimal('1'), fecha=date(2026, 5, 1),
+                        descripcion='Suscripción streaming')
+        ])
+        self.assertEqual(self._ids('streaming'), [nuevas[0].pk])
+        Transaccion.objects.filter(pk=nuevas[0].pk).update(descripcion='Suscripción gimnasio')
+        self.assertEqual(self._ids('gimnasio'), [nuevas[0].pk])
+
+        self.compras.nombre = 'Tiendas'
+        self.compras.save()
+        self.assertEqual(self._ids('tiendas'), [self.amazon.pk])
+        self.banco.nombre = 'Caja'
+        self.banco.save()
+        self.assertEqual(len(self._ids('caja')), 3)
+
+        self.amazon.delete()
+        Transaccion.objects.filter(pk=nuevas[0].pk).delete()
+        self.assertEqual(self._ids('pedido'), [])
+        self.assertEqual(self._ids('gimnasio'), [])
+
+    def test_motor_basico_encuentra_lo_mismo(self):
+        basico = BuscadorBasico(connection.alias)
+        # Con el acento exacto: icontains no los ignora
+        for texto in ('amazon', 'eléctrica', 'prim amaz', 'online'):
+            self.assertEqual(set(basico.buscar(cuentas_visibles(self.user), texto)), set(self._ids(texto)))
+
+    def test_cuentas_compartidas_en_la_busqueda(self):
+        compartir_cuenta(self.cuenta_otro, self.user, 'LECTOR')
+        usuario = User.objects.get(pk=self.user.pk)
+        todas = {self.amazon.pk, self.luz.pk, self.ajena.pk}
+        self.assertEqual({tx.pk for tx in buscar_transacciones(usuario, 'amazon')}, todas)
+        self.assertEqual(set(BuscadorBasico(connection.alias).buscar(cuentas_visibles(usuario), 'amazon')), todas)
+        # El propietario no ve las del miembro
+        self.assertEqual([tx.pk for tx in buscar_transacciones(self.otro, 'amazon')], [self.ajena.pk])
+
+        self.client.force_login(self.user)
+        respuesta = self.client.get(reverse('mi_finanzas:transacciones_lista'), {'q': 'otro usuario'})
+        self.assertEqual([tx.pk for tx in respuesta.context['transacciones']], [self.ajena.pk])
+
+    def test_vista_lista_con_busqueda(self):
+        self.client.force_login(self.user)
+        respuesta = self.client.get(reverse('mi_finanzas:transacciones_lista'), {'q': 'pedido'})
+        self.assertEqual([tx.pk for tx in respuesta.context['transacciones']], [self.amazon.pk])
+        self.assertContains(respuesta, 'value="pedido"')
@@ -0,0 +1,142 @@
+# mi_finanzas/tests/test_comparativas.py
+
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from mi_finanzas.archivo import archivar_transacciones
+from mi_finanzas.comparativas import calcular_comparativa, comparativa
+from mi_finanzas.divisiones import dividir_transaccion
+from mi_finanzas.models import Categoria, Cuenta, Transaccion
+
+User = get_user_model()
+
+
+class ComparativasTestCase(TestCase):
+    """Interanual, medias móviles y tasa de ahorro con funciones de ventana SQL."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(username='compuser', password='x')
+        self.cuenta = Cuenta.objects.create(usuario=self.user, nombre='Banco', tipo='CHEQUES', saldo=Decimal('5000.00'))
+        self.comida = Categoria.objects.create(usuario=self.user, nombre='Comida', tipo='EGRESO')
+        self.luz = Categoria.objects.create(usuario=self.user, nombre='Luz', tipo='EGRESO')
+        self.ropa = Categoria.objects.create(usuario=self.user, nombre='Ropa', tipo='EGRESO')
+        self.hasta = date(2026, 3, 1)
+        for fecha, categoria, monto in ((date(2025, 3, 8), self.comida, '100.00'), (date(2025, 10, 3), self.ropa, '60.00'),
+                                        (date(2025, 12, 20), self.comida, '90.00'), (date(2026, 1, 4), self.comida, '120.00'),
+                                        (date(2026, 2, 27), self.comida, '150.00')):
+            self._movimiento('EGRESO', monto, fecha, categoria)
+        self._movimiento('INGRESO', '800.00', date(2025, 3, 1))
+        self._movimiento('INGRESO', '1000.00', date(2026, 3, 1))
+        compra = self._movimiento('EGRESO', '250.00', date(2026, 3, 31), self.comida)
+        dividir_transaccion(compra, [(self.comida, Decimal('200.00')), (self.luz, Decimal('50.00'))])
+        # Las transferencias no son ingresos ni gastos
+        Transaccion.objects.create(usuario=self.user, cuenta=self.cuenta, tipo='EGRESO', monto=Decimal('500.00'),
+                                   fecha=date(2026, 3, 2), descripcion='Transferencia', es_transferencia=True)
+
+    def _movimiento(self, tipo, monto, fecha, categoria=None):
+        return Transaccion.objects.create(usuario=self.user, cuenta=self.cuenta, categoria=categoria, tipo=tipo,
+                                          monto=Decimal(monto), fecha=fecha, descripcion=tipo)
+
+    def _comprobar(self, datos):
+        self.assertEqual([fila['mes'] for fila in datos['serie']], [date(2025, m, 1) for m in range(4, 13)]
+                         + [date(2026, m, 1) for m in range(1, 4)])
+        marzo = datos['serie'][-1]
+        self.assertEqual((marzo['ingresos'], marzo['egresos'], marzo['ahorro'], marzo['tasa_ahorro']),
+                         (Decimal('1000.00'), Decimal('250.00'), Decimal('750.00'), Decimal('75.00')))
+        self.assertEqual((marzo['ingresos_anio_anterior'], marzo['egresos_anio_anterior'], marzo['variacion_anual']),
+                         (Decimal('800.00'), Decimal('100.00'), Decimal('150.00')))
+        # 3 meses: 120 + 150 + 250; 12 meses (abr 2025 – mar 2026): 60 + 90 + 120 + 150 + 250
+        self.assertEqual((marzo['media_egresos_3'], marzo['media_egresos_12'], marzo['tasa_ahorro_12']),
+                         (Decimal('173.33'), Decimal('55.83'), Decimal('33.00')))
+        # Meses sin movimientos: ceros, no huecos
+        self.assertEqual(datos['serie'][1]['egresos'], Decimal('0.00'))
+
+        categorias = {fila['nombre']: fila for fila in datos['categorias']}
+        self.assertEqual(list(categorias), ['Comida', 'Luz', 'Ropa'])
+        comida = categorias['Comida']
+        # Medias de los meses anteriores: 3 (dic – feb) y 12 (mar 2025 – feb 2026)
+        self.assertEqual((comida['total'], comida['anio_anterior'], comida['variacion_anual'], comida['media_3'],
+                          comida['media_12']),
+                         (Decimal('200.00'), Decimal('100.00'), Decimal('100.00'), Decimal('120.00'), Decimal('38.33')))
+        self.assertEqual((categorias['Luz']['total'], categorias['Luz']['variacion_anual']), (Decimal('50.00'), None))
+        self.assertEqual((categorias['Ropa']['total'], categorias['Ropa']['media_12']), (Decimal('0.00'), Decimal('5.00')))
+
+    def test_interanual_medias_y_tasa_de_ahorro(self):
+        self._comprobar(calcular_comparativa(self.user, self.hasta))
+
+    def test_meses_archivados_cuentan_igual(self):
+        archivar_transacciones(fecha_corte=date(2026, 1, 1), usuario=self.user)
+        self.assertFalse(Transaccion.objects.filter(usuario=self.user, fecha__lt=date(2026, 1, 1)).exists())
+
+        self._comprobar(calcular_comparativa(self.user, self.hasta))
+
+    def test_numero_de_consultas_constante(self):
+        # Serie, categorías y nombres de categoría, sea cual sea el rango
+        for meses in (1, 12, 60):
+            with self.assertNumQueries(3):
+                datos = calcular_comparativa(self.user, self.hasta, meses)
+            self.assertEqual(len(datos['serie']), meses)
+
+    def test_cache_de_periodo_cerrado_por_meses_tocados(self):
+        comparativa(self.user, self.hasta)
+        with self.assertNumQueries(0):
+            comparativa(self.user, self.hasta)
+
+        # Un movimiento fuera del periodo (ni en sus 12 meses de carga) no lo invalida
+        with self.captureOnCommitCallbacks(execute=True):
+            self._movimiento('EGRESO', '30.00', date(2026, 4, 2), self.luz)
+            self._movimiento('EGRESO', '30.00', date(2024, 2, 28), self.luz)
+        with self.assertNumQueries(0):
+            comparativa(self.user, self.hasta)
+
+        # Uno dentro, sí
+        with self.captureOnCommitCallbacks(execute=True):
+            self._movimiento('EGRESO', '50.00', date(2026, 3, 10), self.luz)
+        luz = {fila['nombre']: fila for fila in comparativa(self.user, self.hasta)['categorias']}['Luz']
+        self.assertEqual(luz['total'], Decimal('100.00'))
+
+        # Editar la fecha sella el mes anterior y el nuevo
+        anterior = comparativa(self.user, date(2025, 5, 1), meses=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            movida = Transaccion.objects.get(fecha=date(2025, 3, 8))
+            movida.fecha = date(2024, 1, 15)
+            movida.save()
+        self.assertEqual(comparativa(self.user, date(2025, 5, 1), meses=1)['serie'][0]['egresos_anio_anterior'],
+                         anterior['serie'][0]['egresos_anio_anterior'])
+        self.assertEqual(comparativa(self.user, self.hasta)['serie'][-1]['egresos_anio_anterior'], Decimal('0.00'))
+
+        # El archivo y los cambios sin fecha (nombres de categoría) también
+        with self.captureOnCommitCallbacks(execute=True):
+            archivar_transacciones(fecha_corte=date(2026, 1, 1), usuario=self.user)
+        with self.assertNumQueries(3):
+            comparativa(self.user, self.hasta)
+        with self.captureOnCommitCallbacks(execute=True):
+            Categoria.objects.filter(pk=self.luz.pk).get().save()
+        with self.assertNumQueries(3):
+            comparativa(self.user, self.hasta)
+
+    def test_cache_de_periodo_abierto_por_version_de_datos(self):
+        comparativa(self.user)
+        with self.assertNumQueries(0):
+            comparativa(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self._movimiento('EGRESO', '30.00', date(2024, 2, 28), self.luz)
+        with self.assertNumQueries(3):
+            comparativa(self.user)
+
+    def test_vistas(self):
+        self.client.force_login(self.user)
+
+        respuesta = self.client.get(reverse('mi_finanzas:comparativas_financieras'), {'hasta': '2026-03', 'meses': 6})
+        self.assertContains(respuesta, 'Gasto por categoría')
+        self.assertEqual(len(respuesta.context['comparativa']['serie']), 6)
+
+        datos = self.client.get(reverse('mi_finanzas:comparativas_financieras_datos'), {'hasta': '2026-03'}).json()
+        self.assertEqual((datos['hasta'], datos['serie'][-1]['egresos']), ('2026-03-01', '250.00'))
@@ -0,0 +1,196 @@
+# mi_finanzas/tests/test_compartidas.py
+
+import json
+from datetime import date
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from mi_finanzas.archivo import archivar_transacciones
+from mi_finanzas.compartidas import (
+    PROPIETARIO, ErrorCompartir, compartir_cuenta, cuentas_editables, dejar_de_compartir, permisos_cuentas,
+)
+from mi_finanzas.etiquetas import etiquetar
+from mi_finanzas.historial import serie_patrimonio
+from mi_finanzas.models import (
+    Categoria, Cuenta, MiembroCuenta, Posicion, PrecioActivo, Transaccion, TransaccionRecurrente,
+)
+from mi_finanzas.panel import saldos
+from mi_finanzas.prevision import prevision
+from mi_finanzas.valoracion import valorar_cuentas
+
+User = get_user_model()
+
+
+class CuentasCompartidasTestCase(TestCase):
+    """Cuentas de un propietario compartidas con editores y lectores."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.ana = User.objects.create_user(username='ana', password='x')
+        self.beto = User.objects.create_user(username='beto', password='x')
+        self.hogar = Cuenta.objects.create(usuario=self.ana, nombre='Hogar', tipo='CHEQUES', saldo=Decimal('1000.00'))
+        self.propia = Cuenta.objects.create(usuario=self.beto, nombre='Personal', tipo='AHORROS', saldo=Decimal('300.00'))
+        self.super_ana = Categoria.objects.create(usuario=self.ana, nombre='Súper', tipo='EGRESO')
+        self.ocio_beto = Categoria.objects.create(usuario=self.beto, nombre='Ocio', tipo='EGRESO')
+        self.compra = Transaccion.objects.create(usuario=self.ana, cuenta=self.hogar, categoria=self.super_ana,
+                                                 tipo='EGRESO', monto=Decimal('80.00'), fecha=date.today(),
+                                                 descripcion='Compra semanal')
+
+    def _beto(self):
+        # Instancia nueva, como request.user en cada petición (los permisos se memorizan en ella)
+        return User.objects.get(pk=self.beto.pk)
+
+    def test_permisos_cacheados_e_invalidados(self):
+        compartir_cuenta(self.hogar, self.beto, 'LECTOR')
+        self.assertEqual(permisos_cuentas(self._beto()),
+                         {self.propia.pk: (PROPIETARIO, self.beto.pk), self.hogar.pk: ('LECTOR', self.ana.pk)})
+        beto = self._beto()
+        with self.assertNumQueries(0):
+            permisos_cuentas(beto)
+            self.assertEqual(cuentas_editables(beto), [self.propia.pk])
+
+        compartir_cuenta(self.hogar, self.beto, 'EDITOR')
+        self.assertEqual(cuentas_editables(self._beto()), sorted([self.propia.pk, self.hogar.pk]))
+        dejar_de_compartir(self.hogar, self.beto.pk)
+        self.assertEqual(list(permisos_cuentas(self._beto())), [self.propia.pk])
+        # Una cuenta nueva también invalida
+        nueva = Cuenta.objects.create(usuario=self.beto, nombre='Efectivo', tipo='EFECTIVO')
+        self.assertIn(nueva.pk, permisos_cuentas(self._beto()))
+
+        with self.assertRaises(ErrorCompartir):
+            compartir_cuenta(self.hogar, self.ana)
+
+    def test_panel_agrega_las_cuentas_compartidas_sin_unir_miembros(self):
+        compartir_cuenta(self.hogar, self.beto, 'LECTOR')
+        self.client.force_login(self.beto)
+        self.client.get(reverse('mi_finanzas:resumen_financiero'))
+
+        with CaptureQueriesContext(connection) as consultas:
+            saldos, ultimas, grafico = (self.client.get(reverse('mi_finanzas:fragmento_panel', args=[tarjeta]))
+                                        for tarjeta in ('saldos', 'ultimas', 'grafico'))
+        self.assertEqual(saldos.context['saldo_total'], Decimal('1220.00'))
+        self.assertEqual(ultimas.context['ultimas_transacciones'], [self.compra])
+        self.assertEqual(json.loads(grafico.context['chart_data_json']), {'labels': ['Súper'], 'data': [80.0]})
+        # Permisos ya en caché: ningún agregado pasa por la tabla de miembros
+        self.assertFalse([q for q in consultas.captured_queries if 'miembrocuenta' in q['sql']])
+
+        listado = self.client.get(reverse('mi_finanzas:cuentas_lista'))
+        self.assertContains(listado, 'Compartida · Lector')
+
+    def test_reportes_y_valoracion_incluyen_las_cuentas_compartidas(self):
+        # Un mes archivado dentro del rango del reporte y una etiqueta del propietario
+        inicio = (date.today() - relativedelta(months=5)).replace(day=1)
+        Transaccion.objects.create(usuario=self.ana, cuenta=self.hogar, categoria=self.super_ana, tipo='EGRESO',
+                                   monto=Decimal('20.00'), fecha=inicio, descripcion='Compra archivada')
+        archivar_transacciones(fecha_corte=inicio + relativedelta(months=1), usuario=self.ana)
+        etiquetar(self.compra, ['hogar'])
+        broker = Cuenta.objects.create(usuario=self.ana, nombre='Broker', tipo='INVERSION')
+        Posicion.objects.create(usuario=self.ana, cuenta=broker, activo='VWCE', cantidad=Decimal('10'))
+        PrecioActivo.objects.create(activo='VWCE', fecha=date(2026, 6, 1), precio=Decimal('100.00'))
+        self.assertEqual(valorar_cuentas(self._beto()), {})
+
+        compartir_cuenta(self.hogar, self.beto, 'LECTOR')
+        compartir_cuenta(broker, self.beto, 'LECTOR')
+        self.client.force_login(self.beto)
+
+        reporte = self.client.get(reverse('mi_finanzas:reportes_financieros'))
+        self.assertEqual(reporte.context['resumen_mensual']['gastos'], Decimal('100.00'))
+        self.assertEqual([(fila['categoria__nombre'], fila['total']) for fila in reporte.context['gastos_por_categoria']],
+                         [('Súper', Decimal('100.00'))])
+        etiquetado = self.client.get(reverse('mi_finanzas:reportes_financieros'), {'etiquetas': 'hogar'})
+        self.assertEqual(etiquetado.context['resumen_mensual']['gastos'], Decimal('80.00'))
+
+        # La caché de la valoración caduca al compartir y con las escrituras del propietario
+        self.assertEqual(valorar_cuentas(self._beto())[broker.pk]['valor'], Decimal('1000.00'))
+        with self.captureOnCommitCallbacks(execute=True):
+            posicion = Posicion.objects.get(cuenta=broker)
+            posicion.cantidad = Decimal('12')
+            posicion.save()
+        self.assertEqual(valorar_cuentas(self._beto())[broker.pk]['valor'], Decimal('1200.00'))
+        # Beto sigue viendo el hogar de Ana: la clave cambia por su propia versión
+        with self.captureOnCommitCallbacks(execute=True):
+            dejar_de_compartir(broker, self.beto.pk)
+        self.assertNotIn(broker.pk, valorar_cuentas(self._beto()))
+
+    def test_patrimonio_y_prevision_cuadran_con_el_panel(self):
+        TransaccionRecurrente.objects.create(usuario=self.ana, cuenta=self.hogar, tipo='EGRESO', monto=Decimal('50.00'),
+                                             descripcion='Alquiler', frecuencia='MENSUAL',
+                                             proximo_pago=date.today() + relativedelta(days=10))
+        self.assertEqual([c['id'] for c in prevision(self._beto())['cuentas']], [self.propia.pk])
+
+        compartir_cuenta(self.hogar, self.beto, 'LECTOR')
+        beto = self._beto()
+        total = saldos(beto, date.today())['saldo_total']
+        self.assertEqual(total, Decimal('1220.00'))
+        self.assertEqual(serie_patrimonio(beto)['total'][-1], total)
+        datos = prevision(beto)
+        self.assertEqual(sum(c['saldo_actual'] for c in datos['cuentas']), total)
+        hogar = next(c for c in datos['cuentas'] if c['id'] == self.hogar.pk)
+        self.assertEqual(hogar['saldo_final'], Decimal('920.00') - 12 * Decimal('50.00'))
+
+        # Las escrituras del propietario invalidan la previsión cacheada del miembro
+        with self.captureOnCommitCallbacks(execute=True):
+            Transaccion.objects.create(usuario=self.ana, cuenta=self.hogar, tipo='EGRESO', monto=Decimal('20.00'),
+                                       fecha=date.today(), descripcion='Farmacia')
+        beto = self._beto()
+        self.assertEqual(next(c for c in prevision(beto)['cuentas'] if c['id'] == self.hogar.pk)['saldo_actual'],
+                         Decimal('900.00'))
+        self.assertEqual(serie_patrimonio(beto)['total'][-1], Decimal('1200.00'))
+
+    def test_lector_solo_ve(self):
+        compartir_cuenta(self.hogar, self.beto, 'LECTOR')
+        self.client.force_login(self.beto)
+
+        self.assertEqual(self.client.get(reverse('mi_finanzas:extracto_cuenta', args=[self.hogar.pk])).status_code, 200)
+        self.assertEqual(self.client.get(reverse('mi_finanzas:editar_cuenta', args=[self.hogar.pk])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('mi_finanzas:editar_transaccion', args=[self.compra.pk])).status_code, 404)
+        self.client.post(reverse('mi_finanzas:anadir_transaccion'), {
+            'cuenta': self.hogar.pk, 'tipo': 'EGRESO', 'monto': '10.00', 'fecha': date.today().isoformat(),
+            'descripcion': 'No debería', 'categoria': self.super_ana.pk,
+        })
+        self.assertEqual(Transaccion.objects.filter(cuenta=self.hogar).count(), 1)
+        self.assertEqual(self.client.get(reverse('mi_finanzas:miembros_cuenta', args=[self.hogar.pk])).status_code, 404)
+
+    def test_editor_registra_en_nombre_del_propietario(self):
+        compartir_cuenta(self.hogar, self.beto, 'EDITOR')
+        self.client.force_login(self.beto)
+        datos = {'cuenta': self.hogar.pk, 'tipo': 'EGRESO', 'monto': '20.00', 'fecha': date.today().isoformat(),
+                 'descripcion': 'Pan'}
+
+        # Las categorías de la transacción son las del propietario de la cuenta
+        self.client.post(reverse('mi_finanzas:anadir_transaccion'), dict(datos, categoria=self.ocio_beto.pk))
+        self.assertFalse(Transaccion.objects.filter(descripcion='Pan').exists())
+        self.client.post(reverse('mi_finanzas:anadir_transaccion'), dict(datos, categoria=self.super_ana.pk))
+        self.assertEqual(Transaccion.objects.get(descripcion='Pan').usuario, self.ana)
+
+        self.client.post(reverse('mi_finanzas:transferir_monto'), {
+            'cuenta_origen': self.propia.pk, 'cuenta_destino': self.hogar.pk, 'monto': '100.00',
+            'fecha': date.today().isoformat(), 'descripcion': 'Aporte',
+        })
+        enviada = Transaccion.objects.get(cuenta=self.propia, es_transferencia=True)
+        recibida = Transaccion.objects.get(cuenta=self.hogar, es_transferencia=True)
+        self.assertEqual((enviada.usuario, recibida.usuario), (self.beto, self.ana))
+        self.hogar.refresh_from_db()
+        self.assertEqual(self.hogar.saldo, Decimal('1000.00') - Decimal('80.00') - Decimal('20.00') + Decimal('100.00'))
+
+    def test_vista_de_miembros(self):
+        self.client.force_login(self.ana)
+        url = reverse('mi_finanzas:miembros_cuenta', args=[self.hogar.pk])
+
+        self.client.post(url, {'username': 'beto', 'rol': 'EDITOR'})
+        self.assertEqual(MiembroCuenta.objects.get(cuenta=self.hogar).rol, 'EDITOR')
+        self.assertContains(self.client.get(url), 'beto')
+        self.client.post(url, {'username': 'nadie', 'rol': 'LECTOR'})
+        self.assertEqual(MiembroCuenta.objects.filter(cuenta=self.hogar).count(), 1)
+
+        self.client.post(url, {'quitar': self.beto.pk})
+        self.assertFalse(MiembroCuenta.objects.filter(cuenta=self.hogar).exists())
+        self.assertEqual(list(permisos_cuentas(self._beto())), [self.propia.pk])
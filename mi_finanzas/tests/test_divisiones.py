@@ -0,0 +1,107 @@
+# mi_finanzas/tests/test_divisiones.py
+
+import tempfile
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from mi_finanzas.archivo import archivar_transacciones, restaurar_archivo
+from mi_finanzas.divisiones import ErrorDivision, dividir_transaccion
+from mi_finanzas.jerarquia import totales_por_subarbol
+from mi_finanzas.models import (
+    Categoria, Cuenta, DivisionArchivada, DivisionTransaccion, ResumenMensualArchivado, Transaccion,
+)
+from mi_finanzas.respaldo import respaldar, restaurar
+
+User = get_user_model()
+
+
+class DivisionesTestCase(TestCase):
+    """Transacciones repartidas entre categorías: saldo una vez, agregados por línea."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='divuser', password='x')
+        self.cuenta = Cuenta.objects.create(usuario=self.user, nombre='Banco', tipo='CHEQUES', saldo=Decimal('500.00'))
+        self.comida = Categoria.objects.create(usuario=self.user, nombre='Comida', tipo='EGRESO')
+        self.hogar = Categoria.objects.create(usuario=self.user, nombre='Hogar', tipo='EGRESO')
+        self.limpieza = Categoria.objects.create(usuario=self.user, nombre='Limpieza', tipo='EGRESO', padre=self.hogar)
+        self.fecha = date.today().replace(day=1)
+        self.ticket = self._gasto('100.00', self.comida, 'Supermercado')
+        self._gasto('10.00', self.hogar, 'Bombillas')
+
+    def _gasto(self, monto, categoria, descripcion, fecha=None):
+        return Transaccion.objects.create(usuario=self.user, cuenta=self.cuenta, categoria=categoria, tipo='EGRESO',
+                                          monto=Decimal(monto), fecha=fecha or self.fecha, descripcion=descripcion)
+
+    def _totales(self):
+        return totales_por_subarbol(Transaccion.objects.filter(usuario=self.user))
+
+    def test_division_no_mueve_el_saldo_y_reparte_los_totales(self):
+        dividir_transaccion(self.ticket, [(self.comida, Decimal('70.00')), (self.limpieza, Decimal('30.00'))])
+
+        self.cuenta.refresh_from_db()
+        self.assertEqual(self.cuenta.saldo, Decimal('390.00'))
+        with self.assertNumQueries(1):
+            totales = self._totales()
+        self.assertEqual(totales[self.comida.pk], Decimal('70.00'))
+        self.assertEqual(totales[self.hogar.pk], Decimal('40.00'))  # 10 propios + 30 de Limpieza
+        self.assertEqual(totales[self.limpieza.pk], Decimal('30.00'))
+
+    def test_lineas_que_no_cuadran(self):
+        with self.assertRaisesMessage(ErrorDivision, 'suman 90.00'):
+            dividir_transaccion(self.ticket, [(self.comida, Decimal('60.00')), (self.hogar, Decimal('30.00'))])
+        nomina = Categoria.objects.create(usuario=self.user, nombre='Nómina', tipo='INGRESO')
+        with self.assertRaises(ErrorDivision):
+            dividir_transaccion(self.ticket, [(self.comida, Decimal('50.00')), (nomina, Decimal('50.00'))])
+        self.assertFalse(DivisionTransaccion.objects.exists())
+
+    def test_cambiar_el_monto_deshace_la_division(self):
+        dividir_transaccion(self.ticket, [(self.comida, Decimal('70.00')), (self.hogar, Decimal('30.00'))])
+        self.ticket.refresh_from_db()
+        self.ticket.descripcion = 'Súper'
+        self.ticket.save()
+        self.assertEqual(self.ticket.divisiones.count(), 2)
+
+        self.ticket.monto = Decimal('120.00')
+        self.ticket.save()
+        self.assertFalse(self.ticket.divisiones.exists())
+        self.assertEqual(self._totales()[self.comida.pk], Decimal('120.00'))
+
+    def test_vista(self):
+        self.client.force_login(self.user)
+        url = reverse('mi_finanzas:division_transaccion', args=[self.ticket.pk])
+        self.assertContains(self.client.get(url), 'Guardar División')
+
+        self.client.post(url, {
+            'form-TOTAL_FORMS': '3', 'form-INITIAL_FORMS': '0',
+            'form-0-categoria': self.comida.pk, 'form-0-monto': '55.50',
+            'form-1-categoria': self.hogar.pk, 'form-1-monto': '44.50',
+        })
+        self.assertEqual(sorted(self.ticket.divisiones.values_list('monto', flat=True)),
+                         [Decimal('44.50'), Decimal('55.50')])
+
+        grafico = self.client.get(reverse('mi_finanzas:fragmento_panel', args=['grafico']))
+        self.assertIn('"data": [55.5, 54.5]', grafico.context['chart_data_json'])
+
+    def test_archivo_y_respaldo_conservan_las_lineas(self):
+        viejo = self._gasto('50.00', self.comida, 'Ticket viejo', fecha=date(2020, 1, 10))
+        dividir_transaccion(viejo, [(self.comida, Decimal('20.00')), (self.limpieza, Decimal('30.00'))])
+
+        archivar_transacciones(fecha_corte=date(2021, 1, 1), usuario=self.user)
+        self.assertEqual(DivisionArchivada.objects.filter(transaccion_id=viejo.pk).count(), 2)
+        resumen = dict(ResumenMensualArchivado.objects.filter(usuario=self.user).values_list('categoria_id', 'total'))
+        self.assertEqual(resumen, {self.comida.pk: Decimal('20.00'), self.limpieza.pk: Decimal('30.00')})
+
+        ruta = Path(tempfile.mkdtemp()) / 'respaldo.jsonl.gz'
+        self.addCleanup(ruta.unlink, missing_ok=True)
+        respaldar(ruta, usuario=self.user)
+        restaurar(ruta, reemplazar=True)
+        self.assertEqual(DivisionArchivada.objects.filter(usuario=self.user).count(), 2)
+
+        restaurar_archivo(usuario=self.user)
+        restaurado = Transaccion.objects.get(usuario=self.user, descripcion='Ticket viejo')
+        self.assertEqual(restaurado.divisiones.count(), 2)
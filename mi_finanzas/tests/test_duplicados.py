@@ -0,0 +1,83 @@
+# mi_finanzas/tests/test_duplicados.py
+
+from datetime import date, timedelta
+from io import StringIO
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from mi_finanzas.duplicados import (
+    POLITICA_ERROR, TransaccionDuplicadaError, escanear_duplicados, insertar_sin_duplicados,
+)
+from mi_finanzas.models import Cuenta, Transaccion, TransaccionRecurrente, normalizar_descripcion
+
+User = get_user_model()
+
+
+class DuplicadosTestCase(TestCase):
+    """Huella normalizada, inserción por lotes y escaneo de duplicados."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='dupuser', password='x')
+        self.cuenta = Cuenta.objects.create(
+            usuario=self.user, nombre='Principal', tipo='CHEQUES', saldo=Decimal('1000.00')
+        )
+
+    def _tx(self, descripcion='Supermercado', monto='50.00', fecha=date(2026, 1, 15)):
+        return Transaccion(
+            usuario=self.user, cuenta=self.cuenta, tipo='EGRESO',
+            monto=Decimal(monto), fecha=fecha, descripcion=descripcion,
+        )
+
+    def test_normalizacion_de_descripcion(self):
+        self.assertEqual(normalizar_descripcion('  Café  -  PANADERÍA!! '), 'cafe panaderia')
+        self.assertEqual(self._tx('Café, Panadería').calcular_huella(), self._tx('cafe panaderia').calcular_huella())
+        self.assertNotEqual(self._tx(monto='50.00').calcular_huella(), self._tx(monto='50.01').calcular_huella())
+
+    def test_save_guarda_la_huella(self):
+        tx = self._tx()
+        tx.save()
+        self.assertEqual(Transaccion.objects.get(pk=tx.pk).huella, tx.calcular_huella())
+
+    def test_lote_omite_existentes_y_repetidos_y_aplica_saldo_una_vez(self):
+        self._tx().save()  # saldo: 950
+        lote = [self._tx(), self._tx('Farmacia'), self._tx('farmacia ')]
+
+        insertadas, omitidas = insertar_sin_duplicados(lote)
+
+        self.assertEqual(len(insertadas), 1)
+        self.assertEqual(len(omitidas), 2)
+        self.cuenta.refresh_from_db()
+        self.assertEqual(self.cuenta.saldo, Decimal('900.00'))
+
+    def test_politica_error_aborta_el_lote(self):
+        self._tx().save()
+        with self.assertRaises(TransaccionDuplicadaError):
+            insertar_sin_duplicados([self._tx('Nueva'), self._tx()], politica=POLITICA_ERROR)
+        self.assertEqual(Transaccion.objects.count(), 1)
+
+    def test_crear_recurrentes_dos_veces_no_duplica(self):
+        hoy = date.today()
+        # Atrasada varios días: la primera ejecución contabiliza las seis ocurrencias, cada una con su fecha
+        TransaccionRecurrente.objects.create(
+            usuario=self.user, cuenta=self.cuenta, tipo='EGRESO', monto=Decimal('10.00'),
+            descripcion='Café', frecuencia='DIARIA', proximo_pago=hoy - timedelta(days=5),
+        )
+        call_command('crear_recurrentes', stdout=StringIO())
+        call_command('crear_recurrentes', stdout=StringIO())
+
+        self.assertEqual(sorted(Transaccion.objects.values_list('fecha', flat=True)),
+                         [hoy - timedelta(days=dias) for dias in range(5, -1, -1)])
+        self.cuenta.refresh_from_db()
+        self.assertEqual(self.cuenta.saldo, Decimal('940.00'))
+
+    def test_escaneo_por_bloques_agrupa_duplicados(self):
+        a, b, c = self._tx(), self._tx(), self._tx('Otra')
+        for tx in (a, b, c):
+            tx.save()
+
+        grupos = list(escanear_duplicados(usuario=self.user, chunk_size=1))
+
+        self.assertEqual(grupos, [sorted([a.pk, b.pk])])
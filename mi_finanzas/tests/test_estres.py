@@ -0,0 +1,72 @@
+# mi_finanzas/tests/test_estres.py
+
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from mi_finanzas.estres import (
+    _clasificar, ejecutar_operaciones, limpiar_escenario, preparar_escenario, resumir, verificar_invariantes,
+)
+from mi_finanzas.models import Cuenta, Transaccion
+
+User = get_user_model()
+
+
+class EstresTestCase(TestCase):
+    """Operaciones aleatorias a través de las vistas e invariantes de saldos y transferencias."""
+
+    def test_operaciones_mantienen_las_invariantes(self):
+        escenario = preparar_escenario(usuarios=1, cuentas=3)
+
+        muestras = ejecutar_operaciones(escenario['usuarios'][0], 40, semilla=7)
+
+        self.assertTrue(muestras)
+        self.assertEqual({estado for _, estado, _ in muestras}, {'ok'})
+        self.assertTrue(Transaccion.objects.filter(es_transferencia=True).exists())
+        self.assertEqual(verificar_invariantes(escenario), [])
+        informe = resumir(muestras, 2.0)
+        self.assertEqual(informe['peticiones'], len(muestras))
+        self.assertEqual(informe['tasa_bloqueo'], 0)
+        self.assertLessEqual(informe['p50_ms'], informe['p99_ms'])
+
+    def test_clasifica_por_la_respuesta_json(self):
+        # Sin saldo inicial las transferencias se rechazan (400 con errores) hasta que entran ingresos (200)
+        escenario = preparar_escenario(usuarios=1, cuentas=2, saldo_inicial=Decimal('0.00'))
+
+        muestras = ejecutar_operaciones(escenario['usuarios'][0], 30, semilla=11)
+
+        estados = {(operacion, estado) for operacion, estado, _ in muestras}
+        self.assertIn(('transferir', 'rechazada'), estados)
+        self.assertIn(('crear', 'ok'), estados)
+        self.assertNotIn('error', {estado for _, estado in estados})
+        self.assertEqual(verificar_invariantes(escenario), [])
+
+        # Una redirección no es un éxito: la vista no contestó como al panel
+        self.client.force_login(User.objects.get(pk=escenario['usuarios'][0]))
+        self.assertEqual(_clasificar(self.client.post(reverse('mi_finanzas:anadir_transaccion'), {})), 'error')
+
+    def test_detecta_saldo_descuadrado(self):
+        escenario = preparar_escenario(usuarios=1, cuentas=2)
+        Cuenta.objects.filter(pk=int(next(iter(escenario['saldos_iniciales'])))).update(saldo=1)
+
+        self.assertEqual(len(verificar_invariantes(escenario)), 1)
+
+        limpiar_escenario(escenario)
+        self.assertFalse(User.objects.filter(pk__in=escenario['usuarios']).exists())
+
+
+class ComandoEstresTestCase(TransactionTestCase):
+    """El comando usa un pool de hilos: sin la transacción abierta de TestCase."""
+
+    def test_comando_informa_y_limpia(self):
+        salida = StringIO()
+
+        call_command('estres_concurrente', '--hilos', '1', '--operaciones', '10', '--semilla', '3', stdout=salida)
+
+        self.assertIn('Invariantes verificadas', salida.getvalue())
+        self.assertIn('TOTAL', salida.getvalue())
+        self.assertFalse(Cuenta.objects.exists())
@@ -0,0 +1,90 @@
+# mi_finanzas/tests/test_etiquetas.py
+
+import tempfile
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from mi_finanzas.archivo import archivar_transacciones, restaurar_archivo
+from mi_finanzas.etiquetas import etiquetar, filtrar_por_etiquetas, leer_etiquetas, totales_por_etiqueta
+from mi_finanzas.models import Categoria, Cuenta, Etiqueta, Transaccion, TransaccionEtiquetaArchivada
+from mi_finanzas.respaldo import respaldar, restaurar
+
+User = get_user_model()
+
+
+class EtiquetasTestCase(TestCase):
+    """Etiquetas libres: filtros 'todas'/'cualquiera' y totales por etiqueta."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='etiquser', password='x')
+        self.cuenta = Cuenta.objects.create(usuario=self.user, nombre='Banco', tipo='CHEQUES', saldo=Decimal('1000.00'))
+        self.viajes = Categoria.objects.create(usuario=self.user, nombre='Viajes', tipo='EGRESO')
+        self.fecha = date.today().replace(day=1)
+        self.hotel = self._gasto('300.00', 'Hotel', ['vacaciones-2026', 'deducible'])
+        self.tren = self._gasto('80.00', 'Tren', ['vacaciones-2026'])
+        self.libro = self._gasto('20.00', 'Libro', ['deducible'])
+
+    def _gasto(self, monto, descripcion, etiquetas, fecha=None):
+        tx = Transaccion.objects.create(usuario=self.user, cuenta=self.cuenta, categoria=self.viajes, tipo='EGRESO',
+                                        monto=Decimal(monto), fecha=fecha or self.fecha, descripcion=descripcion)
+        etiquetar(tx, etiquetas)
+        return tx
+
+    def _filtrar(self, nombres, modo):
+        consulta = Transaccion.objects.filter(usuario=self.user)
+        return set(filtrar_por_etiquetas(consulta, self.user, nombres, modo).values_list('descripcion', flat=True))
+
+    def test_filtro_todas_y_cualquiera(self):
+        self.assertEqual(self._filtrar(['vacaciones-2026', 'deducible'], 'y'), {'Hotel'})
+        self.assertEqual(self._filtrar(['vacaciones-2026', 'deducible'], 'o'), {'Hotel', 'Tren', 'Libro'})
+        self.assertEqual(self._filtrar(['deducible', 'no-existe'], 'y'), set())
+        self.assertEqual(self._filtrar(['deducible', 'no-existe'], 'o'), {'Hotel', 'Libro'})
+
+    def test_etiquetar_normaliza_y_sustituye(self):
+        self.assertEqual(leer_etiquetas('Vacaciones-2026, #Deducible deducible'), ['vacaciones-2026', 'deducible'])
+        etiquetar(self.hotel, ['deducible'])
+
+        self.assertEqual(list(self.hotel.etiquetas.values_list('nombre', flat=True)), ['deducible'])
+        self.assertEqual(Etiqueta.objects.filter(usuario=self.user).count(), 2)
+
+    def test_totales_por_etiqueta(self):
+        with self.assertNumQueries(1):
+            totales = totales_por_etiqueta(Transaccion.objects.filter(usuario=self.user))
+
+        self.assertEqual([(t['etiqueta'], t['egresos'], t['cantidad']) for t in totales], [
+            ('vacaciones-2026', Decimal('380.00'), 2), ('deducible', Decimal('320.00'), 2),
+        ])
+
+    def test_vistas(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse('mi_finanzas:editar_transaccion', args=[self.libro.pk]), {
+            'cuenta': self.cuenta.pk, 'categoria': self.viajes.pk, 'tipo': 'EGRESO', 'monto': '20.00',
+            'fecha': self.fecha.isoformat(), 'descripcion': 'Libro', 'etiquetas_texto': 'deducible, #Vacaciones-2026',
+        })
+        self.assertEqual(set(self.libro.etiquetas.values_list('nombre', flat=True)), {'deducible', 'vacaciones-2026'})
+
+        lista = self.client.get(reverse('mi_finanzas:transacciones_lista'),
+                                {'etiquetas': 'vacaciones-2026,deducible', 'modo': 'y'})
+        self.assertEqual({t.descripcion for t in lista.context['transacciones']}, {'Hotel', 'Libro'})
+
+        reporte = self.client.get(reverse('mi_finanzas:reportes_financieros'), {'etiquetas': 'deducible'})
+        self.assertEqual(reporte.context['resumen_mensual']['gastos'], Decimal('320.00'))
+
+    def test_archivo_y_respaldo_conservan_las_etiquetas(self):
+        viejo = self._gasto('50.00', 'Vuelo viejo', ['vacaciones-2019'], fecha=date(2019, 7, 1))
+        archivar_transacciones(fecha_corte=date(2020, 1, 1), usuario=self.user)
+        self.assertEqual(TransaccionEtiquetaArchivada.objects.filter(transaccion_id=viejo.pk).count(), 1)
+
+        ruta = Path(tempfile.mkdtemp()) / 'respaldo.jsonl.gz'
+        self.addCleanup(ruta.unlink, missing_ok=True)
+        respaldar(ruta, usuario=self.user)
+        restaurar(ruta, reemplazar=True)
+        self.assertEqual(self._filtrar(['deducible', 'vacaciones-2026'], 'y'), {'Hotel'})
+
+        restaurar_archivo(usuario=self.user)
+        self.assertEqual(self._filtrar(['vacaciones-2019'], 'y'), {'Vuelo viejo'})
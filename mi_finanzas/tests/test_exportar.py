@@ -0,0 +1,61 @@
+# mi_finanzas/tests/test_exportar.py
+
+import shutil
+import tempfile
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.ipc as pa_ipc
+import pyarrow.parquet as pq
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from mi_finanzas.exportar import exportar_columnar
+from mi_finanzas.models import Categoria, Cuenta, Presupuesto, Transaccion
+
+User = get_user_model()
+
+
+class ExportarColumnarTestCase(TestCase):
+    """Exportación Parquet/Arrow en bloques con tipos y particiones."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='exportuser', password='x')
+        self.cuenta = Cuenta.objects.create(usuario=self.user, nombre='Banco', tipo='CHEQUES', saldo=Decimal('100.50'))
+        self.comida = Categoria.objects.create(usuario=self.user, nombre='Comida', tipo='EGRESO')
+        Presupuesto.objects.create(usuario=self.user, categoria=self.comida, monto_limite=Decimal('300.00'), mes=1, anio=2026)
+        for fecha, monto in [(date(2025, 12, 3), '10.25'), (date(2026, 1, 5), '20.00'), (date(2026, 1, 9), '1.01')]:
+            Transaccion.objects.create(
+                usuario=self.user, cuenta=self.cuenta, categoria=self.comida, tipo='EGRESO',
+                monto=Decimal(monto), fecha=fecha, descripcion='Compra',
+            )
+        self.directorio = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directorio)
+
+    def test_parquet_con_centavos_y_date32(self):
+        resumen = exportar_columnar(self.directorio, chunk_size=2)
+
+        self.assertEqual(resumen, {'cuentas': 1, 'categorias': 1, 'presupuestos': 1, 'transacciones': 3})
+        tabla = pq.read_table(self.directorio / 'transacciones.parquet')
+        self.assertEqual(tabla.schema.field('fecha').type, pa.date32())
+        self.assertEqual(tabla.schema.field('monto_centavos').type, pa.int64())
+        self.assertEqual(tabla.schema.field('monto_centavos').metadata, {b'escala': b'2'})
+        self.assertEqual(sorted(tabla.column('monto_centavos').to_pylist()), [101, 1025, 2000])
+        saldo = pq.read_table(self.directorio / 'cuentas.parquet').column('saldo_centavos').to_pylist()
+        self.assertEqual(saldo, [10050 - 1025 - 2000 - 101])
+
+    def test_particion_por_anio_y_mes(self):
+        exportar_columnar(self.directorio, particionar=True, chunk_size=2)
+
+        enero = pq.read_table(self.directorio / 'transacciones' / 'anio=2026' / 'mes=01' / 'parte.parquet')
+        diciembre = pq.read_table(self.directorio / 'transacciones' / 'anio=2025' / 'mes=12' / 'parte.parquet')
+        self.assertEqual((enero.num_rows, diciembre.num_rows), (2, 1))
+
+    def test_formato_arrow_ipc(self):
+        exportar_columnar(self.directorio, formato='arrow', usuario=self.user)
+
+        with pa_ipc.open_file(self.directorio / 'categorias.arrow') as lector:
+            tabla = lector.read_all()
+        self.assertEqual(tabla.column('nombre').to_pylist(), ['Comida'])
@@ -0,0 +1,109 @@
+# mi_finanzas/tests/test_extracto.py
+
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.test import TestCase
+from django.urls import reverse
+
+from mi_finanzas.archivo import archivar_transacciones
+from mi_finanzas.extracto import leer_cursor, pagina_extracto
+from mi_finanzas.models import Cuenta, SaldoMensual, Transaccion
+
+User = get_user_model()
+
+
+class ExtractoCuentaTestCase(TestCase):
+    """Extracto con saldo acumulado (función ventana) y paginación por cursor."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='extuser', password='x')
+        self.cuenta = Cuenta.objects.create(usuario=self.user, nombre='Banco', tipo='CHEQUES', saldo=Decimal('100.00'))
+        inicio = date(2026, 1, 1)
+        for i in range(25):
+            # Varias transacciones por día: el desempate es el pk
+            Transaccion.objects.create(
+                usuario=self.user, cuenta=self.cuenta, tipo='EGRESO' if i % 3 else 'INGRESO',
+                monto=Decimal('10.10') + i, fecha=inicio + timedelta(days=i // 2), descripcion=f'Movimiento {i}',
+            )
+        self.cuenta.refresh_from_db()
+
+    def _esperado(self):
+        """Saldo tras cada transacción, recorriendo el libro en Python (más recientes primero)."""
+        saldo = self.cuenta.saldo
+        esperado = []
+        for tx in Transaccion.objects.filter(cuenta=self.cuenta).order_by('-fecha', '-pk'):
+            esperado.append((tx.pk, saldo))
+            saldo -= tx.monto if tx.tipo == 'INGRESO' else -tx.monto
+        return esperado, saldo
+
+    def test_recorre_todas_las_paginas_con_saldo_correcto(self):
+        esperado, saldo_inicial = self._esperado()
+        vistas, cursor, paginas = [], None, []
+        while True:
+            pagina = pagina_extracto(self.cuenta, antes=leer_cursor(cursor), tamano=10)
+            paginas.append(pagina)
+            vistas += [(tx.pk, tx.saldo_tras) for tx in pagina['transacciones']]
+            cursor = pagina['siguiente']
+            if cursor is None:
+                break
+
+        self.assertEqual(vistas, esperado)
+        self.assertEqual([len(p['transacciones']) for p in paginas], [10, 10, 5])
+        self.assertIsNone(paginas[0]['anterior'])
+        self.assertEqual(paginas[0]['saldo_cierre'], self.cuenta.saldo)
+        self.assertEqual(paginas[-1]['saldo_apertura'], saldo_inicial)
+        # La apertura de una página es el cierre de la siguiente (más antigua)
+        self.assertEqual(paginas[0]['saldo_apertura'], paginas[1]['saldo_cierre'])
+
+        # Volver hacia lo reciente con 'despues' da la misma página
+        vuelta = pagina_extracto(self.cuenta, despues=leer_cursor(paginas[1]['anterior']), tamano=10)
+        self.assertEqual([tx.pk for tx in vuelta['transacciones']], [tx.pk for tx in paginas[0]['transacciones']])
+        self.assertIsNone(vuelta['anterior'])
+
+    def test_consultas_constantes_por_pagina(self):
+        primera = pagina_extracto(self.cuenta, tamano=5)
+        # La primera lectura construye la serie mensual de la cuenta
+        self.assertTrue(SaldoMensual.objects.filter(cuenta=self.cuenta).exists())
+        # Claves + cierre del mes + aggregate del mes parcial + página con la ventana
+        with self.assertNumQueries(4):
+            pagina_extracto(self.cuenta, antes=leer_cursor(primera['siguiente']), tamano=5)
+
+    def test_apertura_desde_el_cierre_mensual(self):
+        # Meses anteriores, uno de ellos ya en el archivo en frío
+        for i, fecha in enumerate([date(2025, 11, 5), date(2025, 11, 20), date(2025, 12, 3), date(2025, 12, 31)]):
+            Transaccion.objects.create(usuario=self.user, cuenta=self.cuenta, tipo='INGRESO',
+                                       monto=Decimal('7.25') * (i + 1), fecha=fecha, descripcion=f'Anterior {i}')
+        archivar_transacciones(fecha_corte=date(2025, 12, 1), usuario=self.user)
+        self.cuenta.refresh_from_db()
+        esperado, _ = self._esperado()
+
+        vistas, cursor = [], None
+        while True:
+            pagina = pagina_extracto(self.cuenta, antes=leer_cursor(cursor), tamano=4)
+            vistas += [(tx.pk, tx.saldo_tras) for tx in pagina['transacciones']]
+            cursor = pagina['siguiente']
+            if cursor is None:
+                break
+        self.assertEqual(vistas, esperado)
+
+        # La apertura sale de la serie: un descuadre de Cuenta.saldo no la mueve
+        Cuenta.objects.filter(pk=self.cuenta.pk).update(saldo=F('saldo') + 1000)
+        self.cuenta.refresh_from_db()
+        ultima = pagina_extracto(self.cuenta, antes=(date(2026, 1, 1), 0), tamano=4)
+        self.assertEqual([(tx.pk, tx.saldo_tras) for tx in ultima['transacciones']], esperado[-2:])
+
+    def test_vista(self):
+        self.client.force_login(self.user)
+        url = reverse('mi_finanzas:extracto_cuenta', args=[self.cuenta.pk])
+
+        respuesta = self.client.get(url, {'n': 10})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertContains(respuesta, 'Movimiento 24')
+        self.assertContains(respuesta, 'Más antiguas')
+
+        otro = User.objects.create_user(username='otro', password='x')
+        self.client.force_login(otro)
+        self.assertEqual(self.client.get(url).status_code, 404)
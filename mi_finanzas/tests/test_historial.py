@@ -0,0 +1,121 @@
+# mi_finanzas/tests/test_historial.py
+
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from mi_finanzas.archivo import archivar_transacciones
+from mi_finanzas.historial import preparar_series, reconstruir_saldos_mensuales, serie_patrimonio
+from mi_finanzas.models import Cuenta, SaldoMensual, Transaccion
+from mi_finanzas.saldos import saldos_diferidos
+
+User = get_user_model()
+
+HOY = date(2026, 6, 15)
+
+
+class HistorialSaldosTestCase(TestCase):
+    """Saldos a fin de mes: reconstrucción hacia atrás y mantenimiento incremental."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='histuser', password='x')
+        self.banco = Cuenta.objects.create(usuario=self.user, nombre='Banco', tipo='CHEQUES', saldo=Decimal('1000.00'))
+        self.ahorro = Cuenta.objects.create(usuario=self.user, nombre='Ahorro', tipo='AHORROS', saldo=Decimal('0.00'))
+        for fecha, tipo, monto in [(date(2026, 1, 10), 'INGRESO', '500.00'), (date(2026, 3, 5), 'EGRESO', '200.00'),
+                                   (date(2026, 3, 20), 'EGRESO', '50.00'), (date(2026, 5, 1), 'INGRESO', '100.00')]:
+            self._tx(self.banco, tipo, monto, fecha)
+
+    def _tx(self, cuenta, tipo, monto, fecha):
+        tx = Transaccion(usuario=self.user, cuenta=cuenta, tipo=tipo, monto=Decimal(monto), fecha=fecha,
+                         descripcion=f'{tipo} {fecha}')
+        tx.save()
+        return tx
+
+    def _serie(self, cuenta):
+        return dict(SaldoMensual.objects.filter(cuenta=cuenta).values_list('mes', 'saldo'))
+
+    def _reconstruida(self, cuenta):
+        """La serie que daría una reconstrucción completa (sin tocar la actual)."""
+        actual = list(SaldoMensual.objects.filter(cuenta=cuenta).values('usuario_id', 'cuenta_id', 'mes', 'saldo'))
+        reconstruir_saldos_mensuales(Cuenta.objects.filter(pk=cuenta.pk), hoy=HOY)
+        esperada = self._serie(cuenta)
+        SaldoMensual.objects.filter(cuenta=cuenta).delete()
+        SaldoMensual.objects.bulk_create([SaldoMensual(**fila) for fila in actual])
+        return esperada
+
+    def test_reconstruye_hacia_atras_desde_el_saldo(self):
+        reconstruir_saldos_mensuales(Cuenta.objects.filter(usuario=self.user), hoy=HOY)
+
+        self.assertEqual(self._serie(self.banco), {
+            date(2026, 1, 1): Decimal('1500.00'), date(2026, 2, 1): Decimal('1500.00'),
+            date(2026, 3, 1): Decimal('1250.00'), date(2026, 4, 1): Decimal('1250.00'),
+            date(2026, 5, 1): Decimal('1350.00'), date(2026, 6, 1): Decimal('1350.00'),
+        })
+        # Sin movimientos: solo el mes actual
+        self.assertEqual(self._serie(self.ahorro), {date(2026, 6, 1): Decimal('0.00')})
+
+    def test_escritura_atrasada_corrige_los_meses_posteriores(self):
+        reconstruir_saldos_mensuales(Cuenta.objects.filter(usuario=self.user), hoy=HOY)
+        tx = self._tx(self.banco, 'EGRESO', '30.00', date(2026, 2, 14))
+        tx.fecha, tx.monto = date(2026, 4, 2), Decimal('40.00')
+        tx.save()
+        Transaccion.objects.filter(descripcion__startswith='INGRESO 2026-05').get().delete()
+
+        serie = self._serie(self.banco)
+        self.assertEqual(serie[date(2026, 2, 1)], Decimal('1500.00'))
+        self.assertEqual(serie[date(2026, 4, 1)], Decimal('1210.00'))
+        self.assertEqual(serie, self._reconstruida(self.banco))
+
+    def test_escritura_anterior_al_inicio_rehace_la_serie_al_leer(self):
+        reconstruir_saldos_mensuales(Cuenta.objects.filter(usuario=self.user), hoy=HOY)
+        self._tx(self.banco, 'INGRESO', '10.00', date(2025, 11, 3))
+        self.assertFalse(SaldoMensual.objects.filter(cuenta=self.banco).exists())
+
+        preparar_series(self.user, hoy=HOY)
+
+        serie = self._serie(self.banco)
+        self.assertEqual(min(serie), date(2025, 11, 1))
+        self.assertEqual(serie[date(2025, 12, 1)], Decimal('1010.00'))
+        self.assertEqual(serie[date(2026, 6, 1)], Decimal('1360.00'))
+
+    def test_lote_diferido_y_transferencia(self):
+        reconstruir_saldos_mensuales(Cuenta.objects.filter(usuario=self.user), hoy=HOY)
+        with saldos_diferidos():
+            for dia in range(1, 11):
+                self._tx(self.banco, 'EGRESO', '1.00', date(2026, 2, dia))
+        self.client.force_login(self.user)
+        self.client.post(reverse('mi_finanzas:transferir_monto'), {
+            'cuenta_origen': self.banco.pk, 'cuenta_destino': self.ahorro.pk,
+            'monto': '100.00', 'fecha': '2026-06-01', 'descripcion': 'Ahorro',
+        })
+
+        self.assertEqual(self._serie(self.banco)[date(2026, 2, 1)], Decimal('1490.00'))
+        self.assertEqual(self._serie(self.banco)[date(2026, 6, 1)], Decimal('1240.00'))
+        self.assertEqual(self._serie(self.ahorro)[date(2026, 6, 1)], Decimal('100.00'))
+        self.assertEqual(self._serie(self.banco), self._reconstruida(self.banco))
+
+    def test_incluye_transacciones_archivadas(self):
+        archivar_transacciones(fecha_corte=date(2026, 4, 1), usuario=self.user)
+
+        reconstruir_saldos_mensuales(Cuenta.objects.filter(usuario=self.user), hoy=HOY)
+
+        self.assertEqual(self._serie(self.banco)[date(2026, 1, 1)], Decimal('1500.00'))
+        self.assertEqual(self._serie(self.banco)[date(2026, 3, 1)], Decimal('1250.00'))
+
+    def test_serie_de_patrimonio_y_vista(self):
+        serie = serie_patrimonio(self.user, desde=date(2025, 12, 1), hoy=HOY)
+
+        self.assertEqual(serie['meses'][0], date(2025, 12, 1))
+        self.assertEqual(serie['total'][0], Decimal('0.00'))
+        self.assertEqual(serie['total'][-1], Decimal('1350.00'))
+        banco = next(c for c in serie['cuentas'] if c['nombre'] == 'Banco')
+        self.assertIsNone(banco['saldos'][0])
+
+        self.client.force_login(self.user)
+        respuesta = self.client.get(reverse('mi_finanzas:historial_patrimonio'), {'desde': '2026-01'})
+        self.assertEqual(respuesta.status_code, 200)
+        datos = self.client.get(reverse('mi_finanzas:historial_patrimonio_datos'), {'desde': '2026-01'}).json()
+        self.assertEqual(datos['meses'][0], '2026-01-01')
@@ -0,0 +1,107 @@
+# mi_finanzas/tests/test_jerarquia.py
+
+import tempfile
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+from django.urls import reverse
+
+from mi_finanzas.jerarquia import reconstruir_jerarquia, totales_por_subarbol
+from mi_finanzas.models import Categoria, CategoriaRelacion, Cuenta, Presupuesto, Transaccion
+from mi_finanzas.respaldo import respaldar, restaurar
+
+User = get_user_model()
+
+
+class JerarquiaCategoriasTestCase(TestCase):
+    """Árbol de categorías con tabla de cierre y totales por subárbol."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='arboluser', password='x')
+        self.cuenta = Cuenta.objects.create(usuario=self.user, nombre='Banco', tipo='CHEQUES', saldo=Decimal('0'))
+        self.comida = self._categoria('Comida')
+        self.restaurantes = self._categoria('Restaurantes', self.comida)
+        self.cafeterias = self._categoria('Cafeterías', self.restaurantes)
+        self.super = self._categoria('Supermercado', self.comida)
+        self.ocio = self._categoria('Ocio')
+        self.hoy = date.today().replace(day=1)
+        for categoria, monto in ((self.comida, '5'), (self.restaurantes, '30'), (self.cafeterias, '4.10'),
+                                 (self.super, '60'), (self.ocio, '20')):
+            Transaccion.objects.create(usuario=self.user, cuenta=self.cuenta, categoria=categoria, tipo='EGRESO',
+                                       monto=Decimal(monto), fecha=self.hoy, descripcion=categoria.nombre)
+
+    def _categoria(self, nombre, padre=None):
+        return Categoria.objects.create(usuario=self.user, nombre=nombre, tipo='EGRESO', padre=padre)
+
+    def _cierre(self):
+        return set(CategoriaRelacion.objects.filter(ancestro__usuario=self.user)
+                   .values_list('ancestro__nombre', 'descendiente__nombre', 'profundidad'))
+
+    def test_totales_por_subarbol(self):
+        with self.assertNumQueries(1):
+            totales = totales_por_subarbol(Transaccion.objects.filter(usuario=self.user))
+
+        self.assertEqual(totales[self.comida.pk], Decimal('99.10'))
+        self.assertEqual(totales[self.restaurantes.pk], Decimal('34.10'))
+        self.assertEqual(totales[self.cafeterias.pk], Decimal('4.10'))
+        self.assertEqual(totales[self.ocio.pk], Decimal('20.00'))
+        solo = totales_por_subarbol(Transaccion.objects.filter(usuario=self.user), ancestros=[self.restaurantes.pk])
+        self.assertEqual(solo, {self.restaurantes.pk: Decimal('34.10')})
+
+    def test_mover_y_borrar_mantienen_el_cierre(self):
+        self.restaurantes.padre = self.ocio
+        self.restaurantes.save()
+        self.assertIn(('Ocio', 'Cafeterías', 2), self._cierre())
+        self.assertNotIn(('Comida', 'Cafeterías', 2), self._cierre())
+
+        self.ocio.delete()
+        self.restaurantes.refresh_from_db()
+        self.assertIsNone(self.restaurantes.padre_id)
+        cierre = self._cierre()
+        # Reconstruir desde Categoria.padre da exactamente lo mismo
+        reconstruir_jerarquia([self.user.pk])
+        self.assertEqual(self._cierre(), cierre)
+        self.assertIn(('Restaurantes', 'Cafeterías', 1), cierre)
+        self.assertFalse(any(ancestro == 'Ocio' for ancestro, _, _ in cierre))
+
+    def test_sin_ciclos_ni_mezclar_tipos(self):
+        self.comida.padre = self.cafeterias
+        with self.assertRaises(ValidationError):
+            self.comida.full_clean()
+        nomina = Categoria(usuario=self.user, nombre='Nómina', tipo='INGRESO', padre=self.comida)
+        with self.assertRaises(ValidationError):
+            nomina.full_clean()
+
+    def test_panel_y_presupuesto_del_padre(self):
+        Presupuesto.objects.create(usuario=self.user, categoria=self.comida, monto_limite=Decimal('100'),
+                                   mes=self.hoy.month, anio=self.hoy.year)
+        self.client.force_login(self.user)
+        respuesta = self.client.get(reverse('mi_finanzas:fragmento_panel', args=['presupuestos']))
+
+        presupuesto, = respuesta.context['resultados_presupuesto']
+        self.assertEqual(presupuesto['gasto_actual'], Decimal('99.10'))
+        grafico = self.client.get(reverse('mi_finanzas:fragmento_panel', args=['grafico']))
+        self.assertIn('"labels": ["Comida", "Ocio"]', grafico.context['chart_data_json'])
+
+    def test_reporte_en_orden_de_arbol(self):
+        self.client.force_login(self.user)
+        filas = self.client.get(reverse('mi_finanzas:reportes_financieros')).context['gastos_por_categoria']
+
+        self.assertEqual([(f['categoria__nombre'], f['nivel']) for f in filas], [
+            ('Comida', 0), ('Supermercado', 1), ('Restaurantes', 1), ('Cafeterías', 2), ('Ocio', 0),
+        ])
+
+    def test_respaldo_conserva_el_arbol(self):
+        ruta = Path(tempfile.mkdtemp()) / 'respaldo.jsonl.gz'
+        self.addCleanup(ruta.unlink, missing_ok=True)
+        respaldar(ruta, usuario=self.user)
+        cierre = self._cierre()
+
+        restaurar(ruta, reemplazar=True)
+
+        self.assertEqual(self._cierre(), cierre)
+        self.assertEqual(Categoria.objects.get(usuario=self.user, nombre='Cafeterías').padre.nombre, 'Restaurantes')
@@ -0,0 +1,93 @@
+# mi_finanzas/tests/test_panel.py
+
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from mi_finanzas.models import Categoria, Cuenta, Presupuesto, Transaccion
+from mi_finanzas.panel import TARJETAS
+
+User = get_user_model()
+
+
+class PanelPorTarjetasTestCase(TestCase):
+    """El panel es un esqueleto y cada tarjeta se pide (y se refresca) por separado."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(username='paneluser', password='x')
+        self.banco = Cuenta.objects.create(usuario=self.user, nombre='Banco', tipo='CHEQUES', saldo=Decimal('1000.00'))
+        self.ahorro = Cuenta.objects.create(usuario=self.user, nombre='Ahorro', tipo='AHORROS', saldo=Decimal('0.00'))
+        self.comida = Categoria.objects.create(usuario=self.user, nombre='Comida', tipo='EGRESO')
+        self.hoy = date.today()
+        Presupuesto.objects.create(usuario=self.user, categoria=self.comida, monto_limite=Decimal('200.00'),
+                                   mes=self.hoy.month, anio=self.hoy.year)
+        Transaccion.objects.create(usuario=self.user, cuenta=self.banco, tipo='INGRESO', monto=Decimal('500.00'),
+                                   fecha=self.hoy, descripcion='Nómina')
+        Transaccion.objects.create(usuario=self.user, cuenta=self.banco, categoria=self.comida, tipo='EGRESO',
+                                   monto=Decimal('50.00'), fecha=self.hoy, descripcion='Súper')
+        self.client.force_login(self.user)
+
+    def _tarjeta(self, nombre):
+        return self.client.get(reverse('mi_finanzas:fragmento_panel', args=[nombre]))
+
+    def test_el_esqueleto_no_calcula_las_tarjetas(self):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse('mi_finanzas:resumen_financiero'))
+        for nombre in TARJETAS:
+            self.assertContains(respuesta, reverse('mi_finanzas:fragmento_panel', args=[nombre]))
+        self.assertNotIn('saldo_total', respuesta.context)
+        self.assertFalse([q for q in consultas.captured_queries if 'SUM(' in q['sql'].upper()])
+
+    def test_cada_tarjeta_se_sirve_sola(self):
+        self.assertContains(self._tarjeta('saldos'), '1,450.00')
+        self.assertContains(self._tarjeta('presupuestos'), 'Comida')
+        self.assertContains(self._tarjeta('ultimas'), 'Nómina')
+        self.assertEqual(self._tarjeta('grafico').context['chart_data_json'], '{"labels": ["Comida"], "data": [50.0]}')
+        self.assertEqual(self._tarjeta('desconocida').status_code, 404)
+
+    def test_totales_del_mes_por_tipo(self):
+        # El monto se guarda positivo: ingresos y gastos salen del tipo, no del signo
+        Transaccion.objects.create(usuario=self.user, cuenta=self.banco, tipo='EGRESO', monto=Decimal('100.00'),
+                                   fecha=self.hoy, descripcion='Transferencia', es_transferencia=True)
+        totales = self._tarjeta('totales').context
+        self.assertEqual((totales['ingresos_mes'], totales['gastos_mes']), (Decimal('500.00'), Decimal('50.00')))
+
+    def test_transferencia_parcial_indica_las_tarjetas_afectadas(self):
+        respuesta = self.client.post(reverse('mi_finanzas:transferir_monto'), {
+            'cuenta_origen': self.banco.pk, 'cuenta_destino': self.ahorro.pk, 'monto': '100.00',
+            'fecha': self.hoy.isoformat(), 'descripcion': 'Ahorro',
+        }, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['tarjetas'], ['saldos', 'ultimas'])
+        self.assertIn('panel:actualizar', respuesta['HX-Trigger'])
+        self.ahorro.refresh_from_db()
+        self.assertEqual(self.ahorro.saldo, Decimal('100.00'))
+
+        sin_saldo = self.client.post(reverse('mi_finanzas:transferir_monto'), {
+            'cuenta_origen': self.ahorro.pk, 'cuenta_destino': self.banco.pk, 'monto': '999.00',
+            'fecha': self.hoy.isoformat(),
+        }, HTTP_HX_REQUEST='true')
+        self.assertEqual(sin_saldo.status_code, 400)
+        self.assertFalse(sin_saldo.json()['ok'])
+
+    def test_transaccion_parcial_refresca_todo_el_mes(self):
+        datos = {'cuenta': self.banco.pk, 'tipo': 'EGRESO', 'monto': '25.00', 'fecha': self.hoy.isoformat(),
+                 'descripcion': 'Pan', 'categoria': self.comida.pk}
+        respuesta = self.client.post(reverse('mi_finanzas:anadir_transaccion'), datos,
+                                     HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(respuesta.json()['tarjetas'], list(TARJETAS))
+        presupuesto, = self._tarjeta('presupuestos').context['resultados_presupuesto']
+        self.assertEqual(presupuesto['gasto_actual'], Decimal('75.00'))
+
+        invalida = self.client.post(reverse('mi_finanzas:anadir_transaccion'), dict(datos, monto=''),
+                                    HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(invalida.status_code, 400)
+        self.assertIn('monto', invalida.json()['errores'])
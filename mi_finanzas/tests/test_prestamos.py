@@ -0,0 +1,172 @@
+# mi_finanzas/tests/test_prestamos.py
+
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from dateutil.relativedelta import relativedelta
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from mi_finanzas import prestamos as modulo_prestamos
+from mi_finanzas.archivo import archivar_transacciones, restaurar_archivo
+from mi_finanzas.models import Cuenta, CuotaPrestamo, Prestamo, Transaccion, TransaccionRecurrente
+from mi_finanzas.prestamos import recalcular_prestamo
+
+User = get_user_model()
+
+
+class PrestamoTestCase(TestCase):
+    """Calendario de amortización: cálculo vectorizado, pagos enlazados y recálculo parcial."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='presuser', password='x')
+        self.banco = Cuenta.objects.create(usuario=self.user, nombre='Banco', tipo='CHEQUES', saldo=Decimal('50000.00'))
+        self.hipoteca = Cuenta.objects.create(usuario=self.user, nombre='Hipoteca', tipo='HIPOTECA',
+                                              saldo=Decimal('-100000.00'))
+        self.prestamo = Prestamo.objects.create(
+            usuario=self.user, cuenta=self.hipoteca, principal=Decimal('100000.00'), tasa_anual=Decimal('6'),
+            plazo_meses=360, fecha_inicio=date(2026, 1, 1), dia_pago=31,
+        )
+
+    def _pagar(self, monto, fecha=date(2026, 1, 31)):
+        return Transaccion.objects.create(usuario=self.user, cuenta=self.hipoteca, tipo='INGRESO',
+                                          monto=Decimal(monto), fecha=fecha, descripcion='Pago hipoteca')
+
+    def _calendario(self):
+        return list(CuotaPrestamo.objects.filter(prestamo=self.prestamo).order_by('numero')
+                    .values_list('numero', 'fecha', 'cuota', 'interes', 'capital', 'saldo', 'transaccion_id'))
+
+    def test_calendario_completo(self):
+        cuotas = list(self.prestamo.cuotas.order_by('numero'))
+
+        self.assertEqual(self.prestamo.cuota, Decimal('599.55'))
+        self.assertEqual(len(cuotas), 360)
+        self.assertEqual(cuotas[0].interes, Decimal('500.00'))
+        self.assertEqual(cuotas[0].capital, Decimal('99.55'))
+        self.assertEqual(sum(c.capital for c in cuotas), Decimal('100000.00'))
+        self.assertEqual(cuotas[-1].saldo, Decimal('0.00'))
+        self.assertTrue(all(c.cuota == Decimal('599.55') for c in cuotas[:-1]))
+        # Día de pago recortado al último día del mes
+        self.assertEqual(cuotas[1].fecha, date(2026, 2, 28))
+        self.assertEqual(self.prestamo.capital_pendiente, Decimal('100000.00'))
+
+    def test_pago_exacto_y_pago_extra(self):
+        self._pagar('599.55')
+        self.prestamo.refresh_from_db()
+        self.assertEqual(self.prestamo.cuotas_pagadas, 1)
+        self.assertEqual(self.prestamo.capital_pendiente, Decimal('99900.45'))
+
+        primera = CuotaPrestamo.objects.get(prestamo=self.prestamo, numero=1)
+        # Un pago extra solo recalcula desde su cuota: la primera no se toca
+        with mock.patch.object(modulo_prestamos, 'recalcular_prestamo') as recalcular:
+            pago = self._pagar('20599.55', fecha=date(2026, 2, 28))
+        recalcular.assert_not_called()
+        self.assertEqual(CuotaPrestamo.objects.get(pk=primera.pk).transaccion_id, primera.transaccion_id)
+
+        segunda = CuotaPrestamo.objects.get(prestamo=self.prestamo, numero=2)
+        self.assertEqual(segunda.transaccion_id, pago.pk)
+        self.assertEqual(segunda.capital, Decimal('20599.55') - segunda.interes)
+        self.prestamo.refresh_from_db()
+        self.assertEqual(self.prestamo.capital_pendiente, segunda.saldo)
+        # Misma cuota, plazo más corto
+        self.assertLess(self.prestamo.cuotas.count(), 300)
+        self.assertEqual(self.prestamo.cuotas.get(numero=3).cuota, Decimal('599.55'))
+
+        # El recálculo completo repite los pagos y llega al mismo calendario
+        incremental = self._calendario()
+        recalcular_prestamo(self.prestamo)
+        self.assertEqual(self._calendario(), incremental)
+
+    def test_borrar_pago_rehace_el_calendario(self):
+        pago = self._pagar('10599.55')
+        original = Prestamo.objects.get(pk=self.prestamo.pk)
+        self.assertLess(original.capital_pendiente, Decimal('90000'))
+
+        pago.delete()
+
+        self.prestamo.refresh_from_db()
+        self.assertEqual(self.prestamo.cuotas_pagadas, 0)
+        self.assertEqual(self.prestamo.capital_pendiente, Decimal('100000.00'))
+        self.assertEqual(self.prestamo.cuotas.count(), 360)
+
+    def test_transferencia_panel_y_vista(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse('mi_finanzas:transferir_monto'), {
+            'cuenta_origen': self.banco.pk, 'cuenta_destino': self.hipoteca.pk,
+            'monto': '599.55', 'fecha': '2026-01-31', 'descripcion': 'Cuota',
+        })
+
+        self.prestamo.refresh_from_db()
+        self.assertEqual(self.prestamo.cuotas_pagadas, 1)
+        self.assertIsNotNone(self.prestamo.cuotas.get(numero=1).transaccion_id)
+
+        panel = self.client.get(reverse('mi_finanzas:resumen_financiero'))
+        self.assertContains(panel, '99,900.45')
+        vista = self.client.get(reverse('mi_finanzas:prestamo_cuenta', args=[self.hipoteca.pk]))
+        self.assertContains(vista, 'Capital pendiente')
+        self.assertEqual(self.client.get(reverse('mi_finanzas:prestamo_cuenta', args=[self.banco.pk])).status_code, 404)
+
+    def test_pagos_recurrentes_se_registran(self):
+        # crear_recurrentes inserta con bulk_create (sin post_save): dos cuotas atrasadas, cada una su pago
+        hoy = timezone.localdate()
+        TransaccionRecurrente.objects.create(
+            usuario=self.user, cuenta=self.hipoteca, tipo='INGRESO', monto=Decimal('599.55'),
+            descripcion='Cuota hipoteca', frecuencia='MENSUAL', proximo_pago=hoy - relativedelta(months=1),
+        )
+
+        call_command('crear_recurrentes', stdout=StringIO())
+
+        pagos = list(Transaccion.objects.filter(cuenta=self.hipoteca).order_by('fecha').values_list('pk', flat=True))
+        self.assertEqual(len(pagos), 2)
+        self.assertEqual([c.transaccion_id for c in self.prestamo.cuotas.order_by('numero')[:3]], pagos + [None])
+        self.prestamo.refresh_from_db()
+        self.assertEqual(self.prestamo.cuotas_pagadas, 2)
+        self.assertEqual(self.prestamo.capital_pendiente, self.prestamo.cuotas.get(numero=2).saldo)
+
+    def test_cambiar_condiciones_recalcula(self):
+        self.prestamo.plazo_meses = 120
+        self.prestamo.save()
+
+        self.assertEqual(self.prestamo.cuotas.count(), 120)
+        self.assertEqual(Prestamo.objects.get(pk=self.prestamo.pk).cuota, self.prestamo.cuota)
+        self.assertGreater(self.prestamo.cuota, Decimal('1000'))
+
+    def test_pagos_archivados_siguen_contando(self):
+        auto = Cuenta.objects.create(usuario=self.user, nombre='Coche', tipo='AUTO', saldo=Decimal('-10000.00'))
+        prestamo = Prestamo.objects.create(
+            usuario=self.user, cuenta=auto, principal=Decimal('10000.00'), tasa_anual=Decimal('6'),
+            plazo_meses=24, fecha_inicio=date(2020, 1, 1), dia_pago=15,
+        )
+        cuota = prestamo.cuota
+        for mes in (1, 2, 3):
+            Transaccion.objects.create(usuario=self.user, cuenta=auto, tipo='INGRESO', monto=cuota,
+                                       fecha=date(2020, mes, 15), descripcion='Cuota coche')
+
+        archivar_transacciones(fecha_corte=date(2021, 1, 1), usuario=self.user)
+        cuotas = prestamo.cuotas.order_by('numero')
+        self.assertEqual([c.transaccion_id for c in cuotas[:3]], [None, None, None])
+        self.assertEqual([c.pago for c in cuotas[:3]], [cuota] * 3)
+
+        # El siguiente pago cubre la cuarta cuota, no la primera
+        pago = Transaccion.objects.create(usuario=self.user, cuenta=auto, tipo='INGRESO', monto=cuota,
+                                          fecha=date(2021, 4, 15), descripcion='Cuota coche')
+        prestamo.refresh_from_db()
+        self.assertEqual(prestamo.cuotas_pagadas, 4)
+        self.assertEqual(prestamo.cuotas.get(numero=4).transaccion_id, pago.pk)
+
+        # El recálculo completo repite también los pagos archivados
+        calendario = list(prestamo.cuotas.order_by('numero').values_list('numero', 'saldo', 'pago'))
+        recalcular_prestamo(prestamo)
+        self.assertEqual(prestamo.cuotas_pagadas, 4)
+        self.assertEqual(list(prestamo.cuotas.order_by('numero').values_list('numero', 'saldo', 'pago')), calendario)
+
+        # Restaurar el archivo no duplica pagos; borrar un pago sí libera su cuota
+        restaurar_archivo(usuario=self.user)
+        pago.delete()
+        prestamo.refresh_from_db()
+        self.assertEqual(prestamo.cuotas_pagadas, 3)
@@ -0,0 +1,83 @@
+# mi_finanzas/tests/test_prevision.py
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from mi_finanzas.models import Cuenta, Transaccion, TransaccionRecurrente
+from mi_finanzas.prevision import calcular_prevision, prevision
+
+User = get_user_model()
+
+
+class PrevisionTestCase(TestCase):
+    """Saldos diarios proyectados a partir de las recurrentes activas."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.hoy = timezone.localdate()
+        self.user = User.objects.create_user(username='prevuser', password='x')
+        self.banco = Cuenta.objects.create(usuario=self.user, nombre='Banco', tipo='CHEQUES', saldo=Decimal('100.00'))
+        self.tarjeta = Cuenta.objects.create(usuario=self.user, nombre='Tarjeta', tipo='TARJETA', saldo=Decimal('-50.00'))
+        self._recurrente(self.banco, 'EGRESO', '80.00', 'MENSUAL', 5)
+        self._recurrente(self.banco, 'INGRESO', '10.00', 'SEMANAL', 1)
+        self._recurrente(self.tarjeta, 'EGRESO', '5.00', 'DIARIA', 0)
+
+    def _recurrente(self, cuenta, tipo, monto, frecuencia, dentro_de):
+        return TransaccionRecurrente.objects.create(
+            usuario=self.user, cuenta=cuenta, tipo=tipo, monto=Decimal(monto), descripcion=f'{tipo} {frecuencia}',
+            frecuencia=frecuencia, proximo_pago=self.hoy + timedelta(days=dentro_de),
+        )
+
+    def _por_nombre(self, datos):
+        return {c['nombre']: c for c in datos['cuentas']}
+
+    def test_saldos_diarios_y_primer_negativo(self):
+        cuentas = self._por_nombre(calcular_prevision(self.user, dias=90, hoy=self.hoy))
+        banco, tarjeta = cuentas['Banco'], cuentas['Tarjeta']
+
+        self.assertEqual(len(banco['serie']), 91)
+        self.assertEqual(banco['serie'][0], 100.0)
+        # Día 1: +10 (semanal); día 5: -80
+        self.assertEqual(banco['serie'][5], 30.0)
+        self.assertIsNotNone(banco['primer_negativo'])
+        dia = (banco['primer_negativo'] - self.hoy).days
+        self.assertLess(banco['serie'][dia], 0)
+        self.assertTrue(all(saldo >= 0 for saldo in banco['serie'][:dia]))
+        # Las cuentas de crédito no generan alerta
+        self.assertIsNone(tarjeta['primer_negativo'])
+        self.assertEqual(tarjeta['saldo_final'], Decimal('-50.00') - 91 * Decimal('5.00'))
+
+    def test_horizonte_mayor_que_la_tabla_expande_las_reglas(self):
+        con_tabla = calcular_prevision(self.user, dias=365, hoy=self.hoy)
+        with self.settings(MI_FINANZAS_HORIZONTE_OCURRENCIAS=30):
+            expandida = calcular_prevision(self.user, dias=365, hoy=self.hoy)
+        self.assertEqual(con_tabla['total'], expandida['total'])
+
+    def test_cache_por_version_de_datos(self):
+        prevision(self.user, dias=30)
+        with self.assertNumQueries(0):
+            prevision(self.user, dias=30)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Transaccion.objects.create(usuario=self.user, cuenta=self.banco, tipo='INGRESO', monto=Decimal('1000.00'),
+                                       fecha=self.hoy, descripcion='Nómina')
+
+        banco = self._por_nombre(prevision(self.user, dias=30))['Banco']
+        self.assertEqual(banco['saldo_actual'], Decimal('1100.00'))
+
+    def test_vistas(self):
+        self.client.force_login(self.user)
+
+        respuesta = self.client.get(reverse('mi_finanzas:prevision_flujo'), {'dias': 90})
+        self.assertContains(respuesta, 'quedaría en negativo')
+
+        datos = self.client.get(reverse('mi_finanzas:prevision_flujo_datos'), {'dias': 30}).json()
+        self.assertEqual(datos['dias'], 30)
+        self.assertEqual(len(datos['total']), 31)
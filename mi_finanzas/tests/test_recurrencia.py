@@ -0,0 +1,107 @@
+# mi_finanzas/tests/test_recurrencia.py
+
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from mi_finanzas.models import Cuenta, Transaccion, TransaccionRecurrente
+from mi_finanzas.recurrencia import ocurrencias, proximos_vencimientos
+
+User = get_user_model()
+
+
+class RecurrenciaTestCase(TestCase):
+    """Reglas con calendario real y tabla de próximas ocurrencias."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='recuser', password='x')
+        self.cuenta = Cuenta.objects.create(usuario=self.user, nombre='Banco', tipo='CHEQUES', saldo=Decimal('500.00'))
+
+    def _recurrente(self, frecuencia, proximo_pago, **extra):
+        return TransaccionRecurrente.objects.create(
+            usuario=self.user, cuenta=self.cuenta, tipo='EGRESO', monto=Decimal('20.00'),
+            descripcion='Cuota', frecuencia=frecuencia, proximo_pago=proximo_pago, **extra,
+        )
+
+    def _fechas(self, recurrente, limite):
+        return [fecha for _, fecha in ocurrencias(recurrente, limite=limite)]
+
+    def test_mensual_anclada_a_fin_de_mes(self):
+        rec = self._recurrente('MENSUAL', date(2026, 1, 31))
+        self.assertEqual(
+            self._fechas(rec, 4), [date(2026, 1, 31), date(2026, 2, 28), date(2026, 3, 31), date(2026, 4, 30)]
+        )
+        rec = self._recurrente('MENSUAL', date(2026, 2, 28), fin_de_mes=True, intervalo=2)
+        self.assertEqual(self._fechas(rec, 3), [date(2026, 2, 28), date(2026, 4, 30), date(2026, 6, 30)])
+
+    def test_anual_y_semanal_con_intervalo(self):
+        rec = self._recurrente('ANUAL', date(2024, 2, 29))
+        self.assertEqual(rec.calcular_siguiente_fecha(), date(2025, 2, 28))
+        self.assertEqual(self._fechas(rec, 5)[-1], date(2028, 2, 29))
+        rec = self._recurrente('SEMANAL', date(2026, 1, 5), intervalo=2)
+        self.assertEqual(rec.calcular_siguiente_fecha(), date(2026, 1, 19))
+
+    def test_fin_por_fecha_y_por_numero(self):
+        rec = self._recurrente('MENSUAL', date(2026, 1, 15), max_ocurrencias=3)
+        self.assertEqual(len(self._fechas(rec, 10)), 3)
+        rec = self._recurrente('DIARIA', date(2026, 1, 1), fecha_fin=date(2026, 1, 1))
+        self.assertIsNone(rec.calcular_siguiente_fecha())
+
+    def test_vencimientos_del_mes_en_una_consulta(self):
+        hoy = timezone.localdate()
+        self._recurrente('SEMANAL', hoy)
+        self._recurrente('MENSUAL', hoy + timedelta(days=10))
+        self._recurrente('MENSUAL', hoy + timedelta(days=45))
+
+        with self.assertNumQueries(1):
+            vencimientos = list(proximos_vencimientos(self.user, dias=30))
+
+        self.assertEqual(len(vencimientos), 5 + 1)
+        self.assertEqual([o.fecha for o in vencimientos], sorted(o.fecha for o in vencimientos))
+
+    def test_cambiar_la_regla_regenera_sus_ocurrencias(self):
+        rec = self._recurrente('MENSUAL', date(2030, 1, 31))
+        otra = self._recurrente('SEMANAL', date(2030, 1, 1))
+        filas_otra = list(otra.ocurrencias.values_list('pk', flat=True))
+
+        rec.frecuencia = 'ANUAL'
+        rec.save()
+
+        self.assertEqual(rec.ocurrencias.order_by('indice')[1].fecha, date(2031, 1, 31))
+        self.assertEqual(list(otra.ocurrencias.values_list('pk', flat=True)), filas_otra)
+
+    def test_contabilizar_avanza_la_tabla_y_termina_la_regla(self):
+        hoy = timezone.localdate()
+        rec = self._recurrente('DIARIA', hoy - timedelta(days=1), max_ocurrencias=2)
+        self.assertEqual(list(rec.ocurrencias.values_list('fecha', flat=True)), [hoy - timedelta(days=1), hoy])
+
+        # Las dos vencidas se contabilizan en la misma ejecución, cada una con su fecha
+        call_command('crear_recurrentes', stdout=StringIO())
+        rec.refresh_from_db()
+        self.assertEqual(sorted(Transaccion.objects.filter(usuario=self.user).values_list('fecha', flat=True)),
+                         [hoy - timedelta(days=1), hoy])
+        self.assertFalse(rec.esta_activa)
+        self.assertFalse(rec.ocurrencias.exists())
+
+        call_command('crear_recurrentes', stdout=StringIO())
+        self.assertEqual(Transaccion.objects.filter(usuario=self.user).count(), 2)
+
+    def test_contabilizar_atrasadas_sigue_el_calendario(self):
+        # Mensual anclada en un 31, tres meses sin ejecutar: cada pago con la fecha de su ocurrencia
+        hoy = date(2026, 5, 15)
+        rec = self._recurrente('MENSUAL', date(2026, 1, 31))
+
+        with patch('django.utils.timezone.localdate', return_value=hoy):
+            call_command('crear_recurrentes', stdout=StringIO())
+
+        self.assertEqual(sorted(Transaccion.objects.filter(usuario=self.user).values_list('fecha', flat=True)),
+                         [date(2026, 1, 31), date(2026, 2, 28), date(2026, 3, 31), date(2026, 4, 30)])
+        rec.refresh_from_db()
+        self.assertEqual(rec.proximo_pago, date(2026, 5, 31))
+        self.assertEqual(rec.ocurrencias.order_by('fecha').first().fecha, date(2026, 5, 31))
@@ -0,0 +1,60 @@
+# mi_finanzas/tests/test_replicas.py
+
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from mi_finanzas.models import Cuenta, Transaccion
+from mi_finanzas.replicas import en_replica
+
+User = get_user_model()
+
+
+@override_settings(MI_FINANZAS_REPLICAS={'default': 'replica'})
+class ReplicasTestCase(TestCase):
+    """Lecturas en réplica (segunda copia SQLite) con lectura de lo propio escrito."""
+
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(username='replicauser', password='x')
+        Cuenta.objects.create(usuario=self.user, nombre='Banco', tipo='CHEQUES')
+        # Solo la réplica tiene este ingreso: así se distingue de dónde se leyó
+        cuenta_replica = Cuenta.objects.using('replica').create(usuario=self.user, nombre='Banco', tipo='CHEQUES')
+        Transaccion.objects.using('replica').bulk_create([Transaccion(
+            usuario=self.user, cuenta=cuenta_replica, tipo='INGRESO', monto=Decimal('500.00'),
+            fecha=date.today(), descripcion='Nómina',
+        )])
+        self.client.force_login(self.user)
+        self.url = reverse('mi_finanzas:reportes_financieros')
+
+    def _ingresos_del_reporte(self):
+        return self.client.get(self.url).context['resumen_mensual']['ingresos']
+
+    def test_reporte_lee_de_la_replica(self):
+        self.assertEqual(self._ingresos_del_reporte(), Decimal('500.00'))
+
+    def test_tras_un_post_las_siguientes_peticiones_leen_de_la_primaria(self):
+        with self.settings(MI_FINANZAS_PRIMARIO_TRAS_ESCRITURA=2):
+            self.client.post(reverse('mi_finanzas:anadir_cuenta'), {'nombre': 'Caja', 'tipo': 'EFECTIVO', 'saldo': '0'})
+            lecturas = [self._ingresos_del_reporte() for _ in range(3)]
+
+        self.assertEqual(lecturas, [Decimal('0'), Decimal('0'), Decimal('500.00')])
+        self.assertTrue(Cuenta.objects.using('default').filter(nombre='Caja').exists())
+        self.assertFalse(Cuenta.objects.using('replica').filter(nombre='Caja').exists())
+
+    def test_escrituras_van_siempre_a_la_primaria(self):
+        with en_replica():
+            leida = Cuenta.objects.get(usuario=self.user)
+            Cuenta.objects.create(usuario=self.user, nombre='Nueva', tipo='EFECTIVO')
+
+        self.assertEqual(leida._state.db, 'replica')
+        self.assertEqual(router.db_for_write(Cuenta, instance=leida), 'default')
+        self.assertTrue(Cuenta.objects.using('default').filter(nombre='Nueva').exists())
@@ -0,0 +1,125 @@
+# mi_finanzas/tests/test_respaldo.py
+
+import os
+import tempfile
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from mi_finanzas.archivo import archivar_transacciones
+from mi_finanzas.compartidas import compartir_cuenta, cuentas_visibles
+from mi_finanzas.models import (
+    Categoria, Cuenta, CuotaPrestamo, MiembroCuenta, Posicion, Prestamo, Presupuesto, SaldoApertura, Transaccion,
+    TransaccionArchivada, TransaccionRecurrente,
+)
+from mi_finanzas.respaldo import respaldar, restaurar
+
+User = get_user_model()
+
+
+class RespaldoTestCase(TestCase):
+    """Respaldo JSONL comprimido y restauración en bloque con reasignación de claves."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='respuser', password='x')
+        self.banco = Cuenta.objects.create(usuario=self.user, nombre='Banco', tipo='CHEQUES', saldo=Decimal('1000.00'))
+        self.ahorro = Cuenta.objects.create(usuario=self.user, nombre='Ahorro', tipo='AHORROS', saldo=Decimal('0.00'))
+        comida = Categoria.objects.create(usuario=self.user, nombre='Comida', tipo='EGRESO')
+        Presupuesto.objects.create(usuario=self.user, categoria=comida, monto_limite=Decimal('200.00'), mes=1, anio=2026)
+        TransaccionRecurrente.objects.create(
+            usuario=self.user, cuenta=self.banco, categoria=comida, tipo='EGRESO',
+            monto=Decimal('9.99'), descripcion='Streaming', frecuencia='MENSUAL',
+        )
+        Transaccion.objects.create(usuario=self.user, cuenta=self.banco, categoria=comida, tipo='EGRESO',
+                                   monto=Decimal('40.00'), fecha=date(2019, 5, 1), descripcion='Antigua')
+        Transaccion.objects.create(usuario=self.user, cuenta=self.banco, categoria=comida, tipo='EGRESO',
+                                   monto=Decimal('15.50'), fecha=date(2026, 1, 2), descripcion='Mercado')
+        origen = Transaccion.objects.create(usuario=self.user, cuenta=self.banco, tipo='EGRESO', monto=Decimal('100.00'),
+                                            fecha=date(2026, 1, 3), descripcion='A ahorro', es_transferencia=True)
+        destino = Transaccion.objects.create(usuario=self.user, cuenta=self.ahorro, tipo='INGRESO', monto=Decimal('100.00'),
+                                             fecha=date(2026, 1, 3), descripcion='Desde banco', es_transferencia=True)
+        Transaccion.objects.filter(pk=origen.pk).update(transaccion_relacionada=destino)
+        Transaccion.objects.filter(pk=destino.pk).update(transaccion_relacionada=origen)
+        archivar_transacciones(fecha_corte=date(2020, 1, 1), usuario=self.user)
+
+        descriptor, self.ruta = tempfile.mkstemp(suffix='.jsonl.gz')
+        os.close(descriptor)
+        self.addCleanup(os.remove, self.ruta)
+
+    def test_restaurar_en_otro_usuario_reasigna_claves_y_saldos(self):
+        resumen = respaldar(self.ruta, usuario=self.user)
+        self.assertEqual(resumen['transacciones'], 4)
+
+        otro = User.objects.create_user(username='copia', password='x')
+        restaurar(self.ruta, usuario_destino=otro)
+
+        banco = Cuenta.objects.get(usuario=otro, nombre='Banco')
+        self.assertNotEqual(banco.pk, self.banco.pk)
+        # Saldo copiado tal cual (no se reaplican las transacciones)
+        self.assertEqual(banco.saldo, Cuenta.objects.get(pk=self.banco.pk).saldo)
+
+        origen = Transaccion.objects.get(usuario=otro, cuenta=banco, es_transferencia=True)
+        destino = origen.transaccion_relacionada
+        self.assertEqual(destino.cuenta.nombre, 'Ahorro')
+        self.assertEqual(destino.transaccion_relacionada_id, origen.pk)
+        self.assertEqual(destino.usuario, otro)
+
+        # La transacción antigua vuelve al archivo con el mismo corte
+        self.assertEqual(TransaccionArchivada.objects.filter(usuario=otro).count(), 1)
+        self.assertEqual(SaldoApertura.objects.get(cuenta=banco).fecha_corte, date(2020, 1, 1))
+        self.assertEqual(TransaccionRecurrente.objects.get(usuario=otro).cuenta, banco)
+        self.assertEqual(Presupuesto.objects.get(usuario=otro).categoria.usuario, otro)
+
+    def test_reemplazar_restaura_el_mismo_usuario(self):
+        respaldar(self.ruta)
+        saldos = dict(Cuenta.objects.values_list('nombre', 'saldo'))
+        fechas = sorted(Transaccion.objects.values_list('fecha_creacion', flat=True))
+
+        restaurar(self.ruta, reemplazar=True)
+
+        self.assertEqual(dict(Cuenta.objects.values_list('nombre', 'saldo')), saldos)
+        self.assertEqual(Transaccion.objects.count(), 3)
+        self.assertEqual(sorted(Transaccion.objects.values_list('fecha_creacion', flat=True)), fechas)
+
+    def test_prestamos_posiciones_y_miembros(self):
+        hipoteca = Cuenta.objects.create(usuario=self.user, nombre='Hipoteca', tipo='HIPOTECA',
+                                         saldo=Decimal('-5000.00'))
+        prestamo = Prestamo.objects.create(usuario=self.user, cuenta=hipoteca, principal=Decimal('5000.00'),
+                                           tasa_anual=Decimal('4'), plazo_meses=12, fecha_inicio=date(2019, 1, 1))
+        Transaccion.objects.create(usuario=self.user, cuenta=hipoteca, tipo='INGRESO', monto=prestamo.cuota,
+                                   fecha=date(2019, 1, 1), descripcion='Cuota archivada')
+        Transaccion.objects.create(usuario=self.user, cuenta=hipoteca, tipo='INGRESO', monto=prestamo.cuota,
+                                   fecha=date(2026, 2, 1), descripcion='Cuota viva')
+        archivar_transacciones(fecha_corte=date(2020, 1, 1), usuario=self.user)
+        broker = Cuenta.objects.create(usuario=self.user, nombre='Broker', tipo='INVERSION')
+        Posicion.objects.create(usuario=self.user, cuenta=broker, activo='vwce', cantidad=Decimal('12.5'))
+        pareja = User.objects.create_user(username='pareja', password='x')
+        compartir_cuenta(self.banco, pareja, rol='EDITOR')
+        cuotas = list(CuotaPrestamo.objects.filter(prestamo=prestamo).order_by('numero')
+                      .values_list('numero', 'saldo', 'pago'))
+
+        respaldar(self.ruta, usuario=self.user)
+        restaurar(self.ruta, usuario_destino=self.user, reemplazar=True)
+
+        banco = Cuenta.objects.get(usuario=self.user, nombre='Banco')
+        self.assertNotEqual(banco.pk, self.banco.pk)
+        restaurado = Prestamo.objects.get(cuenta__usuario=self.user)
+        self.assertEqual((restaurado.cuota, restaurado.cuotas_pagadas), (prestamo.cuota, 2))
+        self.assertEqual(list(restaurado.cuotas.order_by('numero').values_list('numero', 'saldo', 'pago')), cuotas)
+        # La cuota pagada en vivo vuelve a enlazarse; la archivada conserva su pago
+        viva = Transaccion.objects.get(usuario=self.user, descripcion='Cuota viva')
+        self.assertEqual(restaurado.cuotas.get(numero=2).transaccion_id, viva.pk)
+        self.assertIsNone(restaurado.cuotas.get(numero=1).transaccion_id)
+        self.assertEqual(Posicion.objects.get(cuenta__usuario=self.user).cantidad, Decimal('12.5'))
+        miembro = MiembroCuenta.objects.get(usuario=pareja)
+        self.assertEqual((miembro.cuenta_id, miembro.rol), (banco.pk, 'EDITOR'))
+        self.assertIn(banco.pk, cuentas_visibles(pareja))
+
+    def test_fichero_ajeno_se_rechaza(self):
+        import gzip
+        with gzip.open(self.ruta, 'wt') as f:
+            f.write('{"model": "mi_finanzas.cuenta"}\n')
+        with self.assertRaises(ValueError):
+            restaurar(self.ruta)
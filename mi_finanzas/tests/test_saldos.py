@@ -0,0 +1,77 @@
+# mi_finanzas/tests/test_saldos.py
+
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from mi_finanzas.models import Cuenta, Transaccion
+from mi_finanzas.saldos import saldos_diferidos
+
+User = get_user_model()
+
+
+def _updates_de_cuenta(contexto):
+    return [q for q in contexto.captured_queries
+            if q['sql'].startswith('UPDATE') and 'mi_finanzas_cuenta' in q['sql']]
+
+
+class SaldosDiferidosTestCase(TestCase):
+    """Un UPDATE por cuenta al cerrar el lote en lugar de uno por transacción."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='loteuser', password='x')
+        self.banco = Cuenta.objects.create(usuario=self.user, nombre='Banco', tipo='CHEQUES', saldo=Decimal('100.00'))
+        self.caja = Cuenta.objects.create(usuario=self.user, nombre='Caja', tipo='EFECTIVO', saldo=Decimal('0.00'))
+
+    def _tx(self, cuenta, tipo, monto):
+        return Transaccion(usuario=self.user, cuenta=cuenta, tipo=tipo, monto=Decimal(monto),
+                           fecha=date(2026, 3, 1), descripcion='Lote')
+
+    def test_un_update_por_cuenta_al_salir(self):
+        with CaptureQueriesContext(connection) as contexto:
+            with saldos_diferidos():
+                for _ in range(10):
+                    self._tx(self.banco, 'EGRESO', '5.00').save()
+                    self._tx(self.caja, 'INGRESO', '2.50').save()
+                # Todavía sin aplicar
+                self.assertEqual(Cuenta.objects.get(pk=self.banco.pk).saldo, Decimal('100.00'))
+
+        self.assertEqual(len(_updates_de_cuenta(contexto)), 2)
+        self.assertEqual(Cuenta.objects.get(pk=self.banco.pk).saldo, Decimal('50.00'))
+        self.assertEqual(Cuenta.objects.get(pk=self.caja.pk).saldo, Decimal('25.00'))
+
+    def test_ediciones_y_borrados_se_acumulan(self):
+        tx = self._tx(self.banco, 'EGRESO', '30.00')
+        tx.save()
+        otra = self._tx(self.banco, 'INGRESO', '10.00')
+        otra.save()
+
+        with CaptureQueriesContext(connection) as contexto:
+            with saldos_diferidos():
+                tx.cuenta, tx.monto = self.caja, Decimal('20.00')
+                tx.save()
+                otra.delete()
+
+        self.assertEqual(len(_updates_de_cuenta(contexto)), 2)
+        self.assertEqual(Cuenta.objects.get(pk=self.banco.pk).saldo, Decimal('100.00'))
+        self.assertEqual(Cuenta.objects.get(pk=self.caja.pk).saldo, Decimal('-20.00'))
+
+    def test_excepcion_revierte_todo(self):
+        with self.assertRaises(RuntimeError):
+            with saldos_diferidos():
+                self._tx(self.banco, 'EGRESO', '40.00').save()
+                raise RuntimeError('fallo a mitad del lote')
+
+        self.assertFalse(Transaccion.objects.exists())
+        self.assertEqual(Cuenta.objects.get(pk=self.banco.pk).saldo, Decimal('100.00'))
+
+    def test_fuera_del_lote_se_aplica_al_momento(self):
+        with CaptureQueriesContext(connection) as contexto:
+            self._tx(self.banco, 'EGRESO', '1.00').save()
+
+        self.assertEqual(len(_updates_de_cuenta(contexto)), 1)
+        self.assertEqual(Cuenta.objects.get(pk=self.banco.pk).saldo, Decimal('99.00'))
@@ -0,0 +1,219 @@
+# mi_finanzas/tests/test_shards.py
+
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+
+from dateutil.relativedelta import relativedelta
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from mi_finanzas.anomalias import detectar_anomalias
+from mi_finanzas.compartidas import compartir_cuenta, dejar_de_compartir
+from mi_finanzas.models import (
+    AnomaliaGasto, AsignacionShard, CambioRegistrado, Categoria, Cuenta, Posicion, Prestamo, SaldoMensual,
+    Transaccion, TransaccionRecurrente,
+)
+from mi_finanzas.shards import ErrorMoverUsuario, alias_para, en_shard, mover_usuario
+from mi_finanzas.tareas import ejecutar_tarea, encolar, reclamar_tarea
+from mi_finanzas.sincronizacion import cambios_desde
+
+User = get_user_model()
+
+SHARDS = ['default', 'shard_1', 'shard_2']
+
+
+@override_settings(MI_FINANZAS_SHARDS=SHARDS)
+class ShardsTestCase(TestCase):
+    """Reparto de usuarios entre varios ficheros SQLite."""
+
+    databases = set(SHARDS)
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        # Ids consecutivos: con usuario_id % 3 cada usuario cae en un shard distinto
+        self.usuarios = [User.objects.create_user(username=f'shard{i}', password='x') for i in range(3)]
+        self.cuentas = {}
+        for usuario in self.usuarios:
+            with en_shard(alias_para(usuario)):
+                self.cuentas[usuario.pk] = Cuenta.objects.create(
+                    usuario=usuario, nombre='Banco', tipo='CHEQUES', saldo=Decimal('100.00')
+                )
+
+    def test_cada_usuario_queda_en_un_shard_distinto(self):
+        aliases = {alias_para(u) for u in self.usuarios}
+        self.assertEqual(aliases, set(SHARDS))
+        self.assertEqual(AsignacionShard.objects.count(), 3)
+        for usuario in self.usuarios:
+            for alias in SHARDS:
+                esperado = 1 if alias == alias_para(usuario) else 0
+                self.assertEqual(Cuenta.objects.using(alias).filter(usuario=usuario).count(), esperado)
+
+    def test_saldo_se_actualiza_en_el_shard_de_la_transaccion(self):
+        usuario = next(u for u in self.usuarios if alias_para(u) != 'default')
+        cuenta = self.cuentas[usuario.pk]
+        # Sin shard activo: la instancia de la cuenta decide la base
+        Transaccion(usuario=usuario, cuenta=cuenta, tipo='EGRESO', monto=Decimal('30.00'),
+                    fecha=date(2026, 1, 5), descripcion='Mercado').save()
+
+        alias = alias_para(usuario)
+        self.assertEqual(Cuenta.objects.using(alias).get(pk=cuenta.pk).saldo, Decimal('70.00'))
+        self.assertEqual(Transaccion.objects.using(alias).filter(usuario=usuario).count(), 1)
+        self.assertFalse(Transaccion.objects.using('default').exists())
+
+    def test_vistas_trabajan_en_el_shard_del_usuario(self):
+        usuario = next(u for u in self.usuarios if alias_para(u) != 'default')
+        alias = alias_para(usuario)
+        with en_shard(alias):
+            ahorro = Cuenta.objects.create(usuario=usuario, nombre='Ahorro', tipo='AHORROS')
+        self.client.force_login(usuario)
+
+        respuesta = self.client.post(reverse('mi_finanzas:transferir_monto'), {
+            'cuenta_origen': self.cuentas[usuario.pk].pk, 'cuenta_destino': ahorro.pk,
+            'monto': '40.00', 'fecha': '2026-01-10', 'descripcion': 'Ahorro',
+        })
+
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertEqual(Cuenta.objects.using(alias).get(pk=ahorro.pk).saldo, Decimal('40.00'))
+        par = Transaccion.objects.using(alias).filter(usuario=usuario, es_transferencia=True)
+        self.assertEqual(par.count(), 2)
+        self.assertTrue(all(tx.transaccion_relacionada_id for tx in par))
+        self.assertContains(self.client.get(reverse('mi_finanzas:cuentas_lista')), 'Ahorro')
+
+    def test_mover_usuario_copia_y_borra_el_origen(self):
+        usuario = self.usuarios[0]
+        origen = alias_para(usuario)
+        destino = next(a for a in SHARDS if a != origen)
+        with en_shard(origen):
+            Transaccion.objects.create(usuario=usuario, cuenta=self.cuentas[usuario.pk], tipo='INGRESO',
+                                       monto=Decimal('5.00'), fecha=date(2026, 1, 2), descripcion='Interés')
+
+        mover_usuario(usuario, destino)
+
+        self.assertEqual(alias_para(usuario), destino)
+        self.assertEqual(AsignacionShard.objects.get(usuario=usuario).alias, destino)
+        self.assertFalse(Cuenta.objects.using(origen).filter(usuario=usuario).exists())
+        cuenta = Cuenta.objects.using(destino).get(usuario=usuario)
+        self.assertEqual(cuenta.saldo, Decimal('105.00'))
+        self.assertEqual(Transaccion.objects.using(destino).filter(cuenta=cuenta).count(), 1)
+        # Ids nuevos en otra base: los clientes sin conexión empiezan de cero
+        with en_shard(destino):
+            self.assertTrue(cambios_desde(usuario, (2, 0))['reiniciar'])
+        self.assertFalse(CambioRegistrado.objects.using(origen).filter(usuario=usuario).exists())
+
+    def test_mover_usuario_con_prestamo_posicion_y_cuenta_compartida(self):
+        usuario = self.usuarios[0]
+        origen = alias_para(usuario)
+        destino = next(a for a in SHARDS if a != origen)
+        pareja = User.objects.create_user(username='shardpareja', password='x')
+        AsignacionShard.objects.create(usuario=pareja, alias=origen)
+        hoy = timezone.localdate()
+        with en_shard(origen):
+            auto = Cuenta.objects.create(usuario=usuario, nombre='Coche', tipo='AUTO', saldo=Decimal('-6000.00'))
+            Prestamo.objects.create(usuario=usuario, cuenta=auto, principal=Decimal('6000.00'),
+                                    tasa_anual=Decimal('5'), plazo_meses=24, fecha_inicio=date(2025, 1, 1))
+            Transaccion.objects.create(usuario=usuario, cuenta=auto, tipo='INGRESO', monto=Decimal('263.23'),
+                                       fecha=date(2025, 1, 1), descripcion='Cuota')
+            broker = Cuenta.objects.create(usuario=usuario, nombre='Broker', tipo='INVERSION')
+            Posicion.objects.create(usuario=usuario, cuenta=broker, activo='BTC', cantidad=Decimal('0.25'))
+            ocio = Categoria.objects.create(usuario=usuario, nombre='Ocio', tipo='EGRESO')
+            # Seis meses normales y un gasto desorbitado en el mes en curso
+            for meses, monto in enumerate(['400'] + ['20', '25', '18', '22', '20', '21']):
+                Transaccion.objects.create(usuario=usuario, cuenta=self.cuentas[usuario.pk], categoria=ocio,
+                                           tipo='EGRESO', monto=Decimal(monto), descripcion='Salida',
+                                           fecha=hoy.replace(day=1) - relativedelta(months=meses))
+            compartir_cuenta(self.cuentas[usuario.pk], pareja)
+        detectar_anomalias(usuario.pk)
+
+        # Compartiendo cuentas no se mueve (los ids de las cuentas cambian)
+        with self.assertRaises(ErrorMoverUsuario):
+            mover_usuario(usuario, destino)
+        self.assertEqual(alias_para(usuario), origen)
+
+        with en_shard(origen):
+            dejar_de_compartir(self.cuentas[usuario.pk], pareja.pk)
+            anomalias = AnomaliaGasto.objects.filter(usuario=usuario).count()
+        self.assertGreater(anomalias, 0)
+        mover_usuario(usuario, destino)
+
+        with en_shard(destino):
+            prestamo = Prestamo.objects.get(usuario=usuario)
+            self.assertEqual((prestamo.cuenta.nombre, prestamo.cuotas_pagadas), ('Coche', 1))
+            self.assertEqual(prestamo.cuotas.count(), 24)
+            self.assertEqual(Posicion.objects.get(usuario=usuario).cantidad, Decimal('0.25'))
+            banco = Cuenta.objects.get(usuario=usuario, nombre='Banco')
+            self.assertEqual(SaldoMensual.objects.filter(cuenta=banco).order_by('mes').last().saldo, banco.saldo)
+            self.assertEqual(AnomaliaGasto.objects.filter(usuario=usuario).count(), anomalias)
+        self.assertFalse(Prestamo.objects.using(origen).filter(usuario=usuario).exists())
+
+    def test_rebalancear_solo_hacia_shards(self):
+        usuario = self.usuarios[0]
+        origen = alias_para(usuario)
+        # La réplica existe en DATABASES, pero el router nunca escribe en ella
+        with self.assertRaises(CommandError):
+            call_command('rebalancear_shards', usuario=usuario.username, destino='replica', stdout=StringIO())
+        self.assertEqual(alias_para(usuario), origen)
+
+        destino = next(a for a in SHARDS if a != origen)
+        call_command('rebalancear_shards', usuario=usuario.username, destino=destino, stdout=StringIO())
+        self.assertEqual(alias_para(usuario), destino)
+
+    def test_buscar_duplicados_en_el_shard_de_cada_usuario(self):
+        duplicados = {}
+        for usuario in self.usuarios:
+            with en_shard(alias_para(usuario)):
+                duplicados[alias_para(usuario)] = sorted(
+                    Transaccion.objects.create(usuario=usuario, cuenta=self.cuentas[usuario.pk], tipo='EGRESO',
+                                               monto=Decimal('3.00'), fecha=date(2026, 1, 7), descripcion='Café').pk
+                    for _ in range(2)
+                )
+
+        # Sin usuario: todos los shards
+        tarea = encolar('buscar_duplicados')
+        self.assertTrue(ejecutar_tarea(reclamar_tarea('t1')))
+        tarea.refresh_from_db()
+        self.assertEqual(tarea.resultado['grupos'], {alias: [pks] for alias, pks in duplicados.items()})
+
+        # Con usuario en los parámetros (la tarea no es suya): solo su shard
+        usuario = next(u for u in self.usuarios if alias_para(u) != 'default')
+        tarea = encolar('buscar_duplicados', usuario_id=usuario.pk)
+        self.assertTrue(ejecutar_tarea(reclamar_tarea('t1')))
+        tarea.refresh_from_db()
+        self.assertEqual(tarea.resultado['grupos'], {alias_para(usuario): [duplicados[alias_para(usuario)]]})
+
+    def test_crear_recurrentes_recorre_todos_los_shards(self):
+        for usuario in self.usuarios:
+            with en_shard(alias_para(usuario)):
+                TransaccionRecurrente.objects.create(
+                    usuario=usuario, cuenta=self.cuentas[usuario.pk], tipo='EGRESO', monto=Decimal('9.99'),
+                    descripcion='Streaming', frecuencia='MENSUAL', proximo_pago=timezone.localdate(),
+                )
+
+        call_command('crear_recurrentes', stdout=StringIO())
+
+        for usuario in self.usuarios:
+            self.assertEqual(Transaccion.objects.using(alias_para(usuario)).filter(usuario=usuario).count(), 1)
+
+    def test_admin_consulta_el_shard_elegido(self):
+        admin = User.objects.create_superuser(username='raiz', password='x')
+        self.client.force_login(admin)
+        usuario = next(u for u in self.usuarios if alias_para(u) == 'shard_2')
+        url = reverse('admin:mi_finanzas_cuenta_changelist')
+
+        respuesta = self.client.get(url, {'shard': 'shard_2', 'q': usuario.username})
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(list(respuesta.context['cl'].result_list), [self.cuentas[usuario.pk]])
+
+    def test_borrar_usuario_limpia_su_shard(self):
+        usuario = next(u for u in self.usuarios if alias_para(u) != 'default')
+        alias = alias_para(usuario)
+
+        usuario.delete()
+
+        self.assertFalse(Cuenta.objects.using(alias).filter(usuario_id=usuario.pk).exists())
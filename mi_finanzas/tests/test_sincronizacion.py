@@ -0,0 +1,190 @@
+# mi_finanzas/tests/test_sincronizacion.py
+
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from mi_finanzas.archivo import archivar_transacciones
+from mi_finanzas.compartidas import compartir_cuenta, dejar_de_compartir
+from mi_finanzas.models import (
+    CambioRegistrado, Categoria, Cuenta, Presupuesto, SecuenciaCambios, Transaccion, TransaccionRecurrente,
+)
+from mi_finanzas.sincronizacion import SQL_CARGAR_MIEMBROS, cambios_desde, compactar_cambios, leer_cursor_cambios
+
+User = get_user_model()
+
+
+class SincronizacionTestCase(TestCase):
+    """Registro de cambios por usuario (triggers) y lotes incrementales para clientes sin conexión."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(username='syncuser', password='x')
+        self.otro = User.objects.create_user(username='syncotro', password='x')
+        self.banco = Cuenta.objects.create(usuario=self.user, nombre='Banco', tipo='CHEQUES', saldo=Decimal('500.00'))
+        self.ahorro = Cuenta.objects.create(usuario=self.user, nombre='Ahorro', tipo='AHORROS', saldo=Decimal('0.00'))
+        self.comida = Categoria.objects.create(usuario=self.user, nombre='Comida', tipo='EGRESO')
+        self.compra = self._gasto('40.00', 'Súper')
+        Cuenta.objects.create(usuario=self.otro, nombre='Ajena', tipo='CHEQUES')
+
+    def _gasto(self, monto, descripcion, fecha=None):
+        return Transaccion.objects.create(usuario=self.user, cuenta=self.banco, categoria=self.comida, tipo='EGRESO',
+                                          monto=Decimal(monto), fecha=fecha or date.today(), descripcion=descripcion)
+
+    def _filas(self, lote, modelo):
+        return {fila[0]: dict(zip(lote['columnas'][modelo], fila)) for fila in lote['filas'].get(modelo, [])}
+
+    def test_secuencia_por_usuario_y_desde_cero(self):
+        secuencias = list(CambioRegistrado.objects.filter(usuario=self.user).values_list('secuencia', flat=True))
+        self.assertEqual(secuencias, list(range(1, len(secuencias) + 1)))
+        self.assertEqual(SecuenciaCambios.objects.get(usuario=self.user).ultima, len(secuencias))
+        self.assertEqual(SecuenciaCambios.objects.get(usuario=self.otro).ultima, 1)
+
+        lote = cambios_desde(self.user)
+        self.assertEqual(sorted(lote['filas']), ['categoria', 'cuenta', 'transaccion'])
+        self.assertEqual(self._filas(lote, 'cuenta')[self.banco.pk]['saldo'], Decimal('460.00'))
+        self.assertNotIn('usuario_id', lote['columnas']['transaccion'])
+        self.assertEqual((lote['mas'], lote['reiniciar'], lote['borrados']), (False, False, {}))
+        self.assertEqual(leer_cursor_cambios(lote['cursor']), (len(secuencias), 0))
+
+    def test_transferencia_registra_bulk_create_y_update(self):
+        cursor = leer_cursor_cambios(cambios_desde(self.user)['cursor'])
+        self.client.force_login(self.user)
+        self.client.post(reverse('mi_finanzas:transferir_monto'), {
+            'cuenta_origen': self.banco.pk, 'cuenta_destino': self.ahorro.pk, 'monto': '100.00',
+            'fecha': date.today().isoformat(), 'descripcion': 'Ahorro',
+        })
+
+        lote = cambios_desde(self.user, cursor)
+        # Solo lo que cambió: las dos cuentas y el par de transferencias, ya enlazadas por update()
+        self.assertEqual(sorted(self._filas(lote, 'cuenta')), sorted([self.banco.pk, self.ahorro.pk]))
+        par = self._filas(lote, 'transaccion')
+        self.assertEqual(len(par), 2)
+        self.assertNotIn(self.compra.pk, par)
+        enviada, recibida = sorted(par.values(), key=lambda fila: fila['tipo'])
+        self.assertEqual((enviada['transaccion_relacionada_id'], recibida['transaccion_relacionada_id']),
+                         (recibida['id'], enviada['id']))
+
+    def test_borrados_en_bloque_y_lotes_paginados(self):
+        cursor = leer_cursor_cambios(cambios_desde(self.user)['cursor'])
+        viejo = self._gasto('10.00', 'Viejo', fecha=date(2020, 1, 10))
+        self.compra.descripcion = 'Súper grande'
+        self.compra.save()
+        presupuesto = Presupuesto.objects.create(usuario=self.user, categoria=self.comida, monto_limite=Decimal('300'),
+                                                 mes=1, anio=2026)
+        TransaccionRecurrente.objects.create(usuario=self.user, cuenta=self.banco, tipo='EGRESO', monto=Decimal('9.99'),
+                                             descripcion='Streaming', frecuencia='MENSUAL',
+                                             proximo_pago=timezone.localdate())
+        # El archivo borra en bloque: el cliente recibe la lápida
+        archivar_transacciones(fecha_corte=date(2021, 1, 1), usuario=self.user)
+
+        filas, borrados, lotes = {}, {}, 0
+        while True:
+            lote = cambios_desde(self.user, cursor, limite=2)
+            lotes += 1
+            for modelo in lote['filas']:
+                filas.setdefault(modelo, {}).update(self._filas(lote, modelo))
+            for modelo, ids in lote['borrados'].items():
+                borrados.setdefault(modelo, set()).update(ids)
+            cursor = leer_cursor_cambios(lote['cursor'])
+            if not lote['mas']:
+                break
+        self.assertGreater(lotes, 1)
+        self.assertEqual(borrados, {'transaccion': {viejo.pk}})
+        self.assertEqual(filas['transaccion'][self.compra.pk]['descripcion'], 'Súper grande')
+        self.assertEqual(list(filas['presupuesto']), [presupuesto.pk])
+        self.assertEqual(len(filas['transaccionrecurrente']), 1)
+        self.assertEqual(cambios_desde(self.user, cursor)['filas'], {})
+
+    def test_cuentas_compartidas_llegan_a_los_miembros(self):
+        otro = User.objects.get(pk=self.otro.pk)
+        cursor = leer_cursor_cambios(cambios_desde(otro)['cursor'])
+
+        # Al darle acceso recibe la cuenta entera, con sus transacciones
+        compartir_cuenta(self.banco, self.otro, 'LECTOR')
+        otro = User.objects.get(pk=self.otro.pk)
+        lote = cambios_desde(otro, cursor)
+        self.assertEqual(list(self._filas(lote, 'cuenta')), [self.banco.pk])
+        self.assertEqual(list(self._filas(lote, 'transaccion')), [self.compra.pk])
+        cursor = leer_cursor_cambios(lote['cursor'])
+
+        # Los movimientos del propietario también; los de sus cuentas sin compartir, no
+        nueva = self._gasto('15.00', 'Farmacia')
+        Transaccion.objects.create(usuario=self.user, cuenta=self.ahorro, tipo='INGRESO', monto=Decimal('5.00'),
+                                   fecha=date.today(), descripcion='Intereses')
+        lote = cambios_desde(otro, cursor)
+        self.assertEqual(list(self._filas(lote, 'transaccion')), [nueva.pk])
+        self.assertEqual(self._filas(lote, 'cuenta')[self.banco.pk]['saldo'], Decimal('445.00'))
+        self.assertNotIn(self.ahorro.pk, self._filas(lote, 'cuenta'))
+        cursor = leer_cursor_cambios(lote['cursor'])
+
+        # Pasar a una cuenta sin compartir es, para el miembro, un borrado
+        nueva.cuenta = self.ahorro
+        nueva.save()
+        self.assertEqual(cambios_desde(otro, cursor)['borrados'], {'transaccion': [nueva.pk]})
+
+        # La carga de la migración sigue la secuencia de cada miembro sin pisarla
+        with connection.cursor() as sql:
+            for consulta in SQL_CARGAR_MIEMBROS:
+                sql.execute(consulta)
+        secuencias = list(CambioRegistrado.objects.filter(usuario=self.otro).values_list('secuencia', flat=True))
+        self.assertEqual(secuencias, list(range(1, len(secuencias) + 1)))
+        self.assertEqual(SecuenciaCambios.objects.get(usuario=self.otro).ultima, len(secuencias))
+
+        # Al quitarle acceso, lápidas de todo
+        dejar_de_compartir(self.banco, self.otro.pk)
+        otro = User.objects.get(pk=self.otro.pk)
+        lote = cambios_desde(otro, cursor)
+        self.assertEqual(lote['borrados'], {'cuenta': [self.banco.pk], 'transaccion': sorted([self.compra.pk, nueva.pk])})
+        self.assertEqual(lote['filas'], {})
+
+    def test_compactacion_y_horizonte(self):
+        antiguo = leer_cursor_cambios(cambios_desde(self.user)['cursor'])
+        for i in range(3):
+            self._gasto('1.00', f'Café {i}').delete()
+        CambioRegistrado.objects.filter(usuario=self.user, borrado=True).update(
+            fecha=timezone.now() - timedelta(days=40))
+        reciente = leer_cursor_cambios(cambios_desde(self.user)['cursor'])
+
+        superadas, lapidas = compactar_cambios(dias=30)
+        self.assertEqual(lapidas, 3)
+        self.assertGreater(superadas, 0)
+        # Una entrada por fila viva, sin lápidas
+        self.assertEqual(CambioRegistrado.objects.filter(usuario=self.user).count(), 4)
+
+        # El cliente atrasado empieza de cero, por lotes y sin volver a reiniciarse
+        lote = cambios_desde(self.user, antiguo, limite=2)
+        self.assertTrue(lote['reiniciar'])
+        transacciones = set(self._filas(lote, 'transaccion'))
+        while lote['mas']:
+            lote = cambios_desde(self.user, leer_cursor_cambios(lote['cursor']), limite=2)
+            self.assertFalse(lote['reiniciar'])
+            transacciones |= set(self._filas(lote, 'transaccion'))
+        self.assertEqual(transacciones, {self.compra.pk})
+        # El que ya había visto los borrados sigue incremental
+        self.assertFalse(cambios_desde(self.user, reciente)['reiniciar'])
+
+        call_command('compactar_cambios', stdout=StringIO())
+
+    def test_vista_de_cambios(self):
+        url = reverse('mi_finanzas:cambios_sincronizacion')
+        self.client.force_login(self.user)
+
+        datos = self.client.get(url, {'n': 2}).json()
+        self.assertTrue(datos['mas'])
+        self.assertEqual(self.client.get(url, {'desde': 'basura'}).status_code, 400)
+
+        datos = self.client.get(url).json()
+        self.assertEqual(sorted(fila[0] for fila in datos['filas']['cuenta']), sorted([self.banco.pk, self.ahorro.pk]))
+        self.assertEqual(self._filas(datos, 'cuenta')[self.banco.pk]['saldo'], '460.00')
+        siguiente = self.client.get(url, {'desde': datos['cursor']}).json()
+        self.assertEqual((siguiente['filas'], siguiente['borrados'], siguiente['cursor']), ({}, {}, datos['cursor']))
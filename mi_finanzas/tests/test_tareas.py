@@ -0,0 +1,136 @@
+# mi_finanzas/tests/test_tareas.py
+
+import os
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from mi_finanzas.models import Cuenta, Tarea, Transaccion, TransaccionArchivada
+from mi_finanzas.tareas import (
+    ejecutar_tarea, encolar, latir, reclamar_tarea, recuperar_tareas_colgadas, registrar_tarea,
+)
+
+User = get_user_model()
+
+
+@registrar_tarea('prueba_ok')
+def _prueba_ok(tarea, valor=0):
+    tarea.actualizar_progreso(50, 'a mitad')
+    return {'doble': valor * 2}
+
+
+@registrar_tarea('prueba_falla')
+def _prueba_falla(tarea):
+    raise RuntimeError('fallo simulado')
+
+
+class ColaDeTareasTestCase(TestCase):
+    """Reclamo atómico, reintentos con espera y endpoint de estado."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='tareauser', password='x')
+
+    def test_reclamo_es_exclusivo(self):
+        encolar('prueba_ok', usuario=self.user, valor=1)
+
+        primera = reclamar_tarea('t1')
+        segunda = reclamar_tarea('t2')
+
+        self.assertIsNotNone(primera)
+        self.assertEqual((primera.estado, primera.trabajador), ('EN_CURSO', 't1'))
+        self.assertIsNone(segunda)
+
+    def test_ejecucion_correcta_guarda_resultado(self):
+        encolar('prueba_ok', usuario=self.user, valor=21)
+        ejecutar_tarea(reclamar_tarea('t1'))
+
+        tarea = Tarea.objects.get()
+        self.assertEqual((tarea.estado, tarea.progreso, tarea.resultado), ('COMPLETADA', 100, {'doble': 42}))
+
+    def test_fallo_se_reintenta_con_espera_y_luego_falla(self):
+        encolar('prueba_falla', max_intentos=2)
+
+        with self.assertLogs('mi_finanzas.tareas', 'WARNING'):
+            ejecutar_tarea(reclamar_tarea('t1'))
+        tarea = Tarea.objects.get()
+        self.assertEqual((tarea.estado, tarea.intentos), ('PENDIENTE', 1))
+        self.assertGreater(tarea.disponible_desde, timezone.now())
+        self.assertIn('fallo simulado', tarea.error)
+        # Aún en espera: no se puede reclamar
+        self.assertIsNone(reclamar_tarea('t1'))
+
+        Tarea.objects.update(disponible_desde=timezone.now())
+        with self.assertLogs('mi_finanzas.tareas', 'WARNING'):
+            ejecutar_tarea(reclamar_tarea('t1'))
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.intentos), ('FALLIDA', 2))
+
+    def test_tareas_colgadas_se_reencolan(self):
+        encolar('prueba_ok')
+        reclamar_tarea('t1')
+        Tarea.objects.update(latido=timezone.now() - timedelta(hours=2))
+
+        self.assertEqual(recuperar_tareas_colgadas(limite_segundos=60), 1)
+        self.assertEqual(Tarea.objects.get().estado, 'PENDIENTE')
+
+    def test_latido_del_trabajador_evita_reencolar(self):
+        encolar('prueba_ok')
+        encolar('prueba_ok')
+        reclamar_tarea('vivo')
+        reclamar_tarea('caido')
+        Tarea.objects.update(latido=timezone.now() - timedelta(hours=2))
+
+        # Solo las tareas del trabajador que late
+        self.assertEqual(latir('vivo'), 1)
+        self.assertEqual(recuperar_tareas_colgadas(limite_segundos=60), 1)
+        self.assertEqual(dict(Tarea.objects.values_list('estado', 'trabajador')), {'EN_CURSO': 'vivo', 'PENDIENTE': ''})
+
+    def test_endpoint_de_estado_solo_para_el_propietario(self):
+        tarea = encolar('prueba_ok', usuario=self.user, valor=2)
+        ejecutar_tarea(reclamar_tarea('t1'))
+        url = reverse('mi_finanzas:estado_tarea', args=[tarea.pk])
+
+        self.client.force_login(self.user)
+        datos = self.client.get(url).json()
+        self.assertEqual(datos['estado'], 'COMPLETADA')
+        self.assertTrue(datos['terminada'])
+        self.assertEqual(datos['resultado'], {'doble': 4})
+
+        otro = User.objects.create_user(username='otro', password='x')
+        self.client.force_login(otro)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_comandos_en_segundo_plano_encolan(self):
+        cuenta = Cuenta.objects.create(usuario=self.user, nombre='Banco', tipo='CHEQUES')
+        Transaccion.objects.create(usuario=self.user, cuenta=cuenta, tipo='EGRESO', monto=Decimal('10.00'),
+                                   fecha=date(2019, 3, 1), descripcion='Antigua')
+        salida = StringIO()
+        call_command('archivar', '--usuario', 'tareauser', '--antes-de', '2020-01-01', '--en-segundo-plano',
+                     stdout=salida)
+
+        tarea = Tarea.objects.get()
+        self.assertIn(reverse('mi_finanzas:estado_tarea', args=[tarea.pk]), salida.getvalue())
+        self.assertEqual((tarea.nombre, tarea.usuario, tarea.estado), ('archivar', self.user, 'PENDIENTE'))
+        # Nada se archiva hasta que lo ejecuta un trabajador
+        self.assertFalse(TransaccionArchivada.objects.exists())
+        self.assertTrue(ejecutar_tarea(reclamar_tarea('t1')))
+        self.assertEqual(Tarea.objects.get(pk=tarea.pk).resultado, {'archivadas': 1})
+
+        descriptor, ruta = tempfile.mkstemp(suffix='.jsonl.gz')
+        os.close(descriptor)
+        self.addCleanup(os.remove, ruta)
+        call_command('respaldar', ruta, '--usuario', 'tareauser', '--en-segundo-plano', stdout=StringIO())
+        self.assertTrue(ejecutar_tarea(reclamar_tarea('t1')))
+        call_command('restaurar', ruta, '--usuario', 'tareauser', '--reemplazar', '--en-segundo-plano',
+                     stdout=StringIO())
+        self.assertTrue(ejecutar_tarea(reclamar_tarea('t1')))
+        self.assertEqual(list(Tarea.objects.order_by('pk').values_list('nombre', 'estado')),
+                         [('archivar', 'COMPLETADA'), ('respaldar', 'COMPLETADA'), ('restaurar', 'COMPLETADA')])
+        self.assertEqual(TransaccionArchivada.objects.get(usuario=self.user).descripcion, 'Antigua')
@@ -0,0 +1,101 @@
+# mi_finanzas/tests/test_valoracion.py
+
+import shutil
+import tempfile
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from mi_finanzas.models import Cuenta, Posicion, PrecioActivo
+from mi_finanzas.valoracion import ErrorPrecios, calcular_valoracion, cargar_precios, valorar_cuentas
+
+User = get_user_model()
+
+
+class ValoracionTestCase(TestCase):
+    """Precios desde CSV locales y valoración de posiciones a precio de mercado."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.directorio = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directorio)
+        self.user = User.objects.create_user(username='valuser', password='x')
+        self.banco = Cuenta.objects.create(usuario=self.user, nombre='Banco', tipo='CHEQUES', saldo=Decimal('1000.00'))
+        self.broker = Cuenta.objects.create(usuario=self.user, nombre='Broker', tipo='INVERSION', saldo=Decimal('5000.00'))
+        self.wallet = Cuenta.objects.create(usuario=self.user, nombre='Wallet', tipo='CRYPTO', saldo=Decimal('100.00'))
+        Posicion.objects.create(usuario=self.user, cuenta=self.broker, activo='vwce', cantidad=Decimal('10'))
+        Posicion.objects.create(usuario=self.user, cuenta=self.broker, activo='AAPL', cantidad=Decimal('2.5'))
+        Posicion.objects.create(usuario=self.user, cuenta=self.wallet, activo='BTC', cantidad=Decimal('0.01'))
+        Posicion.objects.create(usuario=self.user, cuenta=self.wallet, activo='NOPRICE', cantidad=Decimal('3'))
+        self._cargar('precios.csv', [
+            ('VWCE', '2026-06-01', '100.00'), ('VWCE', '2026-06-02', '110.50'),
+            ('AAPL', '2026-06-02', '200.00'), ('BTC', '2026-06-01', '60000.00'),
+        ])
+
+    def _cargar(self, nombre, filas):
+        ruta = self.directorio / nombre
+        ruta.write_text('activo,fecha,precio\n' + ''.join(f'{a},{f},{p}\n' for a, f, p in filas), encoding='utf-8')
+        with self.captureOnCommitCallbacks(execute=True):
+            return cargar_precios([ruta])
+
+    def test_carga_con_upsert_y_errores(self):
+        self.assertEqual(self._cargar('otra.csv', [('VWCE', '2026-06-02', '111.00'), ('VWCE', '2026-06-03', '112')]), 2)
+
+        self.assertEqual(PrecioActivo.objects.filter(activo='VWCE').count(), 3)
+        self.assertEqual(PrecioActivo.objects.get(activo='VWCE', fecha=date(2026, 6, 2)).precio, Decimal('111.00'))
+        with self.assertRaisesMessage(ErrorPrecios, 'línea 3'):
+            self._cargar('mala.csv', [('BTC', '2026-06-02', '1'), ('BTC', 'ayer', '2')])
+        # La carga fallida no deja nada a medias
+        self.assertFalse(PrecioActivo.objects.filter(activo='BTC', fecha=date(2026, 6, 2)).exists())
+
+    def test_valoracion_con_el_ultimo_precio(self):
+        resultado = calcular_valoracion(self.user)
+
+        self.assertEqual(set(resultado), {self.broker.pk, self.wallet.pk})
+        self.assertEqual(resultado[self.broker.pk]['valor'], Decimal('1605.00'))
+        self.assertEqual(resultado[self.broker.pk]['fecha_precio'], date(2026, 6, 2))
+        self.assertEqual(resultado[self.wallet.pk]['valor'], Decimal('600.00'))
+        self.assertEqual(resultado[self.wallet.pk]['sin_precio'], ['NOPRICE'])
+
+    def test_cache_hasta_nuevos_precios_o_posiciones(self):
+        valorar_cuentas(self.user)
+        with self.assertNumQueries(0):
+            valorar_cuentas(self.user)
+
+        self._cargar('nuevos.csv', [('BTC', '2026-06-05', '70000')])
+        self.assertEqual(valorar_cuentas(self.user)[self.wallet.pk]['valor'], Decimal('700.00'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Posicion.objects.filter(activo='BTC').get().delete()
+        self.assertEqual(valorar_cuentas(self.user)[self.wallet.pk]['valor'], Decimal('0.00'))
+
+    def test_panel_usa_el_valor_de_mercado(self):
+        self.client.force_login(self.user)
+        respuesta = self.client.get(reverse('mi_finanzas:fragmento_panel', args=['saldos']))
+        # 1000 (banco) + 1605 (broker) + 600 (wallet)
+        self.assertEqual(respuesta.context['saldo_total'], Decimal('3205.00'))
+
+    def test_vista_de_posiciones(self):
+        self.client.force_login(self.user)
+        url = reverse('mi_finanzas:posiciones_cuenta', args=[self.broker.pk])
+
+        self.client.post(url, {'activo': ' aapl ', 'cantidad': '4'})
+        self.assertEqual(Posicion.objects.get(cuenta=self.broker, activo='AAPL').cantidad, Decimal('4'))
+        self.client.post(url, {'activo': 'VWCE', 'cantidad': '0'})
+        self.assertFalse(Posicion.objects.filter(cuenta=self.broker, activo='VWCE').exists())
+
+        self.assertContains(self.client.get(url), '800.00')
+        self.assertEqual(self.client.get(reverse('mi_finanzas:posiciones_cuenta', args=[self.banco.pk])).status_code, 404)
+
+    def test_comando(self):
+        salida = StringIO()
+        call_command('cargar_precios', str(self.directorio), stdout=salida)
+        self.assertIn('4 precios cargados de 1 fichero(s)', salida.getvalue())
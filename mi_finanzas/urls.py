@@ -20,7 +20,9 @@ urlpatterns = [
     # =========================================================
     # Vista principal, la raíz de la app (ej: /mi_finanzas/)
     path('', views.resumen_financiero, name='resumen_financiero'),
-    
+    # Cada tarjeta del panel por separado (saldos, totales, presupuestos, grafico, ultimas)
+    path('panel/<slug:tarjeta>/', views.fragmento_panel, name='fragmento_panel'),
+
     # Vista de Cuentas (CLASE)
     path('cuentas/', views.CuentasListView.as_view(), name='cuentas_lista'),
     
@@ -36,6 +38,10 @@ urlpatterns = [
     path('anadir_cuenta/', views.anadir_cuenta, name='anadir_cuenta'),
     path('cuentas/<int:pk>/editar/', views.editar_cuenta, name='editar_cuenta'),    
     path('cuentas/<int:pk>/eliminar/', views.eliminar_cuenta, name='eliminar_cuenta'), 
+    path('cuentas/<int:pk>/extracto/', views.extracto_cuenta, name='extracto_cuenta'),
+    path('cuentas/<int:pk>/prestamo/', views.prestamo_cuenta, name='prestamo_cuenta'),
+    path('cuentas/<int:pk>/posiciones/', views.posiciones_cuenta, name='posiciones_cuenta'),
+    path('cuentas/<int:pk>/miembros/', views.miembros_cuenta, name='miembros_cuenta'),
 
     # =========================================================
     # 4. CRUD de Transacciones y Operaciones
@@ -43,6 +49,8 @@ urlpatterns = [
     path('anadir_transaccion/', views.anadir_transaccion, name='anadir_transaccion'),
     path('transacciones/<int:pk>/editar/', views.editar_transaccion, name='editar_transaccion'),
     path('transacciones/<int:pk>/eliminar/', views.eliminar_transaccion, name='eliminar_transaccion'),
+    path('transacciones/<int:pk>/dividir/', views.division_transaccion, name='division_transaccion'),
+    path('transacciones/autocompletar/', views.autocompletar, name='autocompletar'),
     
     # RUTA DE TRANSFERENCIA
     path('transferir/', views.transferir_monto, name='transferir_monto'), 
@@ -61,4 +69,20 @@ urlpatterns = [
     # 6. Reportes
     # =========================================================
     path('reportes/', views.reportes_financieros, name='reportes_financieros'),
+    path('prevision/', views.prevision_flujo, name='prevision_flujo'),
+    path('prevision/datos/', views.prevision_flujo_datos, name='prevision_flujo_datos'),
+    path('patrimonio/', views.historial_patrimonio, name='historial_patrimonio'),
+    path('patrimonio/datos/', views.historial_patrimonio_datos, name='historial_patrimonio_datos'),
+    path('comparativas/', views.comparativas_financieras, name='comparativas_financieras'),
+    path('comparativas/datos/', views.comparativas_financieras_datos, name='comparativas_financieras_datos'),
+
+    # =========================================================
+    # 7. Tareas en segundo plano
+    # =========================================================
+    path('tareas/<int:pk>/estado/', views.estado_tarea, name='estado_tarea'),
+
+    # =========================================================
+    # 8. Sincronización de clientes sin conexión
+    # =========================================================
+    path('sincronizar/cambios/', views.cambios_sincronizacion, name='cambios_sincronizacion'),
 ]
@@ -0,0 +1,154 @@
+"""
+Valoración a precio de mercado de las cuentas INVERSION/CRYPTO.
+
+- Posiciones (Posicion: activo, cantidad) por cuenta, en el shard del usuario.
+- Precios (PrecioActivo), compartidos y cargados de ficheros CSV locales con
+  cargar_precios(): columnas activo, fecha (AAAA-MM-DD) y precio. Se insertan
+  por lotes con upsert sobre el índice único (activo, fecha), así que volver
+  a cargar un fichero actualiza en lugar de duplicar.
+- valorar_cuentas(): una consulta de posiciones, una del último precio de
+  cada activo (subconsulta correlacionada por el índice) y un único cálculo
+  vectorizado cantidad x precio sumado por cuenta (NumPy).
+- Se valoran las cuentas visibles (propias y compartidas, mi_finanzas/compartidas.py):
+  la caché va por la versión de los datos de cada propietario
+  (mi_finanzas/versiones.py) y la versión de los precios, que cambia con cada carga.
+
+Una cuenta con posiciones vale la suma de sus posiciones con precio (las que
+no tienen se listan en 'sin_precio'); Cuenta.saldo queda como saldo contable.
+"""
+import csv
+import time
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+import numpy as np
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import OuterRef, Subquery
+
+from .compartidas import cuentas_visibles, propietarios
+from .models import Posicion, PrecioActivo
+from .versiones import version_datos
+
+_LOTE = 2000
+_CLAVE_PRECIOS = 'mi_finanzas:precios:version'
+_CACHE_SEGUNDOS = 24 * 60 * 60
+
+
+class ErrorPrecios(ValueError):
+    """Fila de un fichero de precios que no se puede interpretar."""
+
+
+def version_precios():
+    """Versión de la tabla de precios (como version_datos(): nunca se reutiliza una antigua)."""
+    version = cache.get(_CLAVE_PRECIOS)
+    if version is None:
+        cache.add(_CLAVE_PRECIOS, time.time_ns(), None)
+        version = cache.get(_CLAVE_PRECIOS)
+    return version
+
+
+def precios_cambiados():
+    try:
+        cache.incr(_CLAVE_PRECIOS)
+    except ValueError:
+        # Sin versión en caché: la próxima lectura crea una nueva
+        pass
+
+
+# ========================================================
+# --- CARGA DE PRECIOS ---
+# ========================================================
+
+def _filas_csv(fichero, nombre):
+    for numero, fila in enumerate(csv.DictReader(fichero), start=2):
+        try:
+            yield PrecioActivo(
+                activo=fila['activo'].strip().upper(),
+                fecha=date.fromisoformat(fila['fecha'].strip()),
+                precio=Decimal(fila['precio'].strip()),
+            )
+        except (KeyError, AttributeError, ValueError, InvalidOperation) as error:
+            raise ErrorPrecios(f"{nombre}, línea {numero}: fila no válida ({error!r})") from error
+
+
+def cargar_precios(rutas, lote=_LOTE):
+    """Carga (o actualiza) los precios de los CSV indicados. Devuelve el número de filas leídas."""
+    total = 0
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        for ruta in rutas:
+            with open(ruta, newline='', encoding='utf-8') as fichero:
+                filas = _filas_csv(fichero, str(ruta))
+                while bloque := list(islice(filas, lote)):
+                    PrecioActivo.objects.using(DEFAULT_DB_ALIAS).bulk_create(
+                        bloque, update_conflicts=True, unique_fields=['activo', 'fecha'], update_fields=['precio'],
+                    )
+                    total += len(bloque)
+        transaction.on_commit(precios_cambiados, using=DEFAULT_DB_ALIAS)
+    return total
+
+
+def ultimos_precios(activos):
+    """{activo: (fecha, precio)} con el último precio cargado de cada activo."""
+    ultima_fecha = PrecioActivo.objects.filter(activo=OuterRef('activo')).order_by('-fecha').values('fecha')[:1]
+    filas = (
+        PrecioActivo.objects.filter(activo__in=set(activos), fecha=Subquery(ultima_fecha))
+        .values_list('activo', 'fecha', 'precio')
+    )
+    return {activo: (fecha, precio) for activo, fecha, precio in filas}
+
+
+# ========================================================
+# --- VALORACIÓN ---
+# ========================================================
+
+def _sumar_por_cuenta(indices, cantidades, precios, n_cuentas):
+    """Valor (céntimos) de cada cuenta: suma de cantidad x precio de sus posiciones."""
+    valores = np.asarray(cantidades, dtype=np.float64) * np.asarray(precios, dtype=np.float64)
+    totales = np.bincount(np.asarray(indices, dtype=np.int64), weights=valores, minlength=n_cuentas)
+    return np.rint(totales * 100).astype(np.int64).tolist()
+
+
+def calcular_valoracion(usuario):
+    """
+    Valoración sin caché: {cuenta_id: {'valor': Decimal, 'fecha_precio': date | None,
+    'sin_precio': [activos]}} de las cuentas visibles del usuario con posiciones.
+    """
+    posiciones = list(Posicion.objects.filter(cuenta_id__in=cuentas_visibles(usuario))
+                      .values_list('cuenta_id', 'activo', 'cantidad'))
+    if not posiciones:
+        return {}
+    precios = ultimos_precios(activo for _, activo, _ in posiciones)
+
+    cuentas = sorted({cuenta_id for cuenta_id, _, _ in posiciones})
+    posicion = {cuenta_id: i for i, cuenta_id in enumerate(cuentas)}
+    resultado = {cuenta_id: {'valor': Decimal('0.00'), 'fecha_precio': None, 'sin_precio': []} for cuenta_id in cuentas}
+    indices, cantidades, valores = [], [], []
+    for cuenta_id, activo, cantidad in posiciones:
+        if activo not in precios:
+            resultado[cuenta_id]['sin_precio'].append(activo)
+            continue
+        fecha, precio = precios[activo]
+        indices.append(posicion[cuenta_id])
+        cantidades.append(float(cantidad))
+        valores.append(float(precio))
+        # La fecha más antigua de los precios usados: cuán al día está la valoración
+        anterior = resultado[cuenta_id]['fecha_precio']
+        resultado[cuenta_id]['fecha_precio'] = fecha if anterior is None else min(anterior, fecha)
+
+    for cuenta_id, centimos in zip(cuentas, _sumar_por_cuenta(indices, cantidades, valores, len(cuentas))):
+        resultado[cuenta_id]['valor'] = Decimal(centimos) / 100
+    return resultado
+
+
+def valorar_cuentas(usuario):
+    """calcular_valoracion() cacheada hasta que cambien las posiciones de algún propietario o lleguen precios nuevos."""
+    # El propio usuario va entre los propietarios: su versión cambia también al darle o quitarle acceso
+    versiones = '.'.join(str(version_datos(propietario_id)) for propietario_id in propietarios(usuario))
+    clave = f'mi_finanzas:valoracion:{usuario.pk}:{versiones}:{version_precios()}'
+    resultado = cache.get(clave)
+    if resultado is None:
+        resultado = calcular_valoracion(usuario)
+        cache.set(clave, resultado, _CACHE_SEGUNDOS)
+    return resultado
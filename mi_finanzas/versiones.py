@@ -0,0 +1,139 @@
+"""
+Versión de los datos de cada usuario, para cachear cálculos derivados
+(previsión de flujo de caja...) con claves que caducan solas:
+
+    clave = f"...:{usuario_id}:{version_datos(usuario_id)}"
+
+La versión cambia al confirmar (on_commit) cualquier escritura de cuentas,
+categorías, transacciones, recurrentes, presupuestos o posiciones del usuario:
+- save() de esos modelos, por señal post_save;
+- borrados: post_delete de los modelos pequeños y Transaccion.delete();
+  las transacciones no llevan receptor de post_delete para que los borrados
+  masivos (archivo, cascadas) sigan siendo rápidos;
+- rutas en bloque (bulk_create/update): llaman a datos_cambiados() a mano.
+
+Para cálculos de meses ya cerrados (comparativas) hay además sellos por
+usuario y mes: meses_cambiados() sella los meses que toca una escritura con
+fecha (guardar o borrar transacciones, repartos, inserciones en bloque,
+archivo) y sello_meses() da el más reciente de un rango. Un resultado
+calculado antes de ese sello ya no vale; los que no incluyen el mes, sí.
+Los cambios sin fecha (categorías, cuentas borradas, restauraciones) sellan
+todos los meses del usuario.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import router, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Categoria, Cuenta, Posicion, Presupuesto, Transaccion, TransaccionRecurrente
+from .shards import alias_actual
+
+
+def _clave(usuario_id):
+    return f'mi_finanzas:version:{usuario_id}'
+
+
+def version_datos(usuario_id):
+    """Versión actual. Si no está en caché se crea una nueva (nunca se reutiliza una antigua)."""
+    clave = _clave(usuario_id)
+    version = cache.get(clave)
+    if version is None:
+        cache.add(clave, time.time_ns(), None)
+        version = cache.get(clave)
+    return version
+
+
+def _incrementar(usuario_ids):
+    for usuario_id in usuario_ids:
+        try:
+            cache.incr(_clave(usuario_id))
+        except ValueError:
+            # Sin versión en caché: la próxima lectura crea una nueva
+            pass
+
+
+def datos_cambiados(usuario_ids, using=None):
+    """Cambia la versión de esos usuarios al confirmarse la transacción en curso (por defecto, del shard activo)."""
+    usuario_ids = set(usuario_ids)
+    if usuario_ids:
+        transaction.on_commit(lambda: _incrementar(usuario_ids), using=using or alias_actual())
+
+
+@receiver(post_save, sender=Cuenta)
+@receiver(post_save, sender=Categoria)
+@receiver(post_save, sender=Transaccion)
+@receiver(post_save, sender=TransaccionRecurrente)
+@receiver(post_save, sender=Presupuesto)
+@receiver(post_save, sender=Posicion)
+@receiver(post_delete, sender=Cuenta)
+@receiver(post_delete, sender=Categoria)
+@receiver(post_delete, sender=TransaccionRecurrente)
+@receiver(post_delete, sender=Presupuesto)
+@receiver(post_delete, sender=Posicion)
+def _al_escribir(sender, instance, using=None, **kwargs):
+    datos_cambiados([instance.usuario_id], using=using or router.db_for_write(sender, instance=instance))
+
+
+# ========================================================
+# --- SELLOS POR MES ---
+# ========================================================
+
+# Duran más que los resultados cacheados que pueden invalidar
+_SELLOS_SEGUNDOS = 2 * 24 * 60 * 60
+
+
+def _indice_mes(fecha):
+    return fecha.year * 12 + fecha.month - 1
+
+
+def _clave_mes(usuario_id, indice):
+    return f'mi_finanzas:sello:{usuario_id}:{indice}'
+
+
+def _clave_todos(usuario_id):
+    return f'mi_finanzas:sello:{usuario_id}:todos'
+
+
+def sello_meses(usuario_id, desde, hasta):
+    """Sello más reciente de los meses de 'desde' a 'hasta' (fechas, incluidas) del usuario."""
+    todos = _clave_todos(usuario_id)
+    claves = [todos] + [_clave_mes(usuario_id, indice) for indice in range(_indice_mes(desde), _indice_mes(hasta) + 1)]
+    sellos = cache.get_many(claves)
+    if todos not in sellos:
+        # Sin sello general (caché nueva o desalojada): se crea, y lo calculado antes deja de valer
+        cache.add(todos, time.time_ns(), None)
+        sellos[todos] = cache.get(todos)
+    return max(sellos.values())
+
+
+def meses_cambiados(usuario_ids, desde=None, hasta=None, using=None):
+    """
+    Sella, al confirmarse la transacción en curso (por defecto, del shard
+    activo), los meses de 'desde' a 'hasta' (fechas, incluidas) de esos
+    usuarios; sin fechas, todos sus meses.
+    """
+    usuario_ids = set(usuario_ids)
+    if not usuario_ids:
+        return
+
+    def sellar():
+        sello = time.time_ns()
+        if desde is None or hasta is None:
+            cache.set_many({_clave_todos(usuario_id): sello for usuario_id in usuario_ids}, None)
+        else:
+            cache.set_many({
+                _clave_mes(usuario_id, indice): sello
+                for usuario_id in usuario_ids for indice in range(_indice_mes(desde), _indice_mes(hasta) + 1)
+            }, _SELLOS_SEGUNDOS)
+
+    transaction.on_commit(sellar, using=using or alias_actual())
+
+
+@receiver(post_delete, sender=Categoria, dispatch_uid='mi_finanzas_meses_categoria_borrada')
+@receiver(post_save, sender=Categoria, dispatch_uid='mi_finanzas_meses_categoria_guardada')
+@receiver(post_delete, sender=Cuenta, dispatch_uid='mi_finanzas_meses_cuenta_borrada')
+def _cambio_sin_fecha(sender, instance, using=None, **kwargs):
+    # Nombres de categoría en los resultados; borrados en cascada que no pasan por Transaccion.delete()
+    meses_cambiados([instance.usuario_id], using=using or router.db_for_write(sender, instance=instance))
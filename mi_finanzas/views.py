@@ -1,11 +1,12 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import Http404, JsonResponse
 from django.views.generic import ListView, CreateView 
+from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm 
 from django.utils.decorators import method_decorator
 from django.urls import reverse_lazy
 from django.contrib import messages
-from django.db import transaction
 from django.db.models import Sum, DecimalField, Q 
 from django.db.models.functions import Coalesce
 from datetime import date
@@ -18,8 +19,31 @@ from django.core.serializers.json import DjangoJSONEncoder
 # ========================================================
 # 🔑 IMPORTACIONES CONSOLIDADAS DE MODELOS Y FORMULARIOS
 # ========================================================
-from .models import Cuenta, Transaccion, Presupuesto, Categoria 
-from .forms import TransferenciaForm, TransaccionForm, CuentaForm, PresupuestoForm, CategoriaForm 
+from .models import Cuenta, Transaccion, Presupuesto, Categoria, Etiqueta, Tarea, Prestamo, Posicion, MiembroCuenta, TIPOS_CUENTA_CREDITO, TIPOS_CUENTA_PRESTAMO, TIPOS_CUENTA_INVERSION
+from .forms import TransferenciaForm, TransaccionForm, CuentaForm, PresupuestoForm, CategoriaForm, PrestamoForm, PosicionForm, DivisionFormSet, MiembroCuentaForm
+from .anomalias import anomalias_recientes
+from .archivo import resumenes_desde
+from .autocompletar import sugerencias
+from .busqueda import buscar_transacciones
+from .compartidas import (
+    ErrorCompartir, compartir_cuenta, cuenta_accesible, cuentas_editables, cuentas_visibles,
+    dejar_de_compartir, permisos_cuentas, propietarios, transacciones_visibles,
+)
+from .comparativas import MESES, comparativa
+from .divisiones import ErrorDivision, dividir_transaccion, quitar_division
+from .etiquetas import MODOS, etiquetar, filtrar_por_etiquetas, leer_etiquetas, totales_por_etiqueta
+from .extracto import TAMANO_PAGINA, leer_cursor, pagina_extracto
+from .historial import mover_saldo_mensual, serie_patrimonio
+from .jerarquia import filas_arbol, sumar_totales, totales_por_subarbol
+from .panel import TARJETAS, TARJETAS_AFECTADAS, contexto_tarjeta
+from .prestamos import prestamo_de_pago, registrar_pago
+from .prevision import HORIZONTE_DIAS, prevision
+from .replicas import lectura_en_replica
+from .shards import atomico
+from .sincronizacion import LOTE, cambios_desde, leer_cursor_cambios
+from .valoracion import ultimos_precios, valorar_cuentas
+
+User = get_user_model()
 
 
 # ========================================================
@@ -38,115 +62,19 @@ class RegistroUsuario(CreateView):
 
 @login_required
 def resumen_financiero(request):
-    """Muestra el resumen financiero principal (Dashboard)."""
-    cuentas = Cuenta.objects.filter(usuario=request.user)
-    
-    # Cálculo del Saldo Total Neto (Activos + Pasivos Negativos)
-    saldo_total = cuentas.aggregate(total=Coalesce(Sum('saldo'), Decimal(0), output_field=DecimalField()))['total'] 
-    
-    # --- LÓGICA DE FECHAS Y TRANSACCIONES DEL MES ---
+    """
+    Muestra el resumen financiero principal (Dashboard). Solo el esqueleto: las
+    tarjetas (saldos, totales del mes, presupuestos, gráfico, últimas
+    transacciones) se piden aparte a fragmento_panel (mi_finanzas/panel.py).
+    """
     hoy = date.today()
-    primer_dia_mes = hoy.replace(day=1)
-    # Usa relativedelta para manejar cambios de mes/año correctamente
-    primer_dia_siguiente_mes = primer_dia_mes + relativedelta(months=1) 
-    
-    transacciones_mes = Transaccion.objects.filter(
-        usuario=request.user, 
-        fecha__gte=primer_dia_mes,
-        fecha__lt=primer_dia_siguiente_mes
-    )
-    
-    # 🚀 REFINAMIENTO CRÍTICO: Usar el nuevo campo 'es_transferencia'
-    transacciones_mes_sin_transfer = transacciones_mes.filter(es_transferencia=False)
-
-    # Agregación de Ingresos y Gastos (usando el QuerySet filtrado)
-    totales_mes = transacciones_mes_sin_transfer.aggregate(
-        # Ingresos: Montos > 0
-        ingresos=Coalesce(Sum('monto', filter=Q(monto__gt=0)), Decimal(0), output_field=DecimalField()),
-        # Gastos: Montos < 0 (la suma será negativa)
-        gastos=Coalesce(Sum('monto', filter=Q(monto__lt=0)), Decimal(0), output_field=DecimalField())
-    )
-    # ----------------------------------------------------
-    
-    # --- 1. LÓGICA PARA ÚLTIMAS TRANSACCIONES ---
-    ultimas_transacciones = Transaccion.objects.filter(usuario=request.user).order_by('-fecha')[:5]
-
-    # --- 2. LÓGICA PARA GRÁFICO (Gastos por Categoría) ---
-    # Usamos transacciones_mes_sin_transfer
-    gastos_por_categoria = transacciones_mes_sin_transfer.filter(monto__lt=0, categoria__isnull=False).values(
-        'categoria__nombre'
-    ).annotate(
-        # Multiplicar por -1 para obtener el valor positivo del gasto
-        gasto=Coalesce(Sum('monto'), Decimal(0), output_field=DecimalField()) * -1
-    ).order_by('-gasto')
-
-    chart_data = {
-        'labels': [item['categoria__nombre'] for item in gastos_por_categoria],
-        'data': [float(item['gasto']) for item in gastos_por_categoria], # Convertir Decimal a float para JSON
-    }
-    
-    # Convertir a JSON seguro para pasar a la plantilla
-    chart_data_json = json.dumps(chart_data)
-
-    # --- 3. LÓGICA DE PRESUPUESTOS ---
-    presupuestos_activos_list = Presupuesto.objects.filter(
-        usuario=request.user, 
-        # Filtro por mes/año del presupuesto
-        mes=hoy.month,
-        anio=hoy.year
-    )
-    
-    resultados_presupuesto = []
-    for presupuesto in presupuestos_activos_list:
-        # 🚀 REFINAMIENTO CRÍTICO: Usar el nuevo campo 'es_transferencia' en el filtro de gasto
-        gasto_actual_q = Transaccion.objects.filter(
-            usuario=request.user,
-            categoria=presupuesto.categoria,
-            fecha__gte=primer_dia_mes, 
-            fecha__lt=primer_dia_siguiente_mes,
-            monto__lt=0,
-            es_transferencia=False # <-- ¡FILTRO ACTUALIZADO!
-        ).aggregate(
-            total_gastado=Coalesce(Sum('monto'), Decimal(0), output_field=DecimalField())
-        )['total_gastado']
-        # ----------------------------------------------------
-       
-        gasto_actual = abs(gasto_actual_q)
-        restante = presupuesto.monto_limite - gasto_actual
-        porcentaje = (gasto_actual / presupuesto.monto_limite) * 100 if presupuesto.monto_limite > 0 else 0
-       
-        # Lógica simple de color de barra
-        color_barra = 'bg-success'
-        if porcentaje > 75:
-            color_barra = 'bg-warning'
-        if porcentaje > 100:
-            color_barra = 'bg-danger'
-
-        resultados_presupuesto.append({
-            'pk': presupuesto.pk,
-            'categoria': presupuesto.categoria,
-            'monto_limite': presupuesto.monto_limite,
-            'gasto_actual': gasto_actual,
-            'restante': restante,
-            'porcentaje': min(porcentaje, 100), # Limita el % de la barra visualmente a 100
-            'color_barra': color_barra,
-        })
-    # -----------------------------------------------
-
     context = {
-        'cuentas': cuentas,
-        'saldo_total': saldo_total,
-        
-        # Datos del mes
-        'ingresos_mes': totales_mes['ingresos'],
-        # Usamos abs() para mostrar los gastos como un valor positivo, como es común en UI
-        'gastos_mes': abs(totales_mes['gastos']), 
+        'tarjetas': list(TARJETAS),
         'mes_actual_str': hoy.strftime("%B %Y"),
-        
-        # Nuevos datos para el panel
-        'ultimas_transacciones': ultimas_transacciones,
-        'chart_data_json': chart_data_json, 
-        'resultados_presupuesto': resultados_presupuesto, 
+        # Capital pendiente ya calculado al registrar cada pago (mi_finanzas/prestamos.py)
+        'prestamos': Prestamo.objects.filter(cuenta_id__in=cuentas_visibles(request.user)).select_related('cuenta'),
+        # Gastos inusuales ya calculados por 'manage.py detectar_anomalias' (mi_finanzas/anomalias.py)
+        'anomalias': anomalias_recientes(request.user, hoy),
         
         # 💡 CORRECCIÓN APLICADA: Usar 'form_transferencia' para el modal del dashboard
         'form_transferencia': TransferenciaForm(user=request.user),
@@ -156,6 +84,31 @@ def resumen_financiero(request):
     return render(request, 'mi_finanzas/resumen_financiero.html', context)
 
 
+@login_required
+def fragmento_panel(request, tarjeta):
+    """HTML de una sola tarjeta del panel (GET panel/<tarjeta>/)."""
+    if tarjeta not in TARJETAS:
+        raise Http404("Tarjeta desconocida.")
+    return render(request, TARJETAS[tarjeta][1], contexto_tarjeta(tarjeta, request.user, date.today()))
+
+
+def _peticion_parcial(request):
+    """La escritura llega por fetch/HTMX desde el panel: se responde JSON, sin redirigir."""
+    return request.headers.get('HX-Request') == 'true' or request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+
+
+def _tarjetas_actualizadas(escritura, mensaje):
+    """Respuesta a una escritura parcial: las tarjetas que el panel debe volver a pedir."""
+    tarjetas = TARJETAS_AFECTADAS[escritura]
+    respuesta = JsonResponse({'ok': True, 'mensaje': mensaje, 'tarjetas': tarjetas})
+    respuesta['HX-Trigger'] = json.dumps({'panel:actualizar': {'tarjetas': tarjetas}})
+    return respuesta
+
+
+def _errores_parciales(errores):
+    return JsonResponse({'ok': False, 'errores': errores}, status=400)
+
+
 @method_decorator(login_required, name='dispatch')
 class CuentasListView(ListView):
     """Muestra la lista de cuentas del usuario."""
@@ -164,7 +117,12 @@ class CuentasListView(ListView):
     context_object_name = 'cuentas'
 
     def get_queryset(self):
-        return Cuenta.objects.filter(usuario=self.request.user)
+        # Propias y compartidas; cada una con el rol del usuario (PROPIETARIO, EDITOR o LECTOR)
+        permisos = permisos_cuentas(self.request.user)
+        cuentas = list(Cuenta.objects.filter(pk__in=cuentas_visibles(self.request.user)))
+        for cuenta in cuentas:
+            cuenta.rol = permisos[cuenta.pk][0]
+        return cuentas
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -178,15 +136,40 @@ class TransaccionesListView(ListView):
     template_name = 'mi_finanzas/transacciones_lista.html' 
     context_object_name = 'transacciones'
 
+    def _filtro_etiquetas(self):
+        # ?etiquetas=viaje,deducible&modo=y|o (todas / cualquiera)
+        modo = self.request.GET.get('modo', 'y')
+        return leer_etiquetas(self.request.GET.get('etiquetas', '')), modo if modo in MODOS else 'y'
+
     def get_queryset(self):
-        return Transaccion.objects.filter(usuario=self.request.user).order_by('-fecha')
+        etiquetas, modo = self._filtro_etiquetas()
+        # ?q=: búsqueda de texto por relevancia en el índice (mi_finanzas/busqueda.py)
+        if self.request.GET.get('q', '').strip():
+            encontradas = buscar_transacciones(self.request.user, self.request.GET['q'])
+            if not etiquetas:
+                return encontradas
+            ids = set(filtrar_por_etiquetas(
+                Transaccion.objects.filter(pk__in=[t.pk for t in encontradas]), self.request.user, etiquetas, modo,
+            ).values_list('pk', flat=True))
+            return [t for t in encontradas if t.pk in ids]
+        consulta = transacciones_visibles(self.request.user).order_by('-fecha')
+        return filtrar_por_etiquetas(consulta, self.request.user, etiquetas, modo)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        etiquetas, modo = self._filtro_etiquetas()
+        context['q'] = self.request.GET.get('q', '').strip()
+        context['selected_etiquetas'] = ', '.join(etiquetas)
+        context['selected_modo'] = modo
+        context['etiquetas'] = Etiqueta.objects.filter(usuario=self.request.user).values_list('nombre', flat=True)
+        return context
 
 # ========================================================
 # VISTA DE TRANSFERENCIA (Lógica de Negocio) - CORREGIDA
 # ========================================================
 
 @login_required
-@transaction.atomic
+@atomico
 def transferir_monto(request):
     """Maneja la lógica para transferir fondos entre cuentas."""
     if request.method == 'POST':
@@ -206,8 +189,11 @@ def transferir_monto(request):
 
             saldo_futuro_origen = cuenta_origen_bloqueada.saldo - monto
 
-            if saldo_futuro_origen < 0 and cuenta_origen_bloqueada.tipo not in ['TARJETA', 'PRESTAMO', 'HIPOTECA', 'AUTO']:
-                messages.error(request, 'Saldo insuficiente en la cuenta de origen para realizar esta transferencia.')
+            if saldo_futuro_origen < 0 and cuenta_origen_bloqueada.tipo not in TIPOS_CUENTA_CREDITO:
+                error = 'Saldo insuficiente en la cuenta de origen para realizar esta transferencia.'
+                if _peticion_parcial(request):
+                    return _errores_parciales({'__all__': [error]})
+                messages.error(request, error)
                 return redirect('mi_finanzas:resumen_financiero')
 
             # 3. Actualizar saldos (Manual para transferencias) - ¡ESTO ES CRÍTICO!
@@ -217,14 +203,18 @@ def transferir_monto(request):
             
             cuenta_origen_bloqueada.save()
             cuenta_destino_bloqueada.save()
+            # Historial de saldos a fin de mes (el saldo no pasa por Transaccion.save())
+            mover_saldo_mensual(cuenta_origen_bloqueada._state.db, cuenta_origen_bloqueada.pk, fecha, -monto)
+            mover_saldo_mensual(cuenta_destino_bloqueada._state.db, cuenta_destino_bloqueada.pk, fecha, monto)
 
             # 4. Registrar y enlazar transacciones como transferencias
             # 🔴 CORRECCIÓN CLAVE: Instanciar los objetos Transaccion 
             # y luego guardarlos, idealmente, sin activar la lógica de saldo del modelo.
             
             # Crear las instancias de Transaccion
+            # Cada movimiento es del propietario de su cuenta (puede ser una cuenta compartida)
             tx_origen = Transaccion(
-                usuario=request.user, 
+                usuario_id=cuenta_origen_bloqueada.usuario_id, 
                 cuenta=cuenta_origen_bloqueada, 
                 tipo='EGRESO', 
                 monto=monto, 
@@ -233,7 +223,7 @@ def transferir_monto(request):
                 es_transferencia=True 
             )
             tx_destino = Transaccion(
-                usuario=request.user, 
+                usuario_id=cuenta_destino_bloqueada.usuario_id, 
                 cuenta=cuenta_destino_bloqueada, 
                 tipo='INGRESO', 
                 monto=monto,
@@ -242,6 +232,10 @@ def transferir_monto(request):
                 es_transferencia=True
             )
             
+            # bulk_create no pasa por save(): la huella se calcula aquí
+            for tx in (tx_origen, tx_destino):
+                tx.huella = tx.calcular_huella()
+
             # Guardar en la base de datos de manera que el método save() del modelo se salte
             # (usamos el manager por defecto para forzar la inserción y evitar la lógica del modelo)
             Transaccion.objects.bulk_create([tx_origen, tx_destino])
@@ -253,10 +247,20 @@ def transferir_monto(request):
             # Enlazar las transacciones (usando update para no llamar a save() de nuevo)
             Transaccion.objects.filter(pk=tx_origen_db.pk).update(transaccion_relacionada=tx_destino_db)
             Transaccion.objects.filter(pk=tx_destino_db.pk).update(transaccion_relacionada=tx_origen_db)
+
+            # Una transferencia a una cuenta de préstamo es un pago de su calendario
+            prestamo = prestamo_de_pago(tx_destino_db)
+            if prestamo is not None:
+                registrar_pago(prestamo, tx_destino_db)
             
+            # Desde el panel (fetch/HTMX) solo se refrescan las tarjetas que cambian
+            if _peticion_parcial(request):
+                return _tarjetas_actualizadas('transferencia', '¡Transferencia realizada con éxito!')
             messages.success(request, '¡Transferencia realizada con éxito!')
             return redirect('mi_finanzas:resumen_financiero')
             
+        elif _peticion_parcial(request):
+            return _errores_parciales(form.errors)
         else:
             # Mostrar errores de validación del formulario
             for field, errors in form.errors.items():
@@ -301,9 +305,12 @@ def editar_cuenta(request, pk):
     cuenta = get_object_or_404(Cuenta, pk=pk, usuario=request.user)
 
     if request.method == 'POST':
+        saldo_anterior = cuenta.saldo
         form = CuentaForm(request.POST, instance=cuenta) 
         if form.is_valid():
             form.save()
+            # Un ajuste manual del saldo cuenta en el historial como movimiento de hoy
+            mover_saldo_mensual(cuenta._state.db, cuenta.pk, date.today(), cuenta.saldo - saldo_anterior)
             messages.success(request, f"La cuenta '{cuenta.nombre}' ha sido actualizada.")
             return redirect('mi_finanzas:cuentas_lista') 
         else:
@@ -322,7 +329,135 @@ def editar_cuenta(request, pk):
     return render(request, 'mi_finanzas/editar_cuenta.html', context)
 
 @login_required
-@transaction.atomic
+@atomico
+def miembros_cuenta(request, pk):
+    """Miembros de una cuenta propia: compartirla (editor o lector), cambiar el rol o quitar el acceso."""
+    cuenta = get_object_or_404(Cuenta, pk=pk, usuario=request.user)
+
+    if request.method == 'POST' and 'quitar' in request.POST:
+        dejar_de_compartir(cuenta, request.POST['quitar'])
+        messages.success(request, f"Acceso a '{cuenta.nombre}' retirado.")
+        return redirect('mi_finanzas:miembros_cuenta', pk=cuenta.pk)
+
+    if request.method == 'POST':
+        form = MiembroCuentaForm(request.POST)
+        if form.is_valid():
+            try:
+                compartir_cuenta(cuenta, form.cleaned_data['username'], form.cleaned_data['rol'])
+            except ErrorCompartir as error:
+                messages.error(request, str(error))
+            else:
+                messages.success(request, f"Cuenta '{cuenta.nombre}' compartida con {form.cleaned_data['username'].username}.")
+                return redirect('mi_finanzas:miembros_cuenta', pk=cuenta.pk)
+        else:
+            messages.error(request, "Error al compartir la cuenta. Revisa los campos.")
+    else:
+        form = MiembroCuentaForm()
+
+    miembros = list(MiembroCuenta.objects.filter(cuenta=cuenta).order_by('fecha_alta'))
+    # auth_user vive en 'default': los nombres se leen aparte (sin join entre bases)
+    nombres = dict(User.objects.filter(pk__in=[m.usuario_id for m in miembros]).values_list('pk', 'username'))
+    for miembro in miembros:
+        miembro.username = nombres.get(miembro.usuario_id, miembro.usuario_id)
+
+    context = {
+        'cuenta': cuenta,
+        'miembros': miembros,
+        'miembro_form': form,
+        'titulo': f"Compartir: {cuenta.nombre}",
+    }
+    return render(request, 'mi_finanzas/miembros_cuenta.html', context)
+
+@login_required
+@lectura_en_replica
+def extracto_cuenta(request, pk):
+    """Transacciones de una cuenta con el saldo tras cada una, paginadas por cursor (?antes=/?despues=)."""
+    cuenta = cuenta_accesible(request.user, pk)
+    try:
+        tamano = int(request.GET.get('n', TAMANO_PAGINA))
+    except ValueError:
+        tamano = TAMANO_PAGINA
+    pagina = pagina_extracto(
+        cuenta, antes=leer_cursor(request.GET.get('antes')), despues=leer_cursor(request.GET.get('despues')), tamano=tamano,
+    )
+    context = {
+        'cuenta': cuenta,
+        'pagina': pagina,
+        'titulo': f"Extracto de {cuenta.nombre}",
+    }
+    return render(request, 'mi_finanzas/extracto_cuenta.html', context)
+
+@login_required
+@atomico
+def prestamo_cuenta(request, pk):
+    """Condiciones del préstamo de una cuenta PRESTAMO/HIPOTECA/AUTO y su calendario de amortización."""
+    cuenta = get_object_or_404(Cuenta, pk=pk, usuario=request.user, tipo__in=TIPOS_CUENTA_PRESTAMO)
+    prestamo = Prestamo.objects.filter(cuenta=cuenta).first()
+
+    if request.method == 'POST':
+        form = PrestamoForm(request.POST, instance=prestamo)
+        if form.is_valid():
+            prestamo = form.save(commit=False)
+            prestamo.usuario = request.user
+            prestamo.cuenta = cuenta
+            prestamo.save()
+            messages.success(request, f"Condiciones del préstamo '{cuenta.nombre}' guardadas.")
+            return redirect('mi_finanzas:prestamo_cuenta', pk=cuenta.pk)
+        else:
+            messages.error(request, "Error al guardar el préstamo. Revisa los campos.")
+    else:
+        form = PrestamoForm(instance=prestamo, initial={'principal': abs(cuenta.saldo)} if prestamo is None else None)
+
+    context = {
+        'cuenta': cuenta,
+        'prestamo': prestamo,
+        'prestamo_form': form,
+        'cuotas': prestamo.cuotas.select_related('transaccion') if prestamo else [],
+        'titulo': f"Préstamo: {cuenta.nombre}",
+    }
+    return render(request, 'mi_finanzas/prestamo_cuenta.html', context)
+
+@login_required
+def posiciones_cuenta(request, pk):
+    """Posiciones de una cuenta INVERSION/CRYPTO y su valor de mercado. Cantidad 0 elimina la posición."""
+    cuenta = get_object_or_404(Cuenta, pk=pk, usuario=request.user, tipo__in=TIPOS_CUENTA_INVERSION)
+
+    if request.method == 'POST':
+        form = PosicionForm(request.POST)
+        if form.is_valid():
+            activo, cantidad = form.cleaned_data['activo'], form.cleaned_data['cantidad']
+            if cantidad:
+                Posicion.objects.update_or_create(
+                    cuenta=cuenta, activo=activo, defaults={'usuario': request.user, 'cantidad': cantidad},
+                )
+            else:
+                # delete() de la instancia: pasa por post_delete y cambia la versión de los datos
+                for posicion in Posicion.objects.filter(cuenta=cuenta, activo=activo):
+                    posicion.delete()
+            messages.success(request, f"Posición en {activo} actualizada.")
+            return redirect('mi_finanzas:posiciones_cuenta', pk=cuenta.pk)
+        else:
+            messages.error(request, "Error al guardar la posición. Revisa los campos.")
+    else:
+        form = PosicionForm()
+
+    posiciones = list(cuenta.posiciones.order_by('activo'))
+    precios = ultimos_precios(p.activo for p in posiciones)
+    for posicion in posiciones:
+        posicion.fecha_precio, posicion.precio = precios.get(posicion.activo, (None, None))
+        posicion.valor = None if posicion.precio is None else (posicion.cantidad * posicion.precio).quantize(Decimal('0.01'))
+
+    context = {
+        'cuenta': cuenta,
+        'posiciones': posiciones,
+        'valoracion': valorar_cuentas(request.user).get(cuenta.pk),
+        'posicion_form': form,
+        'titulo': f"Posiciones: {cuenta.nombre}",
+    }
+    return render(request, 'mi_finanzas/posiciones_cuenta.html', context)
+
+@login_required
+@atomico
 def eliminar_cuenta(request, pk):
     """Vista para eliminar una cuenta existente."""
     cuenta = get_object_or_404(Cuenta, pk=pk, usuario=request.user)
@@ -345,22 +480,28 @@ def eliminar_cuenta(request, pk):
 # ========================================================
 
 @login_required
-@transaction.atomic
+@atomico
 def anadir_transaccion(request):
     """Vista para añadir una nueva transacción."""
     if request.method == 'POST':
         form = TransaccionForm(request.POST, user=request.user) 
         if form.is_valid():
             transaccion = form.save(commit=False)
-            transaccion.usuario = request.user
+            # La transacción es del propietario de la cuenta (el propio usuario o quien se la compartió)
+            transaccion.usuario_id = transaccion.cuenta.usuario_id
             
             # 💡 NOTA: El modelo Transaccion.save() espera un 'monto' POSITIVO 
             transaccion.monto = abs(transaccion.monto) 
             
             # 🔔 El método save() del modelo Transaccion maneja la actualización del saldo.
             transaccion.save() 
+            etiquetar(transaccion, form.cleaned_data['etiquetas_texto'])
+            if _peticion_parcial(request):
+                return _tarjetas_actualizadas('transaccion', "¡Transacción añadida con éxito!")
             messages.success(request, "¡Transacción añadida con éxito!")
             return redirect('mi_finanzas:transacciones_lista')
+        elif _peticion_parcial(request):
+            return _errores_parciales(form.errors)
         else:
             messages.error(request, "Error al guardar la transacción. Revisa los campos.")
     else:
@@ -379,14 +520,17 @@ def anadir_transaccion(request):
 
 
 @login_required
-@transaction.atomic
+@atomico
 def editar_transaccion(request, pk):
     """Vista para editar una transacción existente."""
-    transaccion_antigua = get_object_or_404(Transaccion, pk=pk, usuario=request.user)
+    transaccion_antigua = get_object_or_404(Transaccion, pk=pk, cuenta_id__in=cuentas_editables(request.user))
     
     # Si la transacción es una transferencia, no permitir la edición directa
     if transaccion_antigua.es_transferencia:
-        messages.error(request, "Las transacciones de transferencia no pueden editarse directamente. Elimina y vuelve a crear la transferencia completa.")
+        error = "Las transacciones de transferencia no pueden editarse directamente. Elimina y vuelve a crear la transferencia completa."
+        if _peticion_parcial(request):
+            return _errores_parciales({'__all__': [error]})
+        messages.error(request, error)
         return redirect('mi_finanzas:transacciones_lista')
 
     if request.method == 'POST':
@@ -395,6 +539,7 @@ def editar_transaccion(request, pk):
         
         if form.is_valid():
             transaccion_nueva = form.save(commit=False)
+            transaccion_nueva.usuario_id = transaccion_nueva.cuenta.usuario_id
             
             # 💡 NOTA: El modelo Transaccion.save() espera un 'monto' POSITIVO.
             transaccion_nueva.monto = abs(transaccion_nueva.monto)
@@ -402,9 +547,13 @@ def editar_transaccion(request, pk):
             # 🔔 El método save() del modelo Transaccion maneja la reversión del viejo saldo 
             # y la aplicación del nuevo saldo, incluyendo el cambio de cuenta si aplica.
             transaccion_nueva.save() 
-            
+            etiquetar(transaccion_nueva, form.cleaned_data['etiquetas_texto'])
+            if _peticion_parcial(request):
+                return _tarjetas_actualizadas('transaccion', "¡Transacción actualizada con éxito!")
             messages.success(request, "¡Transacción actualizada con éxito!")
             return redirect('mi_finanzas:transacciones_lista') 
+        elif _peticion_parcial(request):
+            return _errores_parciales(form.errors)
         else:
             messages.error(request, "Error al actualizar la transacción. Revisa los campos.")
     else:
@@ -425,7 +574,7 @@ def editar_transaccion(request, pk):
 
 
 @login_required
-@transaction.atomic
+@atomico
 def eliminar_transaccion(request, pk):
     """
     Vista para eliminar una transacción y revertir su efecto en el saldo de la cuenta.
@@ -433,7 +582,7 @@ def eliminar_transaccion(request, pk):
     ✅ CORRECCIÓN CLAVE: Esta vista depende completamente del método 
     Transaccion.delete() del modelo para actualizar el saldo.
     """
-    transaccion = get_object_or_404(Transaccion, pk=pk, usuario=request.user)
+    transaccion = get_object_or_404(Transaccion, pk=pk, cuenta_id__in=cuentas_editables(request.user))
     
     # 🚀 REFINAMIENTO CRÍTICO: Eliminar la transferencia completa
     if transaccion.es_transferencia and transaccion.transaccion_relacionada:
@@ -452,6 +601,8 @@ def eliminar_transaccion(request, pk):
             except Transaccion.DoesNotExist:
                 pass # El par ya fue eliminado, no pasa nada.
 
+            if _peticion_parcial(request):
+                return _tarjetas_actualizadas('transferencia', "¡Transferencia eliminada y saldos ajustados con éxito!")
             messages.success(request, "¡Transferencia eliminada y saldos ajustados con éxito!")
             return redirect('mi_finanzas:transacciones_lista')
 
@@ -461,7 +612,8 @@ def eliminar_transaccion(request, pk):
     elif request.method == 'POST':
         # ✅ CORRECCIÓN CLAVE: Simplemente llamamos a .delete()
         transaccion.delete()
-        
+        if _peticion_parcial(request):
+            return _tarjetas_actualizadas('transaccion', "¡Transacción eliminada y saldo ajustado con éxito!")
         messages.success(request, "¡Transacción eliminada y saldo ajustado con éxito!")
         return redirect('mi_finanzas:transacciones_lista')
     
@@ -471,6 +623,52 @@ def eliminar_transaccion(request, pk):
     return render(request, 'mi_finanzas/eliminar_transaccion_confirm.html', context)
 
 
+@login_required
+@atomico
+def division_transaccion(request, pk):
+    """Reparte una transacción entre varias categorías (el saldo de la cuenta no cambia)."""
+    transaccion = get_object_or_404(Transaccion, pk=pk, cuenta_id__in=cuentas_editables(request.user))
+    if transaccion.es_transferencia:
+        messages.error(request, "Las transferencias no se dividen entre categorías.")
+        return redirect('mi_finanzas:transacciones_lista')
+
+    if request.method == 'POST' and 'quitar' in request.POST:
+        quitar_division(transaccion)
+        messages.success(request, "La transacción vuelve a tener una sola categoría.")
+        return redirect('mi_finanzas:transacciones_lista')
+
+    if request.method == 'POST':
+        formset = DivisionFormSet(request.POST, form_kwargs={'transaccion': transaccion})
+        if formset.is_valid():
+            lineas = [(f.cleaned_data['categoria'], f.cleaned_data['monto']) for f in formset if f.cleaned_data]
+            try:
+                dividir_transaccion(transaccion, lineas)
+            except ErrorDivision as error:
+                messages.error(request, str(error))
+            else:
+                messages.success(request, "¡Transacción dividida con éxito!")
+                return redirect('mi_finanzas:transacciones_lista')
+    else:
+        lineas = [{'categoria': d.categoria_id, 'monto': d.monto} for d in transaccion.divisiones.all()]
+        formset = DivisionFormSet(
+            initial=lineas or [{'categoria': transaccion.categoria_id, 'monto': transaccion.monto}],
+            form_kwargs={'transaccion': transaccion},
+        )
+
+    context = {
+        'transaccion': transaccion,
+        'formset': formset,
+        'titulo': "Dividir Transacción",
+    }
+    return render(request, 'mi_finanzas/dividir_transaccion.html', context)
+
+
+@login_required
+def autocompletar(request):
+    """Sugerencias (JSON) para el texto ?q=: descripciones habituales con su categoría/cuenta/monto, categorías y cuentas."""
+    return JsonResponse(sugerencias(request.user, request.GET.get('q', '')), encoder=DjangoJSONEncoder)
+
+
 # ========================================================
 # VISTAS DE PRESUPUESTOS (CRUD)
 # ========================================================
@@ -561,6 +759,7 @@ def eliminar_presupuesto(request, pk):
 # ========================================================
 
 @login_required
+@lectura_en_replica
 def reportes_financieros(request):
     """
     Genera reportes financieros agregando datos de ingresos y egresos
@@ -574,49 +773,74 @@ def reportes_financieros(request):
     # 1er día del mes de inicio (e.g., 01 de Mayo)
     fecha_inicio = fecha_5_meses_atras.replace(day=1) 
     
-    transacciones = Transaccion.objects.filter(
-        usuario=request.user, 
+    # Propias y compartidas (mi_finanzas/compartidas.py), como el panel
+    transacciones = transacciones_visibles(request.user).filter(
         fecha__gte=fecha_inicio
     )
     
     # 🚀 REFINAMIENTO CRÍTICO: Usar el nuevo campo 'es_transferencia' en los reportes
     transacciones_sin_transfer = transacciones.filter(es_transferencia=False)
+
+    # 🏷️ ?etiquetas=viaje,deducible&modo=y|o: el reporte solo de esas transacciones
+    etiquetas = leer_etiquetas(request.GET.get('etiquetas', ''))
+    modo = request.GET.get('modo') if request.GET.get('modo') in MODOS else 'y'
+    transacciones_sin_transfer = filtrar_por_etiquetas(transacciones_sin_transfer, request.user, etiquetas, modo)
     
     # --- 2. CÁLCULO DEL RESUMEN TOTAL (Variable esperada: 'resumen_mensual') ---
-    # Total de Ingresos/Egresos en el rango de 6 meses
+    # Total de Ingresos/Egresos en el rango de 6 meses.
+    # El monto se guarda POSITIVO: el signo lo da el campo 'tipo'.
     totales_agregados = transacciones_sin_transfer.aggregate(
-        ingresos=Coalesce(Sum('monto', filter=Q(monto__gt=0)), Decimal(0), output_field=DecimalField()),
-        egresos=Coalesce(Sum('monto', filter=Q(monto__lt=0)), Decimal(0), output_field=DecimalField())
+        ingresos=Coalesce(Sum('monto', filter=Q(tipo='INGRESO')), Decimal(0), output_field=DecimalField()),
+        egresos=Coalesce(Sum('monto', filter=Q(tipo='EGRESO')), Decimal(0), output_field=DecimalField())
     )
-    
+
+    # 🗄️ Meses del rango que ya están en el archivo: se suman sus resúmenes mensuales
+    resumenes_archivados = resumenes_desde(request.user, fecha_inicio)
+    if etiquetas:
+        # Los resúmenes archivados no guardan etiquetas: con filtro solo cuentan las vivas
+        resumenes_archivados = resumenes_archivados.none()
+    totales_archivados = resumenes_archivados.aggregate(
+        ingresos=Coalesce(Sum('total', filter=Q(tipo='INGRESO')), Decimal(0), output_field=DecimalField()),
+        egresos=Coalesce(Sum('total', filter=Q(tipo='EGRESO')), Decimal(0), output_field=DecimalField())
+    )
+    ingresos = totales_agregados['ingresos'] + totales_archivados['ingresos']
+    egresos = totales_agregados['egresos'] + totales_archivados['egresos']
+
     # Prepara el diccionario 'resumen_mensual' esperado por el HTML
     resumen_mensual = {
-        'ingresos': totales_agregados['ingresos'],
-        # Multiplicar egresos por -1 para que aparezca POSITIVO como "Gastos"
-        'gastos': totales_agregados['egresos'] * -1, 
-        'neto': totales_agregados['ingresos'] + totales_agregados['egresos']
+        'ingresos': ingresos,
+        'gastos': egresos,
+        'neto': ingresos - egresos
     }
     
     # --- 3. CÁLCULO DE GASTOS POR CATEGORÍA (Variable esperada: 'gastos_por_categoria') ---
-    gastos_por_categoria_qs = transacciones_sin_transfer.filter(
-        monto__lt=0, 
-        categoria__isnull=False
-    ).values(
-        'categoria__nombre'
-    ).annotate(
-        # Usa el alias 'total' esperado por la plantilla
-        total=Coalesce(Sum('monto'), Decimal(0), output_field=DecimalField()) * -1
-    ).order_by('-total')
+    # Cada categoría con el total de su subárbol (join con la tabla de cierre + GROUP BY),
+    # sumando los meses ya archivados; la tabla las muestra en orden de árbol
+    totales = sumar_totales(
+        totales_por_subarbol(transacciones_sin_transfer.filter(tipo='EGRESO')),
+        totales_por_subarbol(resumenes_archivados.filter(tipo='EGRESO'), campo='total'),
+    )
+    categorias = Categoria.objects.filter(usuario_id__in=propietarios(request.user), tipo='EGRESO')
+    gastos_por_categoria = [
+        {'categoria__nombre': fila['categoria'].nombre, 'total': fila['total'], 'nivel': fila['nivel']}
+        for fila in filas_arbol(categorias, totales)
+    ]
     
-    # Prepara la variable JSON para el script del gráfico
-    gastos_por_categoria_json = json.dumps(list(gastos_por_categoria_qs), cls=DjangoJSONEncoder)
+    # Prepara la variable JSON para el script del gráfico (solo raíces: las subcategorías ya están en su total)
+    gastos_por_categoria_json = json.dumps(
+        [fila for fila in gastos_por_categoria if fila['nivel'] == 0], cls=DjangoJSONEncoder
+    )
     
     # --- 4. Preparar el contexto final ---
     context = {
         # Lo que la plantilla espera:
         'resumen_mensual': resumen_mensual, 
-        'gastos_por_categoria': gastos_por_categoria_qs, # QuerySet para la tabla HTML
+        'gastos_por_categoria': gastos_por_categoria, # Lista (en orden de árbol) para la tabla HTML
         'gastos_por_categoria_json': gastos_por_categoria_json, # JSON para el script JS
+        # Etiquetas como dimensión del reporte (un join + GROUP BY, mi_finanzas/etiquetas.py)
+        'totales_por_etiqueta': totales_por_etiqueta(transacciones_sin_transfer),
+        'selected_etiquetas': ', '.join(etiquetas),
+        'selected_modo': modo,
         
         # Datos adicionales
         'titulo': f"Reporte de Flujo de Caja por Período ({fecha_inicio.strftime('%b %Y')} a {hoy.strftime('%b %Y')})",
@@ -625,3 +849,138 @@ def reportes_financieros(request):
     
     return render(request, 'mi_finanzas/reportes_financieros.html', context)
 
+
+
+
+# ========================================================
+# PREVISIÓN DE FLUJO DE CAJA
+# ========================================================
+
+def _dias_prevision(request):
+    try:
+        return int(request.GET.get('dias', HORIZONTE_DIAS))
+    except ValueError:
+        return HORIZONTE_DIAS
+
+
+@login_required
+def prevision_flujo(request):
+    """Saldos proyectados por cuenta según las recurrentes activas y primera fecha en negativo."""
+    datos = prevision(request.user, _dias_prevision(request))
+    context = {
+        'prevision': datos,
+        'alertas': [c for c in datos['cuentas'] if c['primer_negativo']],
+        'series_json': json.dumps({
+            'total': datos['total'],
+            'cuentas': [{'nombre': c['nombre'], 'serie': c['serie']} for c in datos['cuentas']],
+        }),
+        'titulo': f"Previsión de Flujo de Caja ({datos['dias']} días)",
+    }
+    return render(request, 'mi_finanzas/prevision_flujo.html', context)
+
+
+@login_required
+def prevision_flujo_datos(request):
+    """La misma previsión en JSON (series diarias incluidas) para gráficos o clientes externos."""
+    return JsonResponse(prevision(request.user, _dias_prevision(request)), encoder=DjangoJSONEncoder)
+
+
+# ========================================================
+# HISTORIAL DE PATRIMONIO (saldos a fin de mes)
+# ========================================================
+
+def _mes_parametro(request, nombre):
+    """Parámetro ?desde=/?hasta= con formato AAAA-MM (None si falta o no es válido)."""
+    try:
+        return date.fromisoformat(request.GET[nombre] + '-01')
+    except (KeyError, ValueError):
+        return None
+
+
+@login_required
+def historial_patrimonio(request):
+    """Patrimonio neto y saldo de cada cuenta al cierre de cada mes (por defecto, últimos 5 años)."""
+    serie = serie_patrimonio(request.user, _mes_parametro(request, 'desde'), _mes_parametro(request, 'hasta'))
+    context = {
+        'serie': serie,
+        'filas': list(zip(serie['meses'], serie['total'])),
+        'serie_json': json.dumps(serie, cls=DjangoJSONEncoder),
+        'titulo': "Evolución del Patrimonio",
+    }
+    return render(request, 'mi_finanzas/historial_patrimonio.html', context)
+
+
+@login_required
+def historial_patrimonio_datos(request):
+    """La misma serie en JSON para gráficos."""
+    serie = serie_patrimonio(request.user, _mes_parametro(request, 'desde'), _mes_parametro(request, 'hasta'))
+    return JsonResponse(serie, encoder=DjangoJSONEncoder)
+
+
+# ========================================================
+# COMPARATIVAS (interanual y medias móviles)
+# ========================================================
+
+def _comparativa(request):
+    try:
+        meses = int(request.GET.get('meses', MESES))
+    except ValueError:
+        meses = MESES
+    return comparativa(request.user, _mes_parametro(request, 'hasta'), meses)
+
+
+@login_required
+def comparativas_financieras(request):
+    """Cada mes frente al mismo mes del año anterior, medias móviles y gasto por categoría."""
+    datos = _comparativa(request)
+    context = {
+        'comparativa': datos,
+        'serie_json': json.dumps(datos['serie'], cls=DjangoJSONEncoder),
+        'titulo': "Comparativas",
+    }
+    return render(request, 'mi_finanzas/comparativas.html', context)
+
+
+@login_required
+def comparativas_financieras_datos(request):
+    """La misma comparativa en JSON para gráficos."""
+    return JsonResponse(_comparativa(request), encoder=DjangoJSONEncoder)
+
+
+# ========================================================
+# VISTAS DE TAREAS EN SEGUNDO PLANO
+# ========================================================
+
+@login_required
+def estado_tarea(request, pk):
+    """Estado y progreso de una tarea del usuario (JSON). La interfaz lo consulta periódicamente."""
+    tarea = get_object_or_404(Tarea, pk=pk, usuario=request.user)
+    return JsonResponse({
+        'id': tarea.pk,
+        'nombre': tarea.nombre,
+        'estado': tarea.estado,
+        'progreso': tarea.progreso,
+        'mensaje': tarea.mensaje,
+        'intentos': tarea.intentos,
+        'terminada': tarea.estado in ('COMPLETADA', 'FALLIDA'),
+        'resultado': tarea.resultado if tarea.estado == 'COMPLETADA' else None,
+    })
+
+
+# ========================================================
+# SINCRONIZACIÓN DE CLIENTES SIN CONEXIÓN
+# ========================================================
+
+@login_required
+@lectura_en_replica
+def cambios_sincronizacion(request):
+    """Cambios del usuario tras ?desde=<cursor>, en lotes de ?n= (JSON, mi_finanzas/sincronizacion.py)."""
+    desde = leer_cursor_cambios(request.GET.get('desde'))
+    if request.GET.get('desde') and desde is None:
+        # Un cursor roto no se trata como "desde cero": el cliente se quedaría con filas borradas
+        return JsonResponse({'error': 'Cursor no válido.'}, status=400)
+    try:
+        limite = int(request.GET.get('n', LOTE))
+    except ValueError:
+        limite = LOTE
+    return JsonResponse(cambios_desde(request.user, desde, limite), encoder=DjangoJSONEncoder)